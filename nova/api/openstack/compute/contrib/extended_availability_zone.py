@@ -36,21 +36,37 @@ class ExtendedAZController(wsgi.Controller):
     def __init__(self):
         self.mc = memorycache.get_client()
 
-    def _get_host_az(self, context, instance):
-        host = instance.get('host')
-        if not host:
-            return None
-        cache_key = "azcache-%s" % host
-        az = self.mc.get(cache_key)
-        if not az:
+    def _load_host_azs(self, context, hosts):
+        azs = {}
+        uncached = []
+        for host in hosts:
+            az = self.mc.get("azcache-%s" % host)
+            if az:
+                azs[host] = az
+            else:
+                uncached.append(host)
+        if uncached:
             elevated = context.elevated()
-            az = availability_zones.get_host_availability_zone(elevated, host)
-            self.mc.set(cache_key, az, AZ_CACHE_SECONDS)
-        return az
-
-    def _extend_server(self, context, server, instance):
+            loaded = availability_zones.get_host_availability_zones(elevated,
+                                                                    uncached)
+            for host, az in loaded.iteritems():
+                self.mc.set("azcache-%s" % host, az, AZ_CACHE_SECONDS)
+            azs.update(loaded)
+        return azs
+
+    def _extend_servers(self, req, context, servers):
         key = "%s:availability_zone" % Extended_availability_zone.alias
-        server[key] = self._get_host_az(context, instance)
+        hosts = {}
+        for server in servers:
+            db_instance = req.get_db_instance(server['id'])
+            hosts[server['id']] = db_instance.get('host')
+        azs = req.load_db_items('availability_zones',
+                                [host for host in hosts.values() if host],
+                                lambda missing: self._load_host_azs(context,
+                                                                    missing))
+        for server in servers:
+            host = hosts[server['id']]
+            server[key] = azs[host] if host else None
 
     @wsgi.extends
     def show(self, req, resp_obj, id):
@@ -58,8 +74,7 @@ class ExtendedAZController(wsgi.Controller):
         if authorize(context):
             resp_obj.attach(xml=ExtendedAZTemplate())
             server = resp_obj.obj['server']
-            db_instance = req.get_db_instance(server['id'])
-            self._extend_server(context, server, db_instance)
+            self._extend_servers(req, context, [server])
 
     @wsgi.extends
     def detail(self, req, resp_obj):
@@ -67,9 +82,7 @@ class ExtendedAZController(wsgi.Controller):
         if authorize(context):
             resp_obj.attach(xml=ExtendedAZsTemplate())
             servers = list(resp_obj.obj['servers'])
-            for server in servers:
-                db_instance = req.get_db_instance(server['id'])
-                self._extend_server(context, server, db_instance)
+            self._extend_servers(req, context, servers)
 
 
 class Extended_availability_zone(extensions.ExtensionDescriptor):
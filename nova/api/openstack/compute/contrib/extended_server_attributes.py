@@ -32,25 +32,35 @@ class ExtendedServerAttributesController(wsgi.Controller):
                                                                  **kwargs)
         self.compute_api = compute.API()
 
-    def _get_hypervisor_hostname(self, context, instance):
-        compute_node = db.compute_node_get_by_host(context, instance["host"])
-
-        try:
-            return compute_node["hypervisor_hostname"]
-        except TypeError:
-            return
-
-    def _extend_server(self, context, server, instance):
+    def _load_hypervisor_hostnames(self, context, hosts):
+        compute_nodes = db.compute_node_get_by_hosts(context, hosts)
+        return dict((compute_node['service']['host'],
+                     compute_node['hypervisor_hostname'])
+                    for compute_node in compute_nodes)
+
+    def _extend_servers(self, req, context, servers):
+        hosts = {}
+        for server in servers:
+            # server['id'] is guaranteed to be in the cache due to
+            # the core API adding it in its 'show' or 'detail' method.
+            db_instance = req.get_db_instance(server['id'])
+            hosts[server['id']] = db_instance['host']
+            for attr in ['host', 'name']:
+                if attr == 'name':
+                    key = "%s:instance_%s" % (
+                            Extended_server_attributes.alias, attr)
+                else:
+                    key = "%s:%s" % (Extended_server_attributes.alias, attr)
+                server[key] = db_instance[attr]
+
+        hypervisor_hostnames = req.load_db_items('hypervisor_hostnames',
+                [host for host in hosts.values() if host],
+                lambda missing: self._load_hypervisor_hostnames(context,
+                                                                missing))
         key = "%s:hypervisor_hostname" % Extended_server_attributes.alias
-        server[key] = self._get_hypervisor_hostname(context, instance)
-
-        for attr in ['host', 'name']:
-            if attr == 'name':
-                key = "%s:instance_%s" % (Extended_server_attributes.alias,
-                                          attr)
-            else:
-                key = "%s:%s" % (Extended_server_attributes.alias, attr)
-            server[key] = instance[attr]
+        for server in servers:
+            host = hosts[server['id']]
+            server[key] = hypervisor_hostnames[host] if host else None
 
     @wsgi.extends
     def show(self, req, resp_obj, id):
@@ -59,10 +69,7 @@ class ExtendedServerAttributesController(wsgi.Controller):
             # Attach our slave template to the response object
             resp_obj.attach(xml=ExtendedServerAttributeTemplate())
             server = resp_obj.obj['server']
-            db_instance = req.get_db_instance(server['id'])
-            # server['id'] is guaranteed to be in the cache due to
-            # the core API adding it in its 'show' method.
-            self._extend_server(context, server, db_instance)
+            self._extend_servers(req, context, [server])
 
     @wsgi.extends
     def detail(self, req, resp_obj):
@@ -70,13 +77,8 @@ class ExtendedServerAttributesController(wsgi.Controller):
         if authorize(context):
             # Attach our slave template to the response object
             resp_obj.attach(xml=ExtendedServerAttributesTemplate())
-
             servers = list(resp_obj.obj['servers'])
-            for server in servers:
-                db_instance = req.get_db_instance(server['id'])
-                # server['id'] is guaranteed to be in the cache due to
-                # the core API adding it in its 'detail' method.
-                self._extend_server(context, server, db_instance)
+            self._extend_servers(req, context, servers)
 
 
 class Extended_server_attributes(extensions.ExtensionDescriptor):
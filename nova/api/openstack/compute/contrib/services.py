@@ -15,23 +15,19 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from oslo.config import cfg
 import webob.exc
 
 from nova.api.openstack import extensions
 from nova.api.openstack import wsgi
 from nova.api.openstack import xmlutil
-from nova import availability_zones
+from nova import compute
 from nova import db
 from nova import exception
 from nova.openstack.common import log as logging
-from nova.openstack.common import timeutils
-from nova import utils
+from nova import servicegroup
 
 LOG = logging.getLogger(__name__)
 authorize = extensions.extension_authorizer('compute', 'services')
-CONF = cfg.CONF
-CONF.import_opt('service_down_time', 'nova.service')
 
 
 class ServicesIndexTemplate(xmlutil.TemplateBuilder):
@@ -59,6 +55,10 @@ class ServicesUpdateTemplate(xmlutil.TemplateBuilder):
 
 
 class ServiceController(object):
+    def __init__(self):
+        self.host_api = compute.HostAPI()
+        self.servicegroup_api = servicegroup.API()
+
     @wsgi.serializers(xml=ServicesIndexTemplate)
     def index(self, req):
         """
@@ -66,9 +66,7 @@ class ServiceController(object):
         """
         context = req.environ['nova.context']
         authorize(context)
-        now = timeutils.utcnow()
-        services = db.service_get_all(context)
-        services = availability_zones.set_availability_zones(context, services)
+        services = self.host_api.service_get_all(context, set_zones=True)
 
         host = ''
         if 'host' in req.GET:
@@ -83,8 +81,7 @@ class ServiceController(object):
 
         svcs = []
         for svc in services:
-            delta = now - (svc['updated_at'] or svc['created_at'])
-            alive = abs(utils.total_seconds(delta)) <= CONF.service_down_time
+            alive = self.servicegroup_api.service_is_up(svc)
             art = (alive and "up") or "down"
             active = 'enabled'
             if svc['disabled']:
@@ -119,7 +116,8 @@ class ServiceController(object):
             if not svc:
                 raise webob.exc.HTTPNotFound('Unknown service')
 
-            db.service_update(context, svc['id'], {'disabled': disabled})
+            self.host_api.service_update(context, svc['id'],
+                                         {'disabled': disabled})
         except exception.ServiceNotFound:
             raise webob.exc.HTTPNotFound("service not found")
 
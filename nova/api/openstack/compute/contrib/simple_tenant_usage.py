@@ -24,7 +24,6 @@ from nova.api.openstack import extensions
 from nova.api.openstack import wsgi
 from nova.api.openstack import xmlutil
 from nova.compute import api
-from nova import exception
 from nova.openstack.common import timeutils
 
 authorize_show = extensions.extension_authorizer('compute',
@@ -96,52 +95,64 @@ class SimpleTenantUsageController(object):
                 stop = period_stop
             dt = stop - start
             seconds = (dt.days * 3600 * 24 + dt.seconds +
-                       dt.microseconds / 100000.0)
+                       dt.microseconds / 1000000.0)
 
             return seconds / 3600.0
         else:
             # instance hasn't launched, so no charge
             return 0
 
+    def _tenant_totals_for_period(self, context, period_start, period_stop,
+                                  tenant_id=None):
+        compute_api = api.API()
+        totals = compute_api.get_usage_totals_by_window(context,
+                                                        period_start,
+                                                        period_stop,
+                                                        tenant_id)
+        rval = []
+        for total in totals:
+            summary = {}
+            summary['tenant_id'] = total['project_id']
+            summary['total_local_gb_usage'] = total['total_local_gb_usage']
+            summary['total_vcpus_usage'] = total['total_vcpus_usage']
+            summary['total_memory_mb_usage'] = total['total_memory_mb_usage']
+            summary['total_hours'] = total['total_hours']
+            summary['start'] = period_start
+            summary['stop'] = period_stop
+            rval.append(summary)
+        return rval
+
     def _tenant_usages_for_period(self, context, period_start,
                                   period_stop, tenant_id=None, detailed=True):
+        if not detailed:
+            # NOTE: without server usages only the totals are needed, and
+            # those are summed by the database rather than here.
+            return self._tenant_totals_for_period(context, period_start,
+                                                  period_stop, tenant_id)
 
         compute_api = api.API()
-        instances = compute_api.get_active_by_window(context,
-                                                     period_start,
-                                                     period_stop,
-                                                     tenant_id)
+        instances = compute_api.get_usage_by_window(context,
+                                                    period_start,
+                                                    period_stop,
+                                                    tenant_id)
         rval = {}
-        flavors = {}
 
         for instance in instances:
             info = {}
             info['hours'] = self._hours_for(instance,
                                             period_start,
                                             period_stop)
-            flavor_type = instance['instance_type_id']
-
-            if not flavors.get(flavor_type):
-                try:
-                    it_ref = compute_api.get_instance_type(context,
-                                                           flavor_type)
-                    flavors[flavor_type] = it_ref
-                except exception.InstanceTypeNotFound:
-                    # can't bill if there is no instance type
-                    continue
-
-            flavor = flavors[flavor_type]
 
             info['instance_id'] = instance['uuid']
             info['name'] = instance['display_name']
 
-            info['memory_mb'] = flavor['memory_mb']
-            info['local_gb'] = flavor['root_gb'] + flavor['ephemeral_gb']
-            info['vcpus'] = flavor['vcpus']
+            info['memory_mb'] = instance['memory_mb']
+            info['local_gb'] = instance['root_gb'] + instance['ephemeral_gb']
+            info['vcpus'] = instance['vcpus']
 
             info['tenant_id'] = instance['project_id']
 
-            info['flavor'] = flavor['name']
+            info['flavor'] = instance['instance_type_name']
 
             info['started_at'] = instance['launched_at']
 
@@ -164,8 +175,7 @@ class SimpleTenantUsageController(object):
             if info['tenant_id'] not in rval:
                 summary = {}
                 summary['tenant_id'] = info['tenant_id']
-                if detailed:
-                    summary['server_usages'] = []
+                summary['server_usages'] = []
                 summary['total_local_gb_usage'] = 0
                 summary['total_vcpus_usage'] = 0
                 summary['total_memory_mb_usage'] = 0
@@ -181,8 +191,7 @@ class SimpleTenantUsageController(object):
                                                  info['hours'])
 
             summary['total_hours'] += info['hours']
-            if detailed:
-                summary['server_usages'].append(info)
+            summary['server_usages'].append(info)
 
         return rval.values()
 
@@ -466,15 +466,23 @@ class Controller(wsgi.Controller):
             raise exc.HTTPBadRequest(explanation=str(err))
         return servers
 
-    def _add_instance_faults(self, ctxt, instances):
-        faults = self.compute_api.get_instance_faults(ctxt, instances)
-        if faults is not None:
-            for instance in instances:
-                faults_list = faults.get(instance['uuid'], [])
-                try:
-                    instance['fault'] = faults_list[0]
-                except IndexError:
-                    pass
+    def _add_instance_faults(self, req, instances):
+        ctxt = req.environ['nova.context']
+        instances_by_uuid = dict((instance['uuid'], instance)
+                                 for instance in instances)
+
+        def _load_faults(uuids):
+            return self.compute_api.get_instance_faults(
+                    ctxt, [instances_by_uuid[uuid] for uuid in uuids]) or {}
+
+        faults = req.load_db_items('faults', instances_by_uuid.keys(),
+                                   _load_faults)
+        for instance in instances:
+            faults_list = faults.get(instance['uuid']) or []
+            try:
+                instance['fault'] = faults_list[0]
+            except IndexError:
+                pass
 
         return instances
 
@@ -529,12 +537,16 @@ class Controller(wsgi.Controller):
             else:
                 search_opts['user_id'] = context.user_id
 
+        # The non-detailed view only shows ids, names and links, so there
+        # is no need to load any of the instance relationships.
+        columns_to_join = None if is_detail else []
+
         limit, marker = common.get_limit_and_marker(req)
         try:
-            instance_list = self.compute_api.get_all(context,
-                                                     search_opts=search_opts,
-                                                     limit=limit,
-                                                     marker=marker)
+            instance_list = self.compute_api.get_all(
+                    context, search_opts=search_opts, limit=limit,
+                    marker=marker, columns_to_join=columns_to_join,
+                    use_slave=True)
         except exception.MarkerNotFound as e:
             msg = _('marker [%s] not found') % marker
             raise exc.HTTPBadRequest(explanation=msg)
@@ -544,7 +556,7 @@ class Controller(wsgi.Controller):
             instance_list = []
 
         if is_detail:
-            self._add_instance_faults(context, instance_list)
+            self._add_instance_faults(req, instance_list)
             response = self._view_builder.detail(req, instance_list)
         else:
             response = self._view_builder.index(req, instance_list)
@@ -724,7 +736,7 @@ class Controller(wsgi.Controller):
             context = req.environ['nova.context']
             instance = self.compute_api.get(context, id)
             req.cache_db_instance(instance)
-            self._add_instance_faults(context, [instance])
+            self._add_instance_faults(req, [instance])
             return self._view_builder.show(req, instance)
         except exception.NotFound:
             msg = _("Instance could not be found")
@@ -1004,7 +1016,7 @@ class Controller(wsgi.Controller):
 
         instance.update(update_dict)
 
-        self._add_instance_faults(ctxt, [instance])
+        self._add_instance_faults(req, [instance])
         return self._view_builder.show(req, instance)
 
     @wsgi.response(202)
@@ -1294,7 +1306,7 @@ class Controller(wsgi.Controller):
 
         instance = self._get_server(context, req, id)
 
-        self._add_instance_faults(context, [instance])
+        self._add_instance_faults(req, [instance])
         view = self._view_builder.show(req, instance)
 
         # Add on the adminPass attribute since the view doesn't do it
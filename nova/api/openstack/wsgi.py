@@ -22,8 +22,10 @@ from xml.dom import minidom
 from xml.parsers import expat
 
 from lxml import etree
+from oslo.config import cfg
 import webob
 
+from nova import db
 from nova import exception
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
@@ -36,6 +38,9 @@ XMLNS_V11 = 'http://docs.openstack.org/compute/api/v1.1'
 
 XMLNS_ATOM = 'http://www.w3.org/2005/Atom'
 
+CONF = cfg.CONF
+CONF.import_opt('debug', 'nova.openstack.common.log')
+
 LOG = logging.getLogger(__name__)
 
 # The vendor content types should serialize identically to the non-vendor
@@ -100,6 +105,26 @@ class Request(webob.Request):
         """
         return self.get_db_items(key).get(item_key)
 
+    def load_db_items(self, key, item_keys, loader):
+        """
+        Allow API methods and extensions to batch-load objects related
+        to many items at once, sharing them with everything else that
+        handles the same API request.
+
+        The loader is called at most once, with the list of keys not
+        already stored, and must return a dict of the objects it found
+        by key.  Keys missing from that dict are stored as None so they
+        are not looked up again.
+        """
+        db_items = self._extension_data['db_items'].setdefault(key, {})
+        missing = [item_key for item_key in set(item_keys)
+                   if item_key not in db_items]
+        if missing:
+            loaded = loader(missing)
+            for item_key in missing:
+                db_items[item_key] = loaded.get(item_key)
+        return dict((item_key, db_items[item_key]) for item_key in item_keys)
+
     def cache_db_instances(self, instances):
         self.cache_db_items('instances', instances, 'uuid')
 
@@ -893,6 +918,9 @@ class Resource(wsgi.Application):
         #            function.  If we try to audit __call__(), we can
         #            run into troubles due to the @webob.dec.wsgify()
         #            decorator.
+        count_queries = CONF.debug
+        if count_queries:
+            db.query_count_start()
         try:
             return self._process_stack(request, action, action_args,
                                    content_type, body, accept)
@@ -904,6 +932,11 @@ class Resource(wsgi.Application):
         #                      <?xml version="1.0" encoding="TF-8"?>
         #                      raises LookupError: unknown encoding: TF-8
             return Fault(webob.exc.HTTPBadRequest(explanation=unicode(e)))
+        finally:
+            if count_queries:
+                LOG.debug(_("%(method)s %(url)s made %(count)d DB queries"),
+                          {'method': request.method, 'url': request.url,
+                           'count': db.query_count_stop()})
 
     def _process_stack(self, request, action, action_args,
                        content_type, body, accept):
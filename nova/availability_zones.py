@@ -37,11 +37,17 @@ CONF.register_opts(availability_zone_opts)
 LOG = logging.getLogger(__name__)
 
 
-def set_availability_zones(context, services):
+def set_availability_zones(context, services, metadata=None):
+    """Return services as dicts, with their availability_zone set.
+
+    metadata maps hosts to their availability zones, as returned by
+    db.aggregate_host_get_by_metadata_key().  It is looked up if not given.
+    """
     # Makes sure services isn't a sqlalchemy object
     services = [dict(service.iteritems()) for service in services]
-    metadata = db.aggregate_host_get_by_metadata_key(context,
-            key='availability_zone')
+    if metadata is None:
+        metadata = db.aggregate_host_get_by_metadata_key(context,
+                key='availability_zone')
     for service in services:
         az = CONF.internal_service_availability_zone
         if service['topic'] == "compute":
@@ -66,6 +72,19 @@ def get_host_availability_zone(context, host, conductor_api=None):
         return CONF.default_availability_zone
 
 
+def get_host_availability_zones(context, hosts):
+    """Return a dict of availability zone by host for a list of hosts."""
+    metadata = db.aggregate_host_get_by_metadata_key(context,
+            key='availability_zone')
+    azs = {}
+    for host in hosts:
+        if metadata.get(host):
+            azs[host] = list(metadata[host])[0]
+        else:
+            azs[host] = CONF.default_availability_zone
+    return azs
+
+
 def get_availability_zones(context):
     """Return available and unavailable zones."""
     enabled_services = db.service_get_all(context, False)
@@ -0,0 +1,59 @@
+# Copyright (c) 2013 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Cell scheduler filters
+"""
+
+from nova import filters
+
+
+class BaseCellFilter(filters.BaseFilter):
+    """Base class for cell filters."""
+
+    def _filter_one(self, cell, filter_properties):
+        """Return True if the cell passes the filter, otherwise False."""
+        return self.cell_passes(cell, filter_properties)
+
+    def cell_passes(self, cell, filter_properties):
+        """Return True if the CellState passes the filter, otherwise False.
+        Override this in a subclass.
+        """
+        raise NotImplementedError()
+
+
+class CellFilterHandler(filters.BaseFilterHandler):
+    def __init__(self):
+        super(CellFilterHandler, self).__init__(BaseCellFilter)
+
+
+def all_filters():
+    """Return a list of filter classes found in this directory."""
+    return CellFilterHandler().get_all_classes()
+
+
+def units_for_instance_type(cell, resource, instance_type):
+    """Return how many instances of instance_type a cell reports room for.
+
+    resource is 'ram_free' or 'disk_free'.  None is returned when the cell
+    has not reported a figure for this instance_type.
+    """
+    units_by_mb = cell.capacities.get(resource, {}).get('units_by_mb', {})
+    if resource == 'ram_free':
+        needed_mb = instance_type['memory_mb']
+    else:
+        needed_mb = (instance_type['root_gb'] +
+                     instance_type['ephemeral_gb']) * 1024
+    return units_by_mb.get(str(needed_mb))
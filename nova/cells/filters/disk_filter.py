@@ -0,0 +1,37 @@
+# Copyright (c) 2013 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Cell disk filter.  Only pass cells that report room for the requested
+instance type in their disk capacity.
+"""
+
+from nova.cells import filters
+
+
+class DiskByInstanceTypeFilter(filters.BaseCellFilter):
+    """Filter out cells without the disk for all requested instances."""
+
+    def cell_passes(self, cell, filter_properties):
+        instance_type = filter_properties.get('instance_type')
+        if not instance_type:
+            return True
+        units = filters.units_for_instance_type(cell, 'disk_free',
+                                                instance_type)
+        # A cell that hasn't reported capacity for this instance type
+        # can't be ruled out.
+        if units is None:
+            return True
+        return units >= filter_properties.get('num_instances', 1)
@@ -25,7 +25,6 @@ from nova.cells import messaging
 from nova.cells import state as cells_state
 from nova.cells import utils as cells_utils
 from nova import context
-from nova import exception
 from nova import manager
 from nova.openstack.common import importutils
 from nova.openstack.common import log as logging
@@ -152,22 +151,33 @@ class CellsManager(manager.Manager):
                     return
             return instance
 
-        rd_context = ctxt.elevated(read_deleted='yes')
-
-        for i in xrange(CONF.cells.instance_update_num_instances):
-            while True:
+        num_synced = 0
+        while num_synced < CONF.cells.instance_update_num_instances:
+            instance_uuids = []
+            for i in xrange(CONF.cells.instance_update_num_instances -
+                            num_synced):
                 # Yield to other greenthreads
                 time.sleep(0)
                 instance_uuid = _next_instance()
                 if not instance_uuid:
-                    return
-                try:
-                    instance = self.db.instance_get_by_uuid(rd_context,
-                            instance_uuid)
-                except exception.InstanceNotFound:
-                    continue
-                self._sync_instance(ctxt, instance)
-                break
+                    break
+                instance_uuids.append(instance_uuid)
+            if not instance_uuids:
+                return
+
+            # Fetch these instances with one query.  Instances that have
+            # since been hard deleted are not found, and more uuids are
+            # taken in their place.
+            rd_context = ctxt.elevated(read_deleted='yes')
+            instances = self.db.instance_get_all_by_filters(rd_context,
+                    {'uuid': instance_uuids}, 'deleted', 'asc',
+                    columns_to_join=['info_cache', 'system_metadata'])
+            instances = dict((instance['uuid'], instance)
+                             for instance in instances)
+            for instance_uuid in instance_uuids:
+                if instance_uuid in instances:
+                    self._sync_instance(ctxt, instances[instance_uuid])
+                    num_synced += 1
 
     def _sync_instance(self, ctxt, instance):
         """Broadcast an instance_update or instance_destroy message up to
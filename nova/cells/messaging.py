@@ -24,6 +24,7 @@ The interface into this module is the MessageRunner class.
 """
 import sys
 
+import eventlet
 from eventlet import queue
 from oslo.config import cfg
 
@@ -50,7 +51,18 @@ cell_messaging_opts = [
             help='Maximum number of hops for cells routing.'),
     cfg.StrOpt('scheduler',
             default='nova.cells.scheduler.CellsScheduler',
-            help='Cells scheduler to use')]
+            help='Cells scheduler to use'),
+    cfg.FloatOpt('instance_update_batch_window',
+            default=0,
+            help='Seconds to coalesce instance updates destined for the '
+                 'top level cell before sending them as one batch.  '
+                 'The default of 0 sends every update immediately.  Only '
+                 'enable batching once all parent cells are upgraded to '
+                 'accept batches, as an older parent drops them'),
+    cfg.IntOpt('instance_update_batch_size',
+            default=100,
+            help='Maximum number of instances in one batch of instance '
+                 'updates sent to the top level cell')]
 
 CONF = cfg.CONF
 CONF.import_opt('name', 'nova.cells.opts', group='cells')
@@ -693,7 +705,8 @@ class _TargetedMessageMethods(_BaseMessageMethods):
         """A parent cell has told us to send our capacity, so let's
         do so.
         """
-        self.msg_runner.tell_parents_our_capacities(message.ctxt)
+        self.msg_runner.tell_parents_our_capacities(message.ctxt,
+                                                    force=True)
 
     def service_get_by_compute_host(self, message, host_name):
         """Return the service entry for a compute host."""
@@ -726,12 +739,11 @@ class _BroadcastMessageMethods(_BaseMessageMethods):
         """Are we the API level?"""
         return not self.state_manager.get_parent_cells()
 
-    def instance_update_at_top(self, message, instance, **kwargs):
-        """Update an instance in the DB if we're a top level cell."""
-        if not self._at_the_top():
-            return
-        instance_uuid = instance['uuid']
-
+    def _fixup_instance_update(self, message, instance):
+        """Strip and convert the fields of an instance update from a
+        child cell so that it can be applied to our DB.  A fixed up
+        'info_cache' is left in the instance if there was one.
+        """
         # Remove things that we can't update in the top level cells.
         # 'metadata' is only updated in the API cell, so don't overwrite
         # it based on what child cells say.  Make sure to update
@@ -742,9 +754,9 @@ class _BroadcastMessageMethods(_BaseMessageMethods):
             instance.pop(key, None)
         instance['cell_name'] = _reverse_path(message.routing_path)
 
-        # Fixup info_cache.  We'll have to update this separately if
-        # it exists.
-        info_cache = instance.pop('info_cache', None)
+        # Fixup info_cache.  It has to be updated separately from the
+        # instance.
+        info_cache = instance.get('info_cache')
         if info_cache is not None:
             info_cache.pop('id', None)
             info_cache.pop('instance', None)
@@ -756,6 +768,14 @@ class _BroadcastMessageMethods(_BaseMessageMethods):
                     for md in instance['system_metadata']])
             instance['system_metadata'] = sys_metadata
 
+    def instance_update_at_top(self, message, instance, **kwargs):
+        """Update an instance in the DB if we're a top level cell."""
+        if not self._at_the_top():
+            return
+        instance_uuid = instance['uuid']
+        self._fixup_instance_update(message, instance)
+        info_cache = instance.pop('info_cache', None)
+
         LOG.debug(_("Got update for instance %(instance_uuid)s: "
                 "%(instance)s") % locals())
 
@@ -774,6 +794,28 @@ class _BroadcastMessageMethods(_BaseMessageMethods):
             self.db.instance_info_cache_update(message.ctxt, instance_uuid,
                     info_cache, update_cells=False)
 
+    def instance_update_batch_at_top(self, message, instances, **kwargs):
+        """Update a batch of instances in the DB in one transaction if
+        we're a top level cell.
+        """
+        if not self._at_the_top():
+            return
+        for instance in instances:
+            self._fixup_instance_update(message, instance)
+
+        LOG.debug(_("Got batched update for %d instances"), len(instances))
+
+        # The batch is sent under the context of its first update, so it
+        # may hold instances of other projects.
+        ctxt = message.ctxt.elevated(read_deleted="yes")
+        missing = self.db.instance_update_many(ctxt, instances)
+        for instance in missing:
+            info_cache = instance.pop('info_cache', None)
+            self.db.instance_create(ctxt, instance)
+            if info_cache:
+                self.db.instance_info_cache_update(ctxt, instance['uuid'],
+                        info_cache, update_cells=False)
+
     def instance_destroy_at_top(self, message, instance, **kwargs):
         """Destroy an instance from the DB if we're a top level cell."""
         if not self._at_the_top():
@@ -910,6 +952,12 @@ class MessageRunner(object):
         self.response_queues = {}
         self.methods_by_type = {}
         self.our_name = CONF.cells.name
+        # Instance updates waiting to be sent up in a batch, by uuid.
+        self._instance_updates = {}
+        self._instance_update_ctxt = None
+        self._instance_update_timer = None
+        # The capacities last sent to each parent cell, by name.
+        self._sent_capacities = {}
         for msg_type, cls in _CELL_MESSAGE_TYPE_TO_METHODS_CLS.iteritems():
             self.methods_by_type[msg_type] = cls(self)
 
@@ -1019,13 +1067,20 @@ class MessageRunner(object):
                     method_kwargs, 'up', cell, fanout=True)
             message.process()
 
-    def tell_parents_our_capacities(self, ctxt):
-        """Send our capacities to parent cells."""
+    def tell_parents_our_capacities(self, ctxt, force=False):
+        """Send our capacities to parent cells.  Unless forced, a parent
+        is skipped if it was last sent the same capacities.
+        """
         parent_cells = self.state_manager.get_parent_cells()
         if not parent_cells:
             return
         my_cell_info = self.state_manager.get_my_state()
         capacities = self.state_manager.get_our_capacities()
+        if not force:
+            parent_cells = [cell for cell in parent_cells
+                    if self._sent_capacities.get(cell.name) != capacities]
+            if not parent_cells:
+                return
         LOG.debug(_("Updating parents with our capacities: %(capacities)s"),
                 locals())
         method_kwargs = {'cell_name': my_cell_info.name,
@@ -1034,6 +1089,7 @@ class MessageRunner(object):
             message = _TargetedMessage(self, ctxt, 'update_capacities',
                     method_kwargs, 'up', cell, fanout=True)
             message.process()
+            self._sent_capacities[cell.name] = capacities
 
     def schedule_run_instance(self, ctxt, target_cell, host_sched_kwargs):
         """Called by the scheduler to tell a child cell to schedule
@@ -1053,14 +1109,54 @@ class MessageRunner(object):
         return message.process()
 
     def instance_update_at_top(self, ctxt, instance):
-        """Update an instance at the top level cell."""
-        message = _BroadcastMessage(self, ctxt, 'instance_update_at_top',
-                                    dict(instance=instance), 'up',
+        """Update an instance at the top level cell.
+
+        Unless batching is disabled, the update is merged with any other
+        pending update for the same instance and sent up later as part of
+        a batch.
+        """
+        window = CONF.cells.instance_update_batch_window
+        if window <= 0:
+            message = _BroadcastMessage(self, ctxt, 'instance_update_at_top',
+                                        dict(instance=instance), 'up',
+                                        run_locally=False)
+            message.process()
+            return
+        instance = jsonutils.to_primitive(instance)
+        if not self._instance_updates:
+            self._instance_update_ctxt = ctxt
+        self._instance_updates.setdefault(instance['uuid'],
+                                          {}).update(instance)
+        if (len(self._instance_updates) >=
+                CONF.cells.instance_update_batch_size):
+            self._flush_instance_updates()
+        elif self._instance_update_timer is None:
+            self._instance_update_timer = eventlet.spawn_after(
+                    window, self._flush_instance_updates)
+
+    def _flush_instance_updates(self):
+        """Send all pending instance updates to the top level cell as
+        one message.
+        """
+        if self._instance_update_timer is not None:
+            self._instance_update_timer.cancel()
+            self._instance_update_timer = None
+        if not self._instance_updates:
+            return
+        instances = self._instance_updates.values()
+        ctxt = self._instance_update_ctxt
+        self._instance_updates = {}
+        self._instance_update_ctxt = None
+        message = _BroadcastMessage(self, ctxt,
+                                    'instance_update_batch_at_top',
+                                    dict(instances=instances), 'up',
                                     run_locally=False)
         message.process()
 
     def instance_destroy_at_top(self, ctxt, instance):
         """Destroy an instance at the top level cell."""
+        # A pending update would only recreate the instance at the top.
+        self._instance_updates.pop(instance['uuid'], None)
         message = _BroadcastMessage(self, ctxt, 'instance_destroy_at_top',
                                     dict(instance=instance), 'up',
                                     run_locally=False)
@@ -21,6 +21,8 @@ import time
 
 from oslo.config import cfg
 
+from nova.cells import filters
+from nova.cells import weights
 from nova import compute
 from nova.compute import vm_states
 from nova.db import base
@@ -29,6 +31,16 @@ from nova.openstack.common import log as logging
 from nova.scheduler import rpcapi as scheduler_rpcapi
 
 cell_scheduler_opts = [
+        cfg.ListOpt('scheduler_filter_classes',
+                default=['nova.cells.filters.all_filters'],
+                help='Filter classes the cells scheduler should use.  '
+                        'An entry of "nova.cells.filters.all_filters" '
+                        'maps to all cells filters included with nova.'),
+        cfg.ListOpt('scheduler_weight_classes',
+                default=['nova.cells.weights.all_weighers'],
+                help='Weigher classes the cells scheduler should use.  '
+                        'An entry of "nova.cells.weights.all_weighers" '
+                        'maps to all cell weighers included with nova.'),
         cfg.IntOpt('scheduler_retries',
                 default=10,
                 help='How many retries when no cells are available.'),
@@ -53,6 +65,12 @@ class CellsScheduler(base.Base):
         self.state_manager = msg_runner.state_manager
         self.compute_api = compute.API()
         self.scheduler_rpcapi = scheduler_rpcapi.SchedulerAPI()
+        self.filter_handler = filters.CellFilterHandler()
+        self.filter_classes = self.filter_handler.get_matching_classes(
+                CONF.cells.scheduler_filter_classes)
+        self.weight_handler = weights.CellWeightHandler()
+        self.weigher_classes = self.weight_handler.get_matching_classes(
+                CONF.cells.scheduler_weight_classes)
 
     def _create_instances_here(self, ctxt, request_spec):
         instance_values = request_spec['instance_properties']
@@ -86,17 +104,31 @@ class CellsScheduler(base.Base):
         request_spec = host_sched_kwargs['request_spec']
 
         # The message we might forward to a child cell
-        cells = self._get_possible_cells()
+        cells = list(self._get_possible_cells())
+        # Shuffle first so that cells which weigh the same are picked
+        # at random.
+        random.shuffle(cells)
+
+        filter_properties = {'context': ctxt,
+                             'scheduler': self,
+                             'routing_path': message.routing_path,
+                             'request_spec': request_spec,
+                             'instance_type': request_spec.get(
+                                     'instance_type'),
+                             'num_instances': len(
+                                     request_spec['instance_uuids'])}
+        cells = self.filter_handler.get_filtered_objects(
+                self.filter_classes, cells, filter_properties)
         if not cells:
             raise exception.NoCellsAvailable()
-        cells = list(cells)
 
-        # Random selection for now
-        random.shuffle(cells)
-        target_cell = cells[0]
+        weighted_cells = self.weight_handler.get_weighed_objects(
+                self.weigher_classes, cells, filter_properties)
+        LOG.debug(_("Weighted cells: %(weighted_cells)s"), locals())
+        target_cell = weighted_cells[0].obj
 
         LOG.debug(_("Scheduling with routing_path=%(routing_path)s"),
-                locals())
+                {'routing_path': message.routing_path})
 
         if target_cell.is_me:
             # Need to create instance DB entries as the host scheduler
@@ -117,6 +117,12 @@ class CellStateManager(base.Base):
         self.parent_cells = {}
         self.child_cells = {}
         self.last_cell_db_check = datetime.datetime.min
+        # Free RAM and disk MB by compute host, the instance_type sizes
+        # and units that _update_our_capacity() last computed.
+        self._host_capacities = {}
+        self._capacity_sizes = None
+        self._ram_mb_free_units = {}
+        self._disk_mb_free_units = {}
         self._cell_db_sync()
         my_cell_capabs = {}
         for cap in CONF.cells.capabilities:
@@ -192,32 +198,35 @@ class CellStateManager(base.Base):
 
         Units are in MB, so 122880 = (10 + 100) * 1024.
 
+        Each compute host's contribution to the units is remembered, and
+        only hosts whose free RAM or disk has changed since the last
+        update (or all hosts, if the instance_type sizes changed) are
+        recomputed.  Instance types sharing a size are counted once.
+
         NOTE(comstud): Perhaps we should only report a single number
         available per instance_type.
         """
-
         compute_hosts = {}
+        for compute in self.db.compute_node_get_all(context):
+            service = compute['service']
+            if not service or service['disabled']:
+                continue
+            compute_hosts[service['host']] = (compute['free_ram_mb'],
+                                              compute['free_disk_gb'] * 1024)
 
-        def _get_compute_hosts():
-            compute_nodes = self.db.compute_node_get_all(context)
-            for compute in compute_nodes:
-                service = compute['service']
-                if not service or service['disabled']:
-                    continue
-                host = service['host']
-                compute_hosts[host] = {
-                        'free_ram_mb': compute['free_ram_mb'],
-                        'free_disk_mb': compute['free_disk_gb'] * 1024}
-
-        _get_compute_hosts()
-        if not compute_hosts:
-            self.my_cell_state.update_capacities({})
-            return
-
-        ram_mb_free_units = {}
-        disk_mb_free_units = {}
-        total_ram_mb_free = 0
-        total_disk_mb_free = 0
+        instance_types = self.db.instance_type_get_all(context)
+        ram_sizes = frozenset(instance_type['memory_mb']
+                              for instance_type in instance_types)
+        disk_sizes = frozenset((instance_type['root_gb'] +
+                                instance_type['ephemeral_gb']) * 1024
+                               for instance_type in instance_types)
+        if (ram_sizes, disk_sizes) != self._capacity_sizes:
+            self._capacity_sizes = (ram_sizes, disk_sizes)
+            self._host_capacities = {}
+            self._ram_mb_free_units = dict((str(size), 0)
+                                           for size in ram_sizes)
+            self._disk_mb_free_units = dict((str(size), 0)
+                                            for size in disk_sizes)
 
         def _free_units(tot, per_inst):
             if per_inst:
@@ -225,31 +234,38 @@ class CellStateManager(base.Base):
             else:
                 return 0
 
-        def _update_from_values(values, instance_type):
-            memory_mb = instance_type['memory_mb']
-            disk_mb = (instance_type['root_gb'] +
-                    instance_type['ephemeral_gb']) * 1024
-            ram_mb_free_units.setdefault(str(memory_mb), 0)
-            disk_mb_free_units.setdefault(str(disk_mb), 0)
-            ram_free_units = _free_units(compute_values['free_ram_mb'],
-                    memory_mb)
-            disk_free_units = _free_units(compute_values['free_disk_mb'],
-                    disk_mb)
-            ram_mb_free_units[str(memory_mb)] += ram_free_units
-            disk_mb_free_units[str(disk_mb)] += disk_free_units
-
-        instance_types = self.db.instance_type_get_all(context)
+        def _add_host(free, sign):
+            free_ram_mb, free_disk_mb = free
+            for size in ram_sizes:
+                self._ram_mb_free_units[str(size)] += (
+                        sign * _free_units(free_ram_mb, size))
+            for size in disk_sizes:
+                self._disk_mb_free_units[str(size)] += (
+                        sign * _free_units(free_disk_mb, size))
+
+        for host in set(self._host_capacities) - set(compute_hosts):
+            _add_host(self._host_capacities.pop(host), -1)
+        for host, free in compute_hosts.iteritems():
+            old_free = self._host_capacities.get(host)
+            if old_free == free:
+                continue
+            if old_free is not None:
+                _add_host(old_free, -1)
+            _add_host(free, 1)
+            self._host_capacities[host] = free
 
-        for compute_values in compute_hosts.values():
-            total_ram_mb_free += compute_values['free_ram_mb']
-            total_disk_mb_free += compute_values['free_disk_mb']
-            for instance_type in instance_types:
-                _update_from_values(compute_values, instance_type)
+        if not compute_hosts:
+            self.my_cell_state.update_capacities({})
+            return
 
+        total_ram_mb_free = sum(free[0] for free in compute_hosts.values())
+        total_disk_mb_free = sum(free[1] for free in compute_hosts.values())
         capacities = {'ram_free': {'total_mb': total_ram_mb_free,
-                                   'units_by_mb': ram_mb_free_units},
+                                   'units_by_mb':
+                                        dict(self._ram_mb_free_units)},
                       'disk_free': {'total_mb': total_disk_mb_free,
-                                    'units_by_mb': disk_mb_free_units}}
+                                    'units_by_mb':
+                                        dict(self._disk_mb_free_units)}}
         self.my_cell_state.update_capacities(capacities)
 
     @lockutils.synchronized('cell-db-sync', 'nova-')
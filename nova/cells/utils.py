@@ -17,6 +17,7 @@
 Cells Utility Methods
 """
 import random
+import uuid
 
 from nova import db
 
@@ -25,6 +26,8 @@ from nova import db
 _PATH_CELL_SEP = '!'
 # Separator used between cell name and item
 _CELL_ITEM_SEP = '@'
+# Number of uuids fetched per query when only uuids are wanted
+_UUID_PAGE_SIZE = 1000
 
 
 def get_instances_to_sync(context, updated_since=None, project_id=None,
@@ -34,6 +37,9 @@ def get_instances_to_sync(context, updated_since=None, project_id=None,
     optionally be shuffled for periodic updates so that multiple
     cells services aren't self-healing the same instances in nearly
     lockstep.
+
+    With uuids_only, the uuids are read a page at a time rather than
+    loading every instance up front.
     """
     filters = {}
     if updated_since is not None:
@@ -42,16 +48,46 @@ def get_instances_to_sync(context, updated_since=None, project_id=None,
         filters['project_id'] = project_id
     if not deleted:
         filters['deleted'] = False
+    if uuids_only:
+        return _get_instance_uuids_to_sync(context, filters, shuffle)
+    return _get_instances_to_sync(context, filters, shuffle)
+
+
+def _get_instance_uuids_to_sync(context, filters, shuffle):
+    """Generate instance uuids in pages of _UUID_PAGE_SIZE.  When
+    shuffling, start from a random point in the uuid space, wrap around
+    to the beginning, and shuffle each page.
+    """
+    start = str(uuid.uuid4()) if shuffle else None
+    marker = start
+    wrapped = start is None
+    while True:
+        uuids = db.instance_get_uuids_by_filters(context, filters,
+                limit=_UUID_PAGE_SIZE, marker=marker)
+        if wrapped and start is not None:
+            uuids = [instance_uuid for instance_uuid in uuids
+                     if instance_uuid <= start]
+        if uuids:
+            marker = uuids[-1]
+            if shuffle:
+                random.shuffle(uuids)
+            for instance_uuid in uuids:
+                yield instance_uuid
+        if len(uuids) < _UUID_PAGE_SIZE:
+            if wrapped:
+                return
+            wrapped = True
+            marker = None
+
+
+def _get_instances_to_sync(context, filters, shuffle):
     # Active instances first.
     instances = db.instance_get_all_by_filters(
             context, filters, 'deleted', 'asc')
     if shuffle:
         random.shuffle(instances)
     for instance in instances:
-        if uuids_only:
-            yield instance['uuid']
-        else:
-            yield instance
+        yield instance
 
 
 def cell_with_item(cell_name, item):
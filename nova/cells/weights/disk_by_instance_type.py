@@ -0,0 +1,48 @@
+# Copyright (c) 2013 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Weigh cells by how many instances of the requested instance type they
+have the disk for.
+"""
+
+from oslo.config import cfg
+
+from nova.cells import filters
+from nova.cells import weights
+
+disk_weigher_opts = [
+        cfg.FloatOpt('disk_weight_multiplier',
+                default=1.0,
+                help='Multiplier used for weighing disk.  Negative '
+                     'numbers mean to stack vs spread.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(disk_weigher_opts, group='cells')
+
+
+class DiskByInstanceTypeWeigher(weights.BaseCellWeigher):
+    """Weigh cells by the disk they have free for the instance type."""
+
+    def _weight_multiplier(self):
+        return CONF.cells.disk_weight_multiplier
+
+    def _weigh_object(self, cell, weight_properties):
+        instance_type = weight_properties.get('instance_type')
+        if not instance_type:
+            return 0
+        return filters.units_for_instance_type(cell, 'disk_free',
+                                               instance_type) or 0
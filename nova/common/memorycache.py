@@ -75,6 +75,12 @@ class Client(object):
             return False
         return self.set(key, value, time, min_compress_len)
 
+    def delete(self, key, time=0):
+        """Deletes the value associated with a key."""
+        if key in self.cache:
+            del self.cache[key]
+        return True
+
     def incr(self, key, delta=1):
         """Increments the value for a key."""
         value = self.get(key)
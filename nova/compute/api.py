@@ -32,6 +32,7 @@ from oslo.config import cfg
 
 from nova import availability_zones
 from nova import block_device
+from nova.common import memorycache
 from nova.compute import instance_actions
 from nova.compute import instance_types
 from nova.compute import power_state
@@ -90,6 +91,14 @@ compute_opts = [
                     'behavior of every instance having the same name, set '
                     'this option to "%(name)s".  Valid keys for the '
                     'template are: name, uuid, count.'),
+    cfg.IntOpt('host_listing_cache_ttl',
+               default=0,
+               help='Seconds to cache the compute node listing used by the '
+                    'admin os-hypervisors API and the availability zones of '
+                    'hosts shown by the os-services API. Changes show up '
+                    'once the cache expires. Each API worker has its own '
+                    'cache unless memcached_servers is set. 0 disables '
+                    'caching'),
 ]
 
 
@@ -1297,7 +1306,21 @@ class API(base.Base):
     def get_active_by_window(self, context, begin, end=None, project_id=None):
         """Get instances that were continuously active over a window."""
         return self.db.instance_get_active_by_window_joined(context, begin,
-                                                     end, project_id)
+                                                     end, project_id,
+                                                     use_slave=True)
+
+    def get_usage_totals_by_window(self, context, begin, end,
+                                   project_id=None):
+        """Get per-project usage totals for a window."""
+        return self.db.instance_usage_totals_by_window(context, begin, end,
+                                                       project_id,
+                                                       use_slave=True)
+
+    def get_usage_by_window(self, context, begin, end=None, project_id=None):
+        """Get usage records for instances active over a window."""
+        return self.db.instance_usage_get_by_window(context, begin, end,
+                                                    project_id,
+                                                    use_slave=True)
 
     #NOTE(bcwaldon): this doesn't really belong in this class
     def get_instance_type(self, context, instance_type_id):
@@ -1322,7 +1345,8 @@ class API(base.Base):
         return inst
 
     def get_all(self, context, search_opts=None, sort_key='created_at',
-                sort_dir='desc', limit=None, marker=None):
+                sort_dir='desc', limit=None, marker=None,
+                columns_to_join=None, use_slave=False):
         """Get all instances filtered by one of the given parameters.
 
         If there is no filter and the context is an admin, it will retrieve
@@ -1334,6 +1358,12 @@ class API(base.Base):
         The results will be returned sorted in the order specified by the
         'sort_dir' parameter using the key specified in the 'sort_key'
         parameter.
+
+        'columns_to_join' lists the instance relationships the caller needs
+        (for example ['metadata']).  None loads the default set.
+
+        Listings that can tolerate replication lag set use_slave to let the
+        instances be read from the slave database.
         """
 
         #TODO(bcwaldon): determine the best argument for target here
@@ -1398,10 +1428,10 @@ class API(base.Base):
                     except ValueError:
                         return []
 
-        inst_models = self._get_instances_by_filters(context, filters,
-                                                     sort_key, sort_dir,
-                                                     limit=limit,
-                                                     marker=marker)
+        inst_models = self._get_instances_by_filters(
+                context, filters, sort_key, sort_dir, limit=limit,
+                marker=marker, columns_to_join=columns_to_join,
+                use_slave=use_slave)
 
         # Convert the models to dictionaries
         instances = []
@@ -1416,7 +1446,9 @@ class API(base.Base):
     def _get_instances_by_filters(self, context, filters,
                                   sort_key, sort_dir,
                                   limit=None,
-                                  marker=None):
+                                  marker=None,
+                                  columns_to_join=None,
+                                  use_slave=False):
         if 'ip6' in filters or 'ip' in filters:
             res = self.network_api.get_instance_uuids_by_ip_filter(context,
                                                                    filters)
@@ -1425,9 +1457,10 @@ class API(base.Base):
             uuids = set([r['instance_uuid'] for r in res])
             filters['uuid'] = uuids
 
-        return self.db.instance_get_all_by_filters(context, filters,
-                                                   sort_key, sort_dir,
-                                                   limit=limit, marker=marker)
+        return self.db.instance_get_all_by_filters(
+                context, filters, sort_key, sort_dir, limit=limit,
+                marker=marker, columns_to_join=columns_to_join,
+                use_slave=use_slave)
 
     @wrap_check_policy
     @check_instance_state(vm_state=[vm_states.ACTIVE, vm_states.STOPPED])
@@ -2460,6 +2493,16 @@ class API(base.Base):
                                         host=host)
 
 
+_host_listing_cache = None
+
+
+def _get_host_listing_cache():
+    global _host_listing_cache
+    if _host_listing_cache is None:
+        _host_listing_cache = memorycache.get_client()
+    return _host_listing_cache
+
+
 class HostAPI(base.Base):
     """Sub-set of the Compute Manager API for managing host operations."""
 
@@ -2467,6 +2510,19 @@ class HostAPI(base.Base):
         self.rpcapi = rpcapi or compute_rpcapi.ComputeAPI()
         super(HostAPI, self).__init__()
 
+    def _cached_listing(self, key, fetch):
+        """Return fetch(), caching the result under key for
+        CONF.host_listing_cache_ttl seconds if it's set.
+        """
+        if CONF.host_listing_cache_ttl <= 0:
+            return fetch()
+        cache = _get_host_listing_cache()
+        listing = cache.get(key)
+        if listing is None:
+            listing = fetch()
+            cache.set(key, listing, CONF.host_listing_cache_ttl)
+        return listing
+
     def _assert_host_exists(self, context, host_name):
         """Raise HostNotFound if compute host doesn't exist."""
         if not self.db.service_get_by_host_and_topic(context, host_name,
@@ -2507,10 +2563,24 @@ class HostAPI(base.Base):
         if filters is None:
             filters = {}
         disabled = filters.pop('disabled', None)
+        set_zones = set_zones or 'availability_zone' in filters
+
+        # NOTE: the services themselves are never cached, as callers judge
+        # whether a service is up from its last heartbeat.
         services = self.db.service_get_all(context, disabled=disabled)
-        if set_zones or 'availability_zone' in filters:
-            services = availability_zones.set_availability_zones(context,
-                                                                 services)
+        if set_zones:
+            def _fetch():
+                metadata = self.db.aggregate_host_get_by_metadata_key(
+                        context, key='availability_zone')
+                return dict((host, list(zones))
+                            for host, zones in metadata.iteritems())
+
+            metadata = self._cached_listing(
+                    'host-listing-availability-zones', _fetch)
+            services = availability_zones.set_availability_zones(
+                    context, services, metadata=metadata)
+        else:
+            services = [dict(service.iteritems()) for service in services]
         ret_services = []
         for service in services:
             for key, val in filters.iteritems():
@@ -2525,6 +2595,10 @@ class HostAPI(base.Base):
         """Get service entry for the given compute hostname."""
         return self.db.service_get_by_compute_host(context, host_name)
 
+    def service_update(self, context, service_id, values):
+        """Update a service, such as to enable or disable it."""
+        return self.db.service_update(context, service_id, values)
+
     def instance_get_all_by_host(self, context, host_name):
         """Return all instances on the given host."""
         return self.db.instance_get_all_by_host(context, host_name)
@@ -2545,7 +2619,13 @@ class HostAPI(base.Base):
         return self.db.compute_node_get(context, int(compute_id))
 
     def compute_node_get_all(self, context):
-        return self.db.compute_node_get_all(context)
+        def _fetch():
+            return [jsonutils.to_primitive(compute_node,
+                                           convert_datetime=False)
+                    for compute_node in self.db.compute_node_get_all(
+                            context, use_slave=True)]
+
+        return self._cached_listing('host-listing-compute-nodes', _fetch)
 
     def compute_node_search_by_hypervisor(self, context, hypervisor_match):
         return self.db.compute_node_search_by_hypervisor(context,
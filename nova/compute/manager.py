@@ -3368,16 +3368,9 @@ class ComputeManager(manager.SchedulerDependentManager):
 
     def _update_volume_usage_cache(self, context, vol_usages, refreshed):
         """Updates the volume usage cache table with a list of stats."""
-        for usage in vol_usages:
-            # Allow switching of greenthreads between queries.
-            greenthread.sleep(0)
-            self.conductor_api.vol_usage_update(context, usage['volume'],
-                                                usage['rd_req'],
-                                                usage['rd_bytes'],
-                                                usage['wr_req'],
-                                                usage['wr_bytes'],
-                                                usage['instance'],
-                                                last_refreshed=refreshed)
+        if vol_usages:
+            self.conductor_api.vol_usage_bulk_update(context, vol_usages,
+                                                     last_refreshed=refreshed)
 
     def _send_volume_usage_notifications(self, context, start_time):
         """Queries vol usage cache table and sends a vol usage notification."""
@@ -3448,8 +3441,10 @@ class ComputeManager(manager.SchedulerDependentManager):
         loop, one database record at a time, checking if the hypervisor has the
         same power state as is in the database.
         """
-        db_instances = self.conductor_api.instance_get_all_by_host(context,
-                                                                   self.host)
+        # Only instance columns are needed here; each instance is re-read
+        # in full before anything is changed.
+        db_instances = self.conductor_api.instance_get_all_by_host(
+                context, self.host, columns_to_join=[])
 
         num_vm_instances = self.driver.get_num_instances()
         num_db_instances = len(db_instances)
@@ -3458,17 +3453,34 @@ class ComputeManager(manager.SchedulerDependentManager):
             LOG.warn(_("Found %(num_db_instances)s in the database and "
                        "%(num_vm_instances)s on the hypervisor.") % locals())
 
+        # Take one snapshot of every domain on the host rather than asking
+        # the hypervisor about each instance in turn.
+        try:
+            vm_infos = self.driver.get_info_all()
+        except NotImplementedError:
+            vm_infos = None
+
         for db_instance in db_instances:
             if db_instance['task_state'] is not None:
                 LOG.info(_("During sync_power_state the instance has a "
                            "pending task. Skip."), instance=db_instance)
                 continue
             # No pending tasks. Now try to figure out the real vm_power_state.
-            try:
-                vm_instance = self.driver.get_info(db_instance)
-                vm_power_state = vm_instance['state']
-            except exception.InstanceNotFound:
-                vm_power_state = power_state.NOSTATE
+            vm_power_state = None
+            if vm_infos is not None:
+                vm_instance = vm_infos.get(db_instance['name'])
+                if (vm_instance is not None and
+                        vm_instance['state'] == db_instance['power_state']):
+                    vm_power_state = vm_instance['state']
+            # NOTE: the snapshot may be stale by now, so anything that
+            # disagrees with the database is confirmed with the hypervisor
+            # before acting on it.
+            if vm_power_state is None:
+                try:
+                    vm_instance = self.driver.get_info(db_instance)
+                    vm_power_state = vm_instance['state']
+                except exception.InstanceNotFound:
+                    vm_power_state = power_state.NOSTATE
             # Note(maoy): the above get_info call might take a long time,
             # for example, because of a broken libvirt driver.
             self._sync_instance_power_state(context,
@@ -3769,7 +3781,8 @@ class ComputeManager(manager.SchedulerDependentManager):
         if CONF.image_cache_manager_interval == 0:
             return
 
-        all_instances = self.conductor_api.instance_get_all(context)
+        all_instances = self.conductor_api.instance_get_all(
+                context, columns_to_join=[])
 
         # Determine what other nodes use this storage
         storage_users.register_storage_use(CONF.instances_path, CONF.host)
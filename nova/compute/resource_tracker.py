@@ -28,10 +28,12 @@ from nova.compute import vm_states
 from nova import conductor
 from nova import context
 from nova import exception
+from nova.openstack.common import excutils
 from nova.openstack.common import importutils
 from nova.openstack.common import jsonutils
 from nova.openstack.common import lockutils
 from nova.openstack.common import log as logging
+from nova.openstack.common import timeutils
 
 resource_tracker_opts = [
     cfg.IntOpt('reserved_host_disk_mb', default=0,
@@ -40,7 +42,13 @@ resource_tracker_opts = [
                help='Amount of memory in MB to reserve for the host'),
     cfg.StrOpt('compute_stats_class',
                default='nova.compute.stats.Stats',
-               help='Class that will manage stats for the local compute host')
+               help='Class that will manage stats for the local compute host'),
+    cfg.IntOpt('compute_node_heartbeat_interval',
+               default=300,
+               help='Minimum number of seconds between compute node updates '
+                    'that carry no changes.  Such updates only refresh the '
+                    'record\'s updated_at, which schedulers use to decide '
+                    'whether to discard their own view of the host'),
 ]
 
 CONF = cfg.CONF
@@ -64,6 +72,15 @@ class ResourceTracker(object):
         self.tracked_instances = {}
         self.tracked_migrations = {}
         self.conductor_api = conductor.API()
+        # The compute node values as last written to the DB, and when:
+        self._persisted_values = {}
+        self._last_persisted = None
+        self.update_counts = {'sent': 0, 'suppressed': 0}
+        # Usage changes made while an audit gathers its data outside the
+        # lock, as (version, change) entries, so the audit can replay them:
+        self._claims_version = 0
+        self._claims_ledger = []
+        self._audit_versions = []
 
     @lockutils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, 'nova-')
     def instance_claim(self, context, instance_ref, limits=None):
@@ -106,6 +123,7 @@ class ResourceTracker(object):
 
             # Mark resources in-use and update stats
             self._update_usage_from_instance(self.compute_node, instance_ref)
+            self._record_claim('instance', instance_ref)
 
             # persist changes to the compute node:
             self._update(context, self.compute_node)
@@ -147,6 +165,7 @@ class ResourceTracker(object):
             # compute host:
             self._update_usage_from_migration(instance_ref, self.compute_node,
                                               migration_ref)
+            self._record_claim('migration', instance_ref, migration_ref)
             elevated = context.elevated()
             self._update(elevated, self.compute_node)
 
@@ -189,21 +208,29 @@ class ResourceTracker(object):
         # and associated stats:
         instance['vm_state'] = vm_states.DELETED
         self._update_usage_from_instance(self.compute_node, instance)
+        self._record_claim('instance', instance)
 
         ctxt = context.get_admin_context()
         self._update(ctxt, self.compute_node)
 
     def abort_resize_claim(self, instance_uuid, instance_type):
         """Remove usage for an incoming migration."""
-        if instance_uuid in self.tracked_migrations:
-            migration, itype = self.tracked_migrations.pop(instance_uuid)
-
-            if instance_type['id'] == migration['new_instance_type_id']:
-                self.stats.update_stats_for_migration(itype, sign=-1)
-                self._update_usage(self.compute_node, itype, sign=-1)
-
-                ctxt = context.get_admin_context()
-                self._update(ctxt, self.compute_node)
+        if self._abort_migration(self.compute_node, instance_uuid,
+                                 instance_type):
+            self._record_claim('abort_migration', instance_uuid,
+                               instance_type)
+            ctxt = context.get_admin_context()
+            self._update(ctxt, self.compute_node)
+
+    def _abort_migration(self, resources, instance_uuid, instance_type):
+        if instance_uuid not in self.tracked_migrations:
+            return False
+        migration, itype = self.tracked_migrations.pop(instance_uuid)
+        if instance_type['id'] != migration['new_instance_type_id']:
+            return False
+        self.stats.update_stats_for_migration(itype, sign=-1)
+        self._update_usage(resources, itype, sign=-1)
+        return True
 
     @lockutils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, 'nova-')
     def update_usage(self, context, instance):
@@ -219,13 +246,13 @@ class ResourceTracker(object):
         # claim first:
         if uuid in self.tracked_instances:
             self._update_usage_from_instance(self.compute_node, instance)
+            self._record_claim('instance', instance)
             self._update(context.elevated(), self.compute_node)
 
     @property
     def disabled(self):
         return self.compute_node is None
 
-    @lockutils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, 'nova-')
     def update_available_resource(self, context):
         """Override in-memory calculations of compute node resource usage based
         on data audited from the hypervisor layer.
@@ -233,6 +260,11 @@ class ResourceTracker(object):
         Add in resource claims in progress to account for operations that have
         declared a need for resources, but not necessarily retrieved them from
         the hypervisor layer yet.
+
+        The hypervisor and DB are queried without holding
+        COMPUTE_RESOURCE_SEMAPHORE, so claims are not held up by the audit.
+        Claims made in the meantime are replayed over the audited usage when
+        it is applied under the semaphore.
         """
         LOG.audit(_("Auditing locally available compute resources"))
         resources = self.driver.get_available_resource(self.nodename)
@@ -240,36 +272,112 @@ class ResourceTracker(object):
             # The virt driver does not support this function
             LOG.audit(_("Virt driver does not support "
                 "'get_available_resource'  Compute tracking is disabled."))
-            self.compute_node = None
+            self._disable()
             return
 
         self._verify_resources(resources)
 
         self._report_hypervisor_resource_view(resources)
 
-        # Grab all instances assigned to this node:
-        instances = self.conductor_api.instance_get_all_by_host_and_node(
-            context, self.host, self.nodename)
+        version = self._begin_audit()
+        try:
+            # Grab all instances assigned to this node:
+            instances = self.conductor_api.instance_get_all_by_host_and_node(
+                context, self.host, self.nodename)
+
+            # Grab all in-progress migrations:
+            capi = self.conductor_api
+            migrations = capi.migration_get_in_progress_by_host_and_node(
+                    context, self.host, self.nodename)
 
-        # Now calculate usage based on instance utilization:
-        self._update_usage_from_instances(resources, instances)
+            usage = self.driver.get_per_instance_usage()
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._end_audit(version)
 
-        # Grab all in-progress migrations:
-        capi = self.conductor_api
-        migrations = capi.migration_get_in_progress_by_host_and_node(context,
-                self.host, self.nodename)
+        self._apply_audit(context, version, resources, instances, migrations,
+                          usage)
 
-        self._update_usage_from_migrations(resources, migrations)
+    @lockutils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, 'nova-')
+    def _disable(self):
+        self.compute_node = None
+
+    def _record_claim(self, *change):
+        """Note a change in usage made under COMPUTE_RESOURCE_SEMAPHORE for
+        any audit that is gathering data.
+        """
+        self._claims_version += 1
+        if self._audit_versions:
+            # Copy, since the caller may go on to modify the instance:
+            change = tuple(jsonutils.to_primitive(item) for item in change)
+            self._claims_ledger.append((self._claims_version, change))
+
+    @lockutils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, 'nova-')
+    def _begin_audit(self):
+        """Start recording claims for an audit.  Returns the claims
+        version the audit starts from.
+        """
+        self._audit_versions.append(self._claims_version)
+        return self._claims_version
+
+    @lockutils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, 'nova-')
+    def _end_audit(self, version):
+        self._finish_audit(version)
+
+    def _finish_audit(self, version):
+        self._audit_versions.remove(version)
+        if self._audit_versions:
+            oldest = min(self._audit_versions)
+            self._claims_ledger = [entry for entry in self._claims_ledger
+                                   if entry[0] > oldest]
+        else:
+            self._claims_ledger = []
 
-        # Detect and account for orphaned instances that may exist on the
-        # hypervisor, but are not in the DB:
-        orphans = self._find_orphaned_instances()
-        self._update_usage_from_orphans(resources, orphans)
+    @lockutils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, 'nova-')
+    def _apply_audit(self, context, version, resources, instances,
+                     migrations, usage):
+        """Calculate usage from the audited data, replaying the claims made
+        since the audit started, and save the result.
+        """
+        try:
+            # Now calculate usage based on instance utilization:
+            self._update_usage_from_instances(resources, instances)
+            self._update_usage_from_migrations(resources, migrations)
+            self._replay_claims(resources, version)
+
+            # Detect and account for orphaned instances that may exist on
+            # the hypervisor, but are not in the DB:
+            orphans = self._find_orphaned_instances(usage)
+            self._update_usage_from_orphans(resources, orphans)
+        finally:
+            self._finish_audit(version)
 
         self._report_final_resource_view(resources)
 
         self._sync_compute_node(context, resources)
 
+    def _replay_claims(self, resources, version):
+        """Apply the changes in usage recorded after version, which the
+        audited instances and migrations may not reflect yet.
+        """
+        for entry_version, change in self._claims_ledger:
+            if entry_version <= version:
+                continue
+            kind = change[0]
+            if kind == 'instance':
+                instance = change[1]
+                if (instance['vm_state'] == vm_states.DELETED and
+                        instance['uuid'] not in self.tracked_instances):
+                    continue
+                self._update_usage_from_instance(resources, instance)
+            elif kind == 'migration':
+                instance, migration = change[1:]
+                if instance['uuid'] not in self.tracked_migrations:
+                    self._update_usage_from_migration(instance, resources,
+                                                      migration)
+            elif kind == 'abort_migration':
+                self._abort_migration(resources, *change[1:])
+
     def _sync_compute_node(self, context, resources):
         """Create or update the compute node DB record."""
         if not self.compute_node:
@@ -304,6 +412,7 @@ class ResourceTracker(object):
         # initialize load stats from existing instances:
         self.compute_node = self.conductor_api.compute_node_create(context,
                                                                    values)
+        self._record_persisted(values)
 
     def _get_service(self, context):
         try:
@@ -346,11 +455,49 @@ class ResourceTracker(object):
             LOG.audit(_("Free VCPU information unavailable"))
 
     def _update(self, context, values, prune_stats=False):
-        """Persist the compute node updates to the DB."""
+        """Persist the compute node updates to the DB.
+
+        Only values that differ from what was last written are sent.  If
+        nothing changed, the update is skipped unless the record has not
+        been touched for compute_node_heartbeat_interval seconds.
+        """
         if "service" in self.compute_node:
             del self.compute_node['service']
+
+        changes = self._changed_values(values)
+        if not changes:
+            if (self._last_persisted and not timeutils.is_older_than(
+                    self._last_persisted,
+                    CONF.compute_node_heartbeat_interval)):
+                self.update_counts['suppressed'] += 1
+                return
+            changes = {'updated_at': timeutils.utcnow()}
+
         self.compute_node = self.conductor_api.compute_node_update(
-            context, self.compute_node, values, prune_stats)
+            context, self.compute_node, changes, prune_stats)
+        self.update_counts['sent'] += 1
+        self._record_persisted(changes)
+        LOG.debug(_("Compute node updates sent: %(sent)d, "
+                    "suppressed: %(suppressed)d") % self.update_counts)
+
+    def _changed_values(self, values):
+        """Return the subset of values that differ from the DB record."""
+        changes = {}
+        for key, value in values.iteritems():
+            if key == 'service':
+                continue
+            value = jsonutils.to_primitive(value)
+            if (key not in self._persisted_values or
+                    self._persisted_values[key] != value):
+                changes[key] = value
+        return changes
+
+    def _record_persisted(self, values):
+        self._persisted_values.update(
+            jsonutils.to_primitive(self.compute_node))
+        self._persisted_values.update(jsonutils.to_primitive(values))
+        self._persisted_values.pop('service', None)
+        self._last_persisted = timeutils.utcnow()
 
     def confirm_resize(self, context, migration, status='confirmed'):
         """Cleanup usage for a confirmed resize."""
@@ -414,7 +561,7 @@ class ResourceTracker(object):
         if itype:
             self.stats.update_stats_for_migration(itype)
             self._update_usage(resources, itype)
-            resources['stats'] = self.stats
+            resources['stats'] = self.stats.nested()
             self.tracked_migrations[uuid] = (migration, itype)
 
     def _update_usage_from_migrations(self, resources, migrations):
@@ -478,7 +625,7 @@ class ResourceTracker(object):
             self._update_usage(resources, instance, sign=sign)
 
         resources['current_workload'] = self.stats.calculate_workload()
-        resources['stats'] = self.stats
+        resources['stats'] = self.stats.nested()
 
     def _update_usage_from_instances(self, resources, instances):
         """Calculate resource usage based on instance utilization.  This is
@@ -508,7 +655,7 @@ class ResourceTracker(object):
             else:
                 self._update_usage_from_instance(resources, instance)
 
-    def _find_orphaned_instances(self):
+    def _find_orphaned_instances(self, usage=None):
         """Given the set of instances and migrations already account for
         by resource tracker, sanity check the hypervisor to determine
         if there are any "orphaned" instances left hanging around.
@@ -516,12 +663,15 @@ class ResourceTracker(object):
         Orphans could be consuming memory and should be accounted for in
         usage calculations to guard against potential out of memory
         errors.
+
+        :param usage: the driver's per instance usage, if already fetched
         """
         uuids1 = frozenset(self.tracked_instances.keys())
         uuids2 = frozenset(self.tracked_migrations.keys())
         uuids = uuids1 | uuids2
 
-        usage = self.driver.get_per_instance_usage()
+        if usage is None:
+            usage = self.driver.get_per_instance_usage()
         vuuids = frozenset(usage.keys())
 
         orphan_uuids = vuuids - uuids
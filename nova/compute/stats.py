@@ -16,6 +16,33 @@
 from nova.compute import task_states
 from nova.compute import vm_states
 
+# Stats counted per project, vm state, task state and OS type.  Stats
+# hands out each count as a num_<counter>_<name> key, and stores them
+# in a dict per counter, keyed by name.
+COUNTERS = ('num_proj', 'num_vm', 'num_task', 'num_os_type')
+
+
+def nest_counters(stats):
+    """Return the stats with the num_<counter>_<name> keys of each of
+    COUNTERS moved into a dict under num_<counter>.
+
+    Counters that are already nested are kept, so stats holding both
+    forms can be passed in.
+    """
+    nested = {}
+    for key, value in stats.iteritems():
+        if key in COUNTERS and isinstance(value, dict):
+            nested.setdefault(key, {}).update(value)
+            continue
+        for counter in COUNTERS:
+            prefix = counter + '_'
+            if key.startswith(prefix):
+                nested.setdefault(counter, {})[key[len(prefix):]] = value
+                break
+        else:
+            nested[key] = value
+    return nested
+
 
 class Stats(dict):
     """Handler for updates to compute node workload stats."""
@@ -31,6 +58,10 @@ class Stats(dict):
 
         self.states.clear()
 
+    def nested(self):
+        """Return the stats in the form they are stored in."""
+        return nest_counters(self)
+
     @property
     def io_workload(self):
         """Calculate an I/O based load by counting I/O heavy operations."""
@@ -73,22 +73,24 @@ class LocalAPI(object):
     def instance_destroy(self, context, instance):
         return self._manager.instance_destroy(context, instance)
 
-    def instance_get_all(self, context):
-        return self._manager.instance_get_all(context)
+    def instance_get_all(self, context, columns_to_join=None):
+        return self._manager.instance_get_all(
+            context, columns_to_join=columns_to_join)
 
-    def instance_get_all_by_host(self, context, host):
-        return self._manager.instance_get_all_by_host(context, host)
+    def instance_get_all_by_host(self, context, host, columns_to_join=None):
+        return self._manager.instance_get_all_by_host(
+            context, host, columns_to_join=columns_to_join)
 
     def instance_get_all_by_host_and_node(self, context, host, node):
         return self._manager.instance_get_all_by_host(context, host, node)
 
     def instance_get_all_by_filters(self, context, filters,
                                     sort_key='created_at',
-                                    sort_dir='desc'):
-        return self._manager.instance_get_all_by_filters(context,
-                                                         filters,
-                                                         sort_key,
-                                                         sort_dir)
+                                    sort_dir='desc',
+                                    columns_to_join=None):
+        return self._manager.instance_get_all_by_filters(
+            context, filters, sort_key, sort_dir,
+            columns_to_join=columns_to_join)
 
     def instance_get_all_hung_in_rebooting(self, context, timeout):
         return self._manager.instance_get_all_hung_in_rebooting(context,
@@ -235,6 +237,10 @@ class LocalAPI(object):
                                               instance, last_refreshed,
                                               update_totals)
 
+    def vol_usage_bulk_update(self, context, usages, last_refreshed=None):
+        return self._manager.vol_usage_bulk_update(context, usages,
+                                                   last_refreshed)
+
     def service_get_all(self, context):
         return self._manager.service_get_all_by(context)
 
@@ -386,11 +392,13 @@ class API(object):
         return self.conductor_rpcapi.instance_get_by_uuid(context,
                                                           instance_uuid)
 
-    def instance_get_all(self, context):
-        return self.conductor_rpcapi.instance_get_all(context)
+    def instance_get_all(self, context, columns_to_join=None):
+        return self.conductor_rpcapi.instance_get_all(
+            context, columns_to_join=columns_to_join)
 
-    def instance_get_all_by_host(self, context, host):
-        return self.conductor_rpcapi.instance_get_all_by_host(context, host)
+    def instance_get_all_by_host(self, context, host, columns_to_join=None):
+        return self.conductor_rpcapi.instance_get_all_by_host(
+            context, host, columns_to_join=columns_to_join)
 
     def instance_get_all_by_host_and_node(self, context, host, node):
         return self.conductor_rpcapi.instance_get_all_by_host(context,
@@ -398,11 +406,11 @@ class API(object):
 
     def instance_get_all_by_filters(self, context, filters,
                                     sort_key='created_at',
-                                    sort_dir='desc'):
-        return self.conductor_rpcapi.instance_get_all_by_filters(context,
-                                                                 filters,
-                                                                 sort_key,
-                                                                 sort_dir)
+                                    sort_dir='desc',
+                                    columns_to_join=None):
+        return self.conductor_rpcapi.instance_get_all_by_filters(
+            context, filters, sort_key, sort_dir,
+            columns_to_join=columns_to_join)
 
     def instance_get_all_hung_in_rebooting(self, context, timeout):
         return self.conductor_rpcapi.instance_get_all_hung_in_rebooting(
@@ -563,6 +571,10 @@ class API(object):
                                                       instance, last_refreshed,
                                                       update_totals)
 
+    def vol_usage_bulk_update(self, context, usages, last_refreshed=None):
+        return self.conductor_rpcapi.vol_usage_bulk_update(context, usages,
+                                                           last_refreshed)
+
     def service_get_all(self, context):
         return self.conductor_rpcapi.service_get_all_by(context)
 
@@ -49,7 +49,7 @@ datetime_fields = ['launched_at', 'terminated_at']
 class ConductorManager(manager.SchedulerDependentManager):
     """Mission: TBD."""
 
-    RPC_API_VERSION = '1.43'
+    RPC_API_VERSION = '1.45'
 
     def __init__(self, *args, **kwargs):
         super(ConductorManager, self).__init__(service_name='conductor',
@@ -107,15 +107,19 @@ class ConductorManager(manager.SchedulerDependentManager):
         return jsonutils.to_primitive(
             self.db.instance_get_by_uuid(context, instance_uuid))
 
-    def instance_get_all(self, context):
-        return jsonutils.to_primitive(self.db.instance_get_all(context))
+    def instance_get_all(self, context, columns_to_join=None):
+        return jsonutils.to_primitive(
+            self.db.instance_get_all(context,
+                                     columns_to_join=columns_to_join))
 
-    def instance_get_all_by_host(self, context, host, node=None):
+    def instance_get_all_by_host(self, context, host, node=None,
+                                 columns_to_join=None):
         if node is not None:
             result = self.db.instance_get_all_by_host_and_node(
                 context.elevated(), host, node)
         else:
-            result = self.db.instance_get_all_by_host(context.elevated(), host)
+            result = self.db.instance_get_all_by_host(
+                context.elevated(), host, columns_to_join=columns_to_join)
         return jsonutils.to_primitive(result)
 
     @rpc_common.client_exceptions(exception.MigrationNotFound)
@@ -255,9 +259,10 @@ class ConductorManager(manager.SchedulerDependentManager):
                                       " invocation"))
 
     def instance_get_all_by_filters(self, context, filters, sort_key,
-                                    sort_dir):
-        result = self.db.instance_get_all_by_filters(context, filters,
-                                                     sort_key, sort_dir)
+                                    sort_dir, columns_to_join=None):
+        result = self.db.instance_get_all_by_filters(
+            context, filters, sort_key, sort_dir,
+            columns_to_join=columns_to_join)
         return jsonutils.to_primitive(result)
 
     def instance_get_all_hung_in_rebooting(self, context, timeout):
@@ -306,6 +311,14 @@ class ConductorManager(manager.SchedulerDependentManager):
                                  wr_bytes, instance['uuid'], last_refreshed,
                                  update_totals)
 
+    def vol_usage_bulk_update(self, context, usages, last_refreshed=None):
+        usages = [dict(volume_id=usage['volume'],
+                       instance_id=usage['instance']['uuid'],
+                       rd_req=usage['rd_req'], rd_bytes=usage['rd_bytes'],
+                       wr_req=usage['wr_req'], wr_bytes=usage['wr_bytes'])
+                  for usage in usages]
+        self.db.vol_usage_bulk_update(context, usages, last_refreshed)
+
     @rpc_common.client_exceptions(exception.HostBinaryNotFound)
     def service_get_all_by(self, context, topic=None, host=None, binary=None):
         if not any((topic, host, binary)):
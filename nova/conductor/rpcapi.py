@@ -81,6 +81,9 @@ class ConductorAPI(nova.openstack.common.rpc.proxy.RpcProxy):
                  quota_rollback
     1.42 - Added get_ec2_ids, aggregate_metadata_get_by_host
     1.43 - Added compute_stop
+    1.44 - Added columns_to_join to instance_get_all,
+           instance_get_all_by_host and instance_get_all_by_filters
+    1.45 - Added vol_usage_bulk_update
     """
 
     BASE_RPC_API_VERSION = '1.0'
@@ -245,11 +248,12 @@ class ConductorAPI(nova.openstack.common.rpc.proxy.RpcProxy):
         return self.call(context, msg, version='1.14')
 
     def instance_get_all_by_filters(self, context, filters, sort_key,
-                                    sort_dir):
+                                    sort_dir, columns_to_join=None):
         msg = self.make_msg('instance_get_all_by_filters',
                             filters=filters, sort_key=sort_key,
-                            sort_dir=sort_dir)
-        return self.call(context, msg, version='1.15')
+                            sort_dir=sort_dir,
+                            columns_to_join=columns_to_join)
+        return self.call(context, msg, version='1.44')
 
     def instance_get_all_hung_in_rebooting(self, context, timeout):
         msg = self.make_msg('instance_get_all_hung_in_rebooting',
@@ -294,18 +298,27 @@ class ConductorAPI(nova.openstack.common.rpc.proxy.RpcProxy):
                             update_totals=update_totals)
         return self.call(context, msg, version='1.19')
 
+    def vol_usage_bulk_update(self, context, usages, last_refreshed=None):
+        usages_p = jsonutils.to_primitive(usages)
+        msg = self.make_msg('vol_usage_bulk_update', usages=usages_p,
+                            last_refreshed=last_refreshed)
+        return self.call(context, msg, version='1.45')
+
     def service_get_all_by(self, context, topic=None, host=None, binary=None):
         msg = self.make_msg('service_get_all_by', topic=topic, host=host,
                             binary=binary)
         return self.call(context, msg, version='1.28')
 
-    def instance_get_all(self, context):
-        msg = self.make_msg('instance_get_all')
-        return self.call(context, msg, version='1.23')
+    def instance_get_all(self, context, columns_to_join=None):
+        msg = self.make_msg('instance_get_all',
+                            columns_to_join=columns_to_join)
+        return self.call(context, msg, version='1.44')
 
-    def instance_get_all_by_host(self, context, host, node=None):
-        msg = self.make_msg('instance_get_all_by_host', host=host, node=node)
-        return self.call(context, msg, version='1.32')
+    def instance_get_all_by_host(self, context, host, node=None,
+                                 columns_to_join=None):
+        msg = self.make_msg('instance_get_all_by_host', host=host, node=node,
+                            columns_to_join=columns_to_join)
+        return self.call(context, msg, version='1.44')
 
     def instance_fault_create(self, context, values):
         msg = self.make_msg('instance_fault_create', values=values)
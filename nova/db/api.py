@@ -109,6 +109,16 @@ def not_equal(*values):
     return IMPL.not_equal(*values)
 
 
+def query_count_start():
+    """Start counting the queries issued by the current greenthread."""
+    return IMPL.query_count_start()
+
+
+def query_count_stop():
+    """Stop counting queries and return the number issued since start."""
+    return IMPL.query_count_stop()
+
+
 ###################
 
 
@@ -177,9 +187,12 @@ def compute_node_get(context, compute_id):
     return IMPL.compute_node_get(context, compute_id)
 
 
-def compute_node_get_all(context):
-    """Get all computeNodes."""
-    return IMPL.compute_node_get_all(context)
+def compute_node_get_all(context, use_slave=False):
+    """Get all computeNodes.
+
+    If use_slave is True, the call may be served from the slave database.
+    """
+    return IMPL.compute_node_get_all(context, use_slave=use_slave)
 
 
 def compute_node_search_by_hypervisor(context, hypervisor_match):
@@ -204,6 +217,10 @@ def compute_node_get_by_host(context, host):
     return IMPL.compute_node_get_by_host(context, host)
 
 
+def compute_node_get_by_hosts(context, hosts):
+    return IMPL.compute_node_get_by_hosts(context, hosts)
+
+
 def compute_node_statistics(context):
     return IMPL.compute_node_statistics(context)
 
@@ -594,27 +611,71 @@ def instance_get_all(context, columns_to_join=None):
 
 
 def instance_get_all_by_filters(context, filters, sort_key='created_at',
-                                sort_dir='desc', limit=None, marker=None):
-    """Get all instances that match all filters."""
+                                sort_dir='desc', limit=None, marker=None,
+                                columns_to_join=None, use_slave=False):
+    """Get all instances that match all filters.
+
+    If use_slave is True, the call may be served from the slave database.
+    """
     return IMPL.instance_get_all_by_filters(context, filters, sort_key,
                                             sort_dir, limit=limit,
-                                            marker=marker)
+                                            marker=marker,
+                                            columns_to_join=columns_to_join,
+                                            use_slave=use_slave)
+
+
+def instance_get_uuids_by_filters(context, filters, limit=None, marker=None):
+    """Get the uuids of instances that match all filters, in uuid order,
+    starting after the marker uuid.
+    """
+    return IMPL.instance_get_uuids_by_filters(context, filters,
+                                              limit=limit, marker=marker)
 
 
 def instance_get_active_by_window_joined(context, begin, end=None,
-                                         project_id=None, host=None):
+                                         project_id=None, host=None,
+                                         use_slave=False):
     """Get instances and joins active during a certain time window.
 
     Specifying a project_id will filter for a certain project.
     Specifying a host will filter for instances on a given compute host.
+    If use_slave is True, the call may be served from the slave database.
     """
     return IMPL.instance_get_active_by_window_joined(context, begin, end,
-                                              project_id, host)
+                                              project_id, host,
+                                              use_slave=use_slave)
+
 
+def instance_usage_totals_by_window(context, begin, end, project_id=None,
+                                    use_slave=False):
+    """Get per-project usage totals for instances active during a window.
+
+    Hours and flavor-weighted usage are summed by the database, one
+    result per project.  Specifying a project_id will filter for a
+    certain project.  If use_slave is True, the call may be served from
+    the slave database.
+    """
+    return IMPL.instance_usage_totals_by_window(context, begin, end,
+                                                project_id,
+                                                use_slave=use_slave)
 
-def instance_get_all_by_host(context, host):
+
+def instance_usage_get_by_window(context, begin, end=None, project_id=None,
+                                 use_slave=False):
+    """Get usage records for instances active during a window.
+
+    Returns an iterator of dicts holding the instance fields and flavor
+    details needed for billing, streamed from the database.  If use_slave
+    is True, the call may be served from the slave database.
+    """
+    return IMPL.instance_usage_get_by_window(context, begin, end, project_id,
+                                             use_slave=use_slave)
+
+
+def instance_get_all_by_host(context, host, columns_to_join=None):
     """Get all instances belonging to a host."""
-    return IMPL.instance_get_all_by_host(context, host)
+    return IMPL.instance_get_all_by_host(context, host,
+                                         columns_to_join=columns_to_join)
 
 
 def instance_get_all_by_host_and_node(context, host, node):
@@ -692,6 +753,16 @@ def instance_update_and_get_original(context, instance_uuid, values):
     return rv
 
 
+def instance_update_many(context, instances):
+    """Apply updates to a number of instances in one transaction.
+
+    Each entry is a dict of values that includes the instance 'uuid' and
+    may include an 'info_cache' dict.  Cells are not notified.  Returns
+    the entries that matched no instance.
+    """
+    return IMPL.instance_update_many(context, instances)
+
+
 def instance_add_security_group(context, instance_id, security_group_id):
     """Associate the given security group with the given instance."""
     return IMPL.instance_add_security_group(context, instance_id,
@@ -1432,9 +1503,13 @@ def bw_usage_get(context, uuid, start_period, mac):
     return IMPL.bw_usage_get(context, uuid, start_period, mac)
 
 
-def bw_usage_get_by_uuids(context, uuids, start_period):
-    """Return bw usages for instance(s) in a given audit period."""
-    return IMPL.bw_usage_get_by_uuids(context, uuids, start_period)
+def bw_usage_get_by_uuids(context, uuids, start_period, use_slave=False):
+    """Return bw usages for instance(s) in a given audit period.
+
+    If use_slave is True, the call may be served from the slave database.
+    """
+    return IMPL.bw_usage_get_by_uuids(context, uuids, start_period,
+                                      use_slave=use_slave)
 
 
 def bw_usage_update(context, uuid, mac, start_period, bw_in, bw_out,
@@ -1494,6 +1569,17 @@ def vol_usage_update(context, id, rd_req, rd_bytes, wr_req, wr_bytes,
                                  update_totals=update_totals)
 
 
+def vol_usage_bulk_update(context, usages, last_refreshed=None):
+    """Update cached current usage for several volumes at once
+       Creates new records if needed.
+
+    :param usages: a list of dicts with the volume_id, instance_id, rd_req,
+                   rd_bytes, wr_req and wr_bytes of each volume
+    """
+    return IMPL.vol_usage_bulk_update(context, usages,
+                                      last_refreshed=last_refreshed)
+
+
 ###################
 
 
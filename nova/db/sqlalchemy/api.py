@@ -23,13 +23,18 @@ import collections
 import copy
 import datetime
 import functools
+import operator
+import re
 import sys
 import time
 import uuid
 
 from oslo.config import cfg
+import sqlalchemy
 from sqlalchemy import and_
 from sqlalchemy import Boolean
+from sqlalchemy import DateTime
+from sqlalchemy import event
 from sqlalchemy import exc as sqla_exc
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.exc import NoSuchTableError
@@ -38,9 +43,13 @@ from sqlalchemy import MetaData
 from sqlalchemy import or_
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm import joinedload_all
+from sqlalchemy.orm import subqueryload
+from sqlalchemy import pool
 from sqlalchemy.schema import Table
 from sqlalchemy.sql.expression import asc
+from sqlalchemy.sql.expression import case
 from sqlalchemy.sql.expression import desc
+from sqlalchemy.sql.expression import literal
 from sqlalchemy.sql.expression import select
 from sqlalchemy.sql import func
 from sqlalchemy import String
@@ -51,9 +60,11 @@ from nova.compute import vm_states
 import nova.context
 from nova import db
 from nova.db.sqlalchemy import models
+from nova.db.sqlalchemy import utils as db_utils
 from nova import exception
 from nova.openstack.common.db.sqlalchemy import session as db_session
 from nova.openstack.common.db.sqlalchemy import utils as sqlalchemyutils
+from nova.openstack.common import local
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
 from nova.openstack.common import uuidutils
@@ -64,6 +75,21 @@ db_opts = [
                help='When set, compute API will consider duplicate hostnames '
                     'invalid within the specified scope, regardless of case. '
                     'Should be empty, "project" or "global".'),
+    cfg.StrOpt('sql_slave_connection',
+               default='',
+               help='The SQLAlchemy connection string used to connect to a '
+                    'read-only replica of the database.  Read-only calls '
+                    'whose callers tolerate replication lag are sent there '
+                    'when set'),
+    cfg.BoolOpt('sql_slave_fallback',
+                default=True,
+                help='Retry read-only calls against the main database when '
+                     'the slave database cannot be reached'),
+    cfg.IntOpt('sql_slave_retry_interval',
+               default=60,
+               help='Seconds to send read-only calls to the main database '
+                    'after the slave database failed, when '
+                    'sql_slave_fallback is set'),
 ]
 
 CONF = cfg.CONF
@@ -71,11 +97,96 @@ CONF.register_opts(db_opts)
 CONF.import_opt('compute_topic', 'nova.compute.rpcapi')
 CONF.import_opt('sql_connection',
                 'nova.openstack.common.db.sqlalchemy.session')
+CONF.import_opt('sql_idle_timeout',
+                'nova.openstack.common.db.sqlalchemy.session')
+CONF.import_opt('sql_max_pool_size',
+                'nova.openstack.common.db.sqlalchemy.session')
+CONF.import_opt('sql_max_overflow',
+                'nova.openstack.common.db.sqlalchemy.session')
 
 LOG = logging.getLogger(__name__)
 
-get_engine = db_session.get_engine
-get_session = db_session.get_session
+_SLAVE_ENGINE = None
+_SLAVE_MAKER = None
+
+# When the slave database last failed a call.
+_SLAVE_FAILED_AT = None
+
+# Tracks whether the current greenthread is inside a _slave_safe call
+# that asked for the slave database.
+_SLAVE_LOCAL = local.strong_store()
+
+# Counts the queries issued by the current greenthread, when enabled with
+# query_count_start().
+_QUERY_COUNT_LOCAL = local.strong_store()
+
+# The engines whose queries are counted.
+_COUNTED_ENGINES = set()
+
+
+def _create_slave_engine():
+    """Return a new engine for sql_slave_connection.
+
+    Unlike the main engine, it does not connect, and retry connecting,
+    when it is created.  A slave that cannot be reached fails the first
+    call that uses it instead.
+    """
+    connection_dict = sqlalchemy.engine.url.make_url(
+            CONF.sql_slave_connection)
+    engine_args = {
+        'pool_recycle': CONF.sql_idle_timeout,
+        'echo': False,
+        'convert_unicode': True,
+    }
+    if 'sqlite' in connection_dict.drivername:
+        engine_args['poolclass'] = pool.NullPool
+    else:
+        engine_args['pool_size'] = CONF.sql_max_pool_size
+        if CONF.sql_max_overflow is not None:
+            engine_args['max_overflow'] = CONF.sql_max_overflow
+
+    engine = sqlalchemy.create_engine(CONF.sql_slave_connection,
+                                      **engine_args)
+    event.listen(engine, 'checkin', db_session.greenthread_yield)
+    if 'mysql' in connection_dict.drivername:
+        event.listen(engine, 'checkout', db_session.ping_listener)
+    elif 'sqlite' in connection_dict.drivername:
+        event.listen(engine, 'connect', db_session.add_regexp_listener)
+    return engine
+
+
+def get_engine(slave_engine=False):
+    """Return nova's engine, with the query counter attached.
+
+    If slave_engine is True, return the engine for sql_slave_connection.
+    """
+    global _SLAVE_ENGINE
+    if slave_engine:
+        if _SLAVE_ENGINE is None:
+            _SLAVE_ENGINE = _create_slave_engine()
+        engine = _SLAVE_ENGINE
+    else:
+        engine = db_session.get_engine()
+    if engine not in _COUNTED_ENGINES:
+        event.listen(engine, 'before_cursor_execute', _count_query)
+        _COUNTED_ENGINES.add(engine)
+    return engine
+
+
+def get_session(autocommit=True, expire_on_commit=False):
+    """Return a session, bound to the slave database inside a call
+    decorated with _slave_safe whose caller passed use_slave=True.
+    """
+    global _SLAVE_MAKER
+    if getattr(_SLAVE_LOCAL, 'use_slave', False):
+        if _SLAVE_MAKER is None:
+            _SLAVE_MAKER = db_session.get_maker(
+                    get_engine(slave_engine=True), autocommit,
+                    expire_on_commit)
+        return _SLAVE_MAKER()
+    get_engine()
+    return db_session.get_session(autocommit=autocommit,
+                                  expire_on_commit=expire_on_commit)
 
 
 def get_backend():
@@ -83,6 +194,21 @@ def get_backend():
     return sys.modules[__name__]
 
 
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_QUERY_COUNT_LOCAL, 'count', None) is not None:
+        _QUERY_COUNT_LOCAL.count += 1
+
+
+def query_count_start():
+    _QUERY_COUNT_LOCAL.count = 0
+
+
+def query_count_stop():
+    count = getattr(_QUERY_COUNT_LOCAL, 'count', None) or 0
+    _QUERY_COUNT_LOCAL.count = None
+    return count
+
+
 def require_admin_context(f):
     """Decorator to require admin request context.
 
@@ -174,6 +300,50 @@ def _retry_on_deadlock(f):
     return wrapped
 
 
+def _slave_safe(f):
+    """Decorator to let callers of a read-only DB API call have it served
+    from the slave database.
+
+    Callers opt in by passing use_slave=True, which only callers that can
+    tolerate replication lag should do.  It has no effect unless
+    sql_slave_connection is set.  If the slave fails with an
+    OperationalError (for example because it cannot be reached) and
+    sql_slave_fallback is set, the call is repeated against the main
+    database, and calls stay on the main database for the next
+    sql_slave_retry_interval seconds.
+    """
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        global _SLAVE_FAILED_AT
+        use_slave = kwargs.pop('use_slave', False)
+        if (not use_slave or not CONF.sql_slave_connection or
+                getattr(_SLAVE_LOCAL, 'use_slave', False)):
+            return f(*args, **kwargs)
+        if (CONF.sql_slave_fallback and _SLAVE_FAILED_AT is not None and
+                not timeutils.is_older_than(_SLAVE_FAILED_AT,
+                                            CONF.sql_slave_retry_interval)):
+            return f(*args, **kwargs)
+        _SLAVE_LOCAL.use_slave = True
+        try:
+            return f(*args, **kwargs)
+        except (sqla_exc.OperationalError, db_session.DBError) as e:
+            inner = getattr(e, 'inner_exception', e)
+            if not isinstance(inner, sqla_exc.OperationalError):
+                raise
+            _SLAVE_FAILED_AT = timeutils.utcnow()
+            if not CONF.sql_slave_fallback:
+                raise
+            LOG.warn(_("Slave database query for '%(func_name)s' failed, "
+                       "using the main database for %(interval)d seconds: "
+                       "%(error)s"),
+                     dict(func_name=f.__name__, error=inner,
+                          interval=CONF.sql_slave_retry_interval))
+        finally:
+            _SLAVE_LOCAL.use_slave = False
+        return f(*args, **kwargs)
+    return wrapper
+
+
 def model_query(context, model, *args, **kwargs):
     """Query helper that accounts for context's `read_deleted` field.
 
@@ -450,7 +620,6 @@ def _compute_node_get(context, compute_id, session=None):
     result = model_query(context, models.ComputeNode, session=session).\
             filter_by(id=compute_id).\
             options(joinedload('service')).\
-            options(joinedload('stats')).\
             first()
 
     if not result:
@@ -460,10 +629,10 @@ def _compute_node_get(context, compute_id, session=None):
 
 
 @require_admin_context
+@_slave_safe
 def compute_node_get_all(context):
     return model_query(context, models.ComputeNode).\
             options(joinedload('service')).\
-            options(joinedload('stats')).\
             all()
 
 
@@ -476,23 +645,11 @@ def compute_node_search_by_hypervisor(context, hypervisor_match):
             all()
 
 
-def _prep_stats_dict(values):
-    """Make list of ComputeNodeStats."""
-    stats = []
-    d = values.get('stats', {})
-    for k, v in d.iteritems():
-        stat = models.ComputeNodeStat()
-        stat['key'] = k
-        stat['value'] = v
-        stats.append(stat)
-    values['stats'] = stats
-
-
 @require_admin_context
 def compute_node_create(context, values):
     """Creates a new ComputeNode and populates the capacity fields
     with the most recent data."""
-    _prep_stats_dict(values)
+    values['stats'] = dict(values.get('stats', {}))
     convert_datetimes(values, 'created_at', 'deleted_at', 'updated_at')
 
     compute_node_ref = models.ComputeNode()
@@ -501,50 +658,27 @@ def compute_node_create(context, values):
     return compute_node_ref
 
 
-def _update_stats(context, new_stats, compute_id, session, prune_stats=False):
-
-    existing = model_query(context, models.ComputeNodeStat, session=session,
-            read_deleted="no").filter_by(compute_node_id=compute_id).all()
-    statmap = {}
-    for stat in existing:
-        key = stat['key']
-        statmap[key] = stat
-
-    stats = []
-    for k, v in new_stats.iteritems():
-        old_stat = statmap.pop(k, None)
-        if old_stat:
-            # update existing value:
-            old_stat.update({'value': v})
-            stats.append(old_stat)
-        else:
-            # add new stat:
-            stat = models.ComputeNodeStat()
-            stat['compute_node_id'] = compute_id
-            stat['key'] = k
-            stat['value'] = v
-            stats.append(stat)
-
-    if prune_stats:
-        # prune un-touched old stats:
-        for stat in statmap.values():
-            session.add(stat)
-            stat.soft_delete(session=session)
-
-    # add new and updated stats
-    for stat in stats:
-        session.add(stat)
-
-
 @require_admin_context
 def compute_node_update(context, compute_id, values, prune_stats=False):
     """Updates the ComputeNode record with the most recent data."""
-    stats = values.pop('stats', {})
-
     session = get_session()
     with session.begin():
-        _update_stats(context, stats, compute_id, session, prune_stats)
         compute_ref = _compute_node_get(context, compute_id, session=session)
+        if 'stats' in values:
+            new_stats = {}
+            if not prune_stats:
+                new_stats.update(compute_ref['stats'] or {})
+            for key, value in values['stats'].iteritems():
+                # Counters nested in a dict are merged, not replaced.
+                if (isinstance(value, dict) and
+                        isinstance(new_stats.get(key), dict)):
+                    merged = dict(new_stats[key])
+                    merged.update(value)
+                    value = merged
+                new_stats[key] = value
+            # NOTE: stats are stored as one document, so assigning an equal
+            # dict leaves the column out of the UPDATE altogether.
+            values['stats'] = new_stats
         convert_datetimes(values, 'created_at', 'deleted_at', 'updated_at')
         compute_ref.update(values)
     return compute_ref
@@ -559,6 +693,17 @@ def compute_node_get_by_host(context, host):
     return result
 
 
+def compute_node_get_by_hosts(context, hosts):
+    """Get the capacity entries for several hosts at once."""
+    if not hosts:
+        return []
+    return model_query(context, models.ComputeNode, read_deleted="no").\
+            options(joinedload('service')).\
+            join('service').\
+            filter(models.Service.host.in_(hosts)).\
+            all()
+
+
 def compute_node_statistics(context):
     """Compute statistics over all compute nodes."""
     result = model_query(context,
@@ -1532,14 +1677,39 @@ def _build_instance_get(context, session=None):
             options(joinedload('system_metadata'))
 
 
-@require_context
-def instance_get_all(context, columns_to_join=None):
-    if columns_to_join is None:
-        columns_to_join = ['info_cache', 'security_groups', 'metadata',
+# Relationships loaded with instances when the caller does not say
+# otherwise.
+_INSTANCE_DEFAULT_JOINS = ['info_cache', 'security_groups', 'metadata',
                            'instance_type', 'system_metadata']
-    query = model_query(context, models.Instance)
+
+# Key/value collections.  Joining them into a listing query multiplies the
+# number of rows returned per instance, so they are loaded with a second
+# query keyed on the instances found instead.
+_INSTANCE_COLLECTION_JOINS = ['metadata', 'system_metadata']
+
+
+def _instance_joins(query, columns_to_join=None):
+    """Add the requested instance relationships to a query.
+
+    :param query: query on models.Instance
+    :param columns_to_join: list of relationship names to load along with
+                            the instances, or None for the default set.
+                            An empty list loads the instance columns only.
+    """
+    if columns_to_join is None:
+        columns_to_join = _INSTANCE_DEFAULT_JOINS
     for column in columns_to_join:
-        query = query.options(joinedload(column))
+        if column in _INSTANCE_COLLECTION_JOINS:
+            query = query.options(subqueryload(column))
+        else:
+            query = query.options(joinedload(column))
+    return query
+
+
+@require_context
+def instance_get_all(context, columns_to_join=None):
+    query = _instance_joins(model_query(context, models.Instance),
+                            columns_to_join)
     if not context.is_admin:
         # If we're not admin context, add appropriate filter..
         if context.project_id:
@@ -1550,24 +1720,26 @@ def instance_get_all(context, columns_to_join=None):
 
 
 @require_context
+@_slave_safe
 def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
-                                limit=None, marker=None, session=None):
+                                limit=None, marker=None, session=None,
+                                columns_to_join=None):
     """Return instances that match all filters.  Deleted instances
     will be returned by default, unless there's a filter that says
-    otherwise"""
+    otherwise.
+
+    columns_to_join limits the relationships loaded with the instances;
+    see _instance_joins()."""
 
     sort_fn = {'desc': desc, 'asc': asc}
 
     if not session:
         session = get_session()
 
-    query_prefix = session.query(models.Instance).\
-            options(joinedload('info_cache')).\
-            options(joinedload('security_groups')).\
-            options(joinedload('system_metadata')).\
-            options(joinedload('metadata')).\
-            options(joinedload('instance_type')).\
-            order_by(sort_fn[sort_dir](getattr(models.Instance, sort_key)))
+    query_prefix = _instance_joins(session.query(models.Instance),
+                                   columns_to_join)
+    query_prefix = query_prefix.order_by(
+            sort_fn[sort_dir](getattr(models.Instance, sort_key)))
 
     # Make a copy of the filters dictionary to use going forward, as we'll
     # be modifying it and we shouldn't affect the caller's use of it.
@@ -1610,21 +1782,137 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
     query_prefix = regex_filter(query_prefix, models.Instance, filters)
 
     # paginate query
+    sort_keys = [sort_key, 'created_at', 'id']
     if marker is not None:
-        try:
-            marker = _instance_get_by_uuid(context, marker, session=session)
-        except exception.InstanceNotFound:
-            raise exception.MarkerNotFound(marker)
+        marker_values = _instance_get_marker_values(context, marker,
+                                                    sort_keys,
+                                                    session=session)
+        query_prefix = _keyset_filter(query_prefix, models.Instance,
+                                      sort_keys, marker_values, sort_dir)
     query_prefix = sqlalchemyutils.paginate_query(query_prefix,
                            models.Instance, limit,
-                           [sort_key, 'created_at', 'id'],
-                           marker=marker,
+                           sort_keys,
                            sort_dir=sort_dir)
 
     instances = query_prefix.all()
     return instances
 
 
+@require_admin_context
+def instance_get_uuids_by_filters(context, filters, limit=None, marker=None):
+    """Return the uuids of instances matching filters, in uuid order.
+
+    Only the uuid column is selected.  Supports the 'changes-since',
+    'deleted' and 'project_id' filters of instance_get_all_by_filters().
+    Deleted instances are returned unless filtered out.  marker is a
+    uuid; only uuids after it are returned, seeking on the unique uuid
+    index, so large sets can be walked a page at a time.
+    """
+    query = get_session().query(models.Instance.uuid).\
+                          order_by(asc(models.Instance.uuid))
+    if filters.get('changes-since') is not None:
+        changes_since = timeutils.normalize_time(filters['changes-since'])
+        query = query.filter(models.Instance.updated_at > changes_since)
+    if 'deleted' in filters:
+        if filters['deleted']:
+            deleted = or_(models.Instance.deleted == models.Instance.id,
+                          models.Instance.vm_state == vm_states.SOFT_DELETED)
+            query = query.filter(deleted)
+        else:
+            query = query.filter_by(deleted=0).\
+                    filter(models.Instance.vm_state != vm_states.SOFT_DELETED)
+    if filters.get('project_id') is not None:
+        query = query.filter_by(project_id=filters['project_id'])
+    if marker is not None:
+        query = query.filter(models.Instance.uuid > marker)
+    if limit is not None:
+        query = query.limit(limit)
+    return [row[0] for row in query.all()]
+
+
+def _instance_get_marker_values(context, marker, sort_keys, session=None):
+    """Return the sort key values of the marker instance.
+
+    Only the sort key columns are selected, rather than building the whole
+    instance with its joins just to read a few of its attributes.
+    """
+    columns = [getattr(models.Instance, key) for key in sort_keys]
+    result = model_query(context, *columns, session=session,
+                         base_model=models.Instance, project_only=True).\
+                filter_by(uuid=marker).\
+                first()
+    if not result:
+        raise exception.MarkerNotFound(marker)
+    return dict(zip(sort_keys, result))
+
+
+# The databases that sort NULL above every other value, so that NULLs
+# come last in ascending order.  The others sort NULLs first.
+_NULLS_HIGH_DIALECTS = ('postgresql', 'oracle')
+
+
+def _keyset_filter(query, model, sort_keys, marker_values, sort_dir):
+    """Restrict a query to the rows that follow a marker in sort order.
+
+    This builds the same lexicographic criteria as paginate_query():
+
+    (k1 > X1) or (k1 == X1 && k2 > X2) or (k1 == X1 && k2 == X2 && k3 > X3)
+
+    but ANDs them with k1 >= X1, which lets the database seek straight to
+    the marker in an index on the first sort key instead of scanning.
+    """
+    if sort_dir == 'desc':
+        after, from_marker = operator.lt, operator.le
+    else:
+        after, from_marker = operator.gt, operator.ge
+
+    # NOTE: an ordering comparison with NULL matches no row, so where NULL
+    # falls in the sort order is spelled out with IS NULL and IS NOT NULL.
+    nulls_high = query.session.bind.dialect.name in _NULLS_HIGH_DIALECTS
+    nulls_first = nulls_high == (sort_dir == 'desc')
+
+    def _equal(column, value):
+        if value is None:
+            return column == None
+        return column == value
+
+    def _after(column, value):
+        if value is None:
+            # Either every other value follows NULL, or none does.
+            return column != None if nulls_first else None
+        if nulls_first:
+            return after(column, value)
+        return or_(after(column, value), column == None)
+
+    criteria = []
+    for i, sort_key in enumerate(sort_keys):
+        crit = _after(getattr(model, sort_key), marker_values[sort_key])
+        if crit is None:
+            continue
+        crit_attrs = [_equal(getattr(model, key), marker_values[key])
+                      for key in sort_keys[:i]]
+        crit_attrs.append(crit)
+        criteria.append(and_(*crit_attrs))
+    query = query.filter(or_(*criteria))
+
+    first_key = getattr(model, sort_keys[0])
+    first_value = marker_values[sort_keys[0]]
+    if first_value is None:
+        if not nulls_first:
+            query = query.filter(first_key == None)
+    elif nulls_first:
+        query = query.filter(from_marker(first_key, first_value))
+    else:
+        query = query.filter(or_(from_marker(first_key, first_value),
+                                 first_key == None))
+    return query
+
+
+# A regular expression anchored at the start and otherwise made up of
+# characters that are literal in both regular expressions and LIKE.
+_LITERAL_PREFIX_RE = re.compile(r'^\^([^\\.^$*+?{}\[\]|()%_]+)$')
+
+
 def regex_filter(query, model, filters):
     """Applies regular expression filtering to a query.
 
@@ -1650,24 +1938,31 @@ def regex_filter(query, model, filters):
             continue
         if 'property' == type(column_attr).__name__:
             continue
-        query = query.filter(column_attr.op(db_regexp_op)(
-                                    str(filters[filter_name])))
+        value = str(filters[filter_name])
+        prefix = _LITERAL_PREFIX_RE.match(value)
+        if prefix:
+            # NOTE: a literal prefix match can use an index on the column,
+            # which a regular expression match never can.  LIKE ignores
+            # case on SQLite, where the case-sensitive GLOB is used instead.
+            if db_string == 'sqlite':
+                query = query.filter(
+                        column_attr.op('GLOB')(prefix.group(1) + '*'))
+            else:
+                query = query.filter(column_attr.like(prefix.group(1) + '%'))
+            continue
+        query = query.filter(column_attr.op(db_regexp_op)(value))
     return query
 
 
 @require_context
+@_slave_safe
 def instance_get_active_by_window_joined(context, begin, end=None,
                                          project_id=None, host=None):
     """Return instances and joins that were active during window."""
     session = get_session()
-    query = session.query(models.Instance)
-
-    query = query.options(joinedload('info_cache')).\
-                  options(joinedload('security_groups')).\
-                  options(joinedload('metadata')).\
-                  options(joinedload('instance_type')).\
-                  options(joinedload('system_metadata')).\
-                  filter(or_(models.Instance.terminated_at == None,
+    query = _instance_joins(session.query(models.Instance))
+
+    query = query.filter(or_(models.Instance.terminated_at == None,
                              models.Instance.terminated_at > begin))
     if end:
         query = query.filter(models.Instance.launched_at < end)
@@ -1679,19 +1974,95 @@ def instance_get_active_by_window_joined(context, begin, end=None,
     return query.all()
 
 
+def _instance_usage_window_query(query, begin, end, project_id):
+    """Restrict a query to billable instances active during a window."""
+    # NOTE: instances whose flavor has been deleted can't be billed, so
+    # an inner join against the live flavors drops them.
+    query = query.join(models.InstanceTypes,
+                       and_(models.Instance.instance_type_id ==
+                                models.InstanceTypes.id,
+                            models.InstanceTypes.deleted == 0))
+    query = query.filter(or_(models.Instance.terminated_at == None,
+                             models.Instance.terminated_at > begin))
+    query = query.filter(models.Instance.launched_at != None)
+    if end:
+        query = query.filter(models.Instance.launched_at < end)
+    if project_id:
+        query = query.filter(models.Instance.project_id == project_id)
+    return query
+
+
+@require_context
+@_slave_safe
+def instance_usage_totals_by_window(context, begin, end, project_id=None):
+    """Return per-project usage totals for instances active in a window."""
+    started = case([(models.Instance.launched_at > begin,
+                     models.Instance.launched_at)],
+                   else_=literal(begin, DateTime))
+    stopped = case([(models.Instance.terminated_at < end,
+                     models.Instance.terminated_at)],
+                   else_=literal(end, DateTime))
+    hours = (db_utils.EpochSeconds(stopped) -
+             db_utils.EpochSeconds(started)) / 3600.0
+    local_gb = models.InstanceTypes.root_gb + models.InstanceTypes.ephemeral_gb
+
+    session = get_session()
+    query = session.query(models.Instance.project_id,
+                          func.sum(hours),
+                          func.sum(hours * models.InstanceTypes.vcpus),
+                          func.sum(hours * models.InstanceTypes.memory_mb),
+                          func.sum(hours * local_gb))
+    query = _instance_usage_window_query(query, begin, end, project_id)
+    query = query.group_by(models.Instance.project_id)
+
+    return [{'project_id': project,
+             'total_hours': total_hours or 0,
+             'total_vcpus_usage': vcpus_usage or 0,
+             'total_memory_mb_usage': memory_mb_usage or 0,
+             'total_local_gb_usage': local_gb_usage or 0}
+            for (project, total_hours, vcpus_usage, memory_mb_usage,
+                 local_gb_usage) in query]
+
+
+@require_context
+@_slave_safe
+def instance_usage_get_by_window(context, begin, end=None, project_id=None):
+    """Stream usage records for instances active in a window."""
+    session = get_session()
+    query = session.query(models.Instance.uuid,
+                          models.Instance.display_name,
+                          models.Instance.project_id,
+                          models.Instance.vm_state,
+                          models.Instance.launched_at,
+                          models.Instance.terminated_at,
+                          models.InstanceTypes.name,
+                          models.InstanceTypes.vcpus,
+                          models.InstanceTypes.memory_mb,
+                          models.InstanceTypes.root_gb,
+                          models.InstanceTypes.ephemeral_gb)
+    query = _instance_usage_window_query(query, begin, end, project_id)
+    # NOTE: rows are fetched from the cursor in batches as the caller
+    # iterates instead of being loaded into memory all at once.
+    query = query.yield_per(1000)
+
+    keys = ('uuid', 'display_name', 'project_id', 'vm_state', 'launched_at',
+            'terminated_at', 'instance_type_name', 'vcpus', 'memory_mb',
+            'root_gb', 'ephemeral_gb')
+    return (dict(zip(keys, row)) for row in query)
+
+
 @require_admin_context
-def _instance_get_all_query(context, project_only=False):
-    return model_query(context, models.Instance, project_only=project_only).\
-                   options(joinedload('info_cache')).\
-                   options(joinedload('security_groups')).\
-                   options(joinedload('metadata')).\
-                   options(joinedload('instance_type')).\
-                   options(joinedload('system_metadata'))
+def _instance_get_all_query(context, project_only=False,
+                            columns_to_join=None):
+    query = model_query(context, models.Instance, project_only=project_only)
+    return _instance_joins(query, columns_to_join)
 
 
 @require_admin_context
-def instance_get_all_by_host(context, host):
-    return _instance_get_all_query(context).filter_by(host=host).all()
+def instance_get_all_by_host(context, host, columns_to_join=None):
+    return _instance_get_all_query(context,
+                                   columns_to_join=columns_to_join).\
+                                   filter_by(host=host).all()
 
 
 @require_admin_context
@@ -1812,13 +2183,15 @@ def _instance_metadata_update_in_place(context, instance, metadata_type, model,
         instance[metadata_type].append(newitem)
 
 
-def _instance_update(context, instance_uuid, values, copy_old_instance=False):
-    session = get_session()
+def _instance_update(context, instance_uuid, values, copy_old_instance=False,
+                     session=None):
+    if session is None:
+        session = get_session()
 
     if not uuidutils.is_uuid_like(instance_uuid):
         raise exception.InvalidUUID(instance_uuid)
 
-    with session.begin():
+    with session.begin(subtransactions=True):
         instance_ref = _instance_get_by_uuid(context, instance_uuid,
                                              session=session)
         # TODO(deva): remove extra_specs from here after it is included
@@ -1884,6 +2257,39 @@ def _instance_update(context, instance_uuid, values, copy_old_instance=False):
     return (old_instance_ref, instance_ref)
 
 
+@require_context
+def instance_update_many(context, instances):
+    """Apply updates to a number of instances in one transaction.
+
+    :param instances: list of dicts of values to update, each with the
+                      instance's 'uuid' and optionally an 'info_cache' dict
+                      of values for the instance's info cache.
+    :returns: the entries from instances that matched no instance.
+    """
+    uuids = [instance['uuid'] for instance in instances]
+    session = get_session()
+    with session.begin():
+        existing = set(row[0] for row in
+                       model_query(context, models.Instance.uuid,
+                                   base_model=models.Instance,
+                                   session=session, project_only=True).
+                       filter(models.Instance.uuid.in_(uuids)).
+                       all())
+        missing = []
+        for instance in instances:
+            if instance['uuid'] not in existing:
+                missing.append(instance)
+                continue
+            values = dict(instance)
+            info_cache = values.pop('info_cache', None)
+            _instance_update(context, instance['uuid'], values,
+                             session=session)
+            if info_cache is not None:
+                _instance_info_cache_update(context, instance['uuid'],
+                                            info_cache, session=session)
+    return missing
+
+
 def instance_add_security_group(context, instance_uuid, security_group_id):
     """Associate the given security group with the given instance."""
     sec_group_ref = models.SecurityGroupInstanceAssociation()
@@ -1924,8 +2330,13 @@ def instance_info_cache_update(context, instance_uuid, values):
     :param values: = dict containing column values to update
     :param session: = optional session object
     """
-    session = get_session()
-    with session.begin():
+    return _instance_info_cache_update(context, instance_uuid, values)
+
+
+def _instance_info_cache_update(context, instance_uuid, values, session=None):
+    if session is None:
+        session = get_session()
+    with session.begin(subtransactions=True):
         info_cache = model_query(context, models.InstanceInfoCache,
                                  session=session).\
                          filter_by(instance_uuid=instance_uuid).\
@@ -3968,6 +4379,7 @@ def bw_usage_get(context, uuid, start_period, mac):
 
 
 @require_context
+@_slave_safe
 def bw_usage_get_by_uuids(context, uuids, start_period):
     return model_query(context, models.BandwidthUsage, read_deleted="yes").\
                    filter(models.BandwidthUsage.uuid.in_(uuids)).\
@@ -4175,6 +4587,49 @@ def vol_usage_update(context, id, rd_req, rd_bytes, wr_req, wr_bytes,
     return
 
 
+@require_context
+def vol_usage_bulk_update(context, usages, last_refreshed=None):
+    if last_refreshed is None:
+        last_refreshed = timeutils.utcnow()
+
+    session = get_session()
+    with session.begin():
+        volume_ids = [str(usage['volume_id']) for usage in usages]
+        rows_by_volume = {}
+        if volume_ids:
+            rows = model_query(context, models.VolumeUsage,
+                               session=session, read_deleted="yes").\
+                               filter(models.VolumeUsage.volume_id.in_(
+                                      volume_ids)).\
+                               all()
+            for row in rows:
+                rows_by_volume.setdefault(row.volume_id, []).append(row)
+
+        for usage in usages:
+            volume_id = str(usage['volume_id'])
+            rows = rows_by_volume.get(volume_id)
+            if rows:
+                for row in rows:
+                    row.update({'curr_last_refreshed': last_refreshed,
+                                'curr_reads': usage['rd_req'],
+                                'curr_read_bytes': usage['rd_bytes'],
+                                'curr_writes': usage['wr_req'],
+                                'curr_write_bytes': usage['wr_bytes'],
+                                'instance_id': usage['instance_id']})
+                continue
+
+            vol_usage = models.VolumeUsage()
+            vol_usage.tot_last_refreshed = timeutils.utcnow()
+            vol_usage.curr_last_refreshed = timeutils.utcnow()
+            vol_usage.volume_id = volume_id
+            vol_usage.curr_reads = usage['rd_req']
+            vol_usage.curr_read_bytes = usage['rd_bytes']
+            vol_usage.curr_writes = usage['wr_req']
+            vol_usage.curr_write_bytes = usage['wr_bytes']
+            session.add(vol_usage)
+            rows_by_volume[volume_id] = [vol_usage]
+
+
 ####################
 
 
@@ -4301,13 +4756,23 @@ def aggregate_metadata_get_by_host(context, host, key=None):
 
 @require_admin_context
 def aggregate_host_get_by_metadata_key(context, key):
-    query = model_query(context, models.Aggregate).join(
-            "_metadata").filter(models.AggregateMetadata.key == key)
-    rows = query.all()
+    # NOTE: host and value are read with one join rather than loading each
+    # aggregate's hosts and metadata separately.
+    rows = model_query(context, models.AggregateHost.host,
+                       models.AggregateMetadata.value,
+                       base_model=models.AggregateHost).\
+            join(models.Aggregate,
+                 models.Aggregate.id == models.AggregateHost.aggregate_id).\
+            join(models.AggregateMetadata,
+                 models.AggregateMetadata.aggregate_id ==
+                 models.AggregateHost.aggregate_id).\
+            filter(models.Aggregate.deleted == 0).\
+            filter(models.AggregateMetadata.deleted == 0).\
+            filter(models.AggregateMetadata.key == key).\
+            all()
     metadata = collections.defaultdict(set)
-    for agg in rows:
-        for agghost in agg._hosts:
-            metadata[agghost.host].add(agg._metadata[0]['value'])
+    for host, value in rows:
+        metadata[host].add(value)
     return dict(metadata)
 
 
@@ -0,0 +1,45 @@
+# Copyright 2013 OpenStack LLC.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import MetaData, Table, Index
+
+# NOTE: instances_host_deleted_idx already exists from 133_folsom.
+INDEXES = [
+    # Based on the default created_at sort of instance_get_all_by_filters
+    # for a tenant, from: nova/db/sqlalchemy/api.py
+    ('instances_project_id_deleted_created_at_idx',
+     ('project_id', 'deleted', 'created_at')),
+    # Based on prefix name filters of instance_get_all_by_filters
+    ('instances_project_id_deleted_display_name_idx',
+     ('project_id', 'deleted', 'display_name')),
+]
+
+
+def _get_indexes(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    instances = Table('instances', meta, autoload=True)
+    return [Index(name, *[instances.c[column] for column in columns])
+            for name, columns in INDEXES]
+
+
+def upgrade(migrate_engine):
+    for index in _get_indexes(migrate_engine):
+        index.create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    for index in _get_indexes(migrate_engine):
+        index.drop(migrate_engine)
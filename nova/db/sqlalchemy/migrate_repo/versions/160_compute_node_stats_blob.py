@@ -0,0 +1,101 @@
+# Copyright 2013 OpenStack LLC.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Column, MetaData, Table, Text, select
+
+from nova.openstack.common import jsonutils
+from nova.openstack.common import timeutils
+
+# NOTE: compute_node_stats is emptied rather than dropped so that the
+# downgrade has somewhere to put the stats back.
+
+# Stats counted per project, vm state, task state and OS type, which are
+# stored in a dict per counter instead of a num_<counter>_<name> key each.
+COUNTERS = ('num_proj', 'num_vm', 'num_task', 'num_os_type')
+
+
+def _stat_key(key):
+    """Return the path in the stored stats of a compute_node_stats key."""
+    for counter in COUNTERS:
+        prefix = counter + '_'
+        if key.startswith(prefix):
+            return counter, key[len(prefix):]
+    return key, None
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    compute_nodes = Table('compute_nodes', meta, autoload=True)
+    shadow_compute_nodes = Table('shadow_compute_nodes', meta, autoload=True)
+    compute_node_stats = Table('compute_node_stats', meta, autoload=True)
+
+    compute_nodes.create_column(Column('stats', Text))
+    shadow_compute_nodes.create_column(Column('stats', Text))
+
+    stats = {}
+    rows = select([compute_node_stats.c.compute_node_id,
+                   compute_node_stats.c.key,
+                   compute_node_stats.c.value]).\
+            where(compute_node_stats.c.deleted == 0).\
+            execute().\
+            fetchall()
+    for compute_node_id, key, value in rows:
+        node_stats = stats.setdefault(compute_node_id, {})
+        key, name = _stat_key(key)
+        if name is None:
+            node_stats[key] = value
+        else:
+            node_stats.setdefault(key, {})[name] = value
+
+    for compute_node_id, node_stats in stats.iteritems():
+        compute_nodes.update().\
+                where(compute_nodes.c.id == compute_node_id).\
+                values(stats=jsonutils.dumps(node_stats)).\
+                execute()
+
+    compute_node_stats.delete().execute()
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    compute_nodes = Table('compute_nodes', meta, autoload=True)
+    shadow_compute_nodes = Table('shadow_compute_nodes', meta, autoload=True)
+    compute_node_stats = Table('compute_node_stats', meta, autoload=True)
+
+    now = timeutils.utcnow()
+    rows = select([compute_nodes.c.id, compute_nodes.c.stats]).\
+            where(compute_nodes.c.stats != None).\
+            execute().\
+            fetchall()
+    for compute_node_id, blob in rows:
+        node_stats = {}
+        for key, value in jsonutils.loads(blob).iteritems():
+            if isinstance(value, dict):
+                for name, count in value.iteritems():
+                    node_stats['%s_%s' % (key, name)] = count
+            else:
+                node_stats[key] = value
+        for key, value in node_stats.iteritems():
+            compute_node_stats.insert().\
+                    values(created_at=now, deleted=0,
+                           compute_node_id=compute_node_id,
+                           key=key, value=value).\
+                    execute()
+
+    compute_nodes.drop_column('stats')
+    shadow_compute_nodes.drop_column('stats')
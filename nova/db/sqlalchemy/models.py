@@ -95,23 +95,9 @@ class ComputeNode(BASE, NovaBase):
     cpu_info = Column(Text, nullable=True)
     disk_available_least = Column(Integer)
 
-
-class ComputeNodeStat(BASE, NovaBase):
-    """Stats related to the current workload of a compute host that are
-    intended to aid in making scheduler decisions."""
-    __tablename__ = 'compute_node_stats'
-    id = Column(Integer, primary_key=True)
-    key = Column(String(511))
-    value = Column(String(255))
-    compute_node_id = Column(Integer, ForeignKey('compute_nodes.id'))
-
-    primary_join = ('and_(ComputeNodeStat.compute_node_id == '
-                    'ComputeNode.id, ComputeNodeStat.deleted == 0)')
-    stats = relationship("ComputeNode", backref="stats",
-            primaryjoin=primary_join)
-
-    def __str__(self):
-        return "{%d: %s = %s}" % (self.compute_node_id, self.key, self.value)
+    # Stats related to the current workload of the host that are intended
+    # to aid in making scheduler decisions, e.g. {"num_instances": 3}.
+    stats = Column(types.JsonEncodedDict, nullable=True)
 
 
 class Certificate(BASE, NovaBase):
@@ -154,7 +140,13 @@ class Instance(BASE, NovaBase):
         return base_name
 
     def _extra_keys(self):
-        return ['name', 'system_metadata']
+        keys = ['name']
+        # NOTE: system_metadata is only exposed when it was loaded with the
+        # instance, so instances fetched without it can still be iterated
+        # once they are detached from their session.
+        if 'system_metadata' in self.__dict__:
+            keys.append('system_metadata')
+        return keys
 
     user_id = Column(String(255))
     project_id = Column(String(255))
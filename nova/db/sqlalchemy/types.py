@@ -20,6 +20,7 @@
 from sqlalchemy.dialects import postgresql
 from sqlalchemy import types
 
+from nova.openstack.common import jsonutils
 from nova import utils
 
 
@@ -48,3 +49,18 @@ class CIDR(types.TypeDecorator):
         if utils.is_valid_ipv6_cidr(value):
             return utils.get_shortened_ipv6_cidr(value)
         return value
+
+
+class JsonEncodedDict(types.TypeDecorator):
+    """An SQLAlchemy type storing a dict as a JSON document."""
+    impl = types.Text
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return value
+        return jsonutils.dumps(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return value
+        return jsonutils.loads(value)
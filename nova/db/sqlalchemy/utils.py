@@ -20,8 +20,10 @@ from sqlalchemy.engine import reflection
 from sqlalchemy.ext.compiler import compiles
 from sqlalchemy import func
 from sqlalchemy import MetaData, Table, Column, Index
+from sqlalchemy.sql.expression import FunctionElement
 from sqlalchemy.sql.expression import UpdateBase, literal_column
 from sqlalchemy.sql import select
+from sqlalchemy.types import Float
 from sqlalchemy.types import NullType
 
 
@@ -46,6 +48,35 @@ def visit_insert_from_select(element, compiler, **kw):
         compiler.process(element.select))
 
 
+class EpochSeconds(FunctionElement):
+    """Seconds since the epoch of a naive UTC datetime expression.
+
+    The difference of two of these is the number of seconds between them,
+    which lets interval arithmetic be pushed down to the database.
+    """
+    type = Float()
+    name = 'epoch_seconds'
+
+
+@compiles(EpochSeconds)
+def visit_epoch_seconds(element, compiler, **kw):
+    return "EXTRACT(EPOCH FROM %s)" % compiler.process(element.clauses)
+
+
+@compiles(EpochSeconds, 'mysql')
+def visit_epoch_seconds_mysql(element, compiler, **kw):
+    # NOTE: UNIX_TIMESTAMP() would apply the session time zone to
+    # our UTC datetimes, TIMESTAMPDIFF() does not.
+    return "TIMESTAMPDIFF(SECOND, '1970-01-01 00:00:00', %s)" % (
+        compiler.process(element.clauses))
+
+
+@compiles(EpochSeconds, 'sqlite')
+def visit_epoch_seconds_sqlite(element, compiler, **kw):
+    return "CAST(strftime('%%s', %s) AS INTEGER)" % (
+        compiler.process(element.clauses))
+
+
 def _drop_unique_constraint_in_sqlite(migrate_engine, table_name, uc_name,
                                       **col_name_col_instance):
     insp = reflection.Inspector.from_engine(migrate_engine)
@@ -235,7 +235,8 @@ def bandwidth_usage(instance_ref, audit_start,
     macs = [vif['address'] for vif in nw_info]
     uuids = [instance_ref["uuid"]]
 
-    bw_usages = db.bw_usage_get_by_uuids(admin_context, uuids, audit_start)
+    bw_usages = db.bw_usage_get_by_uuids(admin_context, uuids, audit_start,
+                                         use_slave=True)
     bw_usages = [b for b in bw_usages if b.mac in macs]
 
     bw = {}
@@ -21,10 +21,12 @@ import UserDict
 
 from oslo.config import cfg
 
+from nova.compute import stats as compute_stats
 from nova.compute import task_states
 from nova.compute import vm_states
 from nova import db
 from nova import exception
+from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
 from nova.scheduler import filters
@@ -162,37 +164,20 @@ class HostState(object):
         self.vcpus_used = compute['vcpus_used']
         self.updated = compute['updated_at']
 
-        stats = compute.get('stats', [])
-        statmap = self._statmap(stats)
+        statmap = self._statmap(compute.get('stats'))
 
         # Track number of instances on host
         self.num_instances = int(statmap.get('num_instances', 0))
 
-        # Track number of instances by project_id
-        project_id_keys = [k for k in statmap.keys() if
-                k.startswith("num_proj_")]
-        for key in project_id_keys:
-            project_id = key[9:]
-            self.num_instances_by_project[project_id] = int(statmap[key])
-
-        # Track number of instances in certain vm_states
-        vm_state_keys = [k for k in statmap.keys() if k.startswith("num_vm_")]
-        for key in vm_state_keys:
-            vm_state = key[7:]
-            self.vm_states[vm_state] = int(statmap[key])
-
-        # Track number of instances in certain task_states
-        task_state_keys = [k for k in statmap.keys() if
-                k.startswith("num_task_")]
-        for key in task_state_keys:
-            task_state = key[9:]
-            self.task_states[task_state] = int(statmap[key])
-
-        # Track number of instances by host_type
-        os_keys = [k for k in statmap.keys() if k.startswith("num_os_type_")]
-        for key in os_keys:
-            os = key[12:]
-            self.num_instances_by_os_type[os] = int(statmap[key])
+        # Track number of instances by project_id, in certain vm_states and
+        # task_states, and by host_type
+        counters = (('num_proj', self.num_instances_by_project),
+                    ('num_vm', self.vm_states),
+                    ('num_task', self.task_states),
+                    ('num_os_type', self.num_instances_by_os_type))
+        for key, counter in counters:
+            for name, value in statmap.get(key, {}).iteritems():
+                counter[name] = int(value)
 
         self.num_io_ops = int(statmap.get('io_workload', 0))
 
@@ -242,7 +227,20 @@ class HostState(object):
             self.num_io_ops += 1
 
     def _statmap(self, stats):
-        return dict((st['key'], st['value']) for st in stats)
+        """Return compute node stats as a dict, with the counters nested.
+
+        Stats are stored as a single dict per compute node, but compute
+        nodes reported from elsewhere (e.g. by older cells) may still
+        carry them as a list of key/value rows, and computes that are not
+        upgraded yet still report every counter under a key of its own.
+        """
+        if not stats:
+            return {}
+        if isinstance(stats, basestring):
+            stats = jsonutils.loads(stats)
+        elif not isinstance(stats, dict):
+            stats = dict((st['key'], st['value']) for st in stats)
+        return compute_stats.nest_counters(stats)
 
     def __repr__(self):
         return ("(%s, %s) ram:%s disk:%s io_ops:%s instances:%s vm_type:%s" %
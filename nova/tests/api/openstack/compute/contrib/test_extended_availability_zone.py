@@ -40,8 +40,8 @@ def fake_compute_get_all(*args, **kwargs):
     return [inst1, inst2]
 
 
-def fake_get_host_availability_zone(context, host):
-    return host
+def fake_get_host_availability_zones(context, hosts):
+    return dict((host, host) for host in hosts)
 
 
 class ExtendedServerAttributesTest(test.TestCase):
@@ -53,8 +53,8 @@ class ExtendedServerAttributesTest(test.TestCase):
         fakes.stub_out_nw_api(self.stubs)
         self.stubs.Set(compute.api.API, 'get', fake_compute_get)
         self.stubs.Set(compute.api.API, 'get_all', fake_compute_get_all)
-        self.stubs.Set(availability_zones, 'get_host_availability_zone',
-                       fake_get_host_availability_zone)
+        self.stubs.Set(availability_zones, 'get_host_availability_zones',
+                       fake_get_host_availability_zones)
 
         self.flags(
             osapi_compute_extension=[
@@ -92,6 +92,21 @@ class ExtendedServerAttributesTest(test.TestCase):
         for i, server in enumerate(self._get_servers(res.body)):
             self.assertServerAttributes(server, 'all-host')
 
+    def test_detail_loads_zones_once(self):
+        calls = []
+
+        def fake_get_zones(context, hosts):
+            calls.append(hosts)
+            return fake_get_host_availability_zones(context, hosts)
+
+        self.stubs.Set(availability_zones, 'get_host_availability_zones',
+                       fake_get_zones)
+        url = '/v2/fake/servers/detail'
+        res = self._make_request(url)
+
+        self.assertEqual(res.status_int, 200)
+        self.assertEqual([['all-host']], calls)
+
     def test_no_instance_passthrough_404(self):
 
         def fake_compute_get(*args, **kwargs):
@@ -40,8 +40,9 @@ def fake_compute_get_all(*args, **kwargs):
     ]
 
 
-def fake_cn_get(context, host):
-    return {"hypervisor_hostname": host}
+def fake_cn_get_by_hosts(context, hosts):
+    return [{"hypervisor_hostname": host, "service": {"host": host}}
+            for host in hosts]
 
 
 class ExtendedServerAttributesTest(test.TestCase):
@@ -53,7 +54,8 @@ class ExtendedServerAttributesTest(test.TestCase):
         fakes.stub_out_nw_api(self.stubs)
         self.stubs.Set(compute.api.API, 'get', fake_compute_get)
         self.stubs.Set(compute.api.API, 'get_all', fake_compute_get_all)
-        self.stubs.Set(db, 'compute_node_get_by_host', fake_cn_get)
+        self.stubs.Set(db, 'compute_node_get_by_hosts',
+                       fake_cn_get_by_hosts)
         self.flags(
             osapi_compute_extension=[
                 'nova.api.openstack.compute.contrib.select_extensions'],
@@ -97,6 +99,20 @@ class ExtendedServerAttributesTest(test.TestCase):
                                     host='host-%s' % (i + 1),
                                     instance_name='instance-%s' % (i + 1))
 
+    def test_detail_loads_compute_nodes_once(self):
+        calls = []
+
+        def fake_cn_get_by_hosts_counted(context, hosts):
+            calls.append(sorted(hosts))
+            return fake_cn_get_by_hosts(context, hosts)
+
+        self.stubs.Set(db, 'compute_node_get_by_hosts',
+                       fake_cn_get_by_hosts_counted)
+        res = self._make_request('/v2/fake/servers/detail')
+
+        self.assertEqual(res.status_int, 200)
+        self.assertEqual([['host-1', 'host-2']], calls)
+
     def test_no_instance_passthrough_404(self):
 
         def fake_compute_get(*args, **kwargs):
@@ -17,6 +17,7 @@
 import datetime
 
 from nova.api.openstack.compute.contrib import services
+from nova.compute import api as compute_api
 from nova import context
 from nova import db
 from nova import exception
@@ -77,7 +78,7 @@ class FakeRequestWithHostService(object):
         GET = {"host": "host1", "service": "nova-compute"}
 
 
-def fake_service_get_all(context):
+def fake_service_get_all(context, disabled=None):
     return fake_services_list
 
 
@@ -185,6 +186,29 @@ class ServicesTest(test.TestCase):
                     'updated_at': datetime.datetime(2012, 10, 29, 13, 42, 5)}]}
         self.assertEqual(res_dict, response)
 
+    def test_services_list_with_listing_cache(self):
+        self.flags(host_listing_cache_ttl=600)
+        self.stubs.Set(compute_api, '_host_listing_cache', None)
+        req = FakeRequestWithHostService()
+        self.controller.index(req)
+
+        # The service keeps sending heartbeats, so it stays up however
+        # long the listings are cached for.
+        def fake_utcnow_later():
+            return datetime.datetime(2012, 10, 29, 13, 52, 11)
+
+        def fake_service_get_all_later(context, disabled=None):
+            services = [dict(service) for service in fake_services_list]
+            for service in services:
+                service['updated_at'] = datetime.datetime(2012, 10, 29,
+                                                          13, 52, 5)
+            return services
+
+        self.stubs.Set(timeutils, "utcnow", fake_utcnow_later)
+        self.stubs.Set(db, "service_get_all", fake_service_get_all_later)
+        self.assertEqual('up', self.controller.index(req)['services'][0][
+                'state'])
+
     def test_services_enable(self):
         body = {'host': 'host1', 'service': 'nova-compute'}
         req = fakes.HTTPRequest.blank('/v2/fake/os-services/enable')
@@ -42,45 +42,46 @@ START = NOW - datetime.timedelta(hours=HOURS)
 STOP = NOW
 
 
-def fake_instance_type_get(self, context, instance_type_id):
-    return {'id': 1,
+def get_fake_db_instance(start, end, instance_id, tenant_id):
+    return {'uuid': '00000000-0000-0000-0000-00000000000000%02d' % instance_id,
+            'project_id': tenant_id,
+            'display_name': 'name',
+            'vm_state': 'active',
+            'launched_at': start,
+            'terminated_at': end,
+            'instance_type_name': 'fakeflavor',
             'vcpus': VCPUS,
             'root_gb': ROOT_GB,
             'ephemeral_gb': EPHEMERAL_GB,
-            'memory_mb': MEMORY_MB,
-            'name':
-            'fakeflavor'}
+            'memory_mb': MEMORY_MB}
 
 
-def get_fake_db_instance(start, end, instance_id, tenant_id):
-    return {'id': instance_id,
-            'uuid': '00000000-0000-0000-0000-00000000000000%02d' % instance_id,
-            'image_ref': '1',
-            'project_id': tenant_id,
-            'user_id': 'fakeuser',
-            'display_name': 'name',
-            'state_description': 'state',
-            'instance_type_id': 1,
-            'launched_at': start,
-            'terminated_at': end}
+def fake_instance_usage_get_by_window(self, context, begin, end,
+                                      project_id):
+    for x in xrange(TENANTS * SERVERS):
+        tenant_id = "faketenant_%s" % (x / SERVERS)
+        if project_id in (None, tenant_id):
+            yield get_fake_db_instance(START, STOP, x, tenant_id)
 
 
-def fake_instance_get_active_by_window_joined(self, context, begin, end,
-        project_id):
-            return [get_fake_db_instance(START,
-                                         STOP,
-                                         x,
-                                         "faketenant_%s" % (x / SERVERS))
-                                         for x in xrange(TENANTS * SERVERS)]
+def fake_instance_usage_totals_by_window(self, context, begin, end,
+                                         project_id):
+    hours = SERVERS * HOURS
+    return [{'project_id': "faketenant_%s" % x,
+             'total_hours': hours,
+             'total_vcpus_usage': hours * VCPUS,
+             'total_memory_mb_usage': hours * MEMORY_MB,
+             'total_local_gb_usage': hours * (ROOT_GB + EPHEMERAL_GB)}
+            for x in xrange(TENANTS)]
 
 
 class SimpleTenantUsageTest(test.TestCase):
     def setUp(self):
         super(SimpleTenantUsageTest, self).setUp()
-        self.stubs.Set(api.API, "get_instance_type",
-                       fake_instance_type_get)
-        self.stubs.Set(api.API, "get_active_by_window",
-                       fake_instance_get_active_by_window_joined)
+        self.stubs.Set(api.API, "get_usage_by_window",
+                       fake_instance_usage_get_by_window)
+        self.stubs.Set(api.API, "get_usage_totals_by_window",
+                       fake_instance_usage_totals_by_window)
         self.admin_context = context.RequestContext('fakeadmin_0',
                                                     'faketenant_0',
                                                     is_admin=True)
@@ -393,6 +393,8 @@ def fake_instance_get_all_by_filters(num_servers=5, **kwargs):
             marker = kwargs["marker"]
         if "limit" in kwargs:
             limit = kwargs["limit"]
+        kwargs.pop("columns_to_join", None)
+        kwargs.pop("use_slave", None)
 
         for i in xrange(num_servers):
             uuid = get_fake_uuid(i)
@@ -4,6 +4,7 @@ import inspect
 import webob
 
 from nova.api.openstack import wsgi
+from nova import db
 from nova import exception
 from nova import test
 from nova.tests.api.openstack import fakes
@@ -96,6 +97,23 @@ class RequestTest(test.TestCase):
                  'uuid1': instances[1],
                  'uuid2': instances[2]})
 
+    def test_load_db_items(self):
+        request = wsgi.Request.blank('/foo')
+        calls = []
+
+        def loader(keys):
+            calls.append(sorted(keys))
+            return dict((key, key.upper()) for key in keys if key != 'c')
+
+        self.assertEqual(request.load_db_items('things', ['a', 'b'], loader),
+                         {'a': 'A', 'b': 'B'})
+        self.assertEqual(request.load_db_items('things', ['b', 'c'], loader),
+                         {'b': 'B', 'c': None})
+        self.assertEqual(request.load_db_items('things', ['a', 'c'], loader),
+                         {'a': 'A', 'c': None})
+        self.assertEqual(calls, [['a', 'b'], ['c']])
+        self.assertEqual(request.get_db_item('things', 'a'), 'A')
+
 
 class ActionDispatcherTest(test.TestCase):
     def test_dispatch(self):
@@ -214,6 +232,24 @@ class ResourceTest(test.TestCase):
         self.assertEqual(response.body, 'off')
         self.assertEqual(response.status_int, 200)
 
+    def test_resource_call_counts_queries_when_debugging(self):
+        class Controller(object):
+            def index(self, req):
+                return 'off'
+
+        self.mox.StubOutWithMock(db, 'query_count_start')
+        self.mox.StubOutWithMock(db, 'query_count_stop')
+        db.query_count_start()
+        db.query_count_stop().AndReturn(0)
+        self.mox.ReplayAll()
+
+        req = webob.Request.blank('/tests')
+        app = fakes.TestRouter(Controller())
+        self.flags(debug=True)
+        req.get_response(app)
+        self.flags(debug=False)
+        req.get_response(app)
+
     def test_resource_not_authorized(self):
         class Controller(object):
             def index(self, req):
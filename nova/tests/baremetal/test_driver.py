@@ -20,8 +20,14 @@
 
 """Tests for the base baremetal driver class."""
 
+import os
+import stat
+import time
+
+import fixtures
 from oslo.config import cfg
 
+from nova.compute import power_state
 from nova import exception
 from nova import test
 from nova.tests.baremetal.db import base as bm_db_base
@@ -32,6 +38,7 @@ from nova.virt.baremetal import baremetal_states
 from nova.virt.baremetal import db
 from nova.virt.baremetal import driver as bm_driver
 from nova.virt.baremetal import fake
+from nova.virt.baremetal import ipmi
 
 
 CONF = cfg.CONF
@@ -70,6 +77,118 @@ class BareMetalDriverNoDBTestCase(test.TestCase):
                                     fake.FakeFirewallDriver))
 
 
+# Answers 'power status' after a delay, reporting nodes whose address ends
+# in "-off" as powered off, and logs each call.
+FAKE_IPMITOOL = """#!/bin/sh
+sleep %(delay)s
+echo "$@" >> %(log)s
+case "$4" in
+    *-off) echo "Chassis Power is off";;
+    *) echo "Chassis Power is on";;
+esac
+"""
+
+
+class FakeVirtAPI(object):
+
+    def __init__(self, instances):
+        self.instances = instances
+
+    def instance_get_all_by_host(self, context, host):
+        return self.instances
+
+
+class BareMetalPowerStateTestCase(bm_db_base.BMDBTestCase):
+
+    def setUp(self):
+        super(BareMetalPowerStateTestCase, self).setUp()
+        self.flags(**COMMON_FLAGS)
+        self.flags(**BAREMETAL_FLAGS)
+        self.flags(power_manager='nova.virt.baremetal.ipmi.IPMI',
+                   power_state_workers=20,
+                   group='baremetal')
+        self.stubs.Set(ipmi, '_password_files', {})
+        self.stubs.Set(ipmi, '_power_states', {})
+        self.stubs.Set(ipmi, '_power_queries', {})
+        self.stubs.Set(ipmi, '_password_dir_cleaned', False)
+
+        self.tempdir = self.useFixture(fixtures.TempDir()).path
+        self.flags(terminal_pid_dir=os.path.join(self.tempdir, 'console'),
+                   group='baremetal')
+        self.log = os.path.join(self.tempdir, 'ipmitool.log')
+        self.delay = 0.2
+        ipmitool = os.path.join(self.tempdir, 'ipmitool')
+        with open(ipmitool, 'w') as f:
+            f.write(FAKE_IPMITOOL % {'delay': self.delay, 'log': self.log})
+        os.chmod(ipmitool, stat.S_IRWXU)
+        self.useFixture(fixtures.EnvironmentVariable(
+                'PATH', '%s:%s' % (self.tempdir, os.environ['PATH'])))
+
+        instances = []
+        for i in range(40):
+            state = i % 4 and 'on' or 'off'
+            instance = {'uuid': 'instance-uuid-%d' % i,
+                        'name': 'instance-%08x' % i}
+            db.bm_node_create(self.context, bm_db_utils.new_bm_node(
+                    service_host='test_host',
+                    instance_uuid=instance['uuid'],
+                    pm_address='node-%d-%s' % (i, state)))
+            instances.append(instance)
+        # A node of another host, and an instance without a node.
+        db.bm_node_create(self.context, bm_db_utils.new_bm_node(
+                service_host='other_host',
+                instance_uuid='other-uuid',
+                pm_address='other-node'))
+        instances.append({'uuid': 'no-node-uuid', 'name': 'no-node'})
+        self.driver = bm_driver.BareMetalDriver(FakeVirtAPI(instances))
+
+    def _ipmitool_calls(self):
+        if not os.path.exists(self.log):
+            return []
+        with open(self.log) as f:
+            return f.read().splitlines()
+
+    def test_get_info_all(self):
+        start = time.time()
+        infos = self.driver.get_info_all()
+        elapsed = time.time() - start
+
+        self.assertEqual(40, len(infos))
+        self.assertEqual(power_state.SHUTDOWN,
+                         infos['instance-00000000']['state'])
+        self.assertEqual(power_state.RUNNING,
+                         infos['instance-00000001']['state'])
+        calls = self._ipmitool_calls()
+        self.assertEqual(40, len(calls))
+        self.assertEqual(['power', 'status'], calls[0].split()[-2:])
+        # Querying one node at a time would take 40 * delay.
+        self.assertTrue(elapsed < 40 * self.delay / 4,
+                        "took %.2fs" % elapsed)
+        # One password file per node, kept for the next query.
+        self.assertEqual(40, len(ipmi._password_files))
+
+        # Power states are reused until they expire.
+        self.driver.get_info_all()
+        self.assertEqual(40, len(self._ipmitool_calls()))
+        self.flags(ipmi_power_state_ttl=0, group='baremetal')
+        self.driver.get_info_all()
+        self.assertEqual(80, len(self._ipmitool_calls()))
+
+    def test_get_info_all_removes_password_files_of_other_nodes(self):
+        path = ipmi._get_password_file(999, 'gone-password')
+        self.driver.get_info_all()
+        self.assertFalse(999 in ipmi._password_files)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(40, len(ipmi._password_files))
+
+    def test_get_info_all_skips_failed_nodes(self):
+        def fake_exec_ipmitool(*args):
+            raise test.TestingException()
+
+        self.stubs.Set(ipmi.IPMI, '_exec_ipmitool', fake_exec_ipmitool)
+        self.assertEqual({}, self.driver.get_info_all())
+
+
 class BareMetalDriverWithDBTestCase(bm_db_base.BMDBTestCase):
 
     def setUp(self):
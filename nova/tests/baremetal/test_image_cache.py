@@ -0,0 +1,129 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the baremetal master image cache."""
+
+import errno
+import os
+
+import eventlet
+import fixtures
+
+from nova import test
+from nova.virt.baremetal import image_cache
+from nova.virt.libvirt import utils as libvirt_utils
+
+
+class BareMetalImageCacheTestCase(test.TestCase):
+
+    def setUp(self):
+        super(BareMetalImageCacheTestCase, self).setUp()
+        self.tempdir = self.useFixture(fixtures.TempDir()).path
+        self.flags(instances_path=self.tempdir)
+        self.flags(master_image_cache_size=0, group='baremetal')
+        self.cache = image_cache.ImageCache(self.tempdir)
+        self.fetches = []
+
+        def fake_fetch_image(context, target, image_id, user_id, project_id):
+            self.fetches.append(image_id)
+            eventlet.sleep(0.01)
+            with open(target, 'w') as f:
+                f.write('image %s' % image_id + ' ' * 1024 * 1024)
+
+        self.stubs.Set(libvirt_utils, 'fetch_image', fake_fetch_image)
+
+    def _target(self, name):
+        return os.path.join(self.tempdir, name)
+
+    def _fetch(self, name, image_id, copy=False):
+        self.cache.fetch_image(None, self._target(name), image_id,
+                               'fake-user', 'fake-project', copy=copy)
+
+    def _master(self, image_id):
+        return self.cache._master_path(image_id)
+
+    def test_fetch_once_and_link(self):
+        self._fetch('kernel1', 'image1')
+        self._fetch('kernel2', 'image1')
+        self.assertEqual(['image1'], self.fetches)
+
+        st = os.stat(self._master('image1'))
+        self.assertEqual(3, st.st_nlink)
+        self.assertEqual(st.st_ino, os.stat(self._target('kernel1')).st_ino)
+        self.assertEqual(st.st_ino, os.stat(self._target('kernel2')).st_ino)
+
+    def test_fetch_copy(self):
+        self._fetch('disk', 'image1', copy=True)
+        self.assertEqual(1, os.stat(self._master('image1')).st_nlink)
+        with open(self._target('disk')) as f:
+            self.assertTrue(f.read().startswith('image image1'))
+
+    def test_existing_target_not_fetched(self):
+        with open(self._target('kernel'), 'w') as f:
+            f.write('kernel')
+        self._fetch('kernel', 'image1')
+        self.assertEqual([], self.fetches)
+        self.assertFalse(os.path.exists(self._master('image1')))
+
+    def test_concurrent_fetches_download_once(self):
+        threads = [eventlet.spawn(self._fetch, 'kernel%d' % i, 'image1')
+                   for i in range(5)]
+        for thread in threads:
+            thread.wait()
+        self.assertEqual(['image1'], self.fetches)
+        self.assertEqual(6, os.stat(self._master('image1')).st_nlink)
+
+    def test_fetch_across_devices_copies(self):
+        def fake_link(source, link_name):
+            raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+        self.stubs.Set(os, 'link', fake_link)
+        self._fetch('kernel', 'image1')
+        self.assertEqual(1, os.stat(self._master('image1')).st_nlink)
+        self.assertTrue(os.path.exists(self._target('kernel')))
+
+    def test_clean_up_removes_unused_least_recently_used(self):
+        for i in range(4):
+            self._fetch('kernel%d' % i, 'image%d' % i)
+            os.utime(self._master('image%d' % i), (i, i))
+        # image0 is the least recently used, but still linked to.
+        os.unlink(self._target('kernel1'))
+        os.unlink(self._target('kernel2'))
+        os.unlink(self._target('kernel3'))
+
+        # Each image is a little over 1MB, so only two of them fit.
+        self.flags(master_image_cache_size=3, group='baremetal')
+        self.cache.clean_up()
+        self.assertTrue(os.path.exists(self._master('image0')))
+        self.assertFalse(os.path.exists(self._master('image1')))
+        self.assertFalse(os.path.exists(self._master('image2')))
+        self.assertTrue(os.path.exists(self._master('image3')))
+
+        # Used again, so it is fetched again.
+        self._fetch('kernel1', 'image1')
+        self.assertEqual(['image0', 'image1', 'image2', 'image3', 'image1'],
+                         self.fetches)
+
+    def test_clean_up_without_limit(self):
+        self._fetch('kernel', 'image1')
+        os.unlink(self._target('kernel'))
+        self.cache.clean_up()
+        self.assertTrue(os.path.exists(self._master('image1')))
+
+    def test_clean_up_without_cache(self):
+        self.flags(master_image_cache_size=1, group='baremetal')
+        self.cache.clean_up()
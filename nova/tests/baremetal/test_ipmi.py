@@ -23,8 +23,11 @@ import os
 import stat
 import tempfile
 
+import eventlet
+import fixtures
 from oslo.config import cfg
 
+from nova.openstack.common import timeutils
 from nova import test
 from nova.tests.baremetal.db import utils as bm_db_utils
 from nova import utils
@@ -45,6 +48,14 @@ class BareMetalIPMITestCase(test.TestCase):
                 pm_user='fake-user',
                 pm_password='fake-password')
         self.ipmi = ipmi.IPMI(self.node)
+        self.stubs.Set(ipmi, '_password_files', {})
+        self.stubs.Set(ipmi, '_power_states', {})
+        self.stubs.Set(ipmi, '_power_queries', {})
+        self.stubs.Set(ipmi, '_password_dir_cleaned', False)
+        self.tempdir = self.useFixture(fixtures.TempDir()).path
+        self.flags(terminal_pid_dir=os.path.join(self.tempdir, 'console'),
+                   group='baremetal')
+        self.password_dir = os.path.join(self.tempdir, 'ipmi')
 
     def test_construct(self):
         self.assertEqual(self.ipmi.node_id, 123)
@@ -56,6 +67,7 @@ class BareMetalIPMITestCase(test.TestCase):
         pw_file = ipmi._make_password_file(self.node['pm_password'])
         try:
             self.assertTrue(os.path.isfile(pw_file))
+            self.assertEqual(self.password_dir, os.path.dirname(pw_file))
             self.assertEqual(os.stat(pw_file)[stat.ST_MODE] & 0777, 0600)
             with open(pw_file, "r") as f:
                 pm_password = f.read()
@@ -63,13 +75,44 @@ class BareMetalIPMITestCase(test.TestCase):
         finally:
             os.unlink(pw_file)
 
+    def test_stale_password_files_removed(self):
+        os.mkdir(self.password_dir)
+        stale_file = os.path.join(self.password_dir, 'stale')
+        open(stale_file, 'w').close()
+
+        pw_file = ipmi._get_password_file(123, 'fake-password')
+        self.assertEqual([os.path.basename(pw_file)],
+                         os.listdir(self.password_dir))
+        # Only files left by an earlier run are removed.
+        other_file = ipmi._get_password_file(456, 'other-password')
+        self.assertTrue(os.path.exists(pw_file))
+        self.assertTrue(os.path.exists(other_file))
+
+    def test_deactivate_node_removes_password_file(self):
+        pw_file = ipmi._get_password_file(123, 'fake-password')
+        self.mox.StubOutWithMock(self.ipmi, '_power_off')
+        self.ipmi._power_off()
+        self.mox.ReplayAll()
+
+        self.ipmi.deactivate_node()
+        self.assertFalse(os.path.exists(pw_file))
+        self.assertEqual({}, ipmi._password_files)
+
+    def test_forget_other_nodes(self):
+        pw_file = ipmi._get_password_file(123, 'fake-password')
+        other_file = ipmi._get_password_file(456, 'other-password')
+        ipmi.IPMI.forget_other_nodes([123])
+        self.assertTrue(os.path.exists(pw_file))
+        self.assertFalse(os.path.exists(other_file))
+        self.assertEqual([123], ipmi._password_files.keys())
+
     def test_exec_ipmitool(self):
         pw_file = '/tmp/password_file'
 
-        self.mox.StubOutWithMock(ipmi, '_make_password_file')
+        self.mox.StubOutWithMock(ipmi, '_get_password_file')
         self.mox.StubOutWithMock(utils, 'execute')
-        self.mox.StubOutWithMock(bm_utils, 'unlink_without_raise')
-        ipmi._make_password_file(self.ipmi.password).AndReturn(pw_file)
+        ipmi._get_password_file(self.ipmi.node_id,
+                                self.ipmi.password).AndReturn(pw_file)
         args = [
                 'ipmitool',
                 '-I', 'lanplus',
@@ -79,12 +122,80 @@ class BareMetalIPMITestCase(test.TestCase):
                 'A', 'B', 'C',
                 ]
         utils.execute(*args, attempts=3).AndReturn(('', ''))
-        bm_utils.unlink_without_raise(pw_file).AndReturn(None)
         self.mox.ReplayAll()
 
         self.ipmi._exec_ipmitool('A B C')
         self.mox.VerifyAll()
 
+    def test_password_file_reused(self):
+        pw_file = ipmi._get_password_file(123, 'fake-password')
+        self.assertEqual(pw_file,
+                         ipmi._get_password_file(123, 'fake-password'))
+
+        other_file = ipmi._get_password_file(456, 'other-password')
+        self.assertNotEqual(pw_file, other_file)
+
+        new_file = ipmi._get_password_file(123, 'new-password')
+        self.assertFalse(os.path.exists(pw_file))
+        with open(new_file, "r") as f:
+            self.assertEqual('new-password', f.read())
+
+    def test_is_power_on_cached(self):
+        self.flags(ipmi_power_state_ttl=10, group='baremetal')
+        timeutils.set_time_override(timeutils.utcnow())
+        self.addCleanup(timeutils.clear_time_override)
+        self.mox.StubOutWithMock(self.ipmi, '_exec_ipmitool')
+        self.ipmi._exec_ipmitool("power status").AndReturn(
+                ["Chassis Power is on\n"])
+        self.ipmi._exec_ipmitool("power status").AndReturn(
+                ["Chassis Power is off\n"])
+        self.mox.ReplayAll()
+
+        self.assertTrue(self.ipmi.is_power_on())
+        timeutils.advance_time_seconds(9)
+        self.assertTrue(self.ipmi.is_power_on())
+        timeutils.advance_time_seconds(1)
+        self.assertFalse(self.ipmi.is_power_on())
+        self.mox.VerifyAll()
+
+    def test_is_power_refresh_updates_cache(self):
+        self.mox.StubOutWithMock(self.ipmi, '_exec_ipmitool')
+        self.ipmi._exec_ipmitool("power status").AndReturn(
+                ["Chassis Power is off\n"])
+        self.mox.ReplayAll()
+
+        self.assertTrue(self.ipmi._is_power("off"))
+        self.assertFalse(self.ipmi.is_power_on())
+        self.mox.VerifyAll()
+
+    def test_is_power_on_coalesced(self):
+        calls = []
+
+        def fake_exec_ipmitool(command):
+            calls.append(command)
+            eventlet.sleep(0.01)
+            return ["Chassis Power is on\n"]
+
+        self.stubs.Set(self.ipmi, '_exec_ipmitool', fake_exec_ipmitool)
+        other = ipmi.IPMI(self.node)
+        self.stubs.Set(other, '_exec_ipmitool', fake_exec_ipmitool)
+        threads = [eventlet.spawn(pm.is_power_on)
+                   for pm in [self.ipmi, other] * 3]
+        self.assertEqual([True] * 6, [thread.wait() for thread in threads])
+        self.assertEqual(["power status"], calls)
+
+    def test_is_power_on_coalesced_failure(self):
+        def fake_exec_ipmitool(command):
+            eventlet.sleep(0.01)
+            raise test.TestingException()
+
+        self.stubs.Set(self.ipmi, '_exec_ipmitool', fake_exec_ipmitool)
+        threads = [eventlet.spawn(self.ipmi.is_power_on) for i in range(3)]
+        for thread in threads:
+            self.assertRaises(test.TestingException, thread.wait)
+        self.assertEqual({}, ipmi._power_queries)
+        self.assertEqual({}, ipmi._power_states)
+
     def test_is_power(self):
         self.mox.StubOutWithMock(self.ipmi, '_exec_ipmitool')
         self.ipmi._exec_ipmitool("power status").AndReturn(
@@ -0,0 +1,105 @@
+# Copyright (c) 2013 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Unit Tests for cells scheduler filters and weighers.
+"""
+
+from nova.cells import filters
+from nova.cells import state
+from nova.cells import weights
+from nova import test
+
+
+def _get_fake_cells():
+    def _get_cell(name, ram_units, disk_units):
+        cell = state.CellState(name)
+        cell.capacities = {
+                'ram_free': {'total_mb': 0,
+                             'units_by_mb': {'512': ram_units}},
+                'disk_free': {'total_mb': 0,
+                              'units_by_mb': {'10240': disk_units}}}
+        return cell
+
+    return [_get_cell('cell1', 10, 10),
+            _get_cell('cell2', 0, 10),
+            _get_cell('cell3', 10, 1),
+            _get_cell('cell4', 20, 20)]
+
+
+class CellsFiltersTestCase(test.TestCase):
+    def setUp(self):
+        super(CellsFiltersTestCase, self).setUp()
+        self.filter_handler = filters.CellFilterHandler()
+        self.filter_classes = self.filter_handler.get_matching_classes(
+                ['nova.cells.filters.all_filters'])
+        self.filter_properties = {
+                'instance_type': {'memory_mb': 512, 'root_gb': 10,
+                                  'ephemeral_gb': 0},
+                'num_instances': 2}
+
+    def _filtered_names(self, cells):
+        cells = self.filter_handler.get_filtered_objects(
+                self.filter_classes, cells, self.filter_properties)
+        return [cell.name for cell in cells]
+
+    def test_all_filters(self):
+        class_names = [cls.__name__ for cls in self.filter_classes]
+        self.assertIn('RamByInstanceTypeFilter', class_names)
+        self.assertIn('DiskByInstanceTypeFilter', class_names)
+
+    def test_filters_cells_without_room(self):
+        self.assertEqual(['cell1', 'cell4'],
+                         self._filtered_names(_get_fake_cells()))
+
+    def test_cells_without_capacities_pass(self):
+        cell = state.CellState('cell5')
+        self.assertEqual(['cell5'], self._filtered_names([cell]))
+
+    def test_no_instance_type_passes_all(self):
+        self.filter_properties = {}
+        self.assertEqual(4, len(self._filtered_names(_get_fake_cells())))
+
+
+class CellsWeightsTestCase(test.TestCase):
+    def setUp(self):
+        super(CellsWeightsTestCase, self).setUp()
+        self.weight_handler = weights.CellWeightHandler()
+        self.weigher_classes = self.weight_handler.get_matching_classes(
+                ['nova.cells.weights.all_weighers'])
+        self.weight_properties = {
+                'instance_type': {'memory_mb': 512, 'root_gb': 10,
+                                  'ephemeral_gb': 0}}
+
+    def test_all_weighers(self):
+        class_names = [cls.__name__ for cls in self.weigher_classes]
+        self.assertIn('RamByInstanceTypeWeigher', class_names)
+        self.assertIn('DiskByInstanceTypeWeigher', class_names)
+
+    def test_most_room_wins(self):
+        weighted = self.weight_handler.get_weighed_objects(
+                self.weigher_classes, _get_fake_cells(),
+                self.weight_properties)
+        self.assertEqual(['cell4', 'cell1', 'cell3', 'cell2'],
+                         [cell.obj.name for cell in weighted])
+        # 20 ram units * 10.0 + 20 disk units * 1.0
+        self.assertEqual(220.0, weighted[0].weight)
+
+    def test_negative_multiplier_stacks(self):
+        self.flags(ram_weight_multiplier=-10.0, group='cells')
+        self.flags(disk_weight_multiplier=0.0, group='cells')
+        weighted = self.weight_handler.get_weighed_objects(
+                self.weigher_classes, _get_fake_cells(),
+                self.weight_properties)
+        self.assertEqual('cell2', weighted[0].obj.name)
@@ -194,20 +194,27 @@ class CellsManagerClassTestCase(test.TestCase):
         def utcnow():
             return stalled_time
 
-        call_info = {'get_instances': 0, 'sync_instances': []}
+        call_info = {'get_instances': 0, 'sync_instances': [],
+                     'get_all': 0}
 
-        instances = ['instance1', 'instance2', 'instance3']
+        instances = [{'uuid': 'uuid1'}, {'uuid': 'uuid2'},
+                     {'uuid': 'uuid3'}]
 
         def get_instances_to_sync(context, **kwargs):
             self.assertEqual(context, fake_context)
             call_info['shuffle'] = kwargs.get('shuffle')
             call_info['project_id'] = kwargs.get('project_id')
             call_info['updated_since'] = kwargs.get('updated_since')
+            call_info['uuids_only'] = kwargs.get('uuids_only')
             call_info['get_instances'] += 1
-            return iter(instances)
+            return iter([instance['uuid'] for instance in instances])
 
-        def instance_get_by_uuid(context, uuid):
-            return instances[int(uuid[-1]) - 1]
+        def instance_get_all_by_filters(context, filters, sort_key,
+                                        sort_dir, columns_to_join=None):
+            call_info['get_all'] += 1
+            # Return them in a different order than asked for.
+            return [instance for instance in reversed(instances)
+                    if instance['uuid'] in filters['uuid']]
 
         def sync_instance(context, instance):
             self.assertEqual(context, fake_context)
@@ -215,8 +222,8 @@ class CellsManagerClassTestCase(test.TestCase):
 
         self.stubs.Set(cells_utils, 'get_instances_to_sync',
                 get_instances_to_sync)
-        self.stubs.Set(self.cells_manager.db, 'instance_get_by_uuid',
-                instance_get_by_uuid)
+        self.stubs.Set(self.cells_manager.db, 'instance_get_all_by_filters',
+                instance_get_all_by_filters)
         self.stubs.Set(self.cells_manager, '_sync_instance',
                 sync_instance)
         self.stubs.Set(timeutils, 'utcnow', utcnow)
@@ -225,7 +232,9 @@ class CellsManagerClassTestCase(test.TestCase):
         self.assertEqual(call_info['shuffle'], True)
         self.assertEqual(call_info['project_id'], None)
         self.assertEqual(call_info['updated_since'], updated_since)
+        self.assertEqual(call_info['uuids_only'], True)
         self.assertEqual(call_info['get_instances'], 1)
+        self.assertEqual(call_info['get_all'], 1)
         # Only first 2
         self.assertEqual(call_info['sync_instances'],
                 instances[:2])
@@ -236,10 +245,40 @@ class CellsManagerClassTestCase(test.TestCase):
         self.assertEqual(call_info['project_id'], None)
         self.assertEqual(call_info['updated_since'], updated_since)
         self.assertEqual(call_info['get_instances'], 2)
+        self.assertEqual(call_info['get_all'], 2)
         # Now the last 1 and the first 1
         self.assertEqual(call_info['sync_instances'],
                 [instances[-1], instances[0]])
 
+    def test_heal_instances_replaces_hard_deleted(self):
+        self.flags(instance_update_num_instances=2, group='cells')
+        instances = [{'uuid': 'uuid1'}, {'uuid': 'uuid2'},
+                     {'uuid': 'uuid3'}]
+        queried = []
+        synced = []
+
+        def get_instances_to_sync(context, **kwargs):
+            return iter([instance['uuid'] for instance in instances])
+
+        def instance_get_all_by_filters(context, filters, sort_key,
+                                        sort_dir, columns_to_join=None):
+            queried.append(filters['uuid'])
+            # uuid1 has been hard deleted.
+            return [instance for instance in instances[1:]
+                    if instance['uuid'] in filters['uuid']]
+
+        self.stubs.Set(cells_utils, 'get_instances_to_sync',
+                get_instances_to_sync)
+        self.stubs.Set(self.cells_manager.db, 'instance_get_all_by_filters',
+                instance_get_all_by_filters)
+        self.stubs.Set(self.cells_manager, '_sync_instance',
+                lambda context, instance: synced.append(instance))
+
+        self.cells_manager._heal_instances(
+                context.RequestContext('fake', 'fake'))
+        self.assertEqual([['uuid1', 'uuid2'], ['uuid3']], queried)
+        self.assertEqual(instances[1:], synced)
+
     def test_sync_instances(self):
         self.mox.StubOutWithMock(self.msg_runner,
                                  'sync_instances')
@@ -15,6 +15,8 @@
 Tests For Cells Messaging module
 """
 
+import eventlet
+import mox
 from oslo.config import cfg
 
 from nova.cells import messaging
@@ -698,6 +700,32 @@ class CellsTargetedMethodsTestCase(test.TestCase):
 
         self.src_msg_runner.tell_parents_our_capacities(self.ctxt)
 
+    def test_update_capacities_unchanged_not_resent(self):
+        self._setup_attrs('child-cell2', 'child-cell2!api-cell')
+        capacs = {'ram_free': {'total_mb': 1024}}
+        self.mox.StubOutWithMock(self.src_state_manager,
+                                 'get_our_capacities')
+        self.mox.StubOutWithMock(self.tgt_state_manager,
+                                 'update_cell_capacities')
+        self.mox.StubOutWithMock(self.tgt_msg_runner,
+                                 'tell_parents_our_capacities')
+        self.src_state_manager.get_our_capacities().MultipleTimes(
+                ).AndReturn(capacs)
+        # Sent once, then again only when forced.
+        self.tgt_state_manager.update_cell_capacities('child-cell2',
+                                                      capacs)
+        self.tgt_msg_runner.tell_parents_our_capacities(self.ctxt)
+        self.tgt_state_manager.update_cell_capacities('child-cell2',
+                                                      capacs)
+        self.tgt_msg_runner.tell_parents_our_capacities(self.ctxt)
+
+        self.mox.ReplayAll()
+
+        self.src_msg_runner.tell_parents_our_capacities(self.ctxt)
+        self.src_msg_runner.tell_parents_our_capacities(self.ctxt)
+        self.src_msg_runner.tell_parents_our_capacities(self.ctxt,
+                                                        force=True)
+
     def test_announce_capabilities(self):
         self._setup_attrs('api-cell', 'api-cell!child-cell1')
         # To make this easier to test, make us only have 1 child cell.
@@ -720,7 +748,8 @@ class CellsTargetedMethodsTestCase(test.TestCase):
 
         self.mox.StubOutWithMock(self.tgt_msg_runner,
                                  'tell_parents_our_capacities')
-        self.tgt_msg_runner.tell_parents_our_capacities(self.ctxt)
+        self.tgt_msg_runner.tell_parents_our_capacities(self.ctxt,
+                                                        force=True)
 
         self.mox.ReplayAll()
 
@@ -826,6 +855,11 @@ class CellsTargetedMethodsTestCase(test.TestCase):
         self.assertEqual('fake_result', result)
 
 
+class FakeTimer(object):
+    def cancel(self):
+        pass
+
+
 class CellsBroadcastMethodsTestCase(test.TestCase):
     """Test case for _BroadcastMessageMethods class.  Most of these
     tests actually test the full path from the MessageRunner through
@@ -879,6 +913,7 @@ class CellsBroadcastMethodsTestCase(test.TestCase):
         self.assertFalse(self.src_methods_cls._at_the_top())
 
     def test_instance_update_at_top(self):
+        self.flags(instance_update_batch_window=0, group='cells')
         fake_info_cache = {'id': 1,
                            'instance': 'fake_instance',
                            'other': 'moo'}
@@ -929,6 +964,86 @@ class CellsBroadcastMethodsTestCase(test.TestCase):
 
         self.src_msg_runner.instance_update_at_top(self.ctxt, fake_instance)
 
+    def test_instance_update_at_top_coalesced(self):
+        self.flags(instance_update_batch_window=60, group='cells')
+        self.stubs.Set(eventlet, 'spawn_after',
+                       lambda *args: FakeTimer())
+        self.mox.StubOutWithMock(self.tgt_db_inst, 'instance_update')
+        self.mox.StubOutWithMock(self.tgt_db_inst, 'instance_update_many')
+        self.mox.StubOutWithMock(self.tgt_db_inst, 'instance_destroy')
+        self.tgt_db_inst.instance_destroy(self.ctxt, 'fake_uuid2',
+                                          update_cells=False)
+        expected_cell_name = 'api-cell!child-cell2!grandchild-cell1'
+        self.tgt_db_inst.instance_update_many(mox.IgnoreArg(),
+                [{'uuid': 'fake_uuid1', 'vm_state': 'active',
+                  'task_state': None, 'cell_name': expected_cell_name}]
+                ).AndReturn([])
+        self.mox.ReplayAll()
+
+        self.src_msg_runner.instance_update_at_top(self.ctxt,
+                {'uuid': 'fake_uuid1', 'vm_state': 'building',
+                 'task_state': 'spawning'})
+        self.src_msg_runner.instance_update_at_top(self.ctxt,
+                {'uuid': 'fake_uuid1', 'vm_state': 'active',
+                 'task_state': None})
+        self.src_msg_runner.instance_update_at_top(self.ctxt,
+                {'uuid': 'fake_uuid2', 'vm_state': 'building'})
+        self.src_msg_runner.instance_destroy_at_top(self.ctxt,
+                {'uuid': 'fake_uuid2'})
+        self.src_msg_runner._flush_instance_updates()
+        self.assertEqual({}, self.src_msg_runner._instance_updates)
+
+    def test_instance_update_at_top_batch_size(self):
+        self.flags(instance_update_batch_window=60,
+                   instance_update_batch_size=2, group='cells')
+        self.stubs.Set(eventlet, 'spawn_after',
+                       lambda *args: FakeTimer())
+        self.mox.StubOutWithMock(self.tgt_db_inst, 'instance_update_many')
+        self.tgt_db_inst.instance_update_many(mox.IgnoreArg(),
+                mox.IgnoreArg()).AndReturn([])
+        self.mox.ReplayAll()
+
+        self.src_msg_runner.instance_update_at_top(self.ctxt,
+                {'uuid': 'fake_uuid1'})
+        self.src_msg_runner.instance_update_at_top(self.ctxt,
+                {'uuid': 'fake_uuid2'})
+        self.assertEqual({}, self.src_msg_runner._instance_updates)
+
+    def test_instance_update_batch_at_top_creates_missing(self):
+        fake_info_cache = {'id': 1, 'instance': 'fake', 'other': 'moo'}
+        instances = [{'id': 1, 'uuid': 'fake_uuid1', 'name': 'fake',
+                      'other': 'meow'},
+                     {'id': 2, 'uuid': 'fake_uuid2',
+                      'info_cache': fake_info_cache}]
+        expected_cell_name = 'api-cell!child-cell2!grandchild-cell1'
+        expected1 = {'uuid': 'fake_uuid1', 'other': 'meow',
+                     'cell_name': expected_cell_name}
+        expected2 = {'uuid': 'fake_uuid2', 'cell_name': expected_cell_name,
+                     'info_cache': {'other': 'moo'}}
+
+        self.mox.StubOutWithMock(self.src_db_inst, 'instance_update_many')
+        self.mox.StubOutWithMock(self.mid_db_inst, 'instance_update_many')
+        self.mox.StubOutWithMock(self.tgt_db_inst, 'instance_update_many')
+        self.mox.StubOutWithMock(self.tgt_db_inst, 'instance_create')
+        self.mox.StubOutWithMock(self.tgt_db_inst,
+                                 'instance_info_cache_update')
+
+        def _elevated(ctxt):
+            return ctxt.is_admin and ctxt.read_deleted == 'yes'
+
+        self.tgt_db_inst.instance_update_many(mox.Func(_elevated),
+                [expected1, expected2]).AndReturn([expected2])
+        self.tgt_db_inst.instance_create(mox.Func(_elevated),
+                {'uuid': 'fake_uuid2', 'cell_name': expected_cell_name})
+        self.tgt_db_inst.instance_info_cache_update(mox.Func(_elevated),
+                'fake_uuid2', {'other': 'moo'}, update_cells=False)
+        self.mox.ReplayAll()
+
+        message = messaging._BroadcastMessage(self.src_msg_runner,
+                self.ctxt, 'instance_update_batch_at_top',
+                dict(instances=instances), 'up', run_locally=False)
+        message.process()
+
     def test_instance_destroy_at_top(self):
         fake_instance = {'uuid': 'fake_uuid'}
 
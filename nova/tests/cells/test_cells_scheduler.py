@@ -31,6 +31,12 @@ CONF = cfg.CONF
 CONF.import_opt('scheduler_retries', 'nova.cells.scheduler', group='cells')
 
 
+class FakeMessage(object):
+    def __init__(self, ctxt):
+        self.ctxt = ctxt
+        self.routing_path = 'api-cell'
+
+
 class CellsSchedulerTestCase(test.TestCase):
     """Test case for CellsScheduler class."""
 
@@ -146,6 +152,45 @@ class CellsSchedulerTestCase(test.TestCase):
         self.assertEqual(self.request_spec, call_info['request_spec'])
         self.assertEqual(host_sched_kwargs, call_info['host_sched_kwargs'])
 
+    def test_run_instance_selects_cell_with_capacity(self):
+        self.my_cell_state.capacities = {}
+        child_cells = self.state_manager.get_child_cells()
+        for cell in child_cells:
+            cell.capacities = {'ram_free': {'total_mb': 0,
+                                            'units_by_mb': {'512': 0}}}
+        child_cells[-1].capacities['ram_free']['units_by_mb']['512'] = 3
+        self.request_spec['instance_type'] = {'memory_mb': 512,
+                                              'root_gb': 0,
+                                              'ephemeral_gb': 0}
+
+        call_info = {}
+
+        def fake_schedule_run_instance(ctxt, target_cell, host_sched_kwargs):
+            call_info['target_cell'] = target_cell
+
+        self.stubs.Set(self.msg_runner, 'schedule_run_instance',
+                fake_schedule_run_instance)
+
+        message = FakeMessage(self.ctxt)
+        host_sched_kwargs = {'request_spec': self.request_spec}
+        self.scheduler._run_instance(message, host_sched_kwargs)
+        self.assertEqual(child_cells[-1], call_info['target_cell'])
+
+    def test_run_instance_no_cells_with_capacity(self):
+        self.my_cell_state.capacities = {}
+        for cell in self.state_manager.get_child_cells():
+            cell.capacities = {'ram_free': {'total_mb': 0,
+                                            'units_by_mb': {'512': 2}}}
+        self.request_spec['instance_type'] = {'memory_mb': 512,
+                                              'root_gb': 0,
+                                              'ephemeral_gb': 0}
+
+        message = FakeMessage(self.ctxt)
+        host_sched_kwargs = {'request_spec': self.request_spec}
+        self.assertRaises(exception.NoCellsAvailable,
+                          self.scheduler._run_instance, message,
+                          host_sched_kwargs)
+
     def test_run_instance_retries_when_no_cells_avail(self):
         self.flags(scheduler_retries=7, group='cells')
 
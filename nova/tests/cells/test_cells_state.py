@@ -0,0 +1,93 @@
+# Copyright (c) 2013 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For CellStateManager
+"""
+from nova import context
+from nova import test
+from nova.tests.cells import fakes
+
+
+def _compute(host, free_ram_mb, free_disk_gb, disabled=False):
+    return {'service': {'host': host, 'disabled': disabled},
+            'free_ram_mb': free_ram_mb,
+            'free_disk_gb': free_disk_gb}
+
+
+class CellStateManagerCapacityTestCase(test.TestCase):
+    """Test case for computing our own cell's capacities."""
+    def setUp(self):
+        super(CellStateManagerCapacityTestCase, self).setUp()
+        fakes.init(self)
+        self.ctxt = context.get_admin_context()
+        self.state_manager = fakes.get_state_manager('api-cell')
+        self.compute_nodes = []
+        self.instance_types = [
+                {'memory_mb': 512, 'root_gb': 1, 'ephemeral_gb': 0},
+                {'memory_mb': 1024, 'root_gb': 2, 'ephemeral_gb': 0},
+                # Same RAM as the first, should not count twice.
+                {'memory_mb': 512, 'root_gb': 2, 'ephemeral_gb': 0}]
+        self.stubs.Set(self.state_manager.db, 'compute_node_get_all',
+                       lambda ctxt: self.compute_nodes)
+        self.stubs.Set(self.state_manager.db, 'instance_type_get_all',
+                       lambda ctxt: self.instance_types)
+
+    def _capacities(self):
+        self.state_manager._update_our_capacity(self.ctxt)
+        return self.state_manager.my_cell_state.capacities
+
+    def test_no_compute_hosts(self):
+        self.assertEqual({}, self._capacities())
+
+    def test_capacities(self):
+        self.compute_nodes = [_compute('host1', 2048, 4),
+                              _compute('host2', 1024, 1),
+                              _compute('host3', 4096, 8, disabled=True)]
+        capacities = self._capacities()
+        self.assertEqual({'total_mb': 3072,
+                          'units_by_mb': {'512': 6, '1024': 3}},
+                         capacities['ram_free'])
+        self.assertEqual({'total_mb': 5120,
+                          'units_by_mb': {'1024': 5, '2048': 2}},
+                         capacities['disk_free'])
+
+    def test_capacities_updated_from_host_changes(self):
+        self.compute_nodes = [_compute('host1', 2048, 4),
+                              _compute('host2', 1024, 1)]
+        self._capacities()
+
+        # host2 went away and host3 appeared.
+        self.compute_nodes = [_compute('host1', 2048, 4),
+                              _compute('host3', 512, 0)]
+        capacities = self._capacities()
+        self.assertEqual({'total_mb': 2560,
+                          'units_by_mb': {'512': 5, '1024': 2}},
+                         capacities['ram_free'])
+        self.assertEqual({'total_mb': 4096,
+                          'units_by_mb': {'1024': 4, '2048': 2}},
+                         capacities['disk_free'])
+        self.assertEqual({'host1': (2048, 4096), 'host3': (512, 0)},
+                         self.state_manager._host_capacities)
+
+    def test_instance_type_change_recomputes(self):
+        self.compute_nodes = [_compute('host1', 2048, 4)]
+        self._capacities()
+        self.instance_types.append(
+                {'memory_mb': 2048, 'root_gb': 4, 'ephemeral_gb': 0})
+        capacities = self._capacities()
+        self.assertEqual({'512': 4, '1024': 2, '2048': 1},
+                         capacities['ram_free']['units_by_mb'])
+        self.assertEqual({'1024': 4, '2048': 2, '4096': 1},
+                         capacities['disk_free']['units_by_mb'])
@@ -17,6 +17,7 @@ Tests For Cells Utility methods
 """
 import inspect
 import random
+import uuid
 
 from nova.cells import utils as cells_utils
 from nova import db
@@ -80,3 +81,43 @@ class CellsUtilsTestCase(test.TestCase):
                 {'changes-since': 'fake-updated-since',
                  'project_id': 'fake-project'})
         self.assertEqual(call_info['shuffle'], 2)
+
+    def test_get_instances_to_sync_uuids_only(self):
+        uuids = ['uuid%d' % i for i in xrange(5)]
+        calls = []
+
+        def instance_get_uuids_by_filters(context, filters, limit=None,
+                                          marker=None):
+            calls.append(marker)
+            after = [u for u in uuids if marker is None or u > marker]
+            return after[:limit]
+
+        self.stubs.Set(db, 'instance_get_uuids_by_filters',
+                instance_get_uuids_by_filters)
+        self.stubs.Set(cells_utils, '_UUID_PAGE_SIZE', 2)
+
+        instances = cells_utils.get_instances_to_sync('fake_context',
+                                                      uuids_only=True)
+        self.assertTrue(inspect.isgenerator(instances))
+        self.assertEqual(uuids, list(instances))
+        self.assertEqual([None, 'uuid1', 'uuid3'], calls)
+
+    def test_get_instances_to_sync_uuids_only_shuffled(self):
+        uuids = ['uuid%d' % i for i in xrange(5)]
+
+        def instance_get_uuids_by_filters(context, filters, limit=None,
+                                          marker=None):
+            after = [u for u in uuids if marker is None or u > marker]
+            return after[:limit]
+
+        self.stubs.Set(db, 'instance_get_uuids_by_filters',
+                instance_get_uuids_by_filters)
+        self.stubs.Set(cells_utils, '_UUID_PAGE_SIZE', 2)
+        self.stubs.Set(uuid, 'uuid4', lambda: 'uuid2')
+
+        instances = cells_utils.get_instances_to_sync('fake_context',
+                uuids_only=True, shuffle=True)
+        # Every uuid once, starting after the random point.
+        instances = list(instances)
+        self.assertEqual(sorted(uuids), sorted(instances))
+        self.assertEqual(set(['uuid3', 'uuid4']), set(instances[:2]))
@@ -2898,6 +2898,37 @@ class ComputeTestCase(BaseTestCase):
 
         self.compute.post_live_migration_at_destination(admin_ctxt, instance)
 
+    def test_sync_power_states_uses_info_snapshot(self):
+        instance = jsonutils.to_primitive(self._create_fake_instance(
+                params={'power_state': power_state.RUNNING,
+                        'host': self.compute.host}))
+        self.mox.StubOutWithMock(self.compute.driver, 'get_info_all')
+        self.mox.StubOutWithMock(self.compute.driver, 'get_info')
+        self.mox.StubOutWithMock(self.compute, '_sync_instance_power_state')
+        self.compute.driver.get_info_all().AndReturn(
+                {instance['name']: {'state': power_state.RUNNING}})
+        self.compute._sync_instance_power_state(mox.IgnoreArg(),
+                                                mox.IgnoreArg(),
+                                                power_state.RUNNING)
+        self.mox.ReplayAll()
+        self.compute._sync_power_states(self.context)
+
+    def test_sync_power_states_confirms_snapshot_mismatch(self):
+        jsonutils.to_primitive(self._create_fake_instance(
+                params={'power_state': power_state.RUNNING,
+                        'host': self.compute.host}))
+        self.mox.StubOutWithMock(self.compute.driver, 'get_info_all')
+        self.mox.StubOutWithMock(self.compute.driver, 'get_info')
+        self.mox.StubOutWithMock(self.compute, '_sync_instance_power_state')
+        self.compute.driver.get_info_all().AndReturn({})
+        self.compute.driver.get_info(mox.IgnoreArg()).AndReturn(
+                {'state': power_state.RUNNING})
+        self.compute._sync_instance_power_state(mox.IgnoreArg(),
+                                                mox.IgnoreArg(),
+                                                power_state.RUNNING)
+        self.mox.ReplayAll()
+        self.compute._sync_power_states(self.context)
+
     def test_run_kill_vm(self):
         # Detect when a vm is terminated behind the scenes.
         self.stubs.Set(compute_manager.ComputeManager,
@@ -3226,6 +3257,36 @@ class ComputeTestCase(BaseTestCase):
         for instance in unrescued_instances.values():
             self.assertTrue(instance)
 
+    def test_poll_volume_usage_updates_in_bulk(self):
+        ctxt = context.get_admin_context()
+        bdms = [{'instance': {'uuid': 'fake_uuid1'}, 'instance_bdms': []}]
+        vol_usages = [{'volume': 'fake_vol%d' % i,
+                       'instance': {'uuid': 'fake_uuid1'},
+                       'rd_req': i, 'rd_bytes': i, 'wr_req': i,
+                       'wr_bytes': i, 'flush_operations': i}
+                      for i in range(3)]
+        self.flags(volume_usage_poll_interval=10)
+        self.compute._last_vol_usage_poll = 0
+        timeutils.set_time_override()
+        self.stubs.Set(self.compute.driver, 'get_all_volume_usage',
+                       lambda context, compute_host_bdms: vol_usages)
+        self.mox.StubOutWithMock(self.compute, '_get_host_volume_bdms')
+        self.mox.StubOutWithMock(self.compute.conductor_api,
+                                 'vol_usage_bulk_update')
+        self.mox.StubOutWithMock(self.compute.conductor_api,
+                                 'vol_usage_update')
+        self.mox.StubOutWithMock(self.compute,
+                                 '_send_volume_usage_notifications')
+        self.compute._get_host_volume_bdms(ctxt,
+                                           self.compute.host).AndReturn(bdms)
+        self.compute.conductor_api.vol_usage_bulk_update(
+                ctxt, vol_usages, last_refreshed=timeutils.utcnow())
+        self.compute._send_volume_usage_notifications(ctxt, 'fake-time')
+        self.mox.ReplayAll()
+
+        self.compute._poll_volume_usage(ctxt, start_time='fake-time')
+        timeutils.clear_time_override()
+
     def test_poll_unconfirmed_resizes(self):
         instances = [{'uuid': 'fake_uuid1', 'vm_state': vm_states.RESIZED,
                       'task_state': None},
@@ -15,6 +15,7 @@
 
 from nova.cells import utils as cells_utils
 from nova import compute
+from nova.compute import api as compute_api
 from nova.compute import rpcapi as compute_rpcapi
 from nova import context
 from nova.openstack.common import rpc
@@ -321,3 +322,57 @@ class ComputeHostAPICellsTestCase(ComputeHostAPITestCase):
                 'fake-begin', 'fake-end', host='fake-host',
                 state='fake-state')
         self.assertEqual('fake-response', result)
+
+
+class ComputeHostAPIListingCacheTestCase(test.TestCase):
+    def setUp(self):
+        super(ComputeHostAPIListingCacheTestCase, self).setUp()
+        self.flags(host_listing_cache_ttl=60)
+        self.stubs.Set(compute_api, '_host_listing_cache', None)
+        self.host_api = compute.HostAPI()
+        self.ctxt = context.get_admin_context()
+        self.services = [dict(id=1, topic='compute', host='host1',
+                              disabled=False)]
+
+    def test_service_get_all_caches_zones_only(self):
+        self.mox.StubOutWithMock(self.host_api.db, 'service_get_all')
+        self.mox.StubOutWithMock(self.host_api.db,
+                                 'aggregate_host_get_by_metadata_key')
+        self.host_api.db.service_get_all(self.ctxt,
+                disabled=None).AndReturn(self.services)
+        self.host_api.db.aggregate_host_get_by_metadata_key(self.ctxt,
+                key='availability_zone').AndReturn({'host1': set(['az1'])})
+        self.host_api.db.service_get_all(self.ctxt,
+                disabled=None).AndReturn([])
+        self.mox.ReplayAll()
+        services = self.host_api.service_get_all(self.ctxt, set_zones=True)
+        self.assertEqual(['az1'],
+                         [svc['availability_zone'] for svc in services])
+        # The services are read again for fresh heartbeats, but the zones
+        # come from the cache.
+        self.assertEqual([], self.host_api.service_get_all(self.ctxt,
+                                                           set_zones=True))
+
+    def test_compute_node_get_all_cached(self):
+        compute_nodes = [dict(id=1, service=dict(host='host1'))]
+        self.mox.StubOutWithMock(self.host_api.db, 'compute_node_get_all')
+        self.host_api.db.compute_node_get_all(
+                self.ctxt, use_slave=True).AndReturn(compute_nodes)
+        self.mox.ReplayAll()
+        self.assertEqual(compute_nodes,
+                         self.host_api.compute_node_get_all(self.ctxt))
+        self.assertEqual(compute_nodes,
+                         self.host_api.compute_node_get_all(self.ctxt))
+
+    def test_cache_disabled(self):
+        self.flags(host_listing_cache_ttl=0)
+        compute_nodes = [dict(id=1, service=dict(host='host1'))]
+        self.mox.StubOutWithMock(self.host_api.db, 'compute_node_get_all')
+        self.host_api.db.compute_node_get_all(
+                self.ctxt, use_slave=True).AndReturn(compute_nodes)
+        self.host_api.db.compute_node_get_all(
+                self.ctxt, use_slave=True).AndReturn([])
+        self.mox.ReplayAll()
+        self.assertEqual(compute_nodes,
+                         self.host_api.compute_node_get_all(self.ctxt))
+        self.assertEqual([], self.host_api.compute_node_get_all(self.ctxt))
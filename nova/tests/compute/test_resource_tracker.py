@@ -17,8 +17,11 @@
 
 """Tests for compute resource tracking."""
 
+import time
 import uuid
 
+import eventlet
+from eventlet import event
 from oslo.config import cfg
 
 from nova.compute import instance_types
@@ -435,6 +438,52 @@ class TrackerTestCase(BaseTrackerTestCase):
         self.assertFalse(self.tracker.disabled)
         self.assertTrue(self.updated)
 
+    def _record_compute_node_updates(self):
+        sent = []
+
+        def fake_compute_node_update(ctx, compute_node_id, values,
+                                     prune_stats=False):
+            sent.append(values)
+            self.compute.update(values)
+            return self.compute
+
+        self.stubs.Set(db, 'compute_node_update', fake_compute_node_update)
+        return sent
+
+    def test_unchanged_update_suppressed(self):
+        sent = self._record_compute_node_updates()
+        self.tracker.update_available_resource(self.context)
+        self.tracker.update_available_resource(self.context)
+        self.assertEqual([], sent)
+        self.assertEqual(2, self.tracker.update_counts['suppressed'])
+        self.assertEqual(1, self.tracker.update_counts['sent'])
+
+    def test_changed_values_only_sent(self):
+        sent = self._record_compute_node_updates()
+        self.tracker.update_available_resource(self.context)
+        instance = self._fake_instance(memory_mb=3, root_gb=1,
+                                       ephemeral_gb=1)
+        self.tracker.instance_claim(self.context, instance, self.limits)
+        changed = sent[-1]
+        self.assertEqual(3, changed['memory_mb_used'])
+        self.assertNotIn('memory_mb', changed)
+        self.assertNotIn('vcpus', changed)
+
+    def test_heartbeat_after_interval(self):
+        self.flags(compute_node_heartbeat_interval=60)
+        sent = self._record_compute_node_updates()
+        timeutils.set_time_override(timeutils.utcnow())
+        self.addCleanup(timeutils.clear_time_override)
+
+        timeutils.advance_time_seconds(30)
+        self.tracker.update_available_resource(self.context)
+        self.assertEqual([], sent)
+
+        timeutils.advance_time_seconds(31)
+        self.tracker.update_available_resource(self.context)
+        self.assertEqual(1, len(sent))
+        self.assertEqual(['updated_at'], sent[0].keys())
+
     def test_init(self):
         self._assert(FAKE_VIRT_MEMORY_MB, 'memory_mb')
         self._assert(FAKE_VIRT_LOCAL_GB, 'local_gb')
@@ -892,3 +941,74 @@ class OrphanTestCase(BaseTrackerTestCase):
         orphans = self.tracker._find_orphaned_instances()
 
         self.assertEqual(2, len(orphans))
+
+
+class AuditConcurrencyTestCase(BaseTrackerTestCase):
+    """Claims made while an audit is talking to a slow hypervisor."""
+
+    def setUp(self):
+        self.audit_started = None
+        self.audit_release = None
+        super(AuditConcurrencyTestCase, self).setUp()
+
+    def _driver(self):
+        test_case = self
+
+        class SlowVirtDriver(FakeVirtDriver):
+            def get_per_instance_usage(self):
+                if test_case.audit_release is not None:
+                    test_case.audit_started.send()
+                    test_case.audit_release.wait()
+                return {}
+
+        return SlowVirtDriver()
+
+    def _claim_during_audit(self, claim):
+        self.audit_started = event.Event()
+        self.audit_release = event.Event()
+        audit = eventlet.spawn(self.tracker.update_available_resource,
+                               self.context)
+        self.audit_started.wait()
+
+        claim_thread = eventlet.spawn(claim)
+        start = time.time()
+        with eventlet.Timeout(2, False):
+            claim_thread.wait()
+        latency = time.time() - start
+
+        self.audit_release.send()
+        audit.wait()
+        claim_thread.wait()
+        return latency
+
+    def test_instance_claim_not_blocked_by_audit(self):
+        instances = []
+
+        def claim():
+            instance = self._fake_instance(memory_mb=2, root_gb=3,
+                                           ephemeral_gb=1)
+            instances.append(instance)
+            self.tracker.instance_claim(self.context, instance, self.limits)
+
+        latency = self._claim_during_audit(claim)
+        self.assertTrue(latency < 2)
+
+        # The audit read the instances before the claim, but the claim
+        # is still accounted for.
+        self._assert(2, 'memory_mb_used')
+        self._assert(4, 'local_gb_used')
+        self.assertTrue(instances[0]['uuid'] in self.tracker.tracked_instances)
+
+    def test_instance_claim_aborted_during_audit(self):
+        def claim():
+            instance = self._fake_instance(memory_mb=2, root_gb=3,
+                                           ephemeral_gb=1)
+            claim = self.tracker.instance_claim(self.context, instance,
+                                                self.limits)
+            claim.abort()
+
+        self._claim_during_audit(claim)
+        self._assert(0, 'memory_mb_used')
+        self._assert(0, 'local_gb_used')
+        self.assertEqual({}, self.tracker.tracked_instances)
+        self.assertEqual([], self.tracker._claims_ledger)
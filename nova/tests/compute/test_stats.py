@@ -200,3 +200,25 @@ class StatsTestCase(test.TestCase):
 
         self.assertEqual(0, len(self.stats))
         self.assertEqual(0, len(self.stats.states))
+
+    def test_nested(self):
+        instance = self._create_instance()
+        self.stats.update_stats_for_instance(instance)
+
+        self.assertEqual({'num_instances': 1,
+                          'num_vcpus_used': 1,
+                          'io_workload': 1,
+                          'num_proj': {'1234': 1},
+                          'num_vm': {vm_states.BUILDING: 1},
+                          'num_task': {'None': 1},
+                          'num_os_type': {'Linux': 1}},
+                         self.stats.nested())
+
+    def test_nest_counters_mixed(self):
+        counters = {'num_instances': 2,
+                    'num_proj': {'1234': 1},
+                    'num_proj_5678': 1}
+        self.assertEqual({'num_instances': 2,
+                          'num_proj': {'1234': 1, '5678': 1}},
+                         stats.nest_counters(counters))
+        self.assertEqual({'1234': 1}, counters['num_proj'])
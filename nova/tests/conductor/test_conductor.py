@@ -406,6 +406,26 @@ class _BaseTestCase(object):
                                         {'uuid': 'fake-id'}, 'fake-refr',
                                         'fake-bool')
 
+    def test_vol_usage_bulk_update(self):
+        self.mox.StubOutWithMock(db, 'vol_usage_bulk_update')
+        db.vol_usage_bulk_update(self.context,
+                                 [{'volume_id': 'fake-vol',
+                                   'instance_id': 'fake-id',
+                                   'rd_req': 'rd-req',
+                                   'rd_bytes': 'rd-bytes',
+                                   'wr_req': 'wr-req',
+                                   'wr_bytes': 'wr-bytes'}], 'fake-refr')
+        self.mox.ReplayAll()
+        self.conductor.vol_usage_bulk_update(self.context,
+                                             [{'volume': 'fake-vol',
+                                               'instance': {'uuid': 'fake-id'},
+                                               'rd_req': 'rd-req',
+                                               'rd_bytes': 'rd-bytes',
+                                               'wr_req': 'wr-req',
+                                               'wr_bytes': 'wr-bytes',
+                                               'flush_operations': 0}],
+                                             'fake-refr')
+
     def test_ping(self):
         result = self.conductor.ping(self.context, 'foo')
         self.assertEqual(result, {'service': 'conductor', 'arg': 'foo'})
@@ -645,7 +665,8 @@ class ConductorTestCase(_BaseTestCase, test.TestCase):
         filters = {'foo': 'bar'}
         self.mox.StubOutWithMock(db, 'instance_get_all_by_filters')
         db.instance_get_all_by_filters(self.context, filters,
-                                       'fake-key', 'fake-sort')
+                                       'fake-key', 'fake-sort',
+                                       columns_to_join=None)
         self.mox.ReplayAll()
         self.conductor.instance_get_all_by_filters(self.context, filters,
                                                    'fake-key', 'fake-sort')
@@ -653,8 +674,8 @@ class ConductorTestCase(_BaseTestCase, test.TestCase):
     def test_instance_get_all_by_host(self):
         self.mox.StubOutWithMock(db, 'instance_get_all_by_host')
         self.mox.StubOutWithMock(db, 'instance_get_all_by_host_and_node')
-        db.instance_get_all_by_host(self.context.elevated(),
-                                    'host').AndReturn('result')
+        db.instance_get_all_by_host(self.context.elevated(), 'host',
+                                    columns_to_join=None).AndReturn('result')
         db.instance_get_all_by_host_and_node(self.context.elevated(), 'host',
                                              'node').AndReturn('result')
         self.mox.ReplayAll()
@@ -664,6 +685,15 @@ class ConductorTestCase(_BaseTestCase, test.TestCase):
                                                          'node')
         self.assertEqual(result, 'result')
 
+    def test_instance_get_all_by_host_columns_to_join(self):
+        self.mox.StubOutWithMock(db, 'instance_get_all_by_host')
+        db.instance_get_all_by_host(self.context.elevated(), 'host',
+                                    columns_to_join=[]).AndReturn('result')
+        self.mox.ReplayAll()
+        result = self.conductor.instance_get_all_by_host(self.context, 'host',
+                                                         columns_to_join=[])
+        self.assertEqual(result, 'result')
+
     def _test_stubbed(self, name, dbargs, condargs,
                       db_result_listified=False):
 
@@ -772,7 +802,8 @@ class ConductorRPCAPITestCase(_BaseTestCase, test.TestCase):
         filters = {'foo': 'bar'}
         self.mox.StubOutWithMock(db, 'instance_get_all_by_filters')
         db.instance_get_all_by_filters(self.context, filters,
-                                       'fake-key', 'fake-sort')
+                                       'fake-key', 'fake-sort',
+                                       columns_to_join=None)
         self.mox.ReplayAll()
         self.conductor.instance_get_all_by_filters(self.context, filters,
                                                    'fake-key', 'fake-sort')
@@ -890,9 +921,10 @@ class ConductorAPITestCase(_BaseTestCase, test.TestCase):
 
     def test_instance_get_all(self):
         self.mox.StubOutWithMock(db, 'instance_get_all_by_filters')
-        db.instance_get_all(self.context)
+        db.instance_get_all(self.context, columns_to_join=None)
         db.instance_get_all_by_filters(self.context, {'name': 'fake-inst'},
-                                       'updated_at', 'asc')
+                                       'updated_at', 'asc',
+                                       columns_to_join=None)
         self.mox.ReplayAll()
         self.conductor.instance_get_all(self.context)
         self.conductor.instance_get_all_by_filters(self.context,
@@ -948,8 +980,12 @@ class ConductorAPITestCase(_BaseTestCase, test.TestCase):
         self.assertEqual(result, 'fake-result')
 
     def test_instance_get_all_by_host(self):
-        self._test_stubbed('instance_get_all_by_host',
-                           self.context.elevated(), 'host')
+        self.mox.StubOutWithMock(db, 'instance_get_all_by_host')
+        db.instance_get_all_by_host(self.context.elevated(), 'host',
+                                    columns_to_join=None).AndReturn('result')
+        self.mox.ReplayAll()
+        result = self.conductor.instance_get_all_by_host(self.context, 'host')
+        self.assertEqual(result, 'result')
 
     def test_instance_get_all_by_host_and_node(self):
         self._test_stubbed('instance_get_all_by_host_and_node',
@@ -106,7 +106,11 @@ def get_disk_type(path):
     return disk_type
 
 
-def copy_image(src, dest):
+def copy_image(src, dest, host=None, compression=True):
+    pass
+
+
+def clone_image(src, dest):
     pass
 
 
@@ -118,10 +122,36 @@ def create_lvm_image(vg, lv, size, sparse=False):
     pass
 
 
+def create_thin_lvm_image(vg, pool, lv, size):
+    pass
+
+
+def thin_base_volume_name(base, partial=False):
+    if partial:
+        return 'nova-partial-base-%s' % os.path.basename(base)
+    return 'nova-base-%s' % os.path.basename(base)
+
+
+def rename_logical_volume(vg, lv, new_lv):
+    pass
+
+
+def create_thin_lvm_snapshot(vg, origin, lv, size=None):
+    pass
+
+
 def volume_group_free_space(vg):
     pass
 
 
+def list_logical_volumes(vg):
+    return []
+
+
+def list_snapshot_origins(vg):
+    return set()
+
+
 def remove_logical_volumes(*paths):
     pass
 
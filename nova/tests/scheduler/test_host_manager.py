@@ -19,6 +19,7 @@ from nova.compute import task_states
 from nova.compute import vm_states
 from nova import db
 from nova import exception
+from nova.openstack.common import jsonutils
 from nova.openstack.common import timeutils
 from nova.scheduler import filters
 from nova.scheduler import host_manager
@@ -360,6 +361,52 @@ class HostStateTestCase(test.TestCase):
         self.assertEqual(1, host.num_instances_by_os_type['windoze'])
         self.assertEqual(42, host.num_io_ops)
 
+    def test_stat_consumption_from_compute_node_stats_dict(self):
+        stats = {
+            'num_instances': 5,
+            'num_proj': {'12345': 3},
+            'num_vm': {vm_states.BUILDING: 2},
+            'num_task': {task_states.MIGRATING: 2},
+            'num_os_type': {'linux': 4},
+            'io_workload': 42,
+        }
+        compute = dict(stats=stats, memory_mb=0, free_disk_gb=0, local_gb=0,
+                       local_gb_used=0, free_ram_mb=0, vcpus=0, vcpus_used=0,
+                       updated_at=None)
+
+        host = host_manager.HostState("fakehost", "fakenode")
+        host.update_from_compute_node(compute)
+
+        self.assertEqual(5, host.num_instances)
+        self.assertEqual(3, host.num_instances_by_project['12345'])
+        self.assertEqual(2, host.vm_states[vm_states.BUILDING])
+        self.assertEqual(2, host.task_states[task_states.MIGRATING])
+        self.assertEqual(4, host.num_instances_by_os_type['linux'])
+        self.assertEqual(42, host.num_io_ops)
+
+    def test_stat_consumption_from_compute_node_flat_stats_json(self):
+        stats = {
+            'num_instances': 5,
+            'num_proj_12345': 3,
+            'num_vm_%s' % vm_states.BUILDING: 2,
+            'num_task_%s' % task_states.MIGRATING: 2,
+            'num_os_type_linux': 4,
+            'io_workload': 42,
+        }
+        compute = dict(stats=jsonutils.dumps(stats), memory_mb=0,
+                       free_disk_gb=0, local_gb=0, local_gb_used=0,
+                       free_ram_mb=0, vcpus=0, vcpus_used=0, updated_at=None)
+
+        host = host_manager.HostState("fakehost", "fakenode")
+        host.update_from_compute_node(compute)
+
+        self.assertEqual(5, host.num_instances)
+        self.assertEqual(3, host.num_instances_by_project['12345'])
+        self.assertEqual(2, host.vm_states[vm_states.BUILDING])
+        self.assertEqual(2, host.task_states[task_states.MIGRATING])
+        self.assertEqual(4, host.num_instances_by_os_type['linux'])
+        self.assertEqual(42, host.num_io_ops)
+
     def test_stat_consumption_from_instance(self):
         host = host_manager.HostState("fakehost", "fakenode")
 
@@ -112,3 +112,13 @@ class AvailabilityZoneTestCases(test.TestCase):
 
         self.assertEquals(self.availability_zone,
                         az.get_host_availability_zone(self.context, self.host))
+
+    def test_get_host_availability_zones(self):
+        """Test get right availability zones for a list of hosts."""
+        service = self._create_service_with_topic('compute')
+        self._add_to_aggregate(service)
+
+        self.assertEquals({self.host: self.availability_zone,
+                           'other': self.default_az},
+                          az.get_host_availability_zones(self.context,
+                                                         [self.host, 'other']))
@@ -23,12 +23,16 @@ import datetime
 import uuid as stdlib_uuid
 
 from oslo.config import cfg
+import sqlalchemy
+from sqlalchemy import exc as sqla_exc
 from sqlalchemy import MetaData
 from sqlalchemy.schema import Table
 from sqlalchemy.sql.expression import select
 
 from nova import context
 from nova import db
+from nova.db.sqlalchemy import api as sqlalchemy_api
+from nova.db.sqlalchemy import models
 from nova import exception
 from nova.openstack.common.db.sqlalchemy import session as db_session
 from nova.openstack.common import timeutils
@@ -122,6 +126,35 @@ class DbApiTestCase(test.TestCase):
                                                 {'display_name': 't.*st.'})
         self.assertEqual(2, len(result))
 
+    def test_instance_get_all_by_filters_regex_prefix(self):
+        self.create_instances_with_args(display_name='test1')
+        self.create_instances_with_args(display_name='test2')
+        self.create_instances_with_args(display_name='atest')
+        self.create_instances_with_args(display_name='Test3')
+        result = db.instance_get_all_by_filters(self.context,
+                                                {'display_name': '^test'})
+        self.assertEqual(2, len(result))
+        self.assertEqual(['test1', 'test2'],
+                         sorted(inst['display_name'] for inst in result))
+
+    def test_query_count(self):
+        self.create_instances_with_args()
+        db.query_count_start()
+        db.instance_get_all_by_filters(self.context, {},
+                                       columns_to_join=[])
+        db.instance_get_all_by_filters(self.context, {},
+                                       columns_to_join=[])
+        self.assertEqual(2, db.query_count_stop())
+        db.instance_get_all_by_filters(self.context, {},
+                                       columns_to_join=[])
+        self.assertEqual(0, db.query_count_stop())
+
+    def test_query_count_ignores_other_engines(self):
+        engine = sqlalchemy.create_engine('sqlite://')
+        db.query_count_start()
+        engine.execute('SELECT 1')
+        self.assertEqual(0, db.query_count_stop())
+
     def test_instance_get_all_by_filters_regex_unsupported_db(self):
         # Ensure that the 'LIKE' operator is used for unsupported dbs.
         self.flags(sql_connection="notdb://")
@@ -142,6 +175,144 @@ class DbApiTestCase(test.TestCase):
                                                 {'metadata': {'foo': 'bar'}})
         self.assertEqual(1, len(result))
 
+    def test_instance_get_all_by_filters_loads_collections(self):
+        self.create_instances_with_args(metadata={'foo': 'bar', 'a': 'b'})
+        self.create_instances_with_args(metadata={'foo': 'baz'})
+        result = db.instance_get_all_by_filters(self.context, {},
+                                                sort_dir='asc')
+        self.assertEqual(2, len(result))
+        self.assertEqual(2, len(result[0]['metadata']))
+        self.assertEqual(1, len(result[1]['metadata']))
+        self.assertTrue('system_metadata' in dict(result[0]))
+
+    def test_instance_get_all_by_filters_columns_to_join(self):
+        self.create_instances_with_args(metadata={'foo': 'bar'})
+        result = db.instance_get_all_by_filters(self.context, {},
+                                                columns_to_join=[])
+        self.assertEqual(1, len(result))
+        for column in ('metadata', 'system_metadata', 'info_cache',
+                       'security_groups', 'instance_type'):
+            self.assertFalse(column in result[0].__dict__)
+        self.assertFalse('system_metadata' in dict(result[0]))
+        result = db.instance_get_all_by_filters(self.context, {},
+                                                columns_to_join=['metadata'])
+        self.assertEqual('bar', result[0]['metadata'][0]['value'])
+        self.assertFalse('info_cache' in result[0].__dict__)
+
+    def test_instance_get_all_by_host_columns_to_join(self):
+        self.create_instances_with_args(host='host1')
+        self.create_instances_with_args(host='host2')
+        result = db.instance_get_all_by_host(self.context.elevated(),
+                                             'host1', columns_to_join=[])
+        self.assertEqual(1, len(result))
+        self.assertFalse('metadata' in result[0].__dict__)
+
+    def _create_usage_instances(self):
+        ctxt = context.get_admin_context()
+        inst_type = db.instance_type_get_by_name(ctxt, 'm1.small')
+        now = timeutils.utcnow()
+        begin = now - datetime.timedelta(hours=10)
+        # One instance running all window, one launched halfway through and
+        # one terminated before the window started.
+        self.create_instances_with_args(
+                instance_type_id=inst_type['id'],
+                launched_at=begin - datetime.timedelta(hours=1))
+        self.create_instances_with_args(
+                instance_type_id=inst_type['id'],
+                launched_at=begin + datetime.timedelta(hours=5),
+                terminated_at=now + datetime.timedelta(hours=1))
+        self.create_instances_with_args(
+                instance_type_id=inst_type['id'],
+                launched_at=begin - datetime.timedelta(hours=2),
+                terminated_at=begin - datetime.timedelta(hours=1))
+        return inst_type, begin, now
+
+    def test_instance_usage_totals_by_window(self):
+        inst_type, begin, end = self._create_usage_instances()
+        totals = db.instance_usage_totals_by_window(self.context, begin, end)
+        self.assertEqual(1, len(totals))
+        self.assertEqual(self.project_id, totals[0]['project_id'])
+        self.assertEqual(15, totals[0]['total_hours'])
+        self.assertEqual(15 * inst_type['vcpus'],
+                         totals[0]['total_vcpus_usage'])
+        self.assertEqual(15 * inst_type['memory_mb'],
+                         totals[0]['total_memory_mb_usage'])
+        self.assertEqual(15 * (inst_type['root_gb'] +
+                               inst_type['ephemeral_gb']),
+                         totals[0]['total_local_gb_usage'])
+        self.assertEqual([], db.instance_usage_totals_by_window(
+                self.context, begin, end, project_id='other'))
+
+    def test_instance_usage_get_by_window(self):
+        inst_type, begin, end = self._create_usage_instances()
+        usages = list(db.instance_usage_get_by_window(self.context,
+                                                      begin, end))
+        self.assertEqual(2, len(usages))
+        for usage in usages:
+            self.assertEqual(inst_type['name'], usage['instance_type_name'])
+            self.assertEqual(inst_type['memory_mb'], usage['memory_mb'])
+            self.assertEqual(self.project_id, usage['project_id'])
+
+    def test_instance_usage_skips_deleted_instance_type(self):
+        ctxt = context.get_admin_context()
+        inst_type = db.instance_type_create(ctxt,
+                {'name': 'doomed', 'memory_mb': 64, 'vcpus': 1,
+                 'root_gb': 1, 'ephemeral_gb': 0, 'flavorid': 'doomed',
+                 'swap': 0, 'rxtx_factor': 1.0, 'vcpu_weight': None,
+                 'disabled': False, 'is_public': True})
+        now = timeutils.utcnow()
+        self.create_instances_with_args(
+                instance_type_id=inst_type['id'],
+                launched_at=now - datetime.timedelta(hours=1))
+        db.instance_type_destroy(ctxt, 'doomed')
+        begin = now - datetime.timedelta(hours=2)
+        self.assertEqual([], db.instance_usage_totals_by_window(
+                self.context, begin, now))
+        self.assertEqual([], list(db.instance_usage_get_by_window(
+                self.context, begin, now)))
+
+    def test_instance_get_all_by_filters_paginate_same_sort_key(self):
+        instances = [self.create_instances_with_args(display_name='same')
+                     for i in xrange(4)]
+        expected = [inst['uuid'] for inst in instances]
+        for sort_dir in ('asc', 'desc'):
+            seen = []
+            marker = None
+            while True:
+                result = db.instance_get_all_by_filters(self.context, {},
+                                                        'display_name',
+                                                        sort_dir, limit=1,
+                                                        marker=marker)
+                if not result:
+                    break
+                marker = result[0]['uuid']
+                seen.append(marker)
+            if sort_dir == 'desc':
+                seen.reverse()
+            self.assertEqual(expected, seen)
+
+    def test_instance_get_all_by_filters_paginate_null_sort_key(self):
+        instances = [self.create_instances_with_args(host=host)
+                     for host in (None, 'host2', None, 'host1', 'host2',
+                                  None)]
+        for sort_dir in ('asc', 'desc'):
+            expected = [inst['uuid'] for inst in
+                        db.instance_get_all_by_filters(self.context, {},
+                                                       'host', sort_dir)]
+            self.assertEqual(len(instances), len(expected))
+            seen = []
+            marker = None
+            while True:
+                result = db.instance_get_all_by_filters(self.context, {},
+                                                        'host', sort_dir,
+                                                        limit=1,
+                                                        marker=marker)
+                if not result:
+                    break
+                marker = result[0]['uuid']
+                seen.append(marker)
+            self.assertEqual(expected, seen)
+
     def test_instance_get_all_by_filters_unicode_value(self):
         self.create_instances_with_args(display_name=u'test♥')
         result = db.instance_get_all_by_filters(self.context,
@@ -369,6 +540,50 @@ class DbApiTestCase(test.TestCase):
         system_meta = db.instance_system_metadata_get(ctxt, instance['uuid'])
         self.assertEqual('baz', system_meta['original_image_ref'])
 
+    def test_instance_update_many(self):
+        ctxt = context.get_admin_context()
+        instance1 = db.instance_create(ctxt, {})
+        instance2 = db.instance_create(ctxt, {})
+        missing_uuid = str(stdlib_uuid.uuid4())
+        updates = [{'uuid': instance1['uuid'], 'host': 'host1',
+                    'system_metadata': {'key': 'value'}},
+                   {'uuid': instance2['uuid'], 'host': 'host2',
+                    'info_cache': {'network_info': '[1]'}},
+                   {'uuid': missing_uuid, 'host': 'host3'}]
+
+        missing = db.instance_update_many(ctxt, updates)
+
+        self.assertEqual([missing_uuid], [i['uuid'] for i in missing])
+        self.assertEqual('host1',
+                         db.instance_get_by_uuid(ctxt,
+                                                 instance1['uuid'])['host'])
+        self.assertEqual({'key': 'value'},
+                         db.instance_system_metadata_get(ctxt,
+                                                         instance1['uuid']))
+        instance2 = db.instance_get_by_uuid(ctxt, instance2['uuid'])
+        self.assertEqual('host2', instance2['host'])
+        self.assertEqual('[1]', instance2['info_cache']['network_info'])
+
+    def test_instance_get_uuids_by_filters(self):
+        ctxt = context.get_admin_context()
+        uuids = sorted(db.instance_create(ctxt, {'project_id': 'p1',
+                                              'vm_state': 'active'})['uuid']
+                       for i in xrange(3))
+        deleted = db.instance_create(ctxt, {'project_id': 'p2'})
+        db.instance_destroy(ctxt, deleted['uuid'])
+
+        self.assertEqual(uuids, db.instance_get_uuids_by_filters(ctxt,
+                {'project_id': 'p1'}))
+        self.assertEqual(uuids[:2], db.instance_get_uuids_by_filters(ctxt,
+                {'project_id': 'p1'}, limit=2))
+        self.assertEqual(uuids[2:], db.instance_get_uuids_by_filters(ctxt,
+                {'project_id': 'p1'}, marker=uuids[1]))
+        self.assertEqual([deleted['uuid']],
+                         db.instance_get_uuids_by_filters(ctxt,
+                                                          {'deleted': True}))
+        self.assertEqual(uuids, db.instance_get_uuids_by_filters(ctxt,
+                {'deleted': False}))
+
     def test_instance_update_of_instance_type_id(self):
         ctxt = context.get_admin_context()
 
@@ -1229,6 +1444,19 @@ class AggregateDBApiTestCase(test.TestCase):
         self.assertEqual(r1, {'foo.openstack.org': set(['value'])})
         self.assertFalse('fake_key1' in r1)
 
+    def test_aggregate_host_get_by_metadata_key_multiple_keys(self):
+        ctxt = context.get_admin_context()
+        _create_aggregate_with_hosts(context=ctxt,
+                values={'name': 'agg1'}, hosts=['host1', 'host2'],
+                metadata={'availability_zone': 'az1', 'other': 'x'})
+        _create_aggregate_with_hosts(context=ctxt,
+                values={'name': 'agg2'}, hosts=['host2'],
+                metadata={'other': 'y', 'availability_zone': 'az2'})
+        result = db.aggregate_host_get_by_metadata_key(ctxt,
+                key='availability_zone')
+        self.assertEqual({'host1': set(['az1']),
+                          'host2': set(['az1', 'az2'])}, result)
+
     def test_aggregate_get_by_host_not_found(self):
         ctxt = context.get_admin_context()
         _create_aggregate_with_hosts(context=ctxt)
@@ -1453,13 +1681,6 @@ class CapacityTestCase(test.TestCase):
         self.compute_node_dict['host'] = host
         return db.compute_node_create(self.ctxt, self.compute_node_dict)
 
-    def _stats_as_dict(self, stats):
-        d = {}
-        for s in stats:
-            key = s['key']
-            d[key] = s['value']
-        return d
-
     def test_compute_node_create(self):
         item = self._create_helper('host1')
         self.assertEquals(item['free_ram_mb'], 1024)
@@ -1467,7 +1688,7 @@ class CapacityTestCase(test.TestCase):
         self.assertEquals(item['running_vms'], 0)
         self.assertEquals(item['current_workload'], 0)
 
-        stats = self._stats_as_dict(item['stats'])
+        stats = item['stats']
         self.assertEqual(3, stats['num_instances'])
         self.assertEqual(2, stats['num_proj_12345'])
         self.assertEqual(3, stats['num_vm_building'])
@@ -1480,16 +1701,29 @@ class CapacityTestCase(test.TestCase):
         node = nodes[0]
         self.assertEqual(2, node['vcpus'])
 
-        stats = self._stats_as_dict(node['stats'])
+        stats = node['stats']
         self.assertEqual(3, int(stats['num_instances']))
         self.assertEqual(2, int(stats['num_proj_12345']))
         self.assertEqual(3, int(stats['num_vm_building']))
 
+    def test_compute_node_get_by_hosts(self):
+        item = self._create_helper('host1')
+        service = db.service_create(self.ctxt, dict(host='host2',
+                                                    binary='binary2',
+                                                    topic='compute'))
+        self.compute_node_dict['service_id'] = service['id']
+        self._create_helper('host2')
+
+        nodes = db.compute_node_get_by_hosts(self.ctxt, ['host1', 'host3'])
+        self.assertEqual([item['id']], [node['id'] for node in nodes])
+        self.assertEqual('host1', nodes[0]['service']['host'])
+        self.assertEqual([], db.compute_node_get_by_hosts(self.ctxt, []))
+
     def test_compute_node_update(self):
         item = self._create_helper('host1')
 
         compute_node_id = item['id']
-        stats = self._stats_as_dict(item['stats'])
+        stats = dict(item['stats'])
 
         # change some values:
         stats['num_instances'] = 8
@@ -1499,31 +1733,49 @@ class CapacityTestCase(test.TestCase):
             'stats': stats,
         }
         item = db.compute_node_update(self.ctxt, compute_node_id, values)
-        stats = self._stats_as_dict(item['stats'])
+        stats = item['stats']
 
         self.assertEqual(4, item['vcpus'])
         self.assertEqual(8, int(stats['num_instances']))
         self.assertEqual(2, int(stats['num_proj_12345']))
         self.assertEqual(1, int(stats['num_tribbles']))
 
+    def test_compute_node_update_merges_counters(self):
+        item = self._create_helper('host1')
+        db.compute_node_update(self.ctxt, item['id'],
+                {'stats': {'num_proj': {'1234': 1, '5678': 2}}},
+                prune_stats=True)
+        item = db.compute_node_update(self.ctxt, item['id'],
+                {'stats': {'num_proj': {'5678': 3}, 'num_instances': 4}})
+        self.assertEqual({'num_proj': {'1234': 1, '5678': 3},
+                          'num_instances': 4}, item['stats'])
+
     def test_compute_node_stat_prune(self):
         item = self._create_helper('host1')
-        for stat in item['stats']:
-            if stat['key'] == 'num_instances':
-                num_instance_stat = stat
-                break
 
         values = {
             'stats': dict(num_instances=1)
         }
         db.compute_node_update(self.ctxt, item['id'], values, prune_stats=True)
         item = db.compute_node_get_all(self.ctxt)[0]
-        self.assertEqual(1, len(item['stats']))
+        self.assertEqual({'num_instances': 1}, item['stats'])
+
+    def test_compute_node_update_without_stats(self):
+        item = self._create_helper('host1')
+        item = db.compute_node_update(self.ctxt, item['id'], {'vcpus': 4},
+                                      prune_stats=True)
+        self.assertEqual(4, item['vcpus'])
+        self.assertEqual(3, item['stats']['num_instances'])
+
+    def test_compute_node_update_unchanged_stats(self):
+        item = self._create_helper('host1')
+        stats = dict(item['stats'])
+        updated_at = item['updated_at']
 
-        stat = item['stats'][0]
-        self.assertEqual(num_instance_stat['id'], stat['id'])
-        self.assertEqual(num_instance_stat['key'], stat['key'])
-        self.assertEqual(1, int(stat['value']))
+        item = db.compute_node_update(self.ctxt, item['id'],
+                                      {'stats': stats}, prune_stats=True)
+        self.assertEqual(updated_at, item['updated_at'])
+        self.assertEqual(stats, item['stats'])
 
 
 class MigrationTestCase(test.TestCase):
@@ -1766,6 +2018,131 @@ class VolumeUsageDBApiTestCase(test.TestCase):
             self.assertEqual(vol_usages[0][key], value)
         timeutils.clear_time_override()
 
+    def test_vol_usage_bulk_update(self):
+        ctxt = context.get_admin_context()
+        now = timeutils.utcnow()
+        timeutils.set_time_override(now)
+        start_time = now - datetime.timedelta(seconds=10)
+        refreshed_time = now - datetime.timedelta(seconds=5)
+
+        db.vol_usage_update(ctxt, 1, rd_req=10, rd_bytes=20,
+                            wr_req=30, wr_bytes=40, instance_id=1,
+                            update_totals=True)
+        db.vol_usage_bulk_update(ctxt, [
+                dict(volume_id=1, instance_id=1, rd_req=1000,
+                     rd_bytes=2000, wr_req=3000, wr_bytes=4000),
+                dict(volume_id=2, instance_id=1, rd_req=100,
+                     rd_bytes=200, wr_req=300, wr_bytes=400)],
+                last_refreshed=refreshed_time)
+        db.vol_usage_bulk_update(ctxt, [])
+
+        vol_usages = db.vol_get_usage_by_time(ctxt, start_time)
+        self.assertEqual(2, len(vol_usages))
+        vol_usages = dict((usage['volume_id'], usage)
+                          for usage in vol_usages)
+        self.assertEqual(10, vol_usages['1']['tot_reads'])
+        self.assertEqual(refreshed_time,
+                         vol_usages['1']['curr_last_refreshed'])
+        for volume_id, expected in [('1', (1000, 2000, 3000, 4000)),
+                                    ('2', (100, 200, 300, 400))]:
+            usage = vol_usages[volume_id]
+            self.assertEqual(expected, (usage['curr_reads'],
+                                        usage['curr_read_bytes'],
+                                        usage['curr_writes'],
+                                        usage['curr_write_bytes']))
+        timeutils.clear_time_override()
+
+
+class SlaveDBTestCase(test.TestCase):
+    """Tests for routing read-only calls to sql_slave_connection."""
+
+    def setUp(self):
+        super(SlaveDBTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.start_period = timeutils.utcnow().replace(microsecond=0)
+        self.addCleanup(self._reset_slave)
+
+    def _reset_slave(self):
+        sqlalchemy_api._SLAVE_ENGINE = None
+        sqlalchemy_api._SLAVE_MAKER = None
+        sqlalchemy_api._SLAVE_FAILED_AT = None
+        timeutils.clear_time_override()
+
+    def _make_slave(self, tmpdir):
+        self.flags(sql_slave_connection='sqlite:///%s/slave.sqlite' % tmpdir)
+        engine = sqlalchemy_api.get_engine(slave_engine=True)
+        models.BandwidthUsage.__table__.create(engine)
+        bw_usage = models.BandwidthUsage()
+        bw_usage.update({'uuid': 'fake_uuid', 'mac': 'fake_mac',
+                         'start_period': self.start_period,
+                         'bw_in': 100, 'bw_out': 200})
+        session = db_session.get_maker(engine)()
+        with session.begin():
+            bw_usage.save(session=session)
+
+    def test_slave_call_reads_slave(self):
+        with utils.tempdir() as tmpdir:
+            self._make_slave(tmpdir)
+            result = db.bw_usage_get_by_uuids(self.context, ['fake_uuid'],
+                                              self.start_period,
+                                              use_slave=True)
+            self.assertEqual(1, len(result))
+            self.assertEqual(100, result[0]['bw_in'])
+            # Callers that do not ask for the slave keep using the main
+            # database.
+            self.assertEqual([], db.bw_usage_get_by_uuids(self.context,
+                    ['fake_uuid'], self.start_period))
+            self.assertEqual(None, db.bw_usage_get(self.context, 'fake_uuid',
+                                                   self.start_period,
+                                                   'fake_mac'))
+
+    def test_slave_not_configured_reads_main(self):
+        db.bw_usage_update(self.context, 'fake_uuid', 'fake_mac',
+                           self.start_period, 1, 2, 3, 4)
+        result = db.bw_usage_get_by_uuids(self.context, ['fake_uuid'],
+                                          self.start_period, use_slave=True)
+        self.assertEqual(1, len(result))
+        self.assertEqual(1, result[0]['bw_in'])
+
+    def test_slave_unavailable_falls_back_to_main(self):
+        warnings = []
+        self.stubs.Set(sqlalchemy_api.LOG, 'warn',
+                       lambda *args: warnings.append(args))
+        timeutils.set_time_override()
+        db.bw_usage_update(self.context, 'fake_uuid', 'fake_mac',
+                           self.start_period, 1, 2, 3, 4)
+        with utils.tempdir() as tmpdir:
+            self.flags(sql_slave_connection='sqlite:///%s/missing/db' %
+                       tmpdir, sql_slave_retry_interval=60)
+
+            def _get():
+                result = db.bw_usage_get_by_uuids(self.context,
+                                                  ['fake_uuid'],
+                                                  self.start_period,
+                                                  use_slave=True)
+                self.assertEqual(1, len(result))
+                self.assertEqual(1, result[0]['bw_in'])
+
+            _get()
+            self.assertEqual(1, len(warnings))
+            # The slave is not tried again until the retry interval has
+            # passed.
+            timeutils.advance_time_seconds(30)
+            _get()
+            self.assertEqual(1, len(warnings))
+            timeutils.advance_time_seconds(31)
+            _get()
+            self.assertEqual(2, len(warnings))
+
+    def test_slave_unavailable_without_fallback_raises(self):
+        with utils.tempdir() as tmpdir:
+            self.flags(sql_slave_connection='sqlite:///%s/missing/db' %
+                       tmpdir, sql_slave_fallback=False)
+            self.assertRaises(sqla_exc.OperationalError,
+                              db.bw_usage_get_by_uuids, self.context,
+                              ['fake_uuid'], self.start_period,
+                              use_slave=True)
+
 
 class TaskLogTestCase(test.TestCase):
 
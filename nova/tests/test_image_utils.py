@@ -236,3 +236,42 @@ ID        TAG                 VM SIZE                DATE       VM CLOCK
         self.assertEquals(67108864, image_info.virtual_size)
         self.assertEquals(98304, image_info.disk_size)
         self.assertEquals(3, len(image_info.snapshots))
+
+    def _write_qcow2_header(self, path, virtual_size, backing_file=None,
+                            magic=images.QCOW2_MAGIC):
+        backing_file_offset = 0
+        if backing_file:
+            backing_file_offset = images.QCOW2_HEADER.size
+        with open(path, 'wb') as image:
+            image.write(images.QCOW2_HEADER.pack(
+                    magic, 2, backing_file_offset, len(backing_file or ''),
+                    16, virtual_size))
+            if backing_file:
+                image.write(backing_file)
+
+    def test_qcow2_header_info(self):
+        with utils.tempdir() as tmpdir:
+            path = os.path.join(tmpdir, 'disk')
+            self._write_qcow2_header(path, 21474836480, 'base/image')
+            image_info = images.qcow2_header_info(path)
+        self.assertEquals(path, image_info.image)
+        self.assertEquals('qcow2', image_info.file_format)
+        self.assertEquals(21474836480, image_info.virtual_size)
+        self.assertEquals(os.path.join(tmpdir, 'base/image'),
+                          image_info.backing_file)
+
+    def test_qcow2_header_info_no_backing_file(self):
+        with utils.tempdir() as tmpdir:
+            path = os.path.join(tmpdir, 'disk')
+            self._write_qcow2_header(path, 1024)
+            image_info = images.qcow2_header_info(path)
+        self.assertEquals(1024, image_info.virtual_size)
+        self.assertEquals(None, image_info.backing_file)
+
+    def test_qcow2_header_info_not_qcow2(self):
+        with utils.tempdir() as tmpdir:
+            path = os.path.join(tmpdir, 'disk')
+            self._write_qcow2_header(path, 1024, magic='RAW!')
+            self.assertEquals(None, images.qcow2_header_info(path))
+            self.assertEquals(None, images.qcow2_header_info(
+                    os.path.join(tmpdir, 'missing')))
@@ -161,14 +161,14 @@ class RawTestCase(_ImageTestCase, test.TestCase):
         fn = self.mox.CreateMockAnything()
         self.mox.StubOutWithMock(imagebackend.lockutils.synchronized,
                                  '__call__')
-        self.mox.StubOutWithMock(imagebackend.libvirt_utils, 'copy_image')
+        self.mox.StubOutWithMock(imagebackend.libvirt_utils, 'clone_image')
         self.mox.StubOutWithMock(imagebackend.disk, 'extend')
         return fn
 
     def test_create_image(self):
         fn = self.prepare_mocks()
         fn(target=self.TEMPLATE_PATH, image_id=None)
-        imagebackend.libvirt_utils.copy_image(self.TEMPLATE_PATH, self.PATH)
+        imagebackend.libvirt_utils.clone_image(self.TEMPLATE_PATH, self.PATH)
         self.mox.ReplayAll()
 
         image = self.image_class(self.INSTANCE, self.NAME)
@@ -189,7 +189,7 @@ class RawTestCase(_ImageTestCase, test.TestCase):
     def test_create_image_extend(self):
         fn = self.prepare_mocks()
         fn(target=self.TEMPLATE_PATH, image_id=None)
-        imagebackend.libvirt_utils.copy_image(self.TEMPLATE_PATH, self.PATH)
+        imagebackend.libvirt_utils.clone_image(self.TEMPLATE_PATH, self.PATH)
         imagebackend.disk.extend(self.PATH, self.SIZE)
         self.mox.ReplayAll()
 
@@ -384,6 +384,103 @@ class LvmTestCase(_ImageTestCase, test.TestCase):
                           ephemeral_size=None)
         self.mox.VerifyAll()
 
+    def _prepare_thin_mocks(self):
+        self.flags(libvirt_images_thin_pool='FakePool')
+        fn = self.prepare_mocks()
+        self.mox.StubOutWithMock(self.libvirt_utils, 'list_logical_volumes')
+        self.mox.StubOutWithMock(self.libvirt_utils, 'create_thin_lvm_image')
+        self.mox.StubOutWithMock(self.libvirt_utils,
+                                 'create_thin_lvm_snapshot')
+        self.mox.StubOutWithMock(self.libvirt_utils, 'rename_logical_volume')
+        return fn
+
+    def test_create_image_thin(self):
+        fn = self._prepare_thin_mocks()
+        base_lv = 'nova-base-%s' % os.path.basename(self.TEMPLATE_PATH)
+        partial_lv = 'nova-partial-base-%s' % os.path.basename(
+                self.TEMPLATE_PATH)
+        fn(target=self.TEMPLATE_PATH)
+        self.disk.get_disk_size(self.TEMPLATE_PATH
+                                ).AndReturn(self.TEMPLATE_SIZE)
+        self.libvirt_utils.list_logical_volumes(self.VG).AndReturn([])
+        self.libvirt_utils.create_thin_lvm_image(self.VG, 'FakePool',
+                                                 partial_lv,
+                                                 self.TEMPLATE_SIZE)
+        cmd = ('qemu-img', 'convert', '-O', 'raw', self.TEMPLATE_PATH,
+               os.path.join('/dev', self.VG, partial_lv))
+        self.utils.execute(*cmd, run_as_root=True)
+        self.libvirt_utils.rename_logical_volume(self.VG, partial_lv,
+                                                 base_lv)
+        self.libvirt_utils.create_thin_lvm_snapshot(self.VG, base_lv,
+                                                    self.LV, size=None)
+        self.mox.ReplayAll()
+
+        image = self.image_class(self.INSTANCE, self.NAME)
+        image.create_image(fn, self.TEMPLATE_PATH, None)
+
+        self.mox.VerifyAll()
+
+    def test_create_image_thin_partial_base(self):
+        fn = self._prepare_thin_mocks()
+        self.mox.StubOutWithMock(self.libvirt_utils, 'remove_logical_volumes')
+        base_lv = 'nova-base-%s' % os.path.basename(self.TEMPLATE_PATH)
+        partial_lv = 'nova-partial-base-%s' % os.path.basename(
+                self.TEMPLATE_PATH)
+        partial_path = os.path.join('/dev', self.VG, partial_lv)
+        fn(target=self.TEMPLATE_PATH)
+        self.disk.get_disk_size(self.TEMPLATE_PATH
+                                ).AndReturn(self.TEMPLATE_SIZE)
+        # A conversion cut short earlier left its volume behind.
+        self.libvirt_utils.list_logical_volumes(self.VG).AndReturn(
+                [partial_lv])
+        self.libvirt_utils.remove_logical_volumes(partial_path)
+        self.libvirt_utils.create_thin_lvm_image(self.VG, 'FakePool',
+                                                 partial_lv,
+                                                 self.TEMPLATE_SIZE)
+        cmd = ('qemu-img', 'convert', '-O', 'raw', self.TEMPLATE_PATH,
+               partial_path)
+        self.utils.execute(*cmd, run_as_root=True).AndRaise(
+                RuntimeError())
+        self.libvirt_utils.remove_logical_volumes(partial_path)
+        self.libvirt_utils.remove_logical_volumes(self.PATH)
+        self.mox.ReplayAll()
+
+        image = self.image_class(self.INSTANCE, self.NAME)
+        self.assertRaises(RuntimeError, image.create_image, fn,
+                          self.TEMPLATE_PATH, None)
+
+        self.mox.VerifyAll()
+
+    def test_create_image_thin_existing_base_resize(self):
+        fn = self._prepare_thin_mocks()
+        base_lv = 'nova-base-%s' % os.path.basename(self.TEMPLATE_PATH)
+        fn(target=self.TEMPLATE_PATH)
+        self.disk.get_disk_size(self.TEMPLATE_PATH
+                                ).AndReturn(self.TEMPLATE_SIZE)
+        self.libvirt_utils.list_logical_volumes(self.VG).AndReturn([base_lv])
+        self.libvirt_utils.create_thin_lvm_snapshot(self.VG, base_lv,
+                                                    self.LV, size=self.SIZE)
+        self.disk.resize2fs(self.PATH, run_as_root=True)
+        self.mox.ReplayAll()
+
+        image = self.image_class(self.INSTANCE, self.NAME)
+        image.create_image(fn, self.TEMPLATE_PATH, self.SIZE)
+
+        self.mox.VerifyAll()
+
+    def test_create_image_thin_generated(self):
+        fn = self._prepare_thin_mocks()
+        self.libvirt_utils.create_thin_lvm_image(self.VG, 'FakePool',
+                                                 self.LV, self.SIZE)
+        fn(target=self.PATH, ephemeral_size=None)
+        self.mox.ReplayAll()
+
+        image = self.image_class(self.INSTANCE, self.NAME)
+        image.create_image(fn, self.TEMPLATE_PATH,
+                self.SIZE, ephemeral_size=None)
+
+        self.mox.VerifyAll()
+
     def test_prealloc_image(self):
         CONF.set_override('preallocate_images', 'space')
 
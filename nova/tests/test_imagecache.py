@@ -597,6 +597,39 @@ class ImageCacheManagerTestCase(test.TestCase):
                 self.assertNotEqual(stream.getvalue().find('Failed to remove'),
                                     -1)
 
+    def test_remove_base_volumes(self):
+        self.flags(libvirt_images_volume_group='vg',
+                   libvirt_images_thin_pool='pool')
+        removed = []
+        self.stubs.Set(virtutils, 'list_logical_volumes',
+                       lambda vg: ['instance-00000001_disk', 'nova-base-gone',
+                                   'nova-base-present', 'nova-base-used',
+                                   'nova-partial-base-gone',
+                                   'nova-partial-base-present'])
+        self.stubs.Set(virtutils, 'list_snapshot_origins',
+                       lambda vg: set(['nova-base-used']))
+        self.stubs.Set(virtutils, 'remove_logical_volumes',
+                       lambda *paths: removed.extend(paths))
+
+        with utils.tempdir() as base_dir:
+            for name in ('present', 'used'):
+                open(os.path.join(base_dir, name), 'w').close()
+            os.remove(os.path.join(base_dir, 'used'))
+
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager._remove_base_volumes(base_dir)
+
+        self.assertEqual(['/dev/vg/nova-base-gone',
+                          '/dev/vg/nova-partial-base-gone'], removed)
+
+    def test_remove_base_volumes_without_thin_pool(self):
+        self.flags(libvirt_images_volume_group='vg')
+        self.mox.StubOutWithMock(virtutils, 'list_logical_volumes')
+        self.mox.ReplayAll()
+
+        image_cache_manager = imagecache.ImageCacheManager()
+        image_cache_manager._remove_base_volumes('/nonexistent')
+
     def test_handle_base_image_unused(self):
         img = '123'
 
@@ -59,6 +59,7 @@ from nova.virt import firewall as base_firewall
 from nova.virt import images
 from nova.virt.libvirt import blockinfo
 from nova.virt.libvirt import config as vconfig
+from nova.virt.libvirt import disk_transfer
 from nova.virt.libvirt import driver as libvirt_driver
 from nova.virt.libvirt import firewall
 from nova.virt.libvirt import imagebackend
@@ -1042,6 +1043,55 @@ class LibvirtConnTestCase(test.TestCase):
         # None should be listed, since we fake deleted the last one
         self.assertEquals(len(instances), 0)
 
+    def test_get_info_all(self):
+        class FakeDomain(object):
+            def __init__(self, dom_id, name, state):
+                self.dom_id = dom_id
+                self.dom_name = name
+                self.state = state
+
+            def ID(self):
+                return self.dom_id
+
+            def name(self):
+                return self.dom_name
+
+            def info(self):
+                return [self.state, 2048, 1024, self.dom_id + 1, 0]
+
+        running = {0: FakeDomain(0, 'Domain-0',
+                                 libvirt_driver.VIR_DOMAIN_RUNNING),
+                   2: FakeDomain(2, 'instance-2',
+                                 libvirt_driver.VIR_DOMAIN_RUNNING)}
+        defined = {'instance-3': FakeDomain(-1, 'instance-3',
+                                            libvirt_driver.VIR_DOMAIN_SHUTOFF)}
+
+        def fake_lookup_by_id(dom_id):
+            if dom_id not in running:
+                raise libvirt.libvirtError("domain went away",
+                                           libvirt.VIR_ERR_NO_DOMAIN)
+            return running[dom_id]
+
+        self.mox.StubOutWithMock(libvirt_driver.LibvirtDriver, '_conn')
+        libvirt_driver.LibvirtDriver._conn.lookupByID = fake_lookup_by_id
+        libvirt_driver.LibvirtDriver._conn.lookupByName = defined.get
+        libvirt_driver.LibvirtDriver._conn.numOfDomains = lambda: 3
+        libvirt_driver.LibvirtDriver._conn.listDomainsID = lambda: [0, 1, 2]
+        libvirt_driver.LibvirtDriver._conn.listDefinedDomains = (
+            lambda: ['instance-3'])
+
+        self.mox.ReplayAll()
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        infos = conn.get_info_all()
+        self.assertEqual(['Domain-0', 'instance-2', 'instance-3'],
+                         sorted(infos.keys()))
+        self.assertEqual(power_state.SHUTDOWN, infos['instance-3']['state'])
+        self.assertEqual(-1, infos['instance-3']['id'])
+        self.assertEqual(power_state.RUNNING, infos['instance-2']['state'])
+        # Only running domains count, and the snapshot is not re-read.
+        conn._conn.listDomainsID = None
+        self.assertEqual(4, conn.get_vcpu_used(infos))
+
     def test_get_all_block_devices(self):
         xml = [
             # NOTE(vish): id 0 is skipped
@@ -2438,9 +2488,11 @@ class LibvirtConnTestCase(test.TestCase):
         fake_libvirt_utils.disk_sizes['/test/disk.local'] = 20 * GB
         fake_libvirt_utils.disk_backing_files['/test/disk.local'] = 'file'
 
-        self.mox.StubOutWithMock(os.path, "getsize")
-        os.path.getsize('/test/disk').AndReturn((10737418240))
-        os.path.getsize('/test/disk.local').AndReturn((21474836480))
+        self.mox.StubOutWithMock(os, "stat")
+        os.stat('/test/disk').AndReturn(os.stat_result(
+                (0, 1, 0, 1, 0, 0, 10737418240, 0, 0, 0)))
+        os.stat('/test/disk.local').AndReturn(os.stat_result(
+                (0, 2, 0, 1, 0, 0, 21474836480, 0, 0, 0)))
 
         ret = ("image: /test/disk\n"
                "file format: raw\n"
@@ -2471,6 +2523,43 @@ class LibvirtConnTestCase(test.TestCase):
 
         db.instance_destroy(self.context, instance_ref['uuid'])
 
+    def test_get_qcow2_geometry_cached(self):
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        calls = []
+
+        def fake_qcow2_header_info(path):
+            calls.append(path)
+            info = images.QemuImgInfo(None)
+            info.virtual_size = 21474836480
+            info.backing_file = '/var/lib/nova/instances/_base/image'
+            return info
+
+        self.stubs.Set(images, 'qcow2_header_info', fake_qcow2_header_info)
+        stat = os.stat_result((0, 1, 0, 1, 0, 0, 1024, 0, 10, 0))
+        self.assertEqual((21474836480, 'image'),
+                         conn._get_qcow2_geometry('/test/disk', stat))
+        self.assertEqual((21474836480, 'image'),
+                         conn._get_qcow2_geometry('/test/disk', stat))
+        self.assertEqual(['/test/disk'], calls)
+
+        # A write to the disk changes its mtime and size.
+        stat = os.stat_result((0, 1, 0, 1, 0, 0, 2048, 0, 11, 0))
+        conn._get_qcow2_geometry('/test/disk', stat)
+        self.assertEqual(['/test/disk', '/test/disk'], calls)
+
+    def test_get_qcow2_geometry_falls_back_to_qemu_img(self):
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        self.stubs.Set(images, 'qcow2_header_info', lambda path: None)
+        fake_libvirt_utils.disk_sizes['/test/disk'] = 10737418240
+        fake_libvirt_utils.disk_backing_files['/test/disk'] = 'file'
+        self.mox.StubOutWithMock(disk, 'get_disk_size')
+        disk.get_disk_size('/test/disk').AndReturn(10737418240)
+        self.mox.ReplayAll()
+
+        stat = os.stat_result((0, 1, 0, 1, 0, 0, 1024, 0, 10, 0))
+        self.assertEqual((10737418240, 'file'),
+                         conn._get_qcow2_geometry('/test/disk', stat))
+
     def test_spawn_with_network_info(self):
         # Preparing mocks
         def fake_none(*args, **kwargs):
@@ -2900,9 +2989,13 @@ class LibvirtConnTestCase(test.TestCase):
         def get_info(instance_name):
             return jsonutils.dumps(fake_disks.get(instance_name))
         self.stubs.Set(conn, 'get_instance_disk_info', get_info)
+        conn._disk_geometry_cache['/somepath/disk1'] = ('key', 'value')
+        conn._disk_geometry_cache['/somepath/deleted'] = ('key', 'value')
 
         result = conn.get_disk_over_committed_size_total()
         self.assertEqual(result, 10653532160)
+        self.assertEqual(['/somepath/disk1'],
+                         conn._disk_geometry_cache.keys())
 
     def test_cpu_info(self):
         conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
@@ -2950,6 +3043,34 @@ class LibvirtConnTestCase(test.TestCase):
         got = jsonutils.loads(conn.get_cpu_info())
         self.assertEqual(want, got)
 
+    def test_cpu_info_cached_until_reconnect(self):
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
+        self.flags(libvirt_type='kvm')
+        calls = []
+
+        def get_host_capabilities_stub(self):
+            calls.append(1)
+            cpu = vconfig.LibvirtConfigCPU()
+            cpu.arch = "x86_64"
+            caps = vconfig.LibvirtConfigCaps()
+            caps.host = vconfig.LibvirtConfigCapsHost()
+            caps.host.cpu = cpu
+            return caps
+
+        self.stubs.Set(libvirt_driver.LibvirtDriver,
+                       'get_host_capabilities',
+                       get_host_capabilities_stub)
+
+        first = conn.get_cpu_info()
+        self.assertEqual(first, conn.get_cpu_info())
+        self.assertEqual(1, len(calls))
+
+        self.stubs.Set(conn, '_connect', lambda uri, read_only: object())
+        self.stubs.Set(conn, '_test_connection', lambda: False)
+        conn._get_connection()
+        self.assertEqual(first, conn.get_cpu_info())
+        self.assertEqual(2, len(calls))
+
     def test_diagnostic_vcpus_exception(self):
         xml = """
                 <domain type='kvm'>
@@ -3459,10 +3580,13 @@ class HostStateTestCase(test.TestCase):
     class FakeConnection(object):
         """Fake connection object."""
 
+        def get_info_all(self):
+            return {}
+
         def get_vcpu_total(self):
             return 1
 
-        def get_vcpu_used(self):
+        def get_vcpu_used(self, domains_info=None):
             return 0
 
         def get_cpu_info(self):
@@ -3474,7 +3598,7 @@ class HostStateTestCase(test.TestCase):
         def get_memory_mb_total(self):
             return 497
 
-        def get_memory_mb_used(self):
+        def get_memory_mb_used(self, domains_info=None):
             return 88
 
         def get_hypervisor_type(self):
@@ -4207,6 +4331,98 @@ disk size: 4.4M''', ''))
         finally:
             os.unlink(dst_path)
 
+    def test_clone_image(self):
+        tmpdir = self.useFixture(fixtures.TempDir()).path
+        src_path = os.path.join(tmpdir, 'base')
+        dst_path = os.path.join(tmpdir, 'disk')
+        with open(src_path, 'w') as fp:
+            fp.write('canary')
+
+        libvirt_utils.clone_image(src_path, dst_path)
+        with open(dst_path, 'r') as fp:
+            self.assertEquals(fp.read(), 'canary')
+
+    def test_clone_image_falls_back_to_copy(self):
+        self.stubs.Set(libvirt_utils, '_reflink_supported', {})
+        self.mox.StubOutWithMock(os, 'stat')
+        self.mox.StubOutWithMock(utils, 'execute')
+        os.stat('/some').AndReturn(os.stat_result((0,) * 10))
+        utils.execute('cp', '--reflink=always', '/base', '/some/disk1'
+                      ).AndRaise(exception.ProcessExecutionError(
+                          stderr="cp: failed to clone '/some/disk1' from "
+                                 "'/base': Operation not supported"))
+        utils.execute('cp', '/base', '/some/disk1')
+        # Reflinks are not tried again on the same filesystem.
+        os.stat('/some').AndReturn(os.stat_result((0,) * 10))
+        utils.execute('cp', '/base', '/some/disk2')
+        self.mox.ReplayAll()
+
+        libvirt_utils.clone_image('/base', '/some/disk1')
+        libvirt_utils.clone_image('/base', '/some/disk2')
+        self.assertEqual({0: False}, libvirt_utils._reflink_supported)
+
+    def test_clone_image_failure_keeps_trying_reflinks(self):
+        self.stubs.Set(libvirt_utils, '_reflink_supported', {})
+        self.mox.StubOutWithMock(os, 'stat')
+        self.mox.StubOutWithMock(utils, 'execute')
+        os.stat('/some').AndReturn(os.stat_result((0,) * 10))
+        utils.execute('cp', '--reflink=always', '/base', '/some/disk1'
+                      ).AndRaise(exception.ProcessExecutionError(
+                          stderr="cp: failed to clone '/some/disk1' from "
+                                 "'/base': Invalid cross-device link"))
+        utils.execute('cp', '/base', '/some/disk1')
+        os.stat('/some').AndReturn(os.stat_result((0,) * 10))
+        utils.execute('cp', '--reflink=always', '/base', '/some/disk2')
+        self.mox.ReplayAll()
+
+        libvirt_utils.clone_image('/base', '/some/disk1')
+        libvirt_utils.clone_image('/base', '/some/disk2')
+        self.assertEqual({0: True}, libvirt_utils._reflink_supported)
+
+    def test_remove_logical_volumes_skips_clearing_thin_volumes(self):
+        self.flags(libvirt_images_thin_pool='pool')
+        self.mox.StubOutWithMock(utils, 'execute')
+        self.mox.StubOutWithMock(libvirt_utils, 'clear_logical_volume')
+        utils.execute('lvs', '-o', 'pool_lv', '--noheadings', '/dev/vg/thick',
+                      run_as_root=True).AndReturn(('  \n', ''))
+        libvirt_utils.clear_logical_volume('/dev/vg/thick')
+        utils.execute('lvs', '-o', 'pool_lv', '--noheadings', '/dev/vg/thin',
+                      run_as_root=True).AndReturn(('  pool\n', ''))
+        utils.execute('lvremove', '-f', '/dev/vg/thick', '/dev/vg/thin',
+                      attempts=3, run_as_root=True)
+        self.mox.ReplayAll()
+
+        libvirt_utils.remove_logical_volumes('/dev/vg/thick', '/dev/vg/thin')
+
+    def test_remove_logical_volumes_without_thin_pool(self):
+        self.mox.StubOutWithMock(utils, 'execute')
+        self.mox.StubOutWithMock(libvirt_utils, 'clear_logical_volume')
+        libvirt_utils.clear_logical_volume('/dev/vg/lv')
+        utils.execute('lvremove', '-f', '/dev/vg/lv',
+                      attempts=3, run_as_root=True)
+        self.mox.ReplayAll()
+
+        libvirt_utils.remove_logical_volumes('/dev/vg/lv')
+
+    def test_create_thin_lvm_snapshot(self):
+        self.mox.StubOutWithMock(utils, 'execute')
+        utils.execute('lvcreate', '-s', '-kn', '-n', 'disk', 'vg/base',
+                      run_as_root=True, attempts=3)
+        utils.execute('lvextend', '-L', '2048b', 'vg/disk',
+                      run_as_root=True, attempts=3)
+        self.mox.ReplayAll()
+
+        libvirt_utils.create_thin_lvm_snapshot('vg', 'base', 'disk',
+                                               size=2048)
+
+    def test_rename_logical_volume(self):
+        self.mox.StubOutWithMock(utils, 'execute')
+        utils.execute('lvrename', 'vg', 'partial', 'base',
+                      run_as_root=True, attempts=3)
+        self.mox.ReplayAll()
+
+        libvirt_utils.rename_logical_volume('vg', 'partial', 'base')
+
     def test_write_to_file(self):
         dst_fd, dst_path = tempfile.mkstemp()
         try:
@@ -4525,16 +4741,77 @@ class LibvirtDriverTestCase(test.TestCase):
         self.stubs.Set(utils, 'execute', fake_execute)
 
         ins_ref = self._create_instance()
+        ctxt = context.get_admin_context()
         # dest is different host case
         out = self.libvirtconnection.migrate_disk_and_power_off(
-               None, ins_ref, '10.0.0.2', None, None)
+               ctxt, ins_ref, '10.0.0.2', None, None)
         self.assertEquals(out, disk_info_text)
 
         # dest is same host case
         out = self.libvirtconnection.migrate_disk_and_power_off(
-               None, ins_ref, '10.0.0.1', None, None)
+               ctxt, ins_ref, '10.0.0.1', None, None)
         self.assertEquals(out, disk_info_text)
 
+    def _migrate_disks(self, base_on_dest):
+        self.flags(instances_path='/inst')
+        self.stubs.Set(disk_transfer, '_link_rates', {})
+        disk_info = [{'type': 'qcow2', 'path': '/inst/fake/disk',
+                      'virt_disk_size': '3000',
+                      'backing_file': 'base1',
+                      'disk_size': '1000'},
+                     {'type': 'raw', 'path': '/inst/fake/disk.local',
+                      'virt_disk_size': '0',
+                      'backing_file': '',
+                      'disk_size': '3000'}]
+        commands = []
+        progress = []
+
+        def fake_execute(*args, **kwargs):
+            commands.append(args)
+            if args[2:4] == ('test', '-f') and not base_on_dest:
+                raise exception.ProcessExecutionError()
+            return '', ''
+
+        def fake_instance_update(context, instance_uuid, updates):
+            progress.append(updates['progress'])
+
+        self.stubs.Set(self.libvirtconnection, 'get_instance_disk_info',
+                       lambda name: jsonutils.dumps(disk_info))
+        self.stubs.Set(self.libvirtconnection, 'power_off',
+                       lambda instance: None)
+        self.stubs.Set(self.libvirtconnection, 'get_host_ip_addr',
+                       lambda: '10.0.0.1')
+        self.stubs.Set(libvirt_utils, 'get_instance_path',
+                       lambda instance: '/inst/fake')
+        self.stubs.Set(self.libvirtconnection.virtapi, 'instance_update',
+                       fake_instance_update)
+        self.stubs.Set(utils, 'execute', fake_execute)
+
+        self.libvirtconnection.migrate_disk_and_power_off(
+                context.get_admin_context(),
+                {'uuid': 'fake-uuid', 'name': 'fake'},
+                '10.0.0.2', None, None)
+        self.assertEqual([25, 100], sorted(progress))
+        self.assertTrue(('ssh', '10.0.0.2', 'test', '-f',
+                         '/inst/_base/base1') in commands)
+        self.assertTrue(('rsync', '--sparse', '/inst/fake_resize/disk.local',
+                         '10.0.0.2:/inst/fake/disk.local') in commands)
+        return commands
+
+    def test_migrate_disk_and_power_off_base_on_dest(self):
+        commands = self._migrate_disks(base_on_dest=True)
+        self.assertTrue(('rsync', '--sparse', '/inst/fake_resize/disk',
+                         '10.0.0.2:/inst/fake/disk') in commands)
+        self.assertFalse([cmd for cmd in commands if cmd[0] == 'qemu-img'])
+
+    def test_migrate_disk_and_power_off_base_not_on_dest(self):
+        commands = self._migrate_disks(base_on_dest=False)
+        self.assertTrue(('qemu-img', 'convert', '-f', 'qcow2', '-O', 'qcow2',
+                         '/inst/fake_resize/disk',
+                         '/inst/fake_resize/disk_rbase') in commands)
+        self.assertTrue(('rsync', '--sparse', '/inst/fake_resize/disk_rbase',
+                         '10.0.0.2:/inst/fake/disk') in commands)
+
     def test_wait_for_running(self):
         def fake_get_info(instance):
             if instance['name'] == "not_found":
@@ -4776,13 +5053,34 @@ class LibvirtVolumeUsageTestCase(test.TestCase):
                      {'volume_id': 2,
                       'device_name': 'vda'}]
 
-    def test_get_all_volume_usage(self):
-        def fake_block_stats(instance_name, disk):
-            return (169L, 688640L, 0L, 0L, -1L)
+    def _stub_domain(self, targets):
+        calls = []
+
+        class FakeDomain(object):
+            def XMLDesc(self, flags):
+                calls.append('XMLDesc')
+                disks = ''.join("<disk type='block' device='disk'>"
+                                "<target dev='%s' bus='virtio'/></disk>"
+                                % target for target in targets)
+                return "<domain><devices>%s</devices></domain>" % disks
+
+            def blockStats(self, disk):
+                calls.append(('blockStats', disk))
+                return (169L, 688640L, 0L, 0L, -1L)
 
-        self.stubs.Set(self.conn, 'block_stats', fake_block_stats)
+        def fake_lookup(instance_name):
+            calls.append('lookup')
+            return FakeDomain()
+
+        self.stubs.Set(self.conn, '_lookup_by_name', fake_lookup)
+        return calls
+
+    def test_get_all_volume_usage(self):
+        calls = self._stub_domain(['vda', 'vde'])
         vol_usage = self.conn.get_all_volume_usage(self.c,
               [dict(instance=self.ins_ref, instance_bdms=self.bdms)])
+        self.assertEqual(['lookup', 'XMLDesc', ('blockStats', 'vde'),
+                          ('blockStats', 'vda')], calls)
 
         expected_usage = [{'volume': 1,
                            'instance': self.ins_ref,
@@ -4796,6 +5094,22 @@ class LibvirtVolumeUsageTestCase(test.TestCase):
                             'wr_bytes': 0L}]
         self.assertEqual(vol_usage, expected_usage)
 
+    def test_get_all_volume_usage_skips_detached_device(self):
+        calls = self._stub_domain(['vda'])
+        vol_usage = self.conn.get_all_volume_usage(self.c,
+              [dict(instance=self.ins_ref, instance_bdms=self.bdms)])
+        self.assertEqual(['lookup', 'XMLDesc', ('blockStats', 'vda')], calls)
+        self.assertEqual([2], [usage['volume'] for usage in vol_usage])
+
+    def test_get_all_volume_usage_instance_not_found(self):
+        def fake_lookup(instance_name):
+            raise exception.InstanceNotFound(instance_id=instance_name)
+
+        self.stubs.Set(self.conn, '_lookup_by_name', fake_lookup)
+        vol_usage = self.conn.get_all_volume_usage(self.c,
+              [dict(instance=self.ins_ref, instance_bdms=self.bdms)])
+        self.assertEqual(vol_usage, [])
+
     def test_get_all_volume_usage_device_not_found(self):
         def fake_lookup(instance_name):
             raise libvirt.libvirtError('invalid path')
@@ -0,0 +1,128 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+import eventlet
+import fixtures
+
+from nova import test
+from nova import utils
+from nova.virt.libvirt import disk_transfer
+
+
+class DiskTransferTestCase(test.TestCase):
+
+    def setUp(self):
+        super(DiskTransferTestCase, self).setUp()
+        self.tempdir = self.useFixture(fixtures.TempDir()).path
+        self.stubs.Set(disk_transfer, '_link_rates', {})
+        self.commands = []
+
+        def fake_execute(*cmd, **kwargs):
+            self.commands.append(cmd)
+            return '', ''
+
+        self.stubs.Set(utils, 'execute', fake_execute)
+
+    def _make_disk(self, name, size, sparse):
+        path = os.path.join(self.tempdir, name)
+        with open(path, 'w') as f:
+            if sparse:
+                f.truncate(size)
+            else:
+                f.write('x' * size)
+        return path
+
+    def test_compression_modes(self):
+        path = self._make_disk('disk', 64 * 1024, sparse=False)
+        self.flags(libvirt_disk_transfer_compression='always')
+        self.assertTrue(disk_transfer.use_compression('host1', path))
+        self.flags(libvirt_disk_transfer_compression='never')
+        self.assertFalse(disk_transfer.use_compression('host1', path))
+
+    def test_auto_compression_of_sparse_disk(self):
+        path = self._make_disk('disk', 64 * 1024 * 1024, sparse=True)
+        self.assertTrue(disk_transfer.use_compression('host1', path))
+
+    def test_auto_compression_follows_link_rate(self):
+        self.flags(libvirt_disk_transfer_fast_link=100)
+        path = self._make_disk('disk', 64 * 1024, sparse=False)
+        # Nothing is known about the link until a disk has been sent.
+        self.assertFalse(disk_transfer.use_compression('host1', path))
+
+        disk_transfer._link_rates['host1'] = 10 * 1024 * 1024
+        self.assertTrue(disk_transfer.use_compression('host1', path))
+        disk_transfer._link_rates['host1'] = 1000 * 1024 * 1024
+        self.assertFalse(disk_transfer.use_compression('host1', path))
+
+    def test_copy_records_uncompressed_link_rate(self):
+        path = self._make_disk('disk', 64 * 1024, sparse=False)
+        transfer = disk_transfer.DiskTransfer('host1')
+        transfer.copy(path, '/dest/disk', 64 * 1024)
+        self.assertEqual(('rsync', '--sparse', path, 'host1:/dest/disk'),
+                         self.commands[-1])
+        # Too small to tell how fast the link is.
+        self.assertFalse('host1' in disk_transfer._link_rates)
+
+        transfer.copy(path, '/dest/disk', disk_transfer._MIN_RATE_SAMPLE)
+        self.assertTrue('host1' in disk_transfer._link_rates)
+
+        sparse_path = self._make_disk('sparse', 64 * 1024 * 1024,
+                                      sparse=True)
+        disk_transfer._link_rates.clear()
+        transfer.copy(sparse_path, '/dest/sparse', 64 * 1024 * 1024)
+        self.assertEqual(('rsync', '--sparse', '--compress', sparse_path,
+                          'host1:/dest/sparse'), self.commands[-1])
+        self.assertFalse('host1' in disk_transfer._link_rates)
+
+    def test_local_copy(self):
+        transfer = disk_transfer.DiskTransfer(None)
+        transfer.copy('/src/disk', '/dest/disk', 1024)
+        self.assertEqual([('cp', '/src/disk', '/dest/disk')], self.commands)
+        self.assertEqual({}, disk_transfer._link_rates)
+
+    def test_run_is_concurrent_and_reports_progress(self):
+        self.flags(libvirt_disk_transfer_workers=2)
+        progress = []
+        state = {'active': 0, 'max_active': 0}
+
+        def job():
+            state['active'] += 1
+            state['max_active'] = max(state['max_active'], state['active'])
+            eventlet.sleep(0.01)
+            state['active'] -= 1
+
+        transfer = disk_transfer.DiskTransfer('host1', progress.append)
+        transfer.run([(job, 100), (job, 100), (job, 200)])
+        self.assertEqual(2, state['max_active'])
+        self.assertEqual([25, 50, 100], progress)
+
+    def test_run_waits_for_all_jobs_and_raises_first_error(self):
+        finished = []
+
+        def failing_job():
+            raise test.TestingException()
+
+        def slow_job():
+            eventlet.sleep(0.01)
+            finished.append(True)
+
+        transfer = disk_transfer.DiskTransfer('host1')
+        self.assertRaises(test.TestingException, transfer.run,
+                          [(failing_job, 1), (slow_job, 1)])
+        self.assertEqual([True], finished)
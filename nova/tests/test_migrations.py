@@ -54,6 +54,7 @@ import uuid
 from migrate.versioning import repository
 
 import nova.db.sqlalchemy.migrate_repo
+from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
 from nova import test
@@ -887,6 +888,50 @@ class TestNovaMigrations(BaseMigrationTestCase):
                     fetchall()
         self.assertEqual(len(rows), 1)
 
+    def _check_159(self, engine, data):
+        instances = get_table(engine, 'instances')
+        index_names = [index.name for index in instances.indexes]
+        self.assertTrue('instances_project_id_deleted_created_at_idx' in
+                        index_names)
+        self.assertTrue('instances_project_id_deleted_display_name_idx' in
+                        index_names)
+
+    def _prerun_160(self, engine):
+        compute_nodes = get_table(engine, 'compute_nodes')
+        compute_node_stats = get_table(engine, 'compute_node_stats')
+        compute_nodes.insert().values(id=1, service_id=1, vcpus=1,
+                                      memory_mb=1,
+                                      local_gb=1, vcpus_used=0,
+                                      memory_mb_used=0, local_gb_used=0,
+                                      hypervisor_type='fake',
+                                      hypervisor_version=1, cpu_info='',
+                                      deleted=0).execute()
+        data = [
+            {'compute_node_id': 1, 'key': 'num_instances', 'value': '3',
+             'deleted': 0},
+            {'compute_node_id': 1, 'key': 'num_proj_12345', 'value': '2',
+             'deleted': 0},
+            {'compute_node_id': 1, 'key': 'num_vm_building', 'value': '9',
+             'deleted': 1},
+        ]
+        for item in data:
+            compute_node_stats.insert().values(item).execute()
+        return data
+
+    def _check_160(self, engine, data):
+        compute_nodes = get_table(engine, 'compute_nodes')
+        compute_node_stats = get_table(engine, 'compute_node_stats')
+        self.assertIn('stats', get_table(engine, 'shadow_compute_nodes').c)
+
+        node = compute_nodes.select().\
+                where(compute_nodes.c.id == 1).\
+                execute().\
+                first()
+        self.assertEqual({'num_instances': '3',
+                          'num_proj': {'12345': '2'}},
+                         jsonutils.loads(node['stats']))
+        self.assertEqual([], compute_node_stats.select().execute().fetchall())
+
 
 class TestBaremetalMigrations(BaseMigrationTestCase):
     """Test sqlalchemy-migrate migrations."""
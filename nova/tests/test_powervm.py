@@ -18,8 +18,14 @@
 Test suite for PowerVMDriver.
 """
 
+import socket
+import subprocess
+
+import paramiko
+
 from nova import context
 from nova import db
+from nova import exception as nova_exception
 from nova import test
 
 from nova.compute import power_state
@@ -93,6 +99,12 @@ class FakeIVMOperator(object):
                 'disk_used': 0,
                 'disk_avail': 10168}
 
+    def get_host_resources(self):
+        resources = self.get_memory_info()
+        resources.update(self.get_cpu_info())
+        resources.update(self.get_disk_info())
+        return resources
+
     def get_hostname(self):
         return 'fake-powervm'
 
@@ -230,3 +242,243 @@ class PowerVMDriverTestCase(test.TestCase):
         joined_path = common.aix_path_join(path_one, path_two)
         expected_path = '/some/file/path/filename'
         self.assertEqual(joined_path, expected_path)
+
+
+# Shell functions standing in for the IVM commands run by the operator.
+FAKE_IVM_COMMANDS = """
+ioscli() { "$@"; }
+hostname() { echo fake-ivm; }
+lshwres() {
+    case "$2" in
+        mem) echo 65536,46336;;
+        proc) echo 8.00,6.30;;
+    esac
+}
+lsvg() {
+    if [ $# -eq 0 ]; then
+        echo rootvg; echo datavg
+    else
+        echo "1271 (10168 megabytes):0 (0 megabytes):1271 (10168 megabytes)"
+    fi
+}
+lsmap() { echo ent4; }
+lsdev() { echo value; echo; echo 1; }
+"""
+
+
+class FakeFile(object):
+
+    def __init__(self, channel=None, data=''):
+        self.channel = channel
+        self.data = data
+
+    def read(self):
+        return self.data
+
+    def write(self, data):
+        self.data += data
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeChannel(object):
+    """Runs commands in a local shell with the fake IVM commands."""
+
+    def __init__(self, client):
+        self.client = client
+        self.stdin = FakeFile(self)
+        self.stdout = FakeFile(self)
+        self.stderr = FakeFile(self)
+        self.cmd = None
+        self.exit_status = None
+
+    def exec_command(self, cmd):
+        if not self.client.transport.active:
+            raise socket.error('Connection reset by peer')
+        self.client.commands.append(cmd)
+        self.cmd = cmd
+
+    def makefile(self, mode, bufsize):
+        return 'w' in mode and self.stdin or self.stdout
+
+    def makefile_stderr(self, mode, bufsize):
+        return self.stderr
+
+    def recv_exit_status(self):
+        if self.exit_status is None:
+            script = FAKE_IVM_COMMANDS
+            if self.cmd == 'ioscli oem_setup_env':
+                script += self.stdin.data
+            else:
+                script += self.cmd
+            proc = subprocess.Popen(['sh', '-c', script],
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE)
+            self.stdout.data, self.stderr.data = proc.communicate()
+            self.exit_status = proc.returncode
+        return self.exit_status
+
+
+class FakeTransport(object):
+
+    def __init__(self, client):
+        self.client = client
+        self.active = True
+        self.keepalive = 0
+
+    def is_active(self):
+        return self.active
+
+    def set_keepalive(self, interval):
+        self.keepalive = interval
+
+    def open_session(self):
+        return FakeChannel(self.client)
+
+
+class FakeSSHClient(object):
+
+    def __init__(self):
+        self.transport = FakeTransport(self)
+        self._transport = self.transport
+        self.commands = []
+        self.closed = False
+
+    def get_transport(self):
+        return self.transport
+
+    def exec_command(self, cmd):
+        channel = self.transport.open_session()
+        channel.exec_command(cmd)
+        channel.recv_exit_status()
+        return channel.stdin, channel.stdout, channel.stderr
+
+    def close(self):
+        self.closed = True
+        self.transport.active = False
+
+
+class PowerVMSSHTestCase(test.TestCase):
+    """Unit tests for running IVM commands over pooled SSH connections."""
+
+    def setUp(self):
+        super(PowerVMSSHTestCase, self).setUp()
+        self.flags(powervm_ssh_pool_size=2,
+                   powervm_ssh_keepalive_interval=15)
+        self.stubs.Set(common, '_ssh_pools', {})
+        self.clients = []
+
+        def fake_ssh_connect(connection):
+            client = FakeSSHClient()
+            self.clients.append(client)
+            return client
+
+        self.stubs.Set(common, 'ssh_connect', fake_ssh_connect)
+        self.operator = operator.IVMOperator(
+                common.Connection('fake-ivm', 'padmin', 'secret'))
+
+    def _commands(self):
+        return sum([client.commands for client in self.clients], [])
+
+    def test_connection_reused_with_keepalive(self):
+        self.assertEqual(['fake-ivm'],
+                         self.operator.run_vios_command('ioscli hostname'))
+        self.operator.run_vios_command('lsmap')
+        self.assertEqual(1, len(self.clients))
+        self.assertEqual(2, len(self.clients[0].commands))
+        self.assertEqual(15, self.clients[0].transport.keepalive)
+
+    def test_pool_shared_with_disk_adapter(self):
+        adapter = powervm_blockdev.PowerVMLocalVolumeAdapter(
+                common.Connection('fake-ivm', 'padmin', 'secret'))
+        self.operator.run_vios_command('lsmap')
+        self.assertEqual(['65536,46336'],
+                         adapter.run_vios_command_as_root('lshwres -r mem'))
+        self.assertEqual(1, len(self.clients))
+
+    def test_reconnects_dead_connection(self):
+        self.operator.run_vios_command('lsmap')
+        self.clients[0].transport.active = False
+        self.operator.run_vios_command('lsmap')
+        self.assertEqual(2, len(self.clients))
+        self.assertTrue(self.clients[0].closed)
+
+    def test_connection_dropped_on_failure(self):
+        self.operator.run_vios_command('lsmap')
+
+        def fail(cmd):
+            raise paramiko.SSHException('Unable to open channel')
+
+        self.stubs.Set(self.clients[0], 'exec_command', fail)
+        self.assertRaises(paramiko.SSHException,
+                          self.operator.run_vios_command, 'lsmap')
+        self.assertTrue(self.clients[0].closed)
+        self.operator.run_vios_command('lsmap')
+        self.assertEqual(2, len(self.clients))
+
+    def test_command_failure_keeps_connection(self):
+        self.assertRaises(nova_exception.ProcessExecutionError,
+                          self.operator.run_vios_command, 'false')
+        self.operator.run_vios_command('lsmap')
+        self.assertEqual(1, len(self.clients))
+        self.assertFalse(self.clients[0].closed)
+
+    def test_run_vios_commands_splits_output(self):
+        outputs = self.operator.run_vios_commands(
+                ['lsvg', 'printf partial', 'true', 'ioscli hostname'])
+        self.assertEqual([['rootvg', 'datavg'], ['partial'], [],
+                          ['fake-ivm']], outputs)
+        self.assertEqual(1, len(self._commands()))
+
+    def test_run_vios_commands_failure(self):
+        exc = self.assertRaises(nova_exception.ProcessExecutionError,
+                                self.operator.run_vios_commands,
+                                ['lsvg', 'echo oops; false', 'lsmap'])
+        self.assertEqual(1, exc.exit_code)
+        self.assertEqual('oops', exc.stdout)
+        self.assertEqual('echo oops; false', exc.cmd)
+
+    def test_run_vios_commands_unchecked(self):
+        outputs = self.operator.run_vios_commands(
+                ['echo oops; false', 'lsmap'], check_exit_code=False)
+        self.assertEqual([['oops'], ['ent4']], outputs)
+
+    def test_run_vios_commands_retries_lost_connection(self):
+        self.operator.run_vios_command('lsmap')
+
+        def fail(cmd):
+            raise socket.error('Connection reset by peer')
+
+        self.stubs.Set(self.clients[0], 'exec_command', fail)
+        outputs = self.operator.run_vios_commands(['lsmap'])
+        self.assertEqual([['ent4']], outputs)
+        self.assertEqual(2, len(self.clients))
+
+    def test_host_resources_in_one_invocation(self):
+        resources = self.operator.get_host_resources()
+        self.assertEqual({'total_mem': 65536, 'avail_mem': 46336,
+                          'total_procs': 8.0, 'avail_procs': 6.3,
+                          'disk_total': 20336, 'disk_used': 0,
+                          'disk_avail': 20336}, resources)
+        # The volume group listing, then everything else in one go.
+        self.assertEqual(2, len(self._commands()))
+        self.operator.get_host_resources()
+        self.assertEqual(3, len(self._commands()))
+
+    def test_inventory_cached(self):
+        self.assertEqual('fake-ivm', self.operator.get_hostname())
+        self.assertEqual('1', self.operator.get_virtual_eth_adapter_id())
+        self.assertEqual(3, len(self._commands()))
+        self.assertEqual('fake-ivm', self.operator.get_hostname())
+        self.assertEqual('1', self.operator.get_virtual_eth_adapter_id())
+        self.assertEqual(3, len(self._commands()))
+
+    def test_inventory_cache_disabled(self):
+        self.flags(powervm_inventory_cache_ttl=0)
+        self.operator.get_hostname()
+        self.operator.get_hostname()
+        self.assertEqual(2, len(self._commands()))
@@ -24,6 +24,7 @@ import os.path
 import StringIO
 import tempfile
 
+import eventlet
 import mox
 import netaddr
 from oslo.config import cfg
@@ -1059,3 +1060,44 @@ class StringLengthTestCase(test.TestCase):
         self.assertRaises(exception.InvalidInput,
                           utils.check_string_length,
                           'a' * 256, 'name', max_length=255)
+
+
+class CoalescedCallTestCase(test.TestCase):
+    def setUp(self):
+        super(CoalescedCallTestCase, self).setUp()
+        self.calls = []
+
+    def _call(self):
+        self.calls.append(True)
+        eventlet.sleep(0.01)
+        return len(self.calls)
+
+    def test_waiting_callers_share_a_call(self):
+        call = utils.CoalescedCall(self._call)
+        threads = [eventlet.spawn(call) for i in range(5)]
+        # The first caller's call was under way when the others arrived,
+        # so they share the call made after it.
+        self.assertEqual([1, 2, 2, 2, 2],
+                         [thread.wait() for thread in threads])
+        self.assertEqual(3, call())
+
+    def test_failed_call_is_not_shared(self):
+        def fail():
+            eventlet.sleep(0.01)
+            self.calls.append(True)
+            if len(self.calls) < 3:
+                raise test.TestingException()
+            return len(self.calls)
+
+        def wait(thread):
+            try:
+                return thread.wait()
+            except test.TestingException:
+                return 'failed'
+
+        call = utils.CoalescedCall(fail)
+        threads = [eventlet.spawn(call) for i in range(4)]
+        # Each caller tries again until one call succeeds.
+        self.assertEqual([3, 3, 'failed', 'failed'],
+                         sorted(wait(thread) for thread in threads))
+        self.assertEqual(3, len(self.calls))
@@ -419,6 +419,17 @@ class _VirtDriverTestCase(_FakeDriverBackendTestCase):
         self.assertIn('num_cpu', info)
         self.assertIn('cpu_time', info)
 
+    @catch_notimplementederror
+    def test_get_info_all(self):
+        instance_ref, network_info = self._get_running_instance()
+        infos = self.connection.get_info_all()
+        self.assertIn(instance_ref['name'], infos)
+        info = infos[instance_ref['name']]
+        self.assertIn('state', info)
+        self.assertIn('num_cpu', info)
+        self.assertEqual(info['state'],
+                         self.connection.get_info(instance_ref)['state'])
+
     @catch_notimplementederror
     def test_get_info_for_unknown_instance(self):
         self.assertRaises(exception.NotFound,
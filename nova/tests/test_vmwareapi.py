@@ -32,7 +32,10 @@ from nova.tests import utils
 from nova.tests.vmwareapi import db_fakes
 from nova.tests.vmwareapi import stubs
 from nova.virt.vmwareapi import driver
+from nova.virt.vmwareapi import error_util
 from nova.virt.vmwareapi import fake as vmwareapi_fake
+from nova.virt.vmwareapi import vim_util
+from nova.virt.vmwareapi import vm_util
 
 
 class VMwareAPIVMTestCase(test.TestCase):
@@ -283,6 +286,56 @@ class VMwareAPIVMTestCase(test.TestCase):
         info = self.conn.get_info({'name': 1})
         self._check_vm_info(info, power_state.RUNNING)
 
+    def test_get_info_all(self):
+        self._create_vm()
+        info_all = self.conn.get_info_all()
+        self.assertEqual([1], info_all.keys())
+        self._check_vm_info(info_all[1], power_state.RUNNING)
+
+    def _no_vm_listing(self):
+        def fake_get_objects(vim, type, *args, **kwargs):
+            self.assertNotEqual("VirtualMachine", type)
+
+        self.stubs.Set(vim_util, "get_objects", fake_get_objects)
+
+    def test_vm_ref_index_follows_changes(self):
+        self._create_vm()
+        session = self.conn._session
+        vm = vmwareapi_fake._get_objects("VirtualMachine")[0]
+        self._no_vm_listing()
+        self.assertEqual(vm.obj, vm_util.get_vm_ref_from_name(session, 1))
+
+        vm.set("name", "renamed")
+        self.assertEqual(None, vm_util.get_vm_ref_from_name(session, 1))
+        self.assertEqual(vm.obj,
+                         vm_util.get_vm_ref_from_name(session, "renamed"))
+
+        vm.set("name", 1)
+        self.conn.destroy(self.instance, self.network_info)
+        self.assertEqual(None, vm_util.get_vm_ref_from_name(session, 1))
+        self.assertEqual(None,
+                         vm_util.get_vm_ref_from_name(session, "renamed"))
+
+    def test_vm_ref_index_reloads_on_invalid_version(self):
+        self._create_vm()
+        session = self.conn._session
+        vm = vmwareapi_fake._get_objects("VirtualMachine")[0]
+        self._no_vm_listing()
+        session.vim._filter_versions.clear()
+        self.assertEqual(vm.obj, vm_util.get_vm_ref_from_name(session, 1))
+
+    def test_vm_ref_index_falls_back_to_listing(self):
+        def fake_wait_for_updates_ex(*args, **kwargs):
+            raise error_util.VimFaultException(["NotSupported"],
+                                               "not supported")
+
+        self.stubs.Set(vmwareapi_fake.FakeVim, "_wait_for_updates_ex",
+                       fake_wait_for_updates_ex)
+        self._create_vm()
+        vm = vmwareapi_fake._get_objects("VirtualMachine")[0]
+        self.assertEqual(vm.obj,
+                         vm_util.get_vm_ref_from_name(self.conn._session, 1))
+
     def test_destroy(self):
         self._create_vm()
         info = self.conn.get_info({'name': 1})
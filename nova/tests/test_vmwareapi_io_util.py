@@ -0,0 +1,227 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Test suite for the VMwareAPI image transfer against a local HTTP datastore.
+"""
+
+import re
+import StringIO
+import time
+import urllib2
+
+import eventlet
+
+from nova import context
+from nova import test
+from nova.virt.vmwareapi import io_util
+from nova.virt.vmwareapi import read_write_util
+from nova.virt.vmwareapi import vmware_images
+from nova import wsgi
+
+BLOCK_SIZE = 64 * 1024
+
+
+class FakeDatastore(object):
+    """Serves one file, sending it in blocks with a delay after each block
+    to stand in for the bandwidth of a single connection."""
+
+    def __init__(self, data, block_delay=0, ranges=True, fail_ranges=False):
+        self.data = data
+        self.block_delay = block_delay
+        self.ranges = ranges
+        self.fail_ranges = fail_ranges
+        self.requests = []
+        self.active_ranges = 0
+        self.max_active_ranges = 0
+
+    def __call__(self, environ, start_response):
+        range_header = environ.get('HTTP_RANGE')
+        self.requests.append(range_header)
+        headers = [('Content-Type', 'application/octet-stream')]
+        if self.ranges:
+            headers.append(('Accept-Ranges', 'bytes'))
+        data = self.data
+        status = '200 OK'
+        if range_header and self.ranges:
+            if self.fail_ranges:
+                start_response('500 Internal Server Error', headers)
+                return ['']
+            start, end = re.match(r'bytes=(\d+)-(\d+)',
+                                  range_header).groups()
+            data = self.data[int(start):int(end) + 1]
+            status = '206 Partial Content'
+            headers.append(('Content-Range', 'bytes %s-%s/%d' %
+                            (start, end, len(self.data))))
+        headers.append(('Content-Length', str(len(data))))
+        start_response(status, headers)
+        return self._send(data, range_header is not None)
+
+    def _send(self, data, is_range):
+        if is_range:
+            self.active_ranges += 1
+            self.max_active_ranges = max(self.max_active_ranges,
+                                         self.active_ranges)
+        try:
+            for offset in xrange(0, len(data), BLOCK_SIZE):
+                yield data[offset:offset + BLOCK_SIZE]
+                if self.block_delay:
+                    eventlet.sleep(self.block_delay)
+        finally:
+            if is_range:
+                self.active_ranges -= 1
+
+
+class FakeWriteFile(object):
+    def __init__(self):
+        self.data = []
+        self.closed = False
+
+    def write(self, data):
+        self.data.append(data)
+
+    def close(self):
+        self.closed = True
+
+
+class VMwareImageTransferTestCase(test.TestCase):
+    """Unit tests for parallel image transfers from the datastore."""
+
+    def setUp(self):
+        super(VMwareImageTransferTestCase, self).setUp()
+        self.data = ''.join(chr(i % 251) for i in xrange(1000003))
+        self.servers = []
+        self.flags(vmwareapi_image_transfer_streams=4,
+                   vmwareapi_image_transfer_chunk_size=100000)
+        # The datastore is read over https, have it talk plain http to the
+        # fake datastore instead.
+        orig_init = read_write_util.VMwareHTTPReadFile.__init__
+
+        def fake_init(handle, *args, **kwargs):
+            kwargs['scheme'] = 'http'
+            orig_init(handle, *args, **kwargs)
+
+        self.stubs.Set(read_write_util.VMwareHTTPReadFile, '__init__',
+                       fake_init)
+
+    def tearDown(self):
+        for server in self.servers:
+            server.stop()
+        super(VMwareImageTransferTestCase, self).tearDown()
+
+    def _start_datastore(self, **kwargs):
+        datastore = FakeDatastore(self.data, **kwargs)
+        server = wsgi.Server("fake_datastore", datastore, host='127.0.0.1')
+        server.start()
+        self.servers.append(server)
+        self.kwargs = {'host': '127.0.0.1:%d' % server.port,
+                       'data_center_name': 'dc1',
+                       'datastore_name': 'ds1',
+                       'cookies': [],
+                       'file_path': 'vm/disk.vmdk'}
+        return datastore
+
+    def _open(self):
+        return read_write_util.VMwareHTTPReadFile(
+                self.kwargs['host'], self.kwargs['data_center_name'],
+                self.kwargs['datastore_name'], self.kwargs['cookies'],
+                self.kwargs['file_path'])
+
+    def _read_all(self, handle):
+        data = []
+        while True:
+            chunk = handle.read(None)
+            if not chunk:
+                break
+            data.append(chunk)
+        handle.close()
+        return ''.join(data)
+
+    def _parallel_handle(self):
+        return vmware_images._get_parallel_read_handle(
+                self._open(), **self.kwargs)
+
+    def test_parallel_read_returns_data_in_order(self):
+        datastore = self._start_datastore()
+        handle = self._parallel_handle()
+        self.assertTrue(isinstance(handle, io_util.ParallelRangeReader))
+        self.assertEqual(self.data, self._read_all(handle))
+        # One full request to find the size, then one per range.
+        self.assertEqual(12, len(datastore.requests))
+        self.assertEqual('bytes=1000000-1000002', datastore.requests[-1])
+
+    def test_parallel_read_holds_one_range_per_stream(self):
+        opened = []
+
+        def fake_open_range(offset, length):
+            opened.append(offset)
+            return StringIO.StringIO(self.data[offset:offset + length])
+
+        handle = io_util.ParallelRangeReader(fake_open_range,
+                                             len(self.data), 100000, 2,
+                                             BLOCK_SIZE)
+        self.assertEqual(BLOCK_SIZE, len(handle.read(None)))
+        eventlet.sleep(0)
+        # The reader is still handing out the first range, so only the
+        # second connection has moved on.
+        self.assertEqual([0, 100000], opened)
+
+        data = [handle.read(None)]
+        while data[-1]:
+            self.assertTrue(len(data[-1]) <= BLOCK_SIZE)
+            data.append(handle.read(None))
+        self.assertEqual(self.data[BLOCK_SIZE:], ''.join(data))
+        self.assertEqual(11, len(opened))
+        handle.close()
+
+    def test_no_ranges_reads_single_stream(self):
+        datastore = self._start_datastore(ranges=False)
+        handle = self._parallel_handle()
+        self.assertTrue(isinstance(handle,
+                                   read_write_util.VMwareHTTPReadFile))
+        self.assertEqual(self.data, self._read_all(handle))
+        self.assertEqual([None], datastore.requests)
+
+    def test_failed_range_raises(self):
+        self._start_datastore(fail_ranges=True)
+        handle = self._parallel_handle()
+        self.assertRaises(urllib2.HTTPError, handle.read, None)
+        handle.close()
+
+    def test_start_transfer_to_writer(self):
+        self._start_datastore()
+        write_file = FakeWriteFile()
+        vmware_images.start_transfer(context.get_admin_context(),
+                                     self._parallel_handle(), len(self.data),
+                                     write_file_handle=write_file)
+        self.assertEqual(self.data, ''.join(write_file.data))
+        self.assertTrue(write_file.closed)
+
+    def test_parallel_read_is_faster_than_single_stream(self):
+        datastore = self._start_datastore(block_delay=0.01)
+
+        start = time.time()
+        self.assertEqual(self.data, self._read_all(self._open()))
+        single_stream = time.time() - start
+
+        start = time.time()
+        self.assertEqual(self.data, self._read_all(self._parallel_handle()))
+        parallel = time.time() - start
+
+        self.assertEqual(4, datastore.max_active_ranges)
+        self.assertTrue(parallel < single_stream * 0.75,
+                        "parallel read took %.2fs, single stream %.2fs" %
+                        (parallel, single_stream))
@@ -23,6 +23,7 @@ import functools
 import os
 import re
 
+import greenlet
 from oslo.config import cfg
 
 from nova.compute import api as compute_api
@@ -51,6 +52,7 @@ from nova.virt.xenapi import host
 from nova.virt.xenapi.imageupload import glance
 from nova.virt.xenapi import pool
 from nova.virt.xenapi import pool_states
+from nova.virt.xenapi import record_cache
 from nova.virt.xenapi import vm_utils
 from nova.virt.xenapi import vmops
 from nova.virt.xenapi import volume_utils
@@ -2156,6 +2158,163 @@ class XenAPIDom0IptablesFirewallTestCase(stubs.XenAPITestBase):
         self.assertEqual(1, len(rules))
 
 
+class XenAPIRecordCacheTestCase(stubs.XenAPITestBase):
+    """Unit tests for the event-driven record cache."""
+    def setUp(self):
+        super(XenAPIRecordCacheTestCase, self).setUp()
+        self.flags(xenapi_use_record_cache=True)
+        stubs.stubout_session(self.stubs, stubs.FakeSessionForVMTests)
+        self.pollers = []
+        self.stubs.Set(record_cache.greenthread, 'spawn',
+                       self.pollers.append)
+        self.session = xenapi_conn.XenAPISession('test_url', 'root',
+                                                 'test_pass',
+                                                 fake.FakeVirtAPI())
+        self.cache = self.session.record_cache
+        self.host_ref = self.session.get_xenapi_host()
+        self.calls = []
+        self.cache_calls = []
+        orig_call_xenapi = self.session.call_xenapi
+
+        def fake_call_xenapi(method, *args):
+            self.calls.append(method)
+            return orig_call_xenapi(method, *args)
+
+        self.stubs.Set(self.session, 'call_xenapi', fake_call_xenapi)
+        orig_cache_call = self.cache._call_xenapi
+
+        def fake_cache_call(method, *args):
+            self.cache_calls.append((method, args[-1]))
+            return orig_cache_call(method, *args)
+
+        self.stubs.Set(self.cache, '_call_xenapi', fake_cache_call)
+
+    def test_poller_started(self):
+        self.assertEqual([self.cache._poll_forever], self.pollers)
+
+    def test_lookup_follows_events(self):
+        vm_ref = xenapi_fake.create_vm('foo', 'Running',
+                                       resident_on=self.host_ref)
+        self.cache.poll(30)
+        self.assertEqual(vm_ref, vm_utils.lookup(self.session, 'foo'))
+
+        xenapi_fake.get_record('VM', vm_ref)['name_label'] = 'bar'
+        self.cache.poll(30)
+        self.assertEqual(vm_ref, vm_utils.lookup(self.session, 'bar'))
+
+        xenapi_fake.destroy_vm(vm_ref)
+        self.cache.poll(30)
+        self.assertEqual(None, self.cache.get_record('VM', vm_ref))
+        # Reads are answered from memory, XenAPI only confirms the name of
+        # each hit.
+        self.assertEqual(['VM.get_name_label'] * 2, self.calls)
+        self.assertEqual([('event.from', 30.0)] * 3, self.cache_calls)
+
+    def test_lookup_miss_asks_xenapi(self):
+        vm_ref = xenapi_fake.create_vm('foo', 'Running')
+        self.assertEqual(vm_ref, vm_utils.lookup(self.session, 'foo'))
+        self.assertEqual(None, vm_utils.lookup(self.session, 'bar'))
+        self.assertEqual(['VM.get_by_name_label'] * 2, self.calls)
+
+    def test_rename_updates_cache(self):
+        old_ref = xenapi_fake.create_vm('foo', 'Running')
+        self.cache.poll(30)
+        vm_utils.set_vm_name_label(self.session, old_ref, 'foo-orig')
+        self.assertEqual([old_ref], self.cache.get_vm_refs_by_name('foo-orig'))
+        self.assertEqual([], self.cache.get_vm_refs_by_name('foo'))
+
+        new_ref = xenapi_fake.create_vm('foo', 'Running')
+        self.assertEqual(new_ref, vm_utils.lookup(self.session, 'foo'))
+        self.assertEqual(old_ref, vm_utils.lookup(self.session, 'foo-orig'))
+
+    def test_lookup_stale_hit_asks_xenapi(self):
+        old_ref = xenapi_fake.create_vm('foo', 'Running')
+        self.cache.poll(30)
+        # Renamed behind the cache's back, and not polled since.
+        xenapi_fake.get_record('VM', old_ref)['name_label'] = 'foo-orig'
+        new_ref = xenapi_fake.create_vm('foo', 'Running')
+        self.assertEqual(new_ref, vm_utils.lookup(self.session, 'foo'))
+        self.assertEqual(['VM.get_name_label', 'VM.get_by_name_label'],
+                         self.calls)
+
+    def test_lookup_duplicate_name(self):
+        xenapi_fake.create_vm('foo', 'Running')
+        xenapi_fake.create_vm('foo', 'Halted')
+        self.cache.poll(30)
+        self.assertRaises(exception.InstanceExists,
+                          vm_utils.lookup, self.session, 'foo')
+
+    def test_list_vms_and_get_record(self):
+        vm_ref = xenapi_fake.create_vm('foo', 'Running', is_a_template=False,
+                                       resident_on=self.host_ref)
+        xenapi_fake.create_vm('elsewhere', 'Running', is_a_template=False,
+                              resident_on='other')
+        self.cache.poll(30)
+        self.calls = []
+        vms = list(vm_utils.list_vms(self.session))
+        self.assertEqual([vm_ref], [ref for ref, rec in vms])
+
+        vm_rec = vm_utils.get_record(self.session, 'VM', vm_ref)
+        self.assertEqual('foo', vm_rec['name_label'])
+        vm_rec['name_label'] = 'changed'
+        self.assertEqual('foo', vm_utils.get_record(self.session, 'VM',
+                                                    vm_ref)['name_label'])
+        self.assertFalse('VM.get_all_records' in self.calls)
+        self.assertFalse('VM.get_record' in self.calls)
+
+    def test_get_record_of_unknown_ref_asks_xenapi(self):
+        self.assertRaises(xenapi_fake.Failure, vm_utils.get_record,
+                          self.session, 'VM', 'missing')
+        self.assertEqual(['VM.get_record'], self.calls)
+
+    def test_destroy_vm_forgets_record(self):
+        vm_ref = xenapi_fake.create_vm('foo', 'Halted')
+        self.cache.poll(30)
+        vm_utils.destroy_vm(self.session, {'uuid': 'fake'}, vm_ref)
+        self.assertEqual(None, self.cache.get_record('VM', vm_ref))
+        self.assertEqual([], self.cache.get_vm_refs_by_name('foo'))
+
+    def test_lost_events_reload(self):
+        xenapi_fake._event_snapshots.clear()
+        vm_ref = xenapi_fake.create_vm('foo', 'Running')
+        self.assertRaises(xenapi_fake.Failure, self.cache.poll, 30)
+
+        self.cache._load()
+        self.assertEqual([vm_ref], self.cache.get_vm_refs_by_name('foo'))
+        self.assertEqual([('event.from', 30.0), ('event.from', 0.0)],
+                         self.cache_calls)
+
+    def test_poll_forever_reloads_after_failure(self):
+        self.stubs.Set(record_cache.greenthread, 'sleep', lambda secs: None)
+        self.stubs.Set(record_cache.LOG, 'warn', lambda *args: None)
+        polls = []
+
+        def fake_poll(timeout):
+            polls.append(timeout)
+            if len(polls) == 1:
+                raise xenapi_fake.Failure(['EVENTS_LOST'])
+            # The poller is only stopped by being killed.
+            raise greenlet.GreenletExit()
+
+        self.stubs.Set(self.cache, 'poll', fake_poll)
+        self.stubs.Set(self.cache, '_load', lambda: polls.append('load'))
+        self.assertRaises(greenlet.GreenletExit, self.cache._poll_forever)
+        self.assertEqual([30.0, 'load', 30.0], polls)
+
+    def test_without_event_from_reads_directly(self):
+        def fake_event_from(*args):
+            raise xenapi_fake.Failure(['MESSAGE_METHOD_UNKNOWN',
+                                       'event.from'])
+
+        self.stubs.Set(stubs.FakeSessionForVMTests, 'event_from',
+                       fake_event_from)
+        session = xenapi_conn.XenAPISession('test_url', 'root', 'test_pass',
+                                            fake.FakeVirtAPI())
+        self.assertEqual(None, session.record_cache)
+        vm_ref = xenapi_fake.create_vm('foo', 'Running')
+        self.assertEqual(vm_ref, vm_utils.lookup(session, 'foo'))
+
+
 class XenAPISRSelectionTestCase(stubs.XenAPITestBase):
     """Unit tests for testing we find the right SR."""
     def test_safe_find_sr_raise_exception(self):
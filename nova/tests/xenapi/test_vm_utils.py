@@ -1,3 +1,7 @@
+import errno
+import os
+
+import fixtures
 import mox
 from nova import context
 from nova import db
@@ -204,3 +208,79 @@ class BittorrentTestCase(stubs.XenAPITestBase):
 
     def test_create_image_uncached(self):
         self._test_create_image('none')
+
+
+class SparseCopyTestCase(test.TestCase):
+    def setUp(self):
+        super(SparseCopyTestCase, self).setUp()
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+        self.src_path = os.path.join(self.tmpdir, 'src')
+        self.dst_path = os.path.join(self.tmpdir, 'dst')
+        open(self.dst_path, 'w').close()
+        self.stubs.Set(vm_utils, 'SPARSE_COPY_BUFFER_SIZE', 8 * 4096)
+
+    def _write_src(self, chunks, size=None):
+        with open(self.src_path, 'w') as f:
+            for offset, data in chunks:
+                f.seek(offset)
+                f.write(data)
+            if size is not None:
+                f.truncate(size)
+
+    def _copy(self, virtual_size):
+        vm_utils._sparse_copy(self.src_path, self.dst_path, virtual_size)
+        with open(self.dst_path) as f:
+            return f.read()
+
+    def test_copies_data_and_skips_zeroed_blocks(self):
+        data = ('a' * 4096 + '\0' * 4096 * 3 + 'b' * 100 + '\0' * 3996 +
+                '\0' * 4096 * 20 + 'c' * 5000)
+        self._write_src([(0, data)])
+        self.assertEqual(data, self._copy(len(data)))
+        # Only the blocks holding data take up space in the copy.
+        self.assertTrue(os.stat(self.dst_path).st_blocks * 512 <
+                        len(data) / 2)
+
+    def test_stops_at_virtual_size(self):
+        self._write_src([(0, 'a' * 10000)])
+        self.assertEqual('a' * 6000, self._copy(6000))
+
+    def test_stops_at_end_of_source(self):
+        self._write_src([(0, 'a' * 6000)])
+        self.assertEqual('a' * 6000, self._copy(10000))
+
+    def test_skips_holes(self):
+        self._write_src([(1 << 20, 'data')], size=4 << 20)
+        reads = []
+        orig_read = os.read
+
+        def fake_read(fd, size):
+            data = orig_read(fd, size)
+            reads.append(len(data))
+            return data
+
+        self.stubs.Set(os, 'read', fake_read)
+        copied = self._copy(4 << 20)
+        # The copy stops after the last block with any data in it.
+        self.assertEqual('\0' * (1 << 20) + 'data' + '\0' * 4092, copied)
+        fd = os.open(self.src_path, os.O_RDONLY)
+        try:
+            region = vm_utils._find_data(fd, 0, 4 << 20)
+        finally:
+            os.close(fd)
+        if region != (0, 4 << 20):
+            # The filesystem knows where the holes are, so they are not
+            # read at all.
+            self.assertTrue(sum(reads) < 1 << 20)
+
+    def test_no_seek_data_support(self):
+        def fake_lseek(fd, offset, whence):
+            if whence in (vm_utils.SEEK_DATA, vm_utils.SEEK_HOLE):
+                raise OSError(errno.EINVAL, 'Invalid argument')
+            return orig_lseek(fd, offset, whence)
+
+        orig_lseek = os.lseek
+        self.stubs.Set(os, 'lseek', fake_lseek)
+        data = 'a' * 4096 + '\0' * 4096 * 10 + 'b' * 4096
+        self._write_src([(0, data)])
+        self.assertEqual(data, self._copy(len(data)))
@@ -45,6 +45,7 @@ from xml.sax import saxutils
 from eventlet import event
 from eventlet.green import subprocess
 from eventlet import greenthread
+from eventlet import semaphore
 import netaddr
 
 from oslo.config import cfg
@@ -657,6 +658,35 @@ class DynamicLoopingCall(LoopingCallBase):
         return self.done
 
 
+class CoalescedCall(object):
+    """Calls a function for any number of callers, one call at a time.
+
+    A caller that has to wait for a call already under way, and finds
+    that a call made after it arrived has since returned, gets that
+    call's result instead of making another.  Calls that raise are not
+    shared.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self._lock = semaphore.Semaphore()
+        self._started = 0
+        self._finished = 0
+        self._result = None
+
+    def __call__(self):
+        arrival = self._started
+        with self._lock:
+            if self._finished > arrival:
+                return self._result
+            self._started += 1
+            call_id = self._started
+            result = self.f()
+            self._finished = call_id
+            self._result = result
+            return result
+
+
 class ProtectedExpatParser(expatreader.ExpatParser):
     """An expat parser which disables DTD's and entities by default."""
 
@@ -70,6 +70,13 @@ class PowerManager(object):
         """Returns True or False according as the node's power state."""
         return True
 
+    @classmethod
+    def forget_other_nodes(cls, node_ids):
+        """Drops anything kept for nodes other than those in node_ids,
+        which are the nodes of this host in use by instances.
+        """
+        pass
+
     # TODO(NTTdocomo): split out console methods to its own class
     def start_console(self):
         pass
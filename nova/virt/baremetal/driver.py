@@ -21,6 +21,7 @@
 A driver for Bare-metal platform.
 """
 
+from eventlet import greenpool
 from oslo.config import cfg
 
 from nova.compute import power_state
@@ -65,6 +66,10 @@ opts = [
     cfg.StrOpt('tftp_root',
                default='/tftpboot',
                help='Baremetal compute node\'s tftp root path'),
+    cfg.IntOpt('power_state_workers',
+               default=32,
+               help='Maximum number of nodes whose power state is queried '
+                    'at once'),
     ]
 
 
@@ -358,6 +363,9 @@ class BareMetalDriver(driver.ComputeDriver):
         #             so we convert from InstanceNotFound
         inst_uuid = instance.get('uuid')
         node = _get_baremetal_node_by_instance_uuid(inst_uuid)
+        return self._get_node_info(node, instance)
+
+    def _get_node_info(self, node, instance):
         pm = get_power_manager(node=node, instance=instance)
         ps = power_state.SHUTDOWN
         if pm.is_power_on():
@@ -368,6 +376,39 @@ class BareMetalDriver(driver.ComputeDriver):
                 'num_cpu': node['cpus'],
                 'cpu_time': 0}
 
+    def get_info_all(self):
+        """Return info about every instance on this host, keyed by name.
+
+        The power states of up to CONF.baremetal.power_state_workers
+        nodes are queried at once.  Instances whose power state could
+        not be read are left out.  The power manager is told which nodes
+        are still in use, so it can drop what it keeps for the others.
+        """
+        context = nova_context.get_admin_context()
+        instances = dict((instance['uuid'], instance) for instance in
+                         self.virtapi.instance_get_all_by_host(context,
+                                                               CONF.host))
+        nodes = db.bm_node_get_associated(context, service_host=CONF.host)
+        pm_class = importutils.import_class(CONF.baremetal.power_manager)
+        pm_class.forget_other_nodes([node['id'] for node in nodes])
+        nodes = [node for node in nodes
+                 if node['instance_uuid'] in instances]
+
+        def _get_info(node):
+            instance = instances[node['instance_uuid']]
+            try:
+                return instance['name'], self._get_node_info(node, instance)
+            except Exception, e:
+                LOG.warn(_("Unable to get the power state of baremetal node "
+                           "%(node)s: %(e)s") % {'node': node['uuid'],
+                                                 'e': e})
+                return instance['name'], None
+
+        pool = greenpool.GreenPool(CONF.baremetal.power_state_workers)
+        return dict((name, info)
+                    for name, info in pool.imap(_get_info, nodes)
+                    if info is not None)
+
     def refresh_security_group_rules(self, security_group_id):
         self.firewall_driver.refresh_security_group_rules(security_group_id)
         return True
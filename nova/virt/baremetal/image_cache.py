@@ -0,0 +1,167 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+A cache of master copies of the images fetched for baremetal instances.
+
+Each image is downloaded once into a master directory, under a name
+derived from its image id, and given to instances as a hard link, or as
+a copy where the instance modifies its file.  Once the cache grows past
+its size limit, masters that no instance links to are removed, least
+recently used first.
+"""
+
+import errno
+import hashlib
+import os
+import re
+
+from oslo.config import cfg
+
+from nova.openstack.common import fileutils
+from nova.openstack.common import lockutils
+from nova.openstack.common import log as logging
+from nova import utils
+from nova.virt.libvirt import utils as libvirt_utils
+
+image_cache_opts = [
+    cfg.StrOpt('master_image_dir_name',
+               default='master_images',
+               help='Directory under tftp_root and instances_path where '
+                    'master copies of baremetal images are kept'),
+    cfg.IntOpt('master_image_cache_size',
+               default=20480,
+               help='Size in MB each master image directory may grow to '
+                    'before unused images are removed, 0 for no limit'),
+    ]
+
+baremetal_group = cfg.OptGroup(name='baremetal',
+                               title='Baremetal Options')
+
+CONF = cfg.CONF
+CONF.register_group(baremetal_group)
+CONF.register_opts(image_cache_opts, baremetal_group)
+CONF.import_opt('instances_path', 'nova.compute.manager')
+
+LOG = logging.getLogger(__name__)
+
+_MASTER_NAME = re.compile(r'^[0-9a-f]{40}$')
+
+
+class ImageCache(object):
+    """Master copies of images under one root directory."""
+
+    def __init__(self, root):
+        self.master_dir = os.path.join(root,
+                                       CONF.baremetal.master_image_dir_name)
+        self.lock_path = os.path.join(CONF.instances_path, 'locks')
+
+    def _master_path(self, image_id):
+        return os.path.join(self.master_dir,
+                            hashlib.sha1(str(image_id)).hexdigest())
+
+    def _synchronized(self, master):
+        lock_name = 'baremetal-image-%s' % hashlib.sha1(master).hexdigest()
+        return lockutils.synchronized(lock_name, 'nova-', external=True,
+                                      lock_path=self.lock_path)
+
+    def fetch_image(self, context, target, image_id, user_id, project_id,
+                    copy=False):
+        """Put the image at target, downloading it into the cache first
+        unless it is already there.
+
+        :param copy: give target a copy of its own rather than a link to
+                     the master, for files that are modified in place.
+        """
+        if os.path.exists(target):
+            return
+        master = self._master_path(image_id)
+
+        @self._synchronized(master)
+        def _fetch_master_and_link():
+            if not os.path.exists(master):
+                fileutils.ensure_tree(self.master_dir)
+                LOG.debug(_("Fetching image %(image_id)s into the master "
+                            "image cache %(master_dir)s") %
+                          {'image_id': image_id,
+                           'master_dir': self.master_dir})
+                libvirt_utils.fetch_image(context, master, image_id,
+                                          user_id, project_id)
+            # NOTE: The modification time of a master records when it was
+            # last used, so that eviction can go least recently used first.
+            os.utime(master, None)
+            if copy:
+                utils.execute('cp', '--reflink=auto', master, target)
+                return
+            try:
+                os.link(master, target)
+            except OSError, e:
+                if e.errno != errno.EXDEV:
+                    raise
+                utils.execute('cp', master, target)
+
+        _fetch_master_and_link()
+        self.clean_up()
+
+    def clean_up(self):
+        """Remove unused masters, least recently used first, until the
+        cache is within CONF.baremetal.master_image_cache_size.
+        """
+        max_size = CONF.baremetal.master_image_cache_size * 1024 * 1024
+        if max_size <= 0:
+            return
+        try:
+            names = os.listdir(self.master_dir)
+        except OSError:
+            return
+
+        masters = []
+        total_size = 0
+        for name in names:
+            if not _MASTER_NAME.match(name):
+                continue
+            path = os.path.join(self.master_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            total_size += st.st_size
+            masters.append((st.st_mtime, path))
+
+        for mtime, path in sorted(masters):
+            if total_size <= max_size:
+                break
+            total_size -= self._remove_if_unused(path)
+
+    def _remove_if_unused(self, master):
+        """Remove the master if no instance links to it.
+
+        :returns: the size of the removed master, or 0.
+        """
+        @self._synchronized(master)
+        def _remove():
+            try:
+                st = os.stat(master)
+            except OSError:
+                return 0
+            if st.st_nlink > 1:
+                return 0
+            LOG.info(_("Removing unused master image %s") % master)
+            os.unlink(master)
+            return st.st_size
+
+        return _remove()
@@ -25,10 +25,14 @@ import os
 import stat
 import tempfile
 
+from eventlet import event
 from oslo.config import cfg
 
 from nova import exception
+from nova.openstack.common import excutils
+from nova.openstack.common import fileutils
 from nova.openstack.common import log as logging
+from nova.openstack.common import timeutils
 from nova import paths
 from nova import utils
 from nova.virt.baremetal import baremetal_states
@@ -48,6 +52,10 @@ opts = [
     cfg.IntOpt('ipmi_power_retry',
                default=5,
                help='maximal number of retries for IPMI operations'),
+    cfg.IntOpt('ipmi_power_state_ttl',
+               default=10,
+               help='seconds a node power state read over IPMI is reused '
+                    'for, 0 to always read it'),
     ]
 
 baremetal_group = cfg.OptGroup(name='baremetal',
@@ -59,15 +67,70 @@ CONF.register_opts(opts, baremetal_group)
 
 LOG = logging.getLogger(__name__)
 
+# Password files by node id, as (password, path).
+_password_files = {}
+
+# Whether files left in the password directory by an earlier run have been
+# removed.
+_password_dir_cleaned = False
+
+# Power status output by node id, as (time read, output).
+_power_states = {}
+
+# Events for the power status queries in progress, by node id.
+_power_queries = {}
+
+
+def _get_password_dir():
+    """Returns the directory holding the password files passed to ipmitool.
+
+    It sits next to CONF.baremetal.terminal_pid_dir.  Files left there by
+    an earlier run are removed the first time it is used.
+    """
+    global _password_dir_cleaned
+    path = os.path.join(os.path.dirname(
+            os.path.normpath(CONF.baremetal.terminal_pid_dir)), 'ipmi')
+    if not _password_dir_cleaned:
+        fileutils.ensure_tree(path)
+        os.chmod(path, stat.S_IRWXU)
+        for name in os.listdir(path):
+            bm_utils.unlink_without_raise(os.path.join(path, name))
+        _password_dir_cleaned = True
+    return path
+
 
 def _make_password_file(password):
-    fd, path = tempfile.mkstemp()
+    fd, path = tempfile.mkstemp(dir=_get_password_dir())
     os.fchmod(fd, stat.S_IRUSR | stat.S_IWUSR)
     with os.fdopen(fd, "w") as f:
         f.write(password)
     return path
 
 
+def _get_password_file(node_id, password):
+    """Returns the path of a file holding the node's password.
+
+    The file is written once per node and reused for as long as the
+    password stays the same.
+    """
+    entry = _password_files.get(node_id)
+    if entry is not None:
+        old_password, path = entry
+        if old_password == password and os.path.exists(path):
+            return path
+        bm_utils.unlink_without_raise(path)
+    path = _make_password_file(password)
+    _password_files[node_id] = (password, path)
+    return path
+
+
+def _remove_password_file(node_id):
+    """Removes the node's password file, if it has one."""
+    entry = _password_files.pop(node_id, None)
+    if entry is not None:
+        bm_utils.unlink_without_raise(entry[1])
+
+
 def _get_console_pid_path(node_id):
     name = "%s.pid" % node_id
     path = os.path.join(CONF.baremetal.terminal_pid_dir, name)
@@ -125,21 +188,49 @@ class IPMI(base.PowerManager):
                 self.address,
                 '-U',
                 self.user,
-                '-f']
-        pwfile = _make_password_file(self.password)
+                '-f',
+                _get_password_file(self.node_id, self.password)]
+        args.extend(command.split(" "))
+        out, err = utils.execute(*args, attempts=3)
+        LOG.debug(_("ipmitool stdout: '%(out)s', stderr: '%(err)s'"),
+                  locals())
+        return out, err
+
+    def _get_power_status(self, refresh=True):
+        """Returns the output of 'power status' for the node.
+
+        Unless refresh is set, output read less than
+        CONF.baremetal.ipmi_power_state_ttl seconds ago is reused, and a
+        caller arriving while the node is already being queried waits
+        for that query instead of starting another.
+        """
+        if not refresh:
+            cached = _power_states.get(self.node_id)
+            if (cached is not None and timeutils.utcnow_ts() - cached[0] <
+                    CONF.baremetal.ipmi_power_state_ttl):
+                return cached[1]
+            query = _power_queries.get(self.node_id)
+            if query is not None:
+                return query.wait()
+
+        query = event.Event()
+        _power_queries[self.node_id] = query
         try:
-            args.append(pwfile)
-            args.extend(command.split(" "))
-            out, err = utils.execute(*args, attempts=3)
-            LOG.debug(_("ipmitool stdout: '%(out)s', stderr: '%(err)s'"),
-                      locals())
-            return out, err
+            out = self._exec_ipmitool("power status")[0]
+        except Exception, e:
+            with excutils.save_and_reraise_exception():
+                query.send_exception(e)
+        else:
+            _power_states[self.node_id] = (timeutils.utcnow_ts(), out)
+            query.send(out)
+            return out
         finally:
-            bm_utils.unlink_without_raise(pwfile)
+            if _power_queries.get(self.node_id) is query:
+                del _power_queries[self.node_id]
 
-    def _is_power(self, state):
-        out_err = self._exec_ipmitool("power status")
-        return out_err[0] == ("Chassis Power is %s\n" % state)
+    def _is_power(self, state, refresh=True):
+        out = self._get_power_status(refresh=refresh)
+        return out == ("Chassis Power is %s\n" % state)
 
     def _power_on(self):
         """Turn the power to this node ON."""
@@ -210,10 +301,17 @@ class IPMI(base.PowerManager):
     def deactivate_node(self):
         """Turns the power to node OFF, regardless of current state."""
         self._power_off()
+        _remove_password_file(self.node_id)
         return self.state
 
+    @classmethod
+    def forget_other_nodes(cls, node_ids):
+        """Removes the password files of nodes not in node_ids."""
+        for node_id in set(_password_files) - set(node_ids):
+            _remove_password_file(node_id)
+
     def is_power_on(self):
-        return self._is_power("on")
+        return self._is_power("on", refresh=False)
 
     def start_console(self):
         if not self.port:
@@ -35,6 +35,7 @@ from nova import utils
 from nova.virt.baremetal import baremetal_states
 from nova.virt.baremetal import base
 from nova.virt.baremetal import db
+from nova.virt.baremetal import image_cache
 from nova.virt.baremetal import utils as bm_utils
 
 pxe_opts = [
@@ -239,6 +240,9 @@ class PXE(base.NodeDriver):
 
     def __init__(self):
         super(PXE, self).__init__()
+        self.tftp_image_cache = image_cache.ImageCache(
+                CONF.baremetal.tftp_root)
+        self.image_cache = image_cache.ImageCache(CONF.instances_path)
 
     def _collect_mac_addresses(self, context, node):
         macs = set()
@@ -257,7 +261,7 @@ class PXE(base.NodeDriver):
                         instance['name'])
         for label in image_info.keys():
             (uuid, path) = image_info[label]
-            bm_utils.cache_image(
+            self.tftp_image_cache.fetch_image(
                     context=context,
                     target=path,
                     image_id=uuid,
@@ -287,12 +291,14 @@ class PXE(base.NodeDriver):
 
         LOG.debug(_("Fetching image %(ami)s for instance %(name)s") %
                         {'ami': image_meta['id'], 'name': instance['name']})
-        bm_utils.cache_image(context=context,
-                             target=image_path,
-                             image_id=image_meta['id'],
-                             user_id=instance['user_id'],
-                             project_id=instance['project_id']
-                        )
+        # NOTE: Files are injected into the image afterwards, so the
+        # instance needs a copy of its own rather than a link to the master.
+        self.image_cache.fetch_image(context=context,
+                                     target=image_path,
+                                     image_id=image_meta['id'],
+                                     user_id=instance['user_id'],
+                                     project_id=instance['project_id'],
+                                     copy=True)
 
         return [image_meta['id'], image_path]
 
@@ -352,6 +358,7 @@ class PXE(base.NodeDriver):
         """Delete instance's image file."""
         bm_utils.unlink_without_raise(get_image_file_path(instance))
         bm_utils.rmtree_without_raise(get_image_dir_path(instance))
+        self.image_cache.clean_up()
 
     def activate_bootloader(self, context, node, instance):
         """Configure PXE boot loader for an instance
@@ -436,6 +443,7 @@ class PXE(base.NodeDriver):
 
         bm_utils.rmtree_without_raise(
                 os.path.join(CONF.baremetal.tftp_root, instance['uuid']))
+        self.tftp_image_cache.clean_up()
 
     def activate_node(self, context, node, instance):
         """Wait for PXE deployment to complete."""
@@ -154,6 +154,16 @@ class ComputeDriver(object):
         # TODO(Vek): Need to pass context in for access to auth_token
         raise NotImplementedError()
 
+    def get_info_all(self):
+        """Get the current status of all instances on the host at once.
+
+        Returns a dict mapping instance name to a dict in the format
+        returned by get_info().  Drivers that can gather this in a
+        single pass should implement it, so that periodic tasks don't
+        have to call get_info() once per instance.
+        """
+        raise NotImplementedError()
+
     def get_num_instances(self):
         """Return the total number of virtual machines.
 
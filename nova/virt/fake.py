@@ -246,6 +246,14 @@ class FakeDriver(driver.ComputeDriver):
                 'num_cpu': 2,
                 'cpu_time': 0}
 
+    def get_info_all(self):
+        return dict((name, {'state': i.state,
+                            'max_mem': 0,
+                            'mem': 0,
+                            'num_cpu': 2,
+                            'cpu_time': 0})
+                    for name, i in self.instances.iteritems())
+
     def get_diagnostics(self, instance_name):
         return {'cpu0_time': 17300000000,
                 'memory': 524288,
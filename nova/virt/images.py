@@ -23,6 +23,7 @@ Handling of VM disk images.
 
 import os
 import re
+import struct
 
 from oslo.config import cfg
 
@@ -184,6 +185,52 @@ def qemu_img_info(path):
     return QemuImgInfo(out)
 
 
+# The start of a qcow2 header: magic, version, backing file offset,
+# backing file name length, cluster bits and virtual size, all big endian.
+QCOW2_HEADER = struct.Struct('>4sIQIIQ')
+QCOW2_MAGIC = 'QFI\xfb'
+QCOW2_MAX_BACKING_FILE_NAME = 1023
+
+
+def qcow2_header_info(path):
+    """Return the virtual size and backing file of a qcow2 image.
+
+    The image header is read directly instead of running qemu-img info.
+    Returns None if path can't be read or doesn't hold a qcow2 header
+    this understands, in which case callers should use qemu_img_info().
+    """
+    try:
+        with open(path, 'rb') as image:
+            header = image.read(QCOW2_HEADER.size)
+            if len(header) != QCOW2_HEADER.size:
+                return None
+            (magic, version, backing_file_offset, backing_file_size,
+             _cluster_bits, virtual_size) = QCOW2_HEADER.unpack(header)
+            if magic != QCOW2_MAGIC or version not in (2, 3):
+                return None
+
+            backing_file = None
+            if backing_file_offset:
+                if backing_file_size > QCOW2_MAX_BACKING_FILE_NAME:
+                    return None
+                image.seek(backing_file_offset)
+                backing_file = image.read(backing_file_size)
+                if len(backing_file) != backing_file_size:
+                    return None
+                if not os.path.isabs(backing_file):
+                    backing_file = os.path.join(os.path.dirname(path),
+                                                backing_file)
+    except IOError:
+        return None
+
+    info = QemuImgInfo(None)
+    info.image = path
+    info.file_format = 'qcow2'
+    info.virtual_size = virtual_size
+    info.backing_file = backing_file
+    return info
+
+
 def convert_image(source, dest, out_format, run_as_root=False):
     """Convert image to other format."""
     cmd = ('qemu-img', 'convert', '-O', out_format, source, dest)
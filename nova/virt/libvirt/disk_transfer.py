@@ -0,0 +1,144 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Copies the disks of an instance to another host for resize and cold
+migration.
+
+The disks are copied concurrently.  Whether the data is compressed on the
+way is decided per disk: mostly empty sparse disks are always compressed,
+as their holes are otherwise sent as zeros, and other disks are compressed
+only once a transfer to the host has shown its link to be slow.
+"""
+
+import os
+import sys
+import time
+
+from eventlet import greenpool
+from oslo.config import cfg
+
+from nova.openstack.common import log as logging
+from nova.virt.libvirt import utils as libvirt_utils
+
+disk_transfer_opts = [
+    cfg.IntOpt('libvirt_disk_transfer_workers',
+               default=4,
+               help='Number of disks copied at the same time when an '
+                    'instance is resized or migrated'),
+    cfg.StrOpt('libvirt_disk_transfer_compression',
+               default='auto',
+               help='Compress disks copied to another host: always, never '
+                    'or auto, to compress sparse disks and disks sent over '
+                    'links slower than libvirt_disk_transfer_fast_link'),
+    cfg.IntOpt('libvirt_disk_transfer_fast_link',
+               default=100,
+               help='Rate in MB/s at which a link to another host is '
+                    'considered fast enough to send disks uncompressed'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(disk_transfer_opts)
+
+LOG = logging.getLogger(__name__)
+
+# The rate in bytes per second of the last uncompressed transfer to each
+# host.  Transfers smaller than _MIN_RATE_SAMPLE take too little time to
+# say much about the link and are not counted.
+_link_rates = {}
+_MIN_RATE_SAMPLE = 64 * 1024 * 1024
+
+
+def _is_sparse(path):
+    """Whether less than half of the file is allocated."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return st.st_blocks * 512 < st.st_size / 2
+
+
+def use_compression(host, path):
+    """Whether to compress the disk at path when sending it to host."""
+    mode = CONF.libvirt_disk_transfer_compression
+    if mode != 'auto':
+        return mode == 'always'
+    if _is_sparse(path):
+        return True
+    rate = _link_rates.get(host)
+    return (rate is not None and
+            rate < CONF.libvirt_disk_transfer_fast_link * 1024 * 1024)
+
+
+class DiskTransfer(object):
+    """Copies disks to one host, several at a time."""
+
+    def __init__(self, host, progress_callback=None):
+        """
+        :param host: the host to copy to, or None for a local copy
+        :param progress_callback: called with the percentage of the data
+                                  copied each time a job completes
+        """
+        self.host = host
+        self.progress_callback = progress_callback
+
+    def copy(self, src, dest, size):
+        """Copy the disk at src, of size bytes, to dest on the host."""
+        compression = self.host is not None and use_compression(self.host,
+                                                                 src)
+        start = time.time()
+        libvirt_utils.copy_image(src, dest, host=self.host,
+                                 compression=compression)
+        elapsed = max(time.time() - start, 0.001)
+        rate = size / elapsed
+        if (self.host is not None and not compression and
+                size >= _MIN_RATE_SAMPLE):
+            _link_rates[self.host] = rate
+        LOG.info(_("Copied %(size)d bytes from %(src)s to %(host)s in "
+                   "%(elapsed).1fs (%(rate).1f MB/s, compression "
+                   "%(compression)s)"),
+                 {'size': size, 'src': src, 'host': self.host or 'localhost',
+                  'elapsed': elapsed, 'rate': rate / (1024 * 1024),
+                  'compression': compression and 'on' or 'off'})
+
+    def run(self, jobs):
+        """Run the jobs, waiting for all of them even if one fails.
+
+        :param jobs: a list of (function, weight) pairs, where the weight
+                     is the number of bytes the function copies.
+        :raises: the first exception raised by a job.
+        """
+        self._total = sum(weight for func, weight in jobs) or 1
+        self._done = 0
+        pool = greenpool.GreenPool(CONF.libvirt_disk_transfer_workers)
+        threads = [pool.spawn(self._run_job, func, weight)
+                   for func, weight in jobs]
+        exc_info = None
+        for thread in threads:
+            try:
+                thread.wait()
+            except Exception:
+                if exc_info is None:
+                    exc_info = sys.exc_info()
+        if exc_info is not None:
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+    def _run_job(self, func, weight):
+        func()
+        self._done += weight
+        if self.progress_callback:
+            self.progress_callback(round(self._done * 100.0 / self._total))
@@ -83,8 +83,10 @@ from nova.virt.disk import api as disk
 from nova.virt import driver
 from nova.virt import event as virtevent
 from nova.virt import firewall
+from nova.virt import images
 from nova.virt.libvirt import blockinfo
 from nova.virt.libvirt import config as vconfig
+from nova.virt.libvirt import disk_transfer
 from nova.virt.libvirt import firewall as libvirt_firewall
 from nova.virt.libvirt import imagebackend
 from nova.virt.libvirt import imagecache
@@ -216,6 +218,7 @@ CONF.import_opt('use_cow_images', 'nova.virt.driver')
 CONF.import_opt('live_migration_retry_count', 'nova.compute.manager')
 CONF.import_opt('vncserver_proxyclient_address', 'nova.vnc')
 CONF.import_opt('server_proxyclient_address', 'nova.spice', group='spice')
+CONF.import_opt('base_dir_name', 'nova.virt.libvirt.imagecache')
 
 DEFAULT_FIREWALL_DRIVER = "%s.%s" % (
     libvirt_firewall.__name__,
@@ -299,6 +302,7 @@ class LibvirtDriver(driver.ComputeDriver):
         self._fc_wwpns = None
         self._wrapped_conn = None
         self._caps = None
+        self._cpu_info = None
         self.read_only = read_only
         self.firewall_driver = firewall.load_driver(
             DEFAULT_FIREWALL_DRIVER,
@@ -315,6 +319,9 @@ class LibvirtDriver(driver.ComputeDriver):
         self._event_queue = None
 
         self._disk_cachemode = None
+        # Maps a disk path to its (inode, mtime, size) stat key and the
+        # (virtual size, backing file) read for it.
+        self._disk_geometry_cache = {}
         self.image_cache_manager = imagecache.ImageCacheManager()
         self.image_backend = imagebackend.Backend(CONF.use_cow_images)
 
@@ -516,6 +523,10 @@ class LibvirtDriver(driver.ComputeDriver):
     def _get_connection(self):
         if not self._wrapped_conn or not self._test_connection():
             LOG.debug(_('Connecting to libvirt: %s'), self.uri)
+            # The host may have changed underneath a new connection, so
+            # re-read its capabilities.
+            self._caps = None
+            self._cpu_info = None
             if not CONF.libvirt_nonblocking:
                 self._wrapped_conn = self._connect(self.uri,
                                                self.read_only)
@@ -2296,6 +2307,10 @@ class LibvirtDriver(driver.ComputeDriver):
 
         """
         virt_dom = self._lookup_by_name(instance['name'])
+        return self._get_domain_info(virt_dom)
+
+    @staticmethod
+    def _get_domain_info(virt_dom):
         (state, max_mem, mem, num_cpu, cpu_time) = virt_dom.info()
         return {'state': LIBVIRT_POWER_STATE[state],
                 'max_mem': max_mem,
@@ -2304,6 +2319,43 @@ class LibvirtDriver(driver.ComputeDriver):
                 'cpu_time': cpu_time,
                 'id': virt_dom.ID()}
 
+    def get_info_all(self):
+        """Retrieve information from libvirt for all domains in one pass.
+
+        Running domains are listed by ID and defined domains by name, and
+        each is looked up and queried once.  Domains that disappear while
+        listing are skipped.  The result includes dom0 on Xen hosts.
+
+        """
+        infos = {}
+        dom_ids = self.list_instance_ids()
+        for dom_id in dom_ids:
+            try:
+                virt_dom = self._conn.lookupByID(dom_id)
+                infos[virt_dom.name()] = self._get_domain_info(virt_dom)
+            except libvirt.libvirtError as err:
+                if err.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
+                    LOG.debug(_("List of domains returned by libVirt: %s")
+                              % dom_ids)
+                    LOG.warn(_("libVirt can't find a domain with id: %s")
+                             % dom_id)
+                    continue
+                raise
+            # NOTE(gtt116): give change to do other task.
+            greenthread.sleep(0)
+
+        for name in self._conn.listDefinedDomains():
+            if name in infos:
+                continue
+            try:
+                virt_dom = self._conn.lookupByName(name)
+                infos[name] = self._get_domain_info(virt_dom)
+            except libvirt.libvirtError as err:
+                if err.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
+                    continue
+                raise
+        return infos
+
     def _create_domain(self, xml=None, domain=None,
                        instance=None, launch_flags=0):
         """Create a domain.
@@ -2399,8 +2451,11 @@ class LibvirtDriver(driver.ComputeDriver):
         Returns a list of all block devices for this domain.
         """
         domain = self._lookup_by_name(instance_name)
-        xml = domain.XMLDesc(0)
+        return self._get_disk_targets(domain.XMLDesc(0))
 
+    @staticmethod
+    def _get_disk_targets(xml):
+        """Returns the target devices of the disks in a domain xml."""
         try:
             doc = etree.fromstring(xml)
         except Exception:
@@ -2485,9 +2540,16 @@ class LibvirtDriver(driver.ComputeDriver):
 
         return info
 
-    def get_vcpu_used(self):
+    @staticmethod
+    def _running_domains(domains_info):
+        # Defined but inactive domains have an ID of -1.
+        return [info for info in domains_info.itervalues()
+                if info['id'] != -1]
+
+    def get_vcpu_used(self, domains_info=None):
         """Get vcpu usage number of physical computer.
 
+        :param domains_info: result of get_info_all(), if already fetched
         :returns: The total number of vcpu that currently used.
 
         """
@@ -2496,27 +2558,16 @@ class LibvirtDriver(driver.ComputeDriver):
         if CONF.libvirt_type == 'lxc':
             return total + 1
 
-        dom_ids = self.list_instance_ids()
-        for dom_id in dom_ids:
-            try:
-                dom = self._conn.lookupByID(dom_id)
-                vcpus = dom.vcpus()
-                total += len(vcpus[1])
-            except libvirt.libvirtError as err:
-                if err.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
-                    LOG.debug(_("List of domains returned by libVirt: %s")
-                              % dom_ids)
-                    LOG.warn(_("libVirt can't find a domain with id: %s")
-                             % dom_id)
-                    continue
-                raise
-            # NOTE(gtt116): give change to do other task.
-            greenthread.sleep(0)
+        if domains_info is None:
+            domains_info = self.get_info_all()
+        for info in self._running_domains(domains_info):
+            total += info['num_cpu']
         return total
 
-    def get_memory_mb_used(self):
+    def get_memory_mb_used(self, domains_info=None):
         """Get the free memory size(MB) of physical computer.
 
+        :param domains_info: result of get_info_all(), if already fetched
         :returns: the total usage of memory(MB).
 
         """
@@ -2529,10 +2580,13 @@ class LibvirtDriver(driver.ComputeDriver):
         idx2 = m.index('Buffers:')
         idx3 = m.index('Cached:')
         if CONF.libvirt_type == 'xen':
+            if domains_info is None:
+                domains_info = self.get_info_all()
             used = 0
-            for domain_id in self.list_instance_ids():
+            for info in self._running_domains(domains_info):
+                domain_id = info['id']
                 # skip dom0
-                dom_mem = int(self._conn.lookupByID(domain_id).info()[2])
+                dom_mem = int(info['mem'])
                 if domain_id != 0:
                     used += dom_mem
                 else:
@@ -2610,6 +2664,9 @@ class LibvirtDriver(driver.ComputeDriver):
 
         """
 
+        if self._cpu_info:
+            return self._cpu_info
+
         caps = self.get_host_capabilities()
         cpu_info = dict()
 
@@ -2637,7 +2694,8 @@ class LibvirtDriver(driver.ComputeDriver):
         # That said, arch_filter.py now seems to rely on
         # the libvirt drivers format which suggests this
         # data format needs to be standardized across drivers
-        return jsonutils.dumps(cpu_info)
+        self._cpu_info = jsonutils.dumps(cpu_info)
+        return self._cpu_info
 
     def get_all_volume_usage(self, context, compute_host_bdms):
         """Return usage info for volumes attached to vms on
@@ -2647,19 +2705,25 @@ class LibvirtDriver(driver.ComputeDriver):
         for instance_bdms in compute_host_bdms:
             instance = instance_bdms['instance']
 
+            mountpoints = []
             for bdm in instance_bdms['instance_bdms']:
-                vol_stats = []
                 mountpoint = bdm['device_name']
                 if mountpoint.startswith('/dev/'):
                     mountpoint = mountpoint[5:]
+                mountpoints.append((mountpoint, bdm['volume_id']))
 
-                LOG.debug(_("Trying to get stats for the volume %s"),
-                            bdm['volume_id'])
-                vol_stats = self.block_stats(instance['name'], mountpoint)
+            LOG.debug(_("Trying to get stats for the volumes %s"),
+                      [volume_id for mountpoint, volume_id in mountpoints],
+                      instance=instance)
+            all_stats = self._get_all_block_stats(
+                    instance['name'], [mountpoint for mountpoint, volume_id
+                                       in mountpoints])
 
+            for mountpoint, volume_id in mountpoints:
+                vol_stats = all_stats.get(mountpoint)
                 if vol_stats:
                     rd_req, rd_bytes, wr_req, wr_bytes, flush_ops = vol_stats
-                    vol_usage.append(dict(volume=bdm['volume_id'],
+                    vol_usage.append(dict(volume=volume_id,
                                           instance=instance,
                                           rd_req=rd_req,
                                           rd_bytes=rd_bytes,
@@ -2668,6 +2732,42 @@ class LibvirtDriver(driver.ComputeDriver):
                                           flush_operations=flush_ops))
         return vol_usage
 
+    def _get_all_block_stats(self, instance_name, disks):
+        """Return a dict of the block stats of each of the disks of the
+        instance, looking the domain up only once.
+
+        Disks that are no longer attached to the domain are left out.
+        """
+        try:
+            domain = self._lookup_by_name(instance_name)
+            attached = set(self._get_disk_targets(domain.XMLDesc(0)))
+        except libvirt.libvirtError as e:
+            errcode = e.get_error_code()
+            LOG.info(_("Getting block stats failed, domain might have "
+                       "been removed. Code=%(errcode)s Error=%(e)s")
+                       % locals())
+            return {}
+        except exception.InstanceNotFound:
+            LOG.info(_("Could not find domain in libvirt for instance %s. "
+                       "Cannot get block stats for devices") % instance_name)
+            return {}
+
+        all_stats = {}
+        for disk in disks:
+            if disk not in attached:
+                LOG.debug(_("Device %(disk)s is not attached to "
+                            "%(instance_name)s, skipping its block stats")
+                          % locals())
+                continue
+            try:
+                all_stats[disk] = domain.blockStats(disk)
+            except libvirt.libvirtError as e:
+                errcode = e.get_error_code()
+                LOG.info(_("Getting block stats failed, device might have "
+                           "been detached. Code=%(errcode)s Error=%(e)s")
+                           % locals())
+        return all_stats
+
     def block_stats(self, instance_name, disk):
         """
         Note that this function takes an instance name.
@@ -2738,11 +2838,12 @@ class LibvirtDriver(driver.ComputeDriver):
             return (available_least / (1024 ** 3))
 
         disk_info_dict = self.get_local_gb_info()
+        domains_info = self.get_info_all()
         dic = {'vcpus': self.get_vcpu_total(),
                'memory_mb': self.get_memory_mb_total(),
                'local_gb': disk_info_dict['total'],
-               'vcpus_used': self.get_vcpu_used(),
-               'memory_mb_used': self.get_memory_mb_used(),
+               'vcpus_used': self.get_vcpu_used(domains_info),
+               'memory_mb_used': self.get_memory_mb_used(domains_info),
                'local_gb_used': disk_info_dict['used'],
                'hypervisor_type': self.get_hypervisor_type(),
                'hypervisor_version': self.get_hypervisor_version(),
@@ -3260,12 +3361,13 @@ class LibvirtDriver(driver.ComputeDriver):
 
             # get the real disk size or
             # raise a localized error if image is unavailable
-            dk_size = int(os.path.getsize(path))
+            stat = os.stat(path)
+            dk_size = int(stat.st_size)
 
             disk_type = driver_nodes[cnt].get('type')
             if disk_type == "qcow2":
-                backing_file = libvirt_utils.get_disk_backing_file(path)
-                virt_size = disk.get_disk_size(path)
+                virt_size, backing_file = self._get_qcow2_geometry(path,
+                                                                   stat)
             else:
                 backing_file = ""
                 virt_size = 0
@@ -3277,16 +3379,43 @@ class LibvirtDriver(driver.ComputeDriver):
                               'disk_size': dk_size})
         return jsonutils.dumps(disk_info)
 
+    def _get_qcow2_geometry(self, path, stat):
+        """Return the virtual size and backing file of a qcow2 disk.
+
+        Results are cached until the file's inode, mtime or size change,
+        and are read from the image header where possible so that the
+        periodic resource audit doesn't fork qemu-img for every disk.
+        """
+        key = (stat.st_ino, stat.st_mtime, stat.st_size)
+        cached = self._disk_geometry_cache.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        info = images.qcow2_header_info(path)
+        if info:
+            virt_size = info.virtual_size
+            backing_file = info.backing_file
+            if backing_file:
+                backing_file = os.path.basename(backing_file)
+        else:
+            backing_file = libvirt_utils.get_disk_backing_file(path)
+            virt_size = disk.get_disk_size(path)
+
+        self._disk_geometry_cache[path] = (key, (virt_size, backing_file))
+        return virt_size, backing_file
+
     def get_disk_over_committed_size_total(self):
         """Return total over committed disk size for all instances."""
         # Disk size that all instance uses : virtual_size - disk_size
         instances_name = self.list_instances()
         disk_over_committed_size = 0
+        disk_paths = set()
         for i_name in instances_name:
             try:
                 disk_infos = jsonutils.loads(
                         self.get_instance_disk_info(i_name))
                 for info in disk_infos:
+                    disk_paths.add(info['path'])
                     i_vt_sz = int(info['virt_disk_size'])
                     i_dk_sz = int(info['disk_size'])
                     disk_over_committed_size += i_vt_sz - i_dk_sz
@@ -3301,6 +3430,10 @@ class LibvirtDriver(driver.ComputeDriver):
                 pass
             # NOTE(gtt116): give change to do other task.
             greenthread.sleep(0)
+        # Forget disks that no longer belong to any instance on this host.
+        for path in self._disk_geometry_cache.keys():
+            if path not in disk_paths:
+                del self._disk_geometry_cache[path]
         return disk_over_committed_size
 
     def unfilter_instance(self, instance_ref, network_info):
@@ -3367,25 +3500,13 @@ class LibvirtDriver(driver.ComputeDriver):
                 utils.execute('mkdir', '-p', inst_base)
             else:
                 utils.execute('ssh', dest, 'mkdir', '-p', inst_base)
-            for info in disk_info:
-                # assume inst_base == dirname(info['path'])
-                img_path = info['path']
-                fname = os.path.basename(img_path)
-                from_path = os.path.join(inst_base_resize, fname)
-                if info['type'] == 'qcow2' and info['backing_file']:
-                    tmp_path = from_path + "_rbase"
-                    # merge backing file
-                    utils.execute('qemu-img', 'convert', '-f', 'qcow2',
-                                  '-O', 'qcow2', from_path, tmp_path)
-
-                    if same_host:
-                        utils.execute('mv', tmp_path, img_path)
-                    else:
-                        libvirt_utils.copy_image(tmp_path, img_path, host=dest)
-                        utils.execute('rm', '-f', tmp_path)
-
-                else:  # raw or qcow2 with no backing file
-                    libvirt_utils.copy_image(from_path, img_path, host=dest)
+            transfer = disk_transfer.DiskTransfer(
+                    dest, functools.partial(self._update_migration_progress,
+                                            context, instance))
+            transfer.run([(functools.partial(self._migrate_disk, transfer,
+                                             info, inst_base_resize, dest),
+                           int(info['disk_size']))
+                          for info in disk_info])
         except Exception:
             with excutils.save_and_reraise_exception():
                 self._cleanup_remote_migration(dest, inst_base,
@@ -3393,6 +3514,57 @@ class LibvirtDriver(driver.ComputeDriver):
 
         return disk_info_text
 
+    def _migrate_disk(self, transfer, info, inst_base_resize, dest):
+        """Copy one disk of an instance being migrated to dest, or move it
+        into place when dest is None.
+        """
+        # assume inst_base == dirname(info['path'])
+        img_path = info['path']
+        fname = os.path.basename(img_path)
+        from_path = os.path.join(inst_base_resize, fname)
+        if info['type'] == 'qcow2' and info['backing_file']:
+            backing_path = os.path.join(CONF.instances_path,
+                                        CONF.base_dir_name,
+                                        info['backing_file'])
+            if self._base_image_exists(backing_path, dest):
+                # NOTE: The base image is already cached on the
+                # destination, so only the changes on top of it are sent.
+                transfer.copy(from_path, img_path, int(info['disk_size']))
+                return
+
+            tmp_path = from_path + "_rbase"
+            # merge backing file
+            utils.execute('qemu-img', 'convert', '-f', 'qcow2',
+                          '-O', 'qcow2', from_path, tmp_path)
+
+            if dest is None:
+                utils.execute('mv', tmp_path, img_path)
+            else:
+                transfer.copy(tmp_path, img_path,
+                              int(info['virt_disk_size']))
+                utils.execute('rm', '-f', tmp_path)
+
+        else:  # raw or qcow2 with no backing file
+            transfer.copy(from_path, img_path, int(info['disk_size']))
+
+    @staticmethod
+    def _base_image_exists(path, host):
+        """Check whether the base image at path exists on host, or locally
+        when host is None.
+        """
+        if host is None:
+            return os.path.exists(path)
+        try:
+            utils.execute('ssh', host, 'test', '-f', path)
+        except exception.ProcessExecutionError:
+            return False
+        return True
+
+    def _update_migration_progress(self, context, instance, progress):
+        LOG.debug(_("Copied %d%% of the disks"), progress, instance=instance)
+        self.virtapi.instance_update(context, instance['uuid'],
+                                     {'progress': progress})
+
     def _wait_for_running(self, instance):
         state = self.get_info(instance)['state']
 
@@ -3601,8 +3773,9 @@ class HostState(object):
         """Retrieve status info from libvirt."""
         LOG.debug(_("Updating host stats"))
         data = {}
+        domains_info = self.driver.get_info_all()
         data["vcpus"] = self.driver.get_vcpu_total()
-        data["vcpus_used"] = self.driver.get_vcpu_used()
+        data["vcpus_used"] = self.driver.get_vcpu_used(domains_info)
         data["cpu_info"] = jsonutils.loads(self.driver.get_cpu_info())
         disk_info_dict = self.driver.get_local_gb_info()
         data["disk_total"] = disk_info_dict['total']
@@ -3610,7 +3783,8 @@ class HostState(object):
         data["disk_available"] = disk_info_dict['free']
         data["host_memory_total"] = self.driver.get_memory_mb_total()
         data["host_memory_free"] = (data["host_memory_total"] -
-                                    self.driver.get_memory_mb_used())
+                                    self.driver.get_memory_mb_used(
+                                        domains_info))
         data["hypervisor_type"] = self.driver.get_hypervisor_type()
         data["hypervisor_version"] = self.driver.get_hypervisor_version()
         data["hypervisor_hostname"] = self.driver.get_hypervisor_hostname()
@@ -55,6 +55,7 @@ CONF = cfg.CONF
 CONF.register_opts(__imagebackend_opts)
 CONF.import_opt('base_dir_name', 'nova.virt.libvirt.imagecache')
 CONF.import_opt('preallocate_images', 'nova.virt.driver')
+CONF.import_opt('libvirt_images_thin_pool', 'nova.virt.libvirt.utils')
 
 LOG = logging.getLogger(__name__)
 
@@ -195,7 +196,7 @@ class Raw(Image):
         @lockutils.synchronized(base, 'nova-', external=True,
                                 lock_path=self.lock_path)
         def copy_raw_image(base, target, size):
-            libvirt_utils.copy_image(base, target)
+            libvirt_utils.clone_image(base, target)
             if size:
                 disk.extend(target, size)
 
@@ -282,6 +283,7 @@ class Lvm(Image):
             self.lv = '%s_%s' % (self.escape(instance['name']),
                                  self.escape(disk_name))
             self.path = os.path.join('/dev', self.vg, self.lv)
+        self.thin_pool = CONF.libvirt_images_thin_pool
 
         # TODO(pbrady): possibly deprecate libvirt_sparse_logical_volumes
         # for the more general preallocate_images
@@ -309,18 +311,57 @@ class Lvm(Image):
             if resize:
                 disk.resize2fs(self.path, run_as_root=True)
 
+        @lockutils.synchronized(base, 'nova-', external=True,
+                                lock_path=self.lock_path)
+        def create_thin_base(base, base_lv, base_size):
+            lvs = libvirt_utils.list_logical_volumes(self.vg)
+            if base_lv in lvs:
+                return
+            # NOTE: the image is written under another name and the volume
+            # only takes the base volume name once it is complete, so that
+            # a conversion cut short is never cloned.
+            partial_lv = libvirt_utils.thin_base_volume_name(base,
+                                                             partial=True)
+            partial_path = os.path.join('/dev', self.vg, partial_lv)
+            if partial_lv in lvs:
+                libvirt_utils.remove_logical_volumes(partial_path)
+            libvirt_utils.create_thin_lvm_image(self.vg, self.thin_pool,
+                                                partial_lv, base_size)
+            with self.remove_volume_on_error(partial_path):
+                images.convert_image(base, partial_path, 'raw',
+                                     run_as_root=True)
+                libvirt_utils.rename_logical_volume(self.vg, partial_lv,
+                                                    base_lv)
+
+        def create_thin_snapshot(base, size):
+            base_size = disk.get_disk_size(base)
+            resize = size > base_size
+            base_lv = libvirt_utils.thin_base_volume_name(base)
+            create_thin_base(base, base_lv, base_size)
+            libvirt_utils.create_thin_lvm_snapshot(
+                    self.vg, base_lv, self.lv, size=size if resize else None)
+            if resize:
+                disk.resize2fs(self.path, run_as_root=True)
+
         generated = 'ephemeral_size' in kwargs
 
         #Generate images with specified size right on volume
         if generated and size:
-            libvirt_utils.create_lvm_image(self.vg, self.lv,
-                                           size, sparse=self.sparse)
+            if self.thin_pool:
+                libvirt_utils.create_thin_lvm_image(self.vg, self.thin_pool,
+                                                    self.lv, size)
+            else:
+                libvirt_utils.create_lvm_image(self.vg, self.lv,
+                                               size, sparse=self.sparse)
             with self.remove_volume_on_error(self.path):
                 prepare_template(target=self.path, *args, **kwargs)
         else:
             prepare_template(target=base, *args, **kwargs)
             with self.remove_volume_on_error(self.path):
-                create_lvm_image(base, size)
+                if self.thin_pool:
+                    create_thin_snapshot(base, size)
+                else:
+                    create_lvm_image(base, size)
 
     @contextlib.contextmanager
     def remove_volume_on_error(self, path):
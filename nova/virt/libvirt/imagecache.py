@@ -32,6 +32,7 @@ from oslo.config import cfg
 
 from nova.compute import task_states
 from nova.compute import vm_states
+from nova import exception
 from nova.openstack.common import fileutils
 from nova.openstack.common import jsonutils
 from nova.openstack.common import lockutils
@@ -74,6 +75,9 @@ CONF = cfg.CONF
 CONF.register_opts(imagecache_opts)
 CONF.import_opt('host', 'nova.netconf')
 CONF.import_opt('instances_path', 'nova.compute.manager')
+CONF.import_opt('libvirt_images_volume_group',
+                'nova.virt.libvirt.imagebackend')
+CONF.import_opt('libvirt_images_thin_pool', 'nova.virt.libvirt.utils')
 
 
 def get_info_filename(base_path):
@@ -451,6 +455,38 @@ class ImageCacheManager(object):
                           {'base_file': base_file,
                            'error': e})
 
+    def _remove_base_volumes(self, base_dir):
+        """Remove the thin volumes holding base images for the LVM backend
+        whose base file is gone and which no instance disk is a snapshot of.
+
+        Returns nothing.
+        """
+        vg = CONF.libvirt_images_volume_group
+        if not (vg and CONF.libvirt_images_thin_pool):
+            return
+
+        # Volumes left partially written by a failed conversion are
+        # removed along with their base file too.
+        prefixes = (virtutils.thin_base_volume_name(''),
+                    virtutils.thin_base_volume_name('', partial=True))
+        try:
+            origins = virtutils.list_snapshot_origins(vg)
+            for lv in virtutils.list_logical_volumes(vg):
+                if lv in origins:
+                    continue
+                for prefix in prefixes:
+                    if lv.startswith(prefix):
+                        break
+                else:
+                    continue
+                if os.path.exists(os.path.join(base_dir, lv[len(prefix):])):
+                    continue
+                LOG.info(_('Removing base volume: %s'), lv)
+                virtutils.remove_logical_volumes(os.path.join('/dev', vg, lv))
+        except exception.ProcessExecutionError, e:
+            LOG.error(_('Failed to remove base volumes from %(vg)s, '
+                        'error was %(error)s'), {'vg': vg, 'error': e})
+
     def _handle_base_image(self, img_id, base_file):
         """Handle the checks for a single base image."""
 
@@ -584,5 +620,8 @@ class ImageCacheManager(object):
                 for base_file in self.removable_base_files:
                     self._remove_base_file(base_file)
 
+        if CONF.remove_unused_base_images:
+            self._remove_base_volumes(base_dir)
+
         # That's it
         LOG.debug(_('Verification complete'))
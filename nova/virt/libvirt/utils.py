@@ -35,6 +35,13 @@ libvirt_opts = [
                 default=False,
                 help='Compress snapshot images when possible. This '
                      'currently applies exclusively to qcow2 images'),
+    cfg.StrOpt('libvirt_images_thin_pool',
+               default=None,
+               help='LVM thin pool in libvirt_images_volume_group to hold VM'
+                    ' images. If set, images are created as thin snapshots'
+                    ' of a volume holding their base image. The pool must'
+                    ' zero new blocks, which is the LVM default, as thin'
+                    ' volumes are not overwritten when deleted.'),
     ]
 
 CONF = cfg.CONF
@@ -233,6 +240,59 @@ def create_lvm_image(vg, lv, size, sparse=False):
     execute(*cmd, run_as_root=True, attempts=3)
 
 
+def create_thin_lvm_image(vg, pool, lv, size):
+    """Create a thinly provisioned LVM image.
+
+    :param vg: existing volume group which holds the thin pool
+    :param pool: existing thin pool which should hold this image
+    :param lv: name for this image (logical volume)
+    :size: virtual size of image in bytes
+    """
+    execute('lvcreate', '-T', '%s/%s' % (vg, pool), '-V', '%db' % size,
+            '-n', lv, run_as_root=True, attempts=3)
+
+
+def thin_base_volume_name(base, partial=False):
+    """Name of the thin volume holding a base image for instances.
+
+    :param base: path of the base image
+    :param partial: name the volume while the image is written to it
+    """
+    if partial:
+        return 'nova-partial-base-%s' % os.path.basename(base)
+    return 'nova-base-%s' % os.path.basename(base)
+
+
+def rename_logical_volume(vg, lv, new_lv):
+    """Rename a logical volume.
+
+    :param vg: volume group which holds the logical volume
+    :param lv: current name of the logical volume
+    :param new_lv: new name for the logical volume
+    """
+    execute('lvrename', vg, lv, new_lv, run_as_root=True, attempts=3)
+
+
+def create_thin_lvm_snapshot(vg, origin, lv, size=None):
+    """Create a thin snapshot of a thinly provisioned LVM image.
+
+    The snapshot shares the blocks of its origin until it is written to,
+    so it is created in constant time whatever the size of the origin.
+
+    :param vg: volume group which holds the origin
+    :param origin: name of the origin logical volume
+    :param lv: name for the snapshot (logical volume)
+    :size: grow the snapshot to this size in bytes, if given
+    """
+    # NOTE: Thin snapshots are skipped on activation by default, -kn
+    # makes them active like any other volume.
+    execute('lvcreate', '-s', '-kn', '-n', lv, '%s/%s' % (vg, origin),
+            run_as_root=True, attempts=3)
+    if size:
+        execute('lvextend', '-L', '%db' % size, '%s/%s' % (vg, lv),
+                run_as_root=True, attempts=3)
+
+
 def get_volume_group_info(vg):
     """Return free/used/total space info for a volume group in bytes
 
@@ -268,6 +328,17 @@ def list_logical_volumes(vg):
     return [line.strip() for line in out.splitlines()]
 
 
+def list_snapshot_origins(vg):
+    """List the logical volumes of a volume group that have snapshots.
+
+    :param vg: volume group name
+    """
+    out, err = execute('lvs', '--noheadings', '-o', 'origin', vg,
+                       run_as_root=True)
+
+    return set(line.strip() for line in out.splitlines() if line.strip())
+
+
 def logical_volume_info(path):
     """Get logical volume info.
 
@@ -297,6 +368,17 @@ def logical_volume_size(path):
     return int(out)
 
 
+def logical_volume_is_thin(path):
+    """Check whether the logical volume is allocated from a thin pool.
+
+    :param path: logical volume path
+    """
+    out, _err = execute('lvs', '-o', 'pool_lv', '--noheadings', path,
+                        run_as_root=True)
+
+    return bool(out.strip())
+
+
 def clear_logical_volume(path):
     """Obfuscate the logical volume.
 
@@ -335,6 +417,10 @@ def remove_logical_volumes(*paths):
     """Remove one or more logical volume."""
 
     for path in paths:
+        # NOTE: Blocks freed from a thin pool are zeroed before the pool
+        # gives them to another volume, so thin volumes are not cleared.
+        if CONF.libvirt_images_thin_pool and logical_volume_is_thin(path):
+            continue
         clear_logical_volume(path)
 
     if paths:
@@ -391,12 +477,13 @@ def get_disk_backing_file(path, basename=True):
     return backing_file
 
 
-def copy_image(src, dest, host=None):
+def copy_image(src, dest, host=None, compression=True):
     """Copy a disk image to an existing directory
 
     :param src: Source image
     :param dest: Destination path
     :param host: Remote host
+    :param compression: Compress the data sent to a remote host
     """
 
     if not host:
@@ -411,15 +498,58 @@ def copy_image(src, dest, host=None):
         # Note however that rsync currently doesn't read sparse files
         # efficiently: https://bugzilla.samba.org/show_bug.cgi?id=8918
         # At least network traffic is mitigated with compression.
+        rsync = ('rsync', '--sparse')
+        if compression:
+            rsync += ('--compress',)
         try:
             # Do a relatively light weight test first, so that we
             # can fall back to scp, without having run out of space
             # on the destination for example.
-            execute('rsync', '--sparse', '--compress', '--dry-run', src, dest)
+            execute(*(rsync + ('--dry-run', src, dest)))
         except exception.ProcessExecutionError:
             execute('scp', src, dest)
         else:
-            execute('rsync', '--sparse', '--compress', src, dest)
+            execute(*(rsync + (src, dest)))
+
+
+# Whether reflinks work, by the device number of the directory being
+# cloned into.  Filesystems found not to support them are not tried again.
+_reflink_supported = {}
+
+# How cp reports that the filesystem cannot clone files, as opposed to a
+# failure of this one clone.
+_REFLINK_UNSUPPORTED_ERRORS = ('Operation not supported',
+                               'Inappropriate ioctl for device')
+
+
+def clone_image(src, dest):
+    """Clone a disk image, sharing its blocks where the filesystem can
+
+    On filesystems with reflink support (btrfs, OCFS2, XFS with reflink=1)
+    the clone takes constant time and space, until either file is written
+    to.  Elsewhere the image is copied with copy_image.
+
+    :param src: Source image
+    :param dest: Destination path
+    """
+    device = os.stat(os.path.dirname(os.path.abspath(dest))).st_dev
+    if _reflink_supported.get(device, True):
+        try:
+            execute('cp', '--reflink=always', src, dest)
+            _reflink_supported[device] = True
+            return
+        except exception.ProcessExecutionError, e:
+            stderr = e.stderr or ''
+            if not any(error in stderr
+                       for error in _REFLINK_UNSUPPORTED_ERRORS):
+                LOG.warn(_("Unable to clone %(src)s, copying it instead: "
+                           "%(error)s"), {'src': src, 'error': stderr})
+            else:
+                if device not in _reflink_supported:
+                    LOG.info(_("Reflinks are not supported for %s, copying "
+                               "images instead") % os.path.dirname(dest))
+                _reflink_supported[device] = False
+    copy_image(src, dest)
 
 
 def write_to_file(path, contents, umask=None):
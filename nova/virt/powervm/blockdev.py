@@ -117,12 +117,10 @@ class PowerVMLocalVolumeAdapter(PowerVMDiskAdapter):
 
         self.command = command.IVMCommand()
 
-        self._connection = None
         self.connection_data = connection
-
-    def _set_connection(self):
-        if self._connection is None:
-            self._connection = common.ssh_connect(self.connection_data)
+        self._pool = common.get_ssh_pool(
+                connection, CONF.powervm_ssh_pool_size,
+                CONF.powervm_ssh_keepalive_interval)
 
     def create_volume(self, size):
         """Creates a logical volume with a minimum size
@@ -513,9 +511,9 @@ class PowerVMLocalVolumeAdapter(PowerVMDiskAdapter):
 
         :param command: String with the command to run.
         """
-        self._set_connection()
-        stdout, stderr = utils.ssh_execute(self._connection, cmd,
-                                           check_exit_code=check_exit_code)
+        with self._pool.get() as ssh:
+            stdout, stderr = utils.ssh_execute(
+                    ssh, cmd, check_exit_code=check_exit_code)
         return stdout.strip().splitlines()
 
     def run_vios_command_as_root(self, command, check_exit_code=True):
@@ -523,7 +521,7 @@ class PowerVMLocalVolumeAdapter(PowerVMDiskAdapter):
 
         :param command: List of commands.
         """
-        self._set_connection()
-        stdout, stderr = common.ssh_command_as_root(
-            self._connection, command, check_exit_code=check_exit_code)
-        return stdout.read().splitlines()
+        with self._pool.get() as ssh:
+            stdout, stderr = common.ssh_command_as_root(
+                ssh, command, check_exit_code=check_exit_code)
+            return stdout.read().splitlines()
@@ -17,8 +17,10 @@
 import contextlib
 import ftplib
 import os
+import socket
 import uuid
 
+from eventlet import queue
 import paramiko
 
 from nova import exception as nova_exception
@@ -28,6 +30,12 @@ from nova.virt.powervm import exception
 
 LOG = logging.getLogger(__name__)
 
+# Errors that mean an SSH connection can no longer be used.
+CONNECTION_ERRORS = (paramiko.SSHException, socket.error, EOFError)
+
+# SSH connection pools by (host, port, username).
+_ssh_pools = {}
+
 
 class Connection(object):
 
@@ -58,6 +66,88 @@ def ssh_connect(connection):
         raise exception.PowerVMConnectionFailed()
 
 
+def _is_active(ssh):
+    transport = ssh.get_transport()
+    return transport is not None and transport.is_active()
+
+
+class SSHConnectionPool(object):
+    """A pool of SSH connections to one PowerVM manager.
+
+    Connections stay open between commands, send keepalives while idle
+    and are replaced when they are found dead or fail while in use.
+    """
+
+    def __init__(self, connection, max_size=1, keepalive=0):
+        """Constructor.
+
+        :param connection: a Connection object.
+        :param max_size: the most connections to keep open at once.
+        :param keepalive: seconds between keepalives on an idle
+                          connection, 0 to send none.
+        """
+        self.connection = connection
+        self.keepalive = keepalive
+        # NOTE: None marks a slot with no open connection yet.  The most
+        # recently used connection is handed out first, so idle slots
+        # are only connected when commands run concurrently.
+        self._free = queue.LifoQueue()
+        for i in xrange(max(max_size, 1)):
+            self._free.put(None)
+
+    def _connect(self):
+        ssh = ssh_connect(self.connection)
+        if self.keepalive:
+            ssh.get_transport().set_keepalive(self.keepalive)
+        return ssh
+
+    @contextlib.contextmanager
+    def get(self):
+        """Context yielding an active paramiko.SSHClient from the pool.
+
+        :raises: PowerVMConnectionFailed
+        """
+        ssh = self._free.get()
+        try:
+            if ssh is not None and not _is_active(ssh):
+                LOG.debug(_('SSH connection to %s was lost, reconnecting') %
+                          self.connection.host)
+                ssh.close()
+                ssh = None
+            if ssh is None:
+                ssh = self._connect()
+        except Exception:
+            self._free.put(None)
+            raise
+
+        try:
+            yield ssh
+        except CONNECTION_ERRORS:
+            ssh.close()
+            self._free.put(None)
+            raise
+        except Exception:
+            self._free.put(ssh)
+            raise
+        else:
+            self._free.put(ssh)
+
+
+def get_ssh_pool(connection, max_size=1, keepalive=0):
+    """Returns the SSH connection pool shared by users of a host.
+
+    :param connection: a Connection object.
+    :param max_size: pool size, used if the pool is created.
+    :param keepalive: keepalive interval, used if the pool is created.
+    """
+    key = (connection.host, connection.port, connection.username)
+    pool = _ssh_pools.get(key)
+    if pool is None:
+        pool = SSHConnectionPool(connection, max_size, keepalive)
+        _ssh_pools[key] = pool
+    return pool
+
+
 def ssh_command_as_root(ssh_connection, cmd, check_exit_code=True):
     """Method to execute remote command as root.
 
@@ -45,7 +45,19 @@ powervm_opts = [
                help='PowerVM image remote path'),
     cfg.StrOpt('powervm_img_local_path',
                default=None,
-               help='Local directory to download glance images to')
+               help='Local directory to download glance images to'),
+    cfg.IntOpt('powervm_ssh_pool_size',
+               default=2,
+               help='Number of SSH connections kept open to the PowerVM '
+                    'manager'),
+    cfg.IntOpt('powervm_ssh_keepalive_interval',
+               default=30,
+               help='Seconds between keepalives sent on idle SSH connections '
+                    'to the PowerVM manager, 0 to disable'),
+    cfg.IntOpt('powervm_inventory_cache_ttl',
+               default=300,
+               help='Seconds to cache the PowerVM manager hostname, volume '
+                    'groups and virtual ethernet adapter, 0 to disable'),
     ]
 
 CONF = cfg.CONF
@@ -18,9 +18,11 @@ import decimal
 import random
 import re
 import time
+import uuid
 
 from oslo.config import cfg
 
+from nova.common import memorycache
 from nova.compute import power_state
 from nova import exception as nova_exception
 from nova.openstack.common import excutils
@@ -142,26 +144,24 @@ class PowerVMOperator(object):
         return self._host_stats
 
     def _update_host_stats(self):
-        memory_info = self._operator.get_memory_info()
-        cpu_info = self._operator.get_cpu_info()
-
         # Note: disk avail information is not accurate. The value
         # is a sum of all Volume Groups and the result cannot
         # represent the real possibility. Example: consider two
         # VGs both 10G, the avail disk will be 20G however,
         # a 15G image does not fit in any VG. This can be improved
         # later on.
-        disk_info = self._operator.get_disk_info()
+        resources = self._operator.get_host_resources()
 
         data = {}
-        data['vcpus'] = cpu_info['total_procs']
-        data['vcpus_used'] = cpu_info['total_procs'] - cpu_info['avail_procs']
+        data['vcpus'] = resources['total_procs']
+        data['vcpus_used'] = (resources['total_procs'] -
+                              resources['avail_procs'])
         data['cpu_info'] = constants.POWERVM_CPU_INFO
-        data['disk_total'] = disk_info['disk_total']
-        data['disk_used'] = disk_info['disk_used']
-        data['disk_available'] = disk_info['disk_avail']
-        data['host_memory_total'] = memory_info['total_mem']
-        data['host_memory_free'] = memory_info['avail_mem']
+        data['disk_total'] = resources['disk_total']
+        data['disk_used'] = resources['disk_used']
+        data['disk_available'] = resources['disk_avail']
+        data['host_memory_total'] = resources['total_mem']
+        data['host_memory_free'] = resources['avail_mem']
         data['hypervisor_type'] = constants.POWERVM_HYPERVISOR_TYPE
         data['hypervisor_version'] = constants.POWERVM_HYPERVISOR_VERSION
         data['hypervisor_hostname'] = self._operator.get_hostname()
@@ -454,12 +454,28 @@ class BaseOperator(object):
                            information to connect to the remote
                            ssh.
         """
-        self._connection = None
         self.connection_data = connection
+        self._pool = common.get_ssh_pool(
+                connection, CONF.powervm_ssh_pool_size,
+                CONF.powervm_ssh_keepalive_interval)
+        self._inventory_cache = memorycache.get_client()
+
+    def _get_inventory(self, key, fetch):
+        """Run an inventory command through fetch, or reuse its output.
 
-    def _set_connection(self):
-        if self._connection is None:
-            self._connection = common.ssh_connect(self.connection_data)
+        While powervm_inventory_cache_ttl is positive, the output is kept
+        per managed system for that many seconds, saving an SSH round
+        trip to the IVM/HMC for each repeat.
+        """
+        ttl = CONF.powervm_inventory_cache_ttl
+        if ttl <= 0:
+            return fetch()
+        key = 'powervm-inventory-%s-%s' % (self.connection_data.host, key)
+        value = self._inventory_cache.get(key)
+        if value is None:
+            value = fetch()
+            self._inventory_cache.set(key, value, ttl)
+        return value
 
     def get_lpar(self, instance_name, resource_type='lpar'):
         """Return a LPAR object by its instance name.
@@ -562,24 +578,30 @@ class BaseOperator(object):
 
         :returns: id of the virtual ethernet adapter.
         """
-        cmd = self.command.lsmap('-all -net -field sea -fmt :')
-        output = self.run_vios_command(cmd)
-        sea = output[0]
-        cmd = self.command.lsdev('-dev %s -attr pvid' % sea)
-        output = self.run_vios_command(cmd)
-        # Returned output looks like this: ['value', '', '1']
-        if output:
-            return output[2]
+        def fetch():
+            cmd = self.command.lsmap('-all -net -field sea -fmt :')
+            output = self.run_vios_command(cmd)
+            sea = output[0]
+            cmd = self.command.lsdev('-dev %s -attr pvid' % sea)
+            output = self.run_vios_command(cmd)
+            # Returned output looks like this: ['value', '', '1']
+            if output:
+                return output[2]
 
-        return None
+            return None
+
+        return self._get_inventory('virtual-eth-adapter-id', fetch)
 
     def get_hostname(self):
         """Returns the managed system hostname.
 
         :returns: string -- hostname
         """
-        output = self.run_vios_command(self.command.hostname())
-        return output[0]
+        def fetch():
+            output = self.run_vios_command(self.command.hostname())
+            return output[0]
+
+        return self._get_inventory('hostname', fetch)
 
     def get_disk_name_by_vhost(self, vhost):
         """Returns the disk name attached to a vhost.
@@ -603,42 +625,37 @@ class BaseOperator(object):
         cmd = self.command.mkvdev('-vdev %s -vadapter %s') % (disk, vhost)
         self.run_vios_command(cmd)
 
-    def get_memory_info(self):
-        """Get memory info.
-
-        :returns: tuple - memory info (total_mem, avail_mem)
-        """
-        cmd = self.command.lshwres(
+    def _memory_info_cmd(self):
+        return self.command.lshwres(
             '-r mem --level sys -F configurable_sys_mem,curr_avail_sys_mem')
-        output = self.run_vios_command(cmd)
+
+    def _parse_memory_info(self, output):
         total_mem, avail_mem = output[0].split(',')
         return {'total_mem': int(total_mem),
                 'avail_mem': int(avail_mem)}
 
-    def get_cpu_info(self):
-        """Get CPU info.
-
-        :returns: tuple - cpu info (total_procs, avail_procs)
-        """
-        cmd = self.command.lshwres(
+    def _cpu_info_cmd(self):
+        return self.command.lshwres(
             '-r proc --level sys -F '
             'configurable_sys_proc_units,curr_avail_sys_proc_units')
-        output = self.run_vios_command(cmd)
+
+    def _parse_cpu_info(self, output):
         total_procs, avail_procs = output[0].split(',')
         return {'total_procs': float(total_procs),
                 'avail_procs': float(avail_procs)}
 
-    def get_disk_info(self):
-        """Get the disk usage information.
+    def _get_volume_groups(self):
+        return self._get_inventory(
+                'volume-groups',
+                lambda: self.run_vios_command(self.command.lsvg()))
 
-        :returns: tuple - disk info (disk_total, disk_used, disk_avail)
-        """
-        vgs = self.run_vios_command(self.command.lsvg())
+    def _vg_usage_cmd(self, vg):
+        return self.command.lsvg('%s -field totalpps usedpps freepps -fmt :'
+                                 % vg)
+
+    def _parse_disk_info(self, outputs):
         (disk_total, disk_used, disk_avail) = [0, 0, 0]
-        for vg in vgs:
-            cmd = self.command.lsvg('%s -field totalpps usedpps freepps -fmt :'
-                                    % vg)
-            output = self.run_vios_command(cmd)
+        for output in outputs:
             # Output example:
             # 1271 (10168 megabytes):0 (0 megabytes):1271 (10168 megabytes)
             (d_total, d_used, d_avail) = re.findall(r'(\d+) megabytes',
@@ -651,25 +668,125 @@ class BaseOperator(object):
                 'disk_used': disk_used,
                 'disk_avail': disk_avail}
 
+    def get_memory_info(self):
+        """Get memory info.
+
+        :returns: tuple - memory info (total_mem, avail_mem)
+        """
+        output = self.run_vios_command(self._memory_info_cmd())
+        return self._parse_memory_info(output)
+
+    def get_cpu_info(self):
+        """Get CPU info.
+
+        :returns: tuple - cpu info (total_procs, avail_procs)
+        """
+        output = self.run_vios_command(self._cpu_info_cmd())
+        return self._parse_cpu_info(output)
+
+    def get_disk_info(self):
+        """Get the disk usage information.
+
+        :returns: tuple - disk info (disk_total, disk_used, disk_avail)
+        """
+        vgs = self._get_volume_groups()
+        outputs = self.run_vios_commands([self._vg_usage_cmd(vg)
+                                          for vg in vgs])
+        return self._parse_disk_info(outputs)
+
+    def get_host_resources(self):
+        """Get the memory, CPU and disk info in one remote invocation.
+
+        :returns: dict -- the keys returned by get_memory_info,
+                  get_cpu_info and get_disk_info
+        """
+        vgs = self._get_volume_groups()
+        cmds = [self._memory_info_cmd(), self._cpu_info_cmd()]
+        cmds.extend(self._vg_usage_cmd(vg) for vg in vgs)
+        outputs = self.run_vios_commands(cmds)
+
+        resources = self._parse_memory_info(outputs[0])
+        resources.update(self._parse_cpu_info(outputs[1]))
+        resources.update(self._parse_disk_info(outputs[2:]))
+        return resources
+
     def run_vios_command(self, cmd, check_exit_code=True):
         """Run a remote command using an active ssh connection.
 
         :param command: String with the command to run.
         """
-        self._set_connection()
-        stdout, stderr = utils.ssh_execute(self._connection, cmd,
-                                           check_exit_code=check_exit_code)
+        with self._pool.get() as ssh:
+            stdout, stderr = utils.ssh_execute(
+                    ssh, cmd, check_exit_code=check_exit_code)
         return stdout.strip().splitlines()
 
+    def run_vios_commands(self, cmds, check_exit_code=True):
+        """Run several read-only commands in one remote invocation.
+
+        The commands run one after the other in a single shell, each
+        followed by a marker line carrying its exit status, and the
+        output is split back up at the markers.  As the commands only
+        read, the invocation is retried once on a new connection if the
+        connection fails.
+
+        :param cmds: list of command strings.
+        :returns: list -- the output lines of each command, in order.
+        """
+        if not cmds:
+            return []
+
+        marker = 'nova-powervm-%s' % uuid.uuid4().hex
+        script = '; '.join('%s; echo "%s:$?"' % (cmd, marker)
+                           for cmd in cmds)
+        for attempt in (1, 2):
+            try:
+                with self._pool.get() as ssh:
+                    stdout, stderr = utils.ssh_execute(
+                            ssh, script, check_exit_code=False)
+                break
+            except common.CONNECTION_ERRORS:
+                if attempt == 2:
+                    raise
+                LOG.debug(_('SSH connection failed running batched '
+                            'commands, retrying'))
+
+        outputs = []
+        lines = []
+        for line in stdout.splitlines():
+            pos = line.find(marker + ':')
+            if pos == -1:
+                lines.append(line)
+                continue
+            # NOTE: A command whose output does not end in a newline
+            # leaves it on the marker line.
+            if line[:pos]:
+                lines.append(line[:pos])
+            cmd = cmds[len(outputs)]
+            exit_code = int(line[pos + len(marker) + 1:])
+            output = '\n'.join(lines)
+            if check_exit_code and exit_code != 0:
+                raise nova_exception.ProcessExecutionError(
+                        exit_code=exit_code, stdout=output, stderr=stderr,
+                        cmd=cmd)
+            outputs.append(output.strip().splitlines())
+            lines = []
+
+        if len(outputs) != len(cmds):
+            raise nova_exception.ProcessExecutionError(
+                    stdout=stdout, stderr=stderr,
+                    cmd=cmds[len(outputs)],
+                    description=_('Batched command output was incomplete'))
+        return outputs
+
     def run_vios_command_as_root(self, command, check_exit_code=True):
         """Run a remote command as root using an active ssh connection.
 
         :param command: List of commands.
         """
-        self._set_connection()
-        stdout, stderr = common.ssh_command_as_root(
-            self._connection, command, check_exit_code=check_exit_code)
-        return stdout.read().splitlines()
+        with self._pool.get() as ssh:
+            stdout, stderr = common.ssh_command_as_root(
+                ssh, command, check_exit_code=check_exit_code)
+            return stdout.read().splitlines()
 
     def macs_for_instance(self, instance):
         pass
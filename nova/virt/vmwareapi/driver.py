@@ -51,6 +51,7 @@ from nova.virt.vmwareapi import error_util
 from nova.virt.vmwareapi import host
 from nova.virt.vmwareapi import vim
 from nova.virt.vmwareapi import vim_util
+from nova.virt.vmwareapi import vm_index
 from nova.virt.vmwareapi import vm_util
 from nova.virt.vmwareapi import vmops
 from nova.virt.vmwareapi import volumeops
@@ -231,6 +232,10 @@ class VMwareESXDriver(driver.ComputeDriver):
         """Return info about the VM instance."""
         return self._vmops.get_info(instance)
 
+    def get_info_all(self):
+        """Return the get_info() data of all VMs in one call."""
+        return self._vmops.get_info_all()
+
     def get_diagnostics(self, instance):
         """Return data about VM diagnostics."""
         return self._vmops.get_info(instance)
@@ -415,6 +420,7 @@ class VMwareAPISession(object):
         self._session_id = None
         self.vim = None
         self._create_session()
+        self.vm_ref_index = vm_index.VMRefIndex(self)
 
     def _get_vim_object(self):
         """Create the VIM Object instance."""
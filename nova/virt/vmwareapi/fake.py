@@ -524,6 +524,10 @@ class FakeVim(object):
         service_content.rootFolder = "RootFolder"
         service_content.sessionManager = "SessionManager"
         self._service_content = service_content
+        # Property filters created on the property collector, and what
+        # they covered at each version handed out by WaitForUpdatesEx.
+        self._property_filters = {}
+        self._filter_versions = {}
 
     def get_service_content(self):
         return self._service_content
@@ -702,6 +706,87 @@ class FakeVim(object):
                 continue
         return lst_ret_objs
 
+    def _create_filter(self, method, *args, **kwargs):
+        """Creates a property filter on the property collector."""
+        filter_ref = str(uuid.uuid4())
+        self._property_filters[filter_ref] = kwargs.get("spec")
+        return filter_ref
+
+    def _destroy_filter(self, method, *args, **kwargs):
+        """Destroys a property filter."""
+        self._property_filters.pop(args[0], None)
+
+    def _filter_contents(self, spec):
+        """Gets the properties a filter covers, keyed by object ref."""
+        type = spec.propSet[0].type
+        properties = spec.propSet[0].pathSet
+        contents = {}
+        for mdo_ref, mdo in _db_content[type].iteritems():
+            contents[mdo_ref] = dict((prop, mdo.get(prop))
+                                     for prop in properties)
+        return contents
+
+    def _wait_for_updates_ex(self, method, *args, **kwargs):
+        """
+        Reports the changes to the objects covered by the property filters
+        since the version given, or returns None if there are none.
+        """
+        version = kwargs.get("version") or ''
+        if version and version not in self._filter_versions:
+            raise error_util.VimFaultException(["InvalidCollectorVersion"],
+                                               _("Invalid version"))
+        old = self._filter_versions.get(version, {})
+        new = {}
+        filter_updates = []
+        for filter_ref, spec in self._property_filters.iteritems():
+            old_contents = old.get(filter_ref, {})
+            new_contents = self._filter_contents(spec)
+            new[filter_ref] = new_contents
+            object_updates = []
+            for obj_ref, props in new_contents.iteritems():
+                old_props = old_contents.get(obj_ref)
+                if old_props is None:
+                    kind = 'enter'
+                    old_props = {}
+                elif old_props != props:
+                    kind = 'modify'
+                else:
+                    continue
+                object_update = DataObject()
+                object_update.kind = kind
+                object_update.obj = obj_ref
+                object_update.changeSet = []
+                for name, val in props.iteritems():
+                    if name in old_props and old_props[name] == val:
+                        continue
+                    change = DataObject()
+                    change.name = name
+                    change.op = 'assign'
+                    change.val = val
+                    object_update.changeSet.append(change)
+                object_updates.append(object_update)
+            for obj_ref in old_contents:
+                if obj_ref not in new_contents:
+                    object_update = DataObject()
+                    object_update.kind = 'leave'
+                    object_update.obj = obj_ref
+                    object_updates.append(object_update)
+            if object_updates:
+                filter_update = DataObject()
+                filter_update.filter = filter_ref
+                filter_update.objectSet = object_updates
+                filter_updates.append(filter_update)
+
+        if not filter_updates:
+            return None
+        new_version = str(uuid.uuid4())
+        self._filter_versions[new_version] = new
+        update_set = DataObject()
+        update_set.version = new_version
+        update_set.filterSet = filter_updates
+        update_set.truncated = False
+        return update_set
+
     def _add_port_group(self, method, *args, **kwargs):
         """Adds a port group to the host system."""
         _host_sk = _db_content["HostSystem"].keys()[0]
@@ -767,6 +852,15 @@ class FakeVim(object):
         elif attr_name == "RetrieveProperties":
             return lambda *args, **kwargs: self._retrieve_properties(
                                                 attr_name, *args, **kwargs)
+        elif attr_name == "CreateFilter":
+            return lambda *args, **kwargs: self._create_filter(
+                                                attr_name, *args, **kwargs)
+        elif attr_name == "DestroyPropertyFilter":
+            return lambda *args, **kwargs: self._destroy_filter(
+                                                attr_name, *args, **kwargs)
+        elif attr_name == "WaitForUpdatesEx":
+            return lambda *args, **kwargs: self._wait_for_updates_ex(
+                                                attr_name, *args, **kwargs)
         elif attr_name == "AcquireCloneTicket":
             return lambda *args, **kwargs: self._just_return()
         elif attr_name == "AddPortGroup":
@@ -24,13 +24,16 @@ to the write using a LightQueue as a Pipe between the reader and the writer.
 from eventlet import event
 from eventlet import greenthread
 from eventlet import queue
+from eventlet import semaphore
 
 from nova import exception
 from nova.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
 
-IO_THREAD_SLEEP_TIME = .01
+# NOTE: Only yield between chunks. Sleeping for a fixed time after each
+# chunk caps the throughput of a transfer at chunk size / sleep time.
+IO_THREAD_SLEEP_TIME = 0
 GLANCE_POLL_INTERVAL = 5
 
 
@@ -71,6 +74,99 @@ class ThreadSafePipe(queue.LightQueue):
         pass
 
 
+class ParallelRangeReader(object):
+    """Reads a file as byte ranges fetched over several connections at once
+    and hands the data back in order, in pieces of at most block_size.
+
+    open_range(offset, length) must return a file-like object with the
+    data for that range. A range holds on to its connection until the
+    reader has taken all of it, so at most streams ranges are held in
+    memory at once."""
+
+    def __init__(self, open_range, size, chunk_size, streams, block_size):
+        self.open_range = open_range
+        self.size = size
+        self.chunk_size = chunk_size
+        self.block_size = block_size
+        self.transferred = 0
+        self._chunk_count = (size + chunk_size - 1) // chunk_size
+        self._chunks = [event.Event() for i in xrange(self._chunk_count)]
+        self._next_chunk = 0
+        self._read_chunk = 0
+        self._current = None
+        self._current_offset = 0
+        self._slots = semaphore.Semaphore(max(streams, 1))
+        self._threads = [greenthread.spawn(self._fetch_chunks)
+                         for i in xrange(min(streams, self._chunk_count))]
+
+    def _fetch_chunks(self):
+        """Fetch ranges until there are none left."""
+        while True:
+            self._slots.acquire()
+            index = self._next_chunk
+            if index >= self._chunk_count:
+                self._slots.release()
+                return
+            self._next_chunk += 1
+            offset = index * self.chunk_size
+            length = min(self.chunk_size, self.size - offset)
+            try:
+                self._chunks[index].send(self._fetch(offset, length))
+            except Exception, exc:
+                self._chunks[index].send_exception(exc)
+                return
+
+    def _fetch(self, offset, length):
+        handle = self.open_range(offset, length)
+        try:
+            data = []
+            remaining = length
+            while remaining > 0:
+                block = handle.read(remaining)
+                if not block:
+                    break
+                data.append(block)
+                remaining -= len(block)
+        finally:
+            handle.close()
+        if remaining != 0:
+            raise IOError(_("Expected %(length)d bytes at offset "
+                            "%(offset)d but got %(got)d") %
+                          {'length': length, 'offset': offset,
+                           'got': length - remaining})
+        return ''.join(data)
+
+    def read(self, chunk_size):
+        """Read the next piece of data. The chunk size is ignored for the
+        pieces are cut to the block size the reader was made with."""
+        if self._current is None:
+            if self._read_chunk >= self._chunk_count:
+                return ""
+            self._current = self._chunks[self._read_chunk].wait()
+            self._chunks[self._read_chunk] = None
+            self._read_chunk += 1
+            self._current_offset = 0
+        start = self._current_offset
+        data = self._current[start:start + self.block_size]
+        self._current_offset += len(data)
+        if self._current_offset >= len(self._current):
+            # The whole range has been handed out, let the next one be
+            # fetched in its place.
+            self._current = None
+            self._slots.release()
+        self.transferred += len(data)
+        return data
+
+    def get_size(self):
+        """Get size of the file to be read."""
+        return self.size
+
+    def close(self):
+        """Stop fetching any ranges that are still outstanding."""
+        for thread in self._threads:
+            thread.kill()
+
+
 class GlanceWriteThread(object):
     """Ensures that image data is written to in the glance client and that
     it is in correct ('active')state."""
@@ -150,6 +246,7 @@ class IOThread(object):
         self.output = output
         self._running = False
         self.got_exception = False
+        self.transferred = 0
 
     def start(self):
         self.done = event.Event()
@@ -165,6 +262,7 @@ class IOThread(object):
                         self.stop()
                         self.done.send(True)
                     self.output.write(data)
+                    self.transferred += len(data)
                     greenthread.sleep(IO_THREAD_SLEEP_TIME)
                 except Exception, exc:
                     self.stop()
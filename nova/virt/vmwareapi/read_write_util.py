@@ -148,16 +148,23 @@ class VMwareHTTPReadFile(VMwareHTTPFile):
     """VMware file read handler class."""
 
     def __init__(self, host, data_center_name, datastore_name, cookies,
-                 file_path, scheme="https"):
+                 file_path, scheme="https", offset=None, length=None):
         base_url = "%s://%s/folder/%s" % (scheme, host,
                                           urllib.pathname2url(file_path))
         param_list = {"dcPath": data_center_name, "dsName": datastore_name}
         base_url = base_url + "?" + urllib.urlencode(param_list)
         headers = {'User-Agent': USER_AGENT,
                    'Cookie': self._build_vim_cookie_headers(cookies)}
+        if offset is not None:
+            # Read just the byte range asked for.
+            headers['Range'] = 'bytes=%d-%d' % (offset, offset + length - 1)
         request = urllib2.Request(base_url, None, headers)
         conn = urllib2.urlopen(request)
         VMwareHTTPFile.__init__(self, conn)
+        if offset is not None and conn.getcode() != httplib.PARTIAL_CONTENT:
+            raise IOError(_("Range request for %(file_path)s returned "
+                            "status %(status)s") %
+                          {'file_path': file_path, 'status': conn.getcode()})
 
     def read(self, chunk_size):
         """Read a chunk of data."""
@@ -169,3 +176,7 @@ class VMwareHTTPReadFile(VMwareHTTPFile):
     def get_size(self):
         """Get size of the file to be read."""
         return self.file_handle.headers.get("Content-Length", -1)
+
+    def supports_ranges(self):
+        """Check if the server can serve byte ranges of the file."""
+        return self.file_handle.headers.get("Accept-Ranges") == "bytes"
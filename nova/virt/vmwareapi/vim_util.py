@@ -219,3 +219,45 @@ def get_properties_for_a_collection_of_objects(vim, type,
                                             lst_obj_specs, [prop_spec])
     return vim.RetrieveProperties(vim.get_service_content().propertyCollector,
                                    specSet=[prop_filter_spec])
+
+
+def get_objects_filter_spec(vim, type, properties_to_collect=None):
+    """
+    Builds a property filter spec covering every object of the type
+    specified in the inventory.
+    """
+    if not properties_to_collect:
+        properties_to_collect = ["name"]
+
+    client_factory = vim.client.factory
+    object_spec = build_object_spec(client_factory,
+                        vim.get_service_content().rootFolder,
+                        [build_recursive_traversal_spec(client_factory)])
+    property_spec = build_property_spec(client_factory, type=type,
+                                properties_to_collect=properties_to_collect)
+    return build_property_filter_spec(client_factory, [property_spec],
+                                      [object_spec])
+
+
+def create_filter(vim, prop_filter_spec):
+    """Creates a filter on the property collector for update tracking."""
+    return vim.CreateFilter(vim.get_service_content().propertyCollector,
+                            spec=prop_filter_spec, partialUpdates=False)
+
+
+def destroy_filter(vim, filter_ref):
+    """Destroys a filter created by create_filter."""
+    return vim.DestroyPropertyFilter(filter_ref)
+
+
+def wait_for_updates_ex(vim, version, max_wait_seconds=0):
+    """
+    Gets the changes seen by the property collector's filters since the
+    version specified, or None if there are none. An empty version gets
+    the current state of every object the filters cover.
+    """
+    client_factory = vim.client.factory
+    wait_options = client_factory.create('ns0:WaitOptions')
+    wait_options.maxWaitSeconds = max_wait_seconds
+    return vim.WaitForUpdatesEx(vim.get_service_content().propertyCollector,
+                                version=version, options=wait_options)
@@ -0,0 +1,139 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+An index of VirtualMachine names to managed object references.
+
+The index keeps a property filter on the names of every VM in the inventory
+and asks the property collector only for what changed since the version it
+last saw, so a lookup by name costs one small WaitForUpdatesEx call instead
+of fetching the name of every VM.
+"""
+
+from nova.openstack.common import log as logging
+from nova import utils
+from nova.virt.vmwareapi import vim_util
+
+LOG = logging.getLogger(__name__)
+
+
+def _moref_key(obj):
+    """Returns a hashable key for a managed object reference."""
+    return getattr(obj, 'value', obj)
+
+
+class VMRefIndex(object):
+    """Name to MoRef index of the VMs seen through a VMwareAPISession."""
+
+    def __init__(self, session):
+        self._session = session
+        self._filter = None
+        self._filter_session_id = None
+        self._version = None
+        self._names = {}
+        self._refs_by_name = {}
+        self._refresh = utils.CoalescedCall(self._load_updates)
+
+    def get_vm_ref(self, vm_name):
+        """Returns a reference to a VM with the name, or None."""
+        refs = self._refs_by_name.get(vm_name)
+        if not refs:
+            return None
+        return refs.values()[0]
+
+    def refresh(self):
+        """
+        Brings the index up to date. Returns False if the property
+        collector could not be used, in which case the caller has to look
+        the VM up some other way.
+        """
+        try:
+            self._refresh()
+        except Exception, excep:
+            LOG.warn(_("Unable to load the VM index: %s") % excep)
+            return False
+        return True
+
+    def _load_updates(self):
+        try:
+            if self._filter_session_id != self._session._session_id:
+                self._create_filter()
+            self._apply_updates()
+        except Exception, excep:
+            LOG.warn(_("Unable to get VM updates, reloading the VM "
+                       "index: %s") % excep)
+            try:
+                self._create_filter()
+                self._apply_updates()
+            except Exception:
+                self._filter_session_id = None
+                raise
+
+    def _create_filter(self):
+        """Creates the filter on the VM names and empties the index."""
+        if (self._filter is not None and
+                self._filter_session_id == self._session._session_id):
+            try:
+                self._session._call_method(vim_util, "destroy_filter",
+                                           self._filter)
+            except Exception, excep:
+                LOG.debug(excep)
+        self._filter = None
+        self._version = ''
+        self._names = {}
+        self._refs_by_name = {}
+        self._filter_session_id = self._session._session_id
+        spec = self._session._call_method(vim_util,
+                    "get_objects_filter_spec", "VirtualMachine", ["name"])
+        self._filter = self._session._call_method(vim_util, "create_filter",
+                                                  spec)
+
+    def _apply_updates(self):
+        while True:
+            update_set = self._session._call_method(vim_util,
+                                "wait_for_updates_ex", self._version)
+            if not update_set:
+                return
+            for filter_update in update_set.filterSet:
+                for object_update in filter_update.objectSet:
+                    self._apply_object_update(object_update)
+            self._version = update_set.version
+            if not getattr(update_set, 'truncated', False):
+                return
+
+    def _apply_object_update(self, object_update):
+        obj = object_update.obj
+        if object_update.kind == 'leave':
+            self._remove(obj)
+            return
+        for change in getattr(object_update, 'changeSet', None) or []:
+            if change.name != 'name':
+                continue
+            self._remove(obj)
+            if change.op != 'remove':
+                self._names[_moref_key(obj)] = change.val
+                self._refs_by_name.setdefault(change.val, {})[
+                        _moref_key(obj)] = obj
+
+    def _remove(self, obj):
+        key = _moref_key(obj)
+        name = self._names.pop(key, None)
+        if name is None:
+            return
+        refs = self._refs_by_name.get(name)
+        if refs is not None:
+            refs.pop(key, None)
+            if not refs:
+                del self._refs_by_name[name]
@@ -491,6 +491,9 @@ def search_datastore_spec(client_factory, file_name):
 
 def get_vm_ref_from_name(session, vm_name):
     """Get reference to the VM with the name specified."""
+    index = getattr(session, 'vm_ref_index', None)
+    if index is not None and index.refresh():
+        return index.get_vm_ref(vm_name)
     vms = session._call_method(vim_util, "get_objects",
                 "VirtualMachine", ["name"])
     for vm in vms:
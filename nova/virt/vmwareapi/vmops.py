@@ -1065,18 +1065,44 @@ class VMwareVMOps(object):
         vm_props = self._session._call_method(vim_util,
                     "get_object_properties", None, vm_ref, "VirtualMachine",
                     lst_properties)
+        prop_set = []
+        for elem in vm_props:
+            prop_set.extend(elem.propSet)
+        return self._get_info_from_props(prop_set)
+
+    def get_info_all(self):
+        """
+        Return data about every VM, keyed by VM name, fetched with a single
+        property collector call.
+        """
+        lst_properties = ["name", "summary.config.numCpu",
+                    "summary.config.memorySizeMB",
+                    "runtime.powerState"]
+        vms = self._session._call_method(vim_util, "get_objects",
+                    "VirtualMachine", lst_properties)
+        info_all = {}
+        for vm in vms:
+            vm_name = None
+            for prop in vm.propSet:
+                if prop.name == "name":
+                    vm_name = prop.val
+            if vm_name is not None:
+                info_all[vm_name] = self._get_info_from_props(vm.propSet)
+        return info_all
+
+    def _get_info_from_props(self, prop_set):
+        """Build the get_info dict from a VM's retrieved properties."""
         max_mem = None
         pwr_state = None
         num_cpu = None
-        for elem in vm_props:
-            for prop in elem.propSet:
-                if prop.name == "summary.config.numCpu":
-                    num_cpu = int(prop.val)
-                elif prop.name == "summary.config.memorySizeMB":
-                    # In MB, but we want in KB
-                    max_mem = int(prop.val) * 1024
-                elif prop.name == "runtime.powerState":
-                    pwr_state = VMWARE_POWER_STATES[prop.val]
+        for prop in prop_set:
+            if prop.name == "summary.config.numCpu":
+                num_cpu = int(prop.val)
+            elif prop.name == "summary.config.memorySizeMB":
+                # In MB, but we want in KB
+                max_mem = int(prop.val) * 1024
+            elif prop.name == "runtime.powerState":
+                pwr_state = VMWARE_POWER_STATES[prop.val]
 
         return {'state': pwr_state,
                 'max_mem': max_mem,
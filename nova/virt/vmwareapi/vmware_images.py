@@ -19,6 +19,10 @@
 Utility functions for Image transfer.
 """
 
+import time
+
+from oslo.config import cfg
+
 from nova import exception
 from nova.image import glance
 from nova.openstack.common import log as logging
@@ -27,7 +31,28 @@ from nova.virt.vmwareapi import read_write_util
 
 LOG = logging.getLogger(__name__)
 
-QUEUE_BUFFER_SIZE = 10
+vmware_images_opts = [
+    cfg.IntOpt('vmwareapi_image_transfer_streams',
+               default=4,
+               help='Number of connections used to read a disk file from '
+                    'the datastore when uploading it to the image service, '
+                    'if the datastore can serve byte ranges'),
+    cfg.IntOpt('vmwareapi_image_transfer_chunk_size',
+               default=2 * 1024 * 1024,
+               help='Size in bytes of each byte range read from the '
+                    'datastore by a parallel image transfer. Each '
+                    'connection holds one range in memory, so a transfer '
+                    'buffers up to vmwareapi_image_transfer_streams times '
+                    'this size (8MB with the defaults)'),
+    cfg.IntOpt('vmwareapi_image_transfer_buffer_chunks',
+               default=10,
+               help='Maximum number of 64KB chunks held in memory between '
+                    'the reader and the writer of an image transfer, on top '
+                    'of the ranges held by a parallel transfer'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(vmware_images_opts)
 
 
 def start_transfer(context, read_file_handle, data_size,
@@ -43,7 +68,8 @@ def start_transfer(context, read_file_handle, data_size,
 
     # The pipe that acts as an intermediate store of data for reader to write
     # to and writer to grab from.
-    thread_safe_pipe = io_util.ThreadSafePipe(QUEUE_BUFFER_SIZE, data_size)
+    thread_safe_pipe = io_util.ThreadSafePipe(
+            CONF.vmwareapi_image_transfer_buffer_chunks, data_size)
     # The read thread. In case of glance it is the instance of the
     # GlanceFileRead class. The glance client read returns an iterator
     # and this class wraps that iterator to provide datachunks in calls
@@ -62,12 +88,18 @@ def start_transfer(context, read_file_handle, data_size,
         write_thread = io_util.GlanceWriteThread(context, thread_safe_pipe,
                 image_service, image_id, image_meta)
     # Start the read and write threads.
+    start_time = time.time()
     read_event = read_thread.start()
     write_event = write_thread.start()
     try:
         # Wait on the read and write events to signal their end
         read_event.wait()
         write_event.wait()
+        elapsed = max(time.time() - start_time, 0.001)
+        LOG.debug(_("Transferred %(size)d bytes in %(elapsed).2f seconds "
+                    "(%(rate).2f MB/s)") %
+                  {'size': read_thread.transferred, 'elapsed': elapsed,
+                   'rate': read_thread.transferred / elapsed / (1 << 20)})
     except Exception, exc:
         # In case of any of the reads or writes raising an exception,
         # stop the threads so that we un-necessarily don't keep the other one
@@ -119,6 +151,7 @@ def upload_image(context, image, instance, **kwargs):
                                 kwargs.get("cookies"),
                                 kwargs.get("file_path"))
     file_size = read_file_handle.get_size()
+    read_file_handle = _get_parallel_read_handle(read_file_handle, **kwargs)
     (image_service, image_id) = glance.get_remote_image_service(context, image)
     # The properties and other fields that we need to set for the image.
     image_metadata = {"disk_format": "vmdk",
@@ -136,6 +169,35 @@ def upload_image(context, image, instance, **kwargs):
               instance=instance)
 
 
+def _get_parallel_read_handle(read_file_handle, **kwargs):
+    """
+    Swap a datastore read handle for one that reads byte ranges of the file
+    over several connections at once, if the datastore can serve ranges
+    and the file is big enough to be worth it.
+    """
+    streams = CONF.vmwareapi_image_transfer_streams
+    chunk_size = CONF.vmwareapi_image_transfer_chunk_size
+    file_size = int(read_file_handle.get_size())
+    if (streams <= 1 or file_size <= chunk_size or
+            not read_file_handle.supports_ranges()):
+        return read_file_handle
+
+    def _open_range(offset, length):
+        return read_write_util.VMwareHTTPReadFile(
+                                kwargs.get("host"),
+                                kwargs.get("data_center_name"),
+                                kwargs.get("datastore_name"),
+                                kwargs.get("cookies"),
+                                kwargs.get("file_path"),
+                                offset=offset, length=length)
+
+    read_file_handle.close()
+    LOG.debug(_("Reading %(file_path)s with %(streams)d connections") %
+              {'file_path': kwargs.get("file_path"), 'streams': streams})
+    return io_util.ParallelRangeReader(_open_range, file_size, chunk_size,
+                streams, read_write_util.READ_CHUNKSIZE)
+
+
 def get_vmdk_size_and_properties(context, image, instance):
     """
     Get size of the vmdk file that is to be downloaded for attach in spawn.
@@ -53,6 +53,7 @@ from nova.virt import driver
 from nova.virt.xenapi import host
 from nova.virt.xenapi import pool
 from nova.virt.xenapi import pool_states
+from nova.virt.xenapi import record_cache
 from nova.virt.xenapi import vm_utils
 from nova.virt.xenapi import vmops
 from nova.virt.xenapi import volumeops
@@ -114,6 +115,10 @@ xenapi_opts = [
     cfg.IntOpt('xenapi_login_timeout',
                default=10,
                help='Timeout in seconds for XenAPI login.'),
+    cfg.BoolOpt('xenapi_use_record_cache',
+                default=False,
+                help='Serve VM, VIF, VBD and VDI records from a local cache '
+                     'kept up to date from XenAPI events'),
     ]
 
 CONF = cfg.CONF
@@ -612,6 +617,8 @@ class XenAPIDriver(driver.ComputeDriver):
 class XenAPISession(object):
     """The session to invoke XenAPI SDK calls."""
 
+    record_cache = None
+
     def __init__(self, url, user, pw, virtapi):
         import XenAPI
         self.XenAPI = XenAPI
@@ -625,6 +632,8 @@ class XenAPISession(object):
         self.product_version, self.product_brand = \
             self._get_product_version_and_brand()
         self._virtapi = virtapi
+        if CONF.xenapi_use_record_cache:
+            self._start_record_cache(url, user, pw, exception)
 
     def _create_first_session(self, url, user, pw, exception):
         try:
@@ -644,6 +653,23 @@ class XenAPISession(object):
         self._sessions.put(session)
         return url
 
+    def _start_record_cache(self, url, user, pw, exception):
+        """Start the record cache on a session of its own, as it keeps an
+        event.from call waiting on its session most of the time.
+        """
+        session = self._create_session(url)
+        with timeout.Timeout(CONF.xenapi_login_timeout, exception):
+            session.login_with_password(user, pw)
+
+        def call_xenapi(method, *args):
+            return session.xenapi_request(method, args)
+
+        cache = record_cache.RecordCache(call_xenapi)
+        if cache.start():
+            self.record_cache = cache
+        else:
+            session.xenapi_request('session.logout', ())
+
     def _populate_session_pool(self, url, user, pw, exception):
         for i in xrange(CONF.xenapi_connection_concurrent - 1):
             session = self._create_session(url)
@@ -50,6 +50,7 @@
 A fake XenAPI SDK.
 """
 
+import copy
 import pickle
 import random
 import uuid
@@ -68,6 +69,10 @@ _CLASSES = ['host', 'network', 'session', 'pool', 'SR', 'VBD',
 
 _db_content = {}
 
+# Snapshots of the tables as they were when each event.from token was
+# handed out, so that later calls can report what has changed since.
+_event_snapshots = {}
+
 LOG = logging.getLogger(__name__)
 
 
@@ -80,6 +85,7 @@ def log_db_contents(msg=None):
 def reset():
     for c in _CLASSES:
         _db_content[c] = {}
+    _event_snapshots.clear()
     host = create_host('fake')
     create_vm('fake',
               'Running',
@@ -201,6 +207,7 @@ def after_VBD_create(vbd_ref, vbd_rec):
     is created."""
     vbd_rec['currently_attached'] = False
     vbd_rec['device'] = ''
+    vbd_rec.setdefault('other_config', {})
 
     vm_ref = vbd_rec['VM']
     vm_rec = _db_content['VM'][vm_ref]
@@ -354,6 +361,40 @@ def get_record(table, ref):
         raise Failure(['HANDLE_INVALID', table, ref])
 
 
+def get_events(classes, token):
+    """Return the events for the given classes since token was issued,
+    along with a new token.  An empty token returns every object."""
+    if token and token not in _event_snapshots:
+        raise Failure(['EVENTS_LOST'])
+    old = _event_snapshots.get(token, {})
+    tables = dict((c, c.lower()) for c in _CLASSES
+                  if c.lower() in [cls.lower() for cls in classes])
+    new = dict((table, copy.deepcopy(_db_content[table]))
+               for table in tables)
+
+    events = []
+    for table, cls in tables.iteritems():
+        old_recs = old.get(table, {})
+        new_recs = new[table]
+        for ref, rec in new_recs.iteritems():
+            if ref not in old_recs:
+                operation = 'add'
+            elif old_recs[ref] != rec:
+                operation = 'mod'
+            else:
+                continue
+            events.append({'class': cls, 'operation': operation,
+                           'ref': ref, 'snapshot': copy.deepcopy(rec)})
+        for ref in old_recs:
+            if ref not in new_recs:
+                events.append({'class': cls, 'operation': 'del',
+                               'ref': ref})
+
+    new_token = str(uuid.uuid4())
+    _event_snapshots[new_token] = new
+    return {'events': events, 'token': new_token, 'valid_ref_counts': {}}
+
+
 def check_for_session_leaks():
     if len(_db_content['session']) > 0:
         raise exception.NovaException('Sessions have leaked: %s' %
@@ -666,6 +707,9 @@ class SessionBase(object):
     def network_get_all_records_where(self, _1, filter):
         return self.xenapi.network.get_all_records()
 
+    def event_from(self, _1, classes, token, timeout):
+        return get_events(classes, token)
+
     def xenapi_request(self, methodname, params):
         if methodname.startswith('login'):
             self._login(methodname, params)
@@ -0,0 +1,188 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+A host-local cache of VM, VIF, VBD and VDI records.
+
+The cache is filled from a single event.from call with an empty token and
+is then kept up to date by a greenthread that long-polls event.from on a
+XenAPI session of its own, so reads are answered from memory and never
+take a session from the pool.  If events are lost the cache is reloaded.
+"""
+
+import copy
+
+from eventlet import greenthread
+from oslo.config import cfg
+
+from nova.openstack.common import log as logging
+
+xenapi_record_cache_opts = [
+    cfg.FloatOpt('xenapi_record_cache_poll_timeout',
+                 default=30.0,
+                 help='Seconds each event.from call made to keep the XenAPI '
+                      'record cache up to date waits for new events'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(xenapi_record_cache_opts)
+
+LOG = logging.getLogger(__name__)
+
+CACHED_CLASSES = ['VM', 'VIF', 'VBD', 'VDI']
+
+# event.from reports class names in lower case.
+_CLASS_NAMES = dict((cls.lower(), cls) for cls in CACHED_CLASSES)
+
+# Seconds to wait before polling again after event.from failed.
+_RETRY_INTERVAL = 5
+
+
+class RecordCache(object):
+    """Records of the cached classes, keyed by class and opaque ref."""
+
+    def __init__(self, call_xenapi):
+        """
+        :param call_xenapi: a function making XenAPI calls on the session
+                            reserved for the cache.
+        """
+        self._call_xenapi = call_xenapi
+        self._token = None
+        self._records = dict((cls, {}) for cls in CACHED_CLASSES)
+        self._vm_refs_by_name = {}
+        self._poller = None
+
+    def start(self):
+        """Load the cache and start keeping it up to date.
+
+        :returns: False if event.from is not available, in which case the
+                  cache cannot be used.
+        """
+        try:
+            self._load()
+        except Exception, exc:
+            LOG.warn(_("Unable to load the XenAPI record cache, reading "
+                       "records directly instead: %s"), exc)
+            return False
+        self._poller = greenthread.spawn(self._poll_forever)
+        return True
+
+    def stop(self):
+        if self._poller is not None:
+            self._poller.kill()
+            self._poller = None
+
+    def get_record(self, record_type, ref):
+        """Return a copy of the record, or None if it is not known."""
+        rec = self._records[record_type].get(ref)
+        return rec is not None and copy.deepcopy(rec) or None
+
+    def get_all_refs_and_recs(self, record_type):
+        """Return (ref, rec) pairs for every record of the type."""
+        return [(ref, copy.deepcopy(rec))
+                for ref, rec in self._records[record_type].items()]
+
+    def get_vm_refs_by_name(self, name_label):
+        """Return the refs of every VM with the given name_label."""
+        return list(self._vm_refs_by_name.get(name_label, []))
+
+    def set_vm_name_label(self, vm_ref, name_label):
+        """Record a VM rename that is known to have happened, without
+        waiting for its event.
+        """
+        rec = self._records['VM'].get(vm_ref)
+        if rec is not None:
+            rec = dict(rec, name_label=name_label)
+            self._store('VM', vm_ref, rec)
+
+    def remove(self, record_type, ref):
+        """Forget a record that is known to be gone, without waiting for
+        its event.
+        """
+        self._remove(record_type, ref)
+
+    def _poll_forever(self):
+        while True:
+            try:
+                self.poll(CONF.xenapi_record_cache_poll_timeout)
+            except Exception, exc:
+                LOG.warn(_("Unable to fetch XenAPI events, reloading the "
+                           "record cache: %s"), exc)
+                greenthread.sleep(_RETRY_INTERVAL)
+                try:
+                    self._load()
+                except Exception, exc:
+                    LOG.warn(_("Unable to reload the XenAPI record cache: "
+                               "%s"), exc)
+                    self._token = None
+
+    def poll(self, timeout):
+        """Apply the events since the last call, waiting up to timeout
+        seconds for some to arrive.
+        """
+        if self._token is None:
+            self._load()
+            return
+        result = self._call_xenapi('event.from', self._classes(),
+                                   self._token, float(timeout))
+        self._apply_events(result)
+
+    def _classes(self):
+        return [cls.lower() for cls in CACHED_CLASSES]
+
+    def _load(self):
+        """Reload every record from scratch."""
+        result = self._call_xenapi('event.from', self._classes(), '', 0.0)
+        self._token = None
+        self._records = dict((cls, {}) for cls in CACHED_CLASSES)
+        self._vm_refs_by_name = {}
+        self._apply_events(result)
+
+    def _apply_events(self, result):
+        for event in result['events']:
+            cls = _CLASS_NAMES.get(event['class'].lower())
+            if cls is None:
+                continue
+            ref = event['ref']
+            rec = event.get('snapshot')
+            if event['operation'] == 'del' or rec is None:
+                self._remove(cls, ref)
+                continue
+            self._store(cls, ref, rec)
+        self._token = result['token']
+
+    def _store(self, cls, ref, rec):
+        rec = copy.deepcopy(rec)
+        if cls == 'VM':
+            self._remove_vm_name(ref)
+            self._vm_refs_by_name.setdefault(rec['name_label'],
+                                             set()).add(ref)
+        self._records[cls][ref] = rec
+
+    def _remove(self, cls, ref):
+        if cls == 'VM':
+            self._remove_vm_name(ref)
+        self._records[cls].pop(ref, None)
+
+    def _remove_vm_name(self, vm_ref):
+        old_rec = self._records['VM'].get(vm_ref)
+        if old_rec is None:
+            return
+        refs = self._vm_refs_by_name.get(old_rec['name_label'])
+        if refs is not None:
+            refs.discard(vm_ref)
+            if not refs:
+                del self._vm_refs_by_name[old_rec['name_label']]
@@ -23,6 +23,7 @@ their attributes like VDIs, VIFs, as well as their lookup functions.
 
 import contextlib
 import decimal
+import errno
 import os
 import re
 import time
@@ -138,6 +139,12 @@ XENAPI_POWER_STATE = {
 
 
 SECTOR_SIZE = 512
+SPARSE_COPY_BUFFER_SIZE = 1024 * 1024
+SPARSE_COPY_YIELD_BYTES = 8 * 1024 * 1024
+# NOTE: os only has these from python 3.3, the values are Linux's. Where
+# they are not supported lseek fails and the whole source is read.
+SEEK_DATA = getattr(os, 'SEEK_DATA', 3)
+SEEK_HOLE = getattr(os, 'SEEK_HOLE', 4)
 MBR_SIZE_SECTORS = 63
 MBR_SIZE_BYTES = MBR_SIZE_SECTORS * SECTOR_SIZE
 KERNEL_DIR = '/boot/guest'
@@ -279,6 +286,10 @@ def destroy_vm(session, instance, vm_ref):
         LOG.exception(exc)
         return
 
+    cache = getattr(session, 'record_cache', None)
+    if cache is not None:
+        cache.remove('VM', vm_ref)
+
     LOG.debug(_("VM destroyed"), instance=instance)
 
 
@@ -1341,11 +1352,30 @@ def determine_is_pv(session, vdi_ref, disk_image_type, os_type):
 
 def set_vm_name_label(session, vm_ref, name_label):
     session.call_xenapi("VM.set_name_label", vm_ref, name_label)
+    cache = getattr(session, 'record_cache', None)
+    if cache is not None:
+        cache.set_vm_name_label(vm_ref, name_label)
+
+
+def get_record(session, record_type, ref):
+    """Return a record, from the session's record cache if it has one."""
+    cache = getattr(session, 'record_cache', None)
+    if cache is not None:
+        rec = cache.get_record(record_type, ref)
+        if rec is not None:
+            return rec
+    return session.call_xenapi('%s.get_record' % record_type, ref)
 
 
 def list_vms(session):
-    for vm_ref, vm_rec in session.get_all_refs_and_recs('VM'):
-        if (vm_rec["resident_on"] != session.get_xenapi_host() or
+    cache = getattr(session, 'record_cache', None)
+    if cache is not None:
+        vms = cache.get_all_refs_and_recs('VM')
+    else:
+        vms = session.get_all_refs_and_recs('VM')
+    host_ref = session.get_xenapi_host()
+    for vm_ref, vm_rec in vms:
+        if (vm_rec["resident_on"] != host_ref or
             vm_rec["is_a_template"] or vm_rec["is_control_domain"]):
             continue
         else:
@@ -1361,13 +1391,12 @@ def lookup_vm_vdis(session, vm_ref):
     if vbd_refs:
         for vbd_ref in vbd_refs:
             try:
-                vdi_ref = session.call_xenapi("VBD.get_VDI", vbd_ref)
+                vbd_rec = get_record(session, 'VBD', vbd_ref)
+                vdi_ref = vbd_rec['VDI']
                 # Test valid VDI
-                record = session.call_xenapi("VDI.get_record", vdi_ref)
+                record = get_record(session, 'VDI', vdi_ref)
                 LOG.debug(_('VDI %s is still available'), record['uuid'])
-                vbd_other_config = session.call_xenapi("VBD.get_other_config",
-                                                       vbd_ref)
-                if not vbd_other_config.get('osvol'):
+                if not vbd_rec['other_config'].get('osvol'):
                     # This is not an attached volume
                     vdi_refs.append(vdi_ref)
             except session.XenAPI.Failure, exc:
@@ -1375,9 +1404,32 @@ def lookup_vm_vdis(session, vm_ref):
     return vdi_refs
 
 
+def _lookup_cached(session, name_label):
+    """Return the refs the record cache has for name_label, or None if
+    XenAPI has to be asked instead.
+    """
+    cache = getattr(session, 'record_cache', None)
+    if cache is None:
+        return None
+    # NOTE: the cache lags behind XenAPI.  A VM created or renamed moments
+    # ago may be missing from it or still be listed under another name, so
+    # only a single hit whose name XenAPI confirms is trusted.
+    vm_refs = cache.get_vm_refs_by_name(name_label)
+    if len(vm_refs) != 1:
+        return None
+    try:
+        if session.call_xenapi("VM.get_name_label", vm_refs[0]) == name_label:
+            return vm_refs
+    except session.XenAPI.Failure:
+        pass
+    return None
+
+
 def lookup(session, name_label):
     """Look the instance up and return it if available."""
-    vm_refs = session.call_xenapi("VM.get_by_name_label", name_label)
+    vm_refs = _lookup_cached(session, name_label)
+    if vm_refs is None:
+        vm_refs = session.call_xenapi("VM.get_by_name_label", name_label)
     n = len(vm_refs)
     if n == 0:
         return None
@@ -2047,13 +2099,102 @@ def _resize_part_and_fs(dev, start, old_sectors, new_sectors):
     utils.execute('tune2fs', '-j', partition_path, run_as_root=True)
 
 
+def _nonzero_runs(data, block_size, empty_block):
+    """Return the (start, end) offsets of the runs of blocks in data that
+    are not all zeros."""
+    runs = []
+    run_start = None
+    for block_start in xrange(0, len(data), block_size):
+        if data[block_start:block_start + block_size] == empty_block:
+            if run_start is not None:
+                runs.append((run_start, block_start))
+                run_start = None
+        elif run_start is None:
+            run_start = block_start
+    if run_start is not None:
+        runs.append((run_start, len(data)))
+    return runs
+
+
+def _find_data(fd, offset, size):
+    """Return (start, end) of the next region of fd at or after offset that
+    may hold data, using SEEK_DATA/SEEK_HOLE where the source supports them.
+    Returns None if there is no more data before size.
+    """
+    try:
+        start = os.lseek(fd, offset, SEEK_DATA)
+    except OSError, e:
+        if e.errno == errno.ENXIO:
+            # Nothing but holes from offset to the end of the source.
+            return None
+        return offset, size
+    if start >= size:
+        return None
+    try:
+        end = os.lseek(fd, start, SEEK_HOLE)
+    except OSError:
+        end = size
+    return start, min(end, size)
+
+
+def _sparse_copy_fd(src, dst, virtual_size, block_size):
+    """Copy virtual_size bytes from the src to the dst file descriptor,
+    seeking over zeroed blocks instead of writing them. Returns the number
+    of bytes written.
+    """
+    empty_block = '\0' * block_size
+    # Read in large buffers, a multiple of the block size, and only look at
+    # individual blocks when a buffer has both data and zeroed blocks.
+    buffer_size = max(SPARSE_COPY_BUFFER_SIZE // block_size, 1) * block_size
+    empty_buffer = '\0' * buffer_size
+    bytes_written = 0
+    unyielded_bytes = 0
+    offset = 0
+    dst_offset = 0
+
+    while offset < virtual_size:
+        region = _find_data(src, offset, virtual_size)
+        if region is None:
+            break
+        offset, region_end = region
+        os.lseek(src, offset, os.SEEK_SET)
+        while offset < region_end:
+            data = os.read(src, min(buffer_size, region_end - offset))
+            if not data:
+                return bytes_written
+            data_len = len(data)
+            if data == empty_buffer[:data_len]:
+                runs = []
+            elif empty_block not in data:
+                runs = [(0, data_len)]
+            else:
+                runs = _nonzero_runs(data, block_size, empty_block)
+
+            for run_start, run_end in runs:
+                if dst_offset != offset + run_start:
+                    dst_offset = offset + run_start
+                    os.lseek(dst, dst_offset, os.SEEK_SET)
+                while run_start < run_end:
+                    written = os.write(dst, buffer(data, run_start,
+                                                   run_end - run_start))
+                    run_start += written
+                    dst_offset += written
+                    bytes_written += written
+
+            offset += data_len
+            # Yield to other greenthreads every few MB rather than on every
+            # block.
+            unyielded_bytes += data_len
+            if unyielded_bytes >= SPARSE_COPY_YIELD_BYTES:
+                unyielded_bytes = 0
+                greenthread.sleep(0)
+
+    return bytes_written
+
+
 def _sparse_copy(src_path, dst_path, virtual_size, block_size=4096):
     """Copy data, skipping long runs of zeros to create a sparse file."""
     start_time = time.time()
-    EMPTY_BLOCK = '\0' * block_size
-    bytes_read = 0
-    skipped_bytes = 0
-    left = virtual_size
 
     LOG.debug(_("Starting sparse_copy src=%(src_path)s dst=%(dst_path)s "
                 "virtual_size=%(virtual_size)d block_size=%(block_size)d"),
@@ -2064,32 +2205,25 @@ def _sparse_copy(src_path, dst_path, virtual_size, block_size=4096):
     # ownership of the devices.
     with utils.temporary_chown(src_path):
         with utils.temporary_chown(dst_path):
-            with open(src_path, "r") as src:
-                with open(dst_path, "w") as dst:
-                    data = src.read(min(block_size, left))
-                    while data:
-                        if data == EMPTY_BLOCK:
-                            dst.seek(block_size, os.SEEK_CUR)
-                            left -= block_size
-                            bytes_read += block_size
-                            skipped_bytes += block_size
-                        else:
-                            dst.write(data)
-                            data_len = len(data)
-                            left -= data_len
-                            bytes_read += data_len
-
-                        if left <= 0:
-                            break
-
-                        data = src.read(min(block_size, left))
-                        greenthread.sleep(0)
+            src = os.open(src_path, os.O_RDONLY)
+            try:
+                dst = os.open(dst_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+                try:
+                    bytes_written = _sparse_copy_fd(src, dst, virtual_size,
+                                                    block_size)
+                finally:
+                    os.close(dst)
+            finally:
+                os.close(src)
 
     duration = time.time() - start_time
-    compression_pct = float(skipped_bytes) / bytes_read * 100
+    skipped_bytes = virtual_size - bytes_written
+    compression_pct = float(skipped_bytes) / max(virtual_size, 1) * 100
+    rate = virtual_size / max(duration, 0.001) / (1 << 20)
 
-    LOG.debug(_("Finished sparse_copy in %(duration).2f secs, "
-                "%(compression_pct).2f%% reduction in size"), locals())
+    LOG.debug(_("Finished sparse_copy in %(duration).2f secs "
+                "(%(rate).2f MB/s), %(compression_pct).2f%% reduction in "
+                "size"), locals())
 
 
 def _copy_partition(session, src_ref, dst_ref, partition, virtual_size):
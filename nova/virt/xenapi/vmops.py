@@ -1270,18 +1270,18 @@ class VMOps(object):
     def get_info(self, instance, vm_ref=None):
         """Return data about VM instance."""
         vm_ref = vm_ref or self._get_vm_opaque_ref(instance)
-        vm_rec = self._session.call_xenapi("VM.get_record", vm_ref)
+        vm_rec = vm_utils.get_record(self._session, 'VM', vm_ref)
         return vm_utils.compile_info(vm_rec)
 
     def get_diagnostics(self, instance):
         """Return data about VM diagnostics."""
         vm_ref = self._get_vm_opaque_ref(instance)
-        vm_rec = self._session.call_xenapi("VM.get_record", vm_ref)
+        vm_rec = vm_utils.get_record(self._session, 'VM', vm_ref)
         return vm_utils.compile_diagnostics(vm_rec)
 
     def _get_vif_device_map(self, vm_rec):
         vif_map = {}
-        for vif in [self._session.call_xenapi("VIF.get_record", vrec)
+        for vif in [vm_utils.get_record(self._session, 'VIF', vrec)
                     for vrec in vm_rec['VIFs']]:
             vif_map[vif['device']] = vif['MAC']
         return vif_map